@@ -0,0 +1,77 @@
+"""
+Scaling benchmarks for the Cuebit prompt registry.
+
+Generates seeded synthetic registries of increasing size and times
+every PromptRegistry operation against each of them, writing a JSON
+report with p50/p95/p99 latencies and per-operation scaling curves.
+
+Usage:
+    python benchmarks/run_benchmarks.py                     # 1k and 10k versions
+    python benchmarks/run_benchmarks.py --profile full      # 1k to 1M versions
+    python benchmarks/run_benchmarks.py --profile wide -o results.json
+
+The same suite is available as `cuebit bench`.
+"""
+
+import argparse
+import json
+import sys
+
+from cuebit.bench import run_benchmarks, DEFAULT_SIZES, FULL_SIZES
+
+# Registry shapes worth comparing
+PROFILES = {
+    # Default shape at the default sizes
+    "quick": {"sizes": DEFAULT_SIZES, "shape": {}},
+    # Full scaling curve with the default shape
+    "full": {"sizes": FULL_SIZES, "shape": {}},
+    # Many projects with short histories, like a shared multi-team registry
+    "wide": {
+        "sizes": [10000, 100000],
+        "shape": {"projects": 120, "versions_per_task": 3, "tag_cardinality": 500},
+    },
+    # Few tasks with long histories and heavy few-shot examples
+    "deep": {
+        "sizes": [10000, 100000],
+        "shape": {
+            "projects": 5,
+            "versions_per_task": 200,
+            "examples_per_prompt": 5.0,
+            "example_words_median": 400,
+        },
+    },
+}
+
+
+def main():
+    """Run a benchmark profile and write its report."""
+    parser = argparse.ArgumentParser(description="Cuebit registry scaling benchmarks")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick",
+                        help="Benchmark profile to run")
+    parser.add_argument("--repeat", type=int, default=50, help="Samples per operation")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--work-dir", type=str, help="Keep benchmark databases in this directory")
+    parser.add_argument("-o", "--output", type=str, help="Output JSON file (stdout if omitted)")
+    args = parser.parse_args()
+
+    profile = PROFILES[args.profile]
+    report = run_benchmarks(
+        sizes=profile["sizes"],
+        repeat=args.repeat,
+        seed=args.seed,
+        work_dir=args.work_dir,
+        log=lambda message: print(message, file=sys.stderr),
+        **profile["shape"]
+    )
+    report["config"]["profile"] = args.profile
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
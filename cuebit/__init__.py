@@ -7,4 +7,5 @@ with version tracking, lineage tracking, aliases, and more.
 
 __version__ = "0.2.1"
 
-from cuebit.registry import PromptRegistry
\ No newline at end of file
+from cuebit.registry import PromptRegistry
+from cuebit.sharding import ShardedPromptRegistry
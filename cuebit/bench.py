@@ -0,0 +1,407 @@
+"""
+Benchmark suite for Cuebit registry operations.
+
+This module provides a seeded generator for synthetic registries of
+configurable size and shape, and a runner that times each
+PromptRegistry operation against registries of increasing size,
+producing latency percentiles and scaling curves as JSON.
+"""
+
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import sqlalchemy
+
+from cuebit.registry import PromptRegistry
+
+# Default registry sizes (total prompt versions) for a scaling curve
+DEFAULT_SIZES = [1000, 10000]
+FULL_SIZES = [1000, 10000, 100000, 1000000]
+
+# Default shape of a generated registry
+DEFAULT_SHAPE = {
+    "projects": 20,
+    "versions_per_task": 10,
+    "tag_cardinality": 50,
+    "max_tags_per_prompt": 4,
+    "template_words_median": 60,
+    "template_words_sigma": 0.8,
+    "examples_per_prompt": 1.0,
+    "example_words_median": 80,
+    "alias_fraction": 0.5,
+}
+
+# Number of prompts passed to each import_prompts call while generating
+_GENERATE_BATCH = 2000
+
+
+class RegistryGenerator:
+    """
+    Seeded generator of synthetic prompt registries.
+
+    Generates projects x tasks x versions with realistic lineage (each
+    version edits its parent's template), Zipf-distributed tags and
+    vocabulary, log-normally distributed template sizes and a Poisson
+    number of examples per prompt. The same seed and shape always
+    produce the same registry content.
+    """
+
+    def __init__(self, seed: int = 42, **shape):
+        """
+        Initialize the generator.
+
+        Args:
+            seed (int): Random seed
+            **shape: Overrides for DEFAULT_SHAPE keys
+        """
+        unknown = set(shape) - set(DEFAULT_SHAPE)
+        if unknown:
+            raise ValueError(f"Unknown generator options: {', '.join(sorted(unknown))}")
+
+        self.seed = seed
+        self.shape = dict(DEFAULT_SHAPE, **shape)
+        self.rng = np.random.RandomState(seed)
+        self.vocabulary = [f"w{i}" for i in range(5000)]
+        self.tags = [f"tag-{i}" for i in range(self.shape["tag_cardinality"])]
+
+    def _words(self, median: int) -> List[str]:
+        """Draw a Zipf-distributed run of words with a log-normal length."""
+        count = int(np.clip(
+            self.rng.lognormal(math.log(median), self.shape["template_words_sigma"]),
+            3, 4000
+        ))
+        ranks = np.minimum(self.rng.zipf(1.2, size=count), len(self.vocabulary)) - 1
+        return [self.vocabulary[r] for r in ranks]
+
+    def _template(self) -> str:
+        """Generate a base template with a few variables."""
+        words = self._words(self.shape["template_words_median"])
+        for v in range(self.rng.randint(1, 5)):
+            words.insert(self.rng.randint(0, len(words) + 1), f"{{var_{v}}}")
+        return " ".join(words)
+
+    def _edit(self, template: str) -> str:
+        """Derive a new version by replacing a few words of a template."""
+        words = template.split(" ")
+        for _ in range(max(1, len(words) // 20)):
+            pos = self.rng.randint(0, len(words))
+            if not words[pos].startswith("{"):
+                words[pos] = self.vocabulary[self.rng.randint(0, len(self.vocabulary))]
+        return " ".join(words)
+
+    def _prompt_tags(self) -> List[str]:
+        """Draw a Zipf-distributed set of tags."""
+        count = self.rng.randint(0, self.shape["max_tags_per_prompt"] + 1)
+        ranks = np.minimum(self.rng.zipf(1.5, size=count), len(self.tags)) - 1
+        return sorted({self.tags[r] for r in ranks})
+
+    def _examples(self) -> List[Dict[str, str]]:
+        """Draw a Poisson number of examples."""
+        return [
+            {
+                "input": " ".join(self._words(self.shape["example_words_median"])),
+                "output": " ".join(self._words(self.shape["example_words_median"] // 4)),
+                "description": f"example {i}"
+            }
+            for i in range(self.rng.poisson(self.shape["examples_per_prompt"]))
+        ]
+
+    def tasks_per_project(self, size: int) -> int:
+        """Number of tasks per project needed to reach a total version count."""
+        per_project = self.shape["projects"] * self.shape["versions_per_task"]
+        return max(1, math.ceil(size / per_project))
+
+    def generate(self, size: int):
+        """
+        Yield exported-format prompt dicts for a registry of a given size.
+
+        Args:
+            size (int): Total number of prompt versions
+
+        Yields:
+            Dict[str, Any]: Prompt data accepted by PromptRegistry.import_prompts
+        """
+        versions = self.shape["versions_per_task"]
+        tasks = self.tasks_per_project(size)
+        produced = 0
+
+        for t in range(tasks):
+            for p in range(self.shape["projects"]):
+                template = self._template()
+                parent_id = None
+                aliased = self.rng.rand() < self.shape["alias_fraction"]
+                for v in range(1, versions + 1):
+                    if produced >= size:
+                        return
+                    if v > 1:
+                        template = self._edit(template)
+                    prompt_id = str(uuid.UUID(int=int(self.rng.randint(0, 2 ** 62)) << 64 | produced))
+                    yield {
+                        "prompt_id": prompt_id,
+                        "project": f"project-{p}",
+                        "task": f"task-{t}",
+                        "template": template,
+                        "version": v,
+                        "alias": f"project-{p}-task-{t}-prod" if aliased and v == versions else None,
+                        "tags": self._prompt_tags(),
+                        "meta": {
+                            "model": ["gpt-4", "gpt-3.5-turbo", "claude"][self.rng.randint(0, 3)],
+                            "temperature": round(float(self.rng.rand()), 2)
+                        },
+                        "parent_id": parent_id,
+                        "template_variables": sorted(set(
+                            w[1:-1] for w in template.split(" ") if w.startswith("{")
+                        )),
+                        "updated_by": f"user-{self.rng.randint(0, 25)}",
+                        "examples": self._examples()
+                    }
+                    parent_id = prompt_id
+                    produced += 1
+
+    def populate(self, registry: PromptRegistry, size: int) -> Dict[str, Any]:
+        """
+        Fill a registry with a generated registry of a given size.
+
+        Prompts go through import_prompts in batches so every derived
+        table and index is maintained exactly as for real data.
+
+        Args:
+            registry (PromptRegistry): Registry to fill (normally empty)
+            size (int): Total number of prompt versions
+
+        Returns:
+            Dict[str, Any]: Import statistics
+        """
+        totals = {"total": 0, "imported": 0, "skipped": 0, "errors": 0}
+        batch = []
+
+        def flush():
+            results = registry.import_prompts(json.dumps(batch), format="json", skip_existing=False)
+            for key in totals:
+                totals[key] += results.get(key, 0)
+            batch.clear()
+
+        for prompt in self.generate(size):
+            batch.append(prompt)
+            if len(batch) >= _GENERATE_BATCH:
+                flush()
+        if batch:
+            flush()
+
+        return totals
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Summarize timing samples (in seconds) as milliseconds.
+
+    Args:
+        samples (List[float]): Durations in seconds
+
+    Returns:
+        Dict[str, float]: Count, mean, p50, p95, p99 and max in milliseconds
+    """
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "n": int(len(values)),
+        "mean_ms": round(float(values.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(values.max()), 4),
+    }
+
+
+def _time(operation: Callable[[], Any], repeat: int) -> List[float]:
+    """Run an operation repeatedly and return its durations."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def benchmark_registry(
+    registry: PromptRegistry,
+    scratch: PromptRegistry,
+    repeat: int = 50,
+    seed: int = 42
+) -> Dict[str, Dict[str, float]]:
+    """
+    Time each PromptRegistry operation against a populated registry.
+
+    Args:
+        registry (PromptRegistry): Populated registry to benchmark
+        scratch (PromptRegistry): Empty registry used as the import target
+        repeat (int): Samples per operation (heavy operations use fewer)
+        seed (int): Random seed for choosing inputs
+
+    Returns:
+        Dict[str, Dict[str, float]]: Percentile summary per operation
+    """
+    rng = np.random.RandomState(seed)
+
+    prompts, total = registry.list_prompts(page=1, page_size=1000)
+    if not prompts:
+        raise ValueError("Cannot benchmark an empty registry")
+
+    ids = [p.prompt_id for p in prompts]
+    aliases = [p.alias for p in prompts if p.alias]
+    projects = registry.list_projects()
+    tags = [tag for tag, _ in registry.get_tag_stats().most_common()]
+    words = [w for p in prompts[:50] for w in p.template.split(" ") if not w.startswith("{")]
+    pages = max(1, total // 20)
+
+    def pick(values):
+        return values[rng.randint(0, len(values))]
+
+    def compare():
+        history = registry.get_version_history(prompts[0].project, prompts[0].task)
+        registry.compare_versions(history[0].prompt_id, history[-1].prompt_id)
+
+    export_sample = json.loads(registry.export_prompts(project=projects[0]))
+    for p in export_sample:
+        p.pop("alias", None)
+
+    def import_project():
+        # Fresh ids each time so nothing is skipped
+        for p in export_sample:
+            p["prompt_id"] = str(uuid.uuid4())
+            p["parent_id"] = None
+        scratch.import_prompts(json.dumps(export_sample), format="json", skip_existing=False)
+
+    heavy = max(3, repeat // 10)
+    operations = {
+        "register": (lambda: registry.register_prompt(
+            task=prompts[0].task,
+            template=pick(prompts).template,
+            meta={"model": "gpt-4"},
+            tags=[pick(tags)] if tags else [],
+            project=prompts[0].project,
+            updated_by="bench"
+        ), repeat),
+        "get_prompt": (lambda: registry.get_prompt(pick(ids)), repeat),
+        "alias_resolve": (lambda: registry.get_prompt_by_alias(pick(aliases)), repeat if aliases else 0),
+        "list_page": (lambda: registry.list_prompts(page=rng.randint(1, pages + 1), page_size=20), repeat),
+        "list_tag_filter": (lambda: registry.list_prompts(tag_filter=[pick(tags)], page_size=20), repeat if tags else 0),
+        "search_page": (lambda: registry.search_prompts(pick(words), page_size=20), repeat),
+        "version_history": (lambda: registry.get_version_history(prompts[0].project, prompts[0].task), repeat),
+        "lineage": (lambda: registry.get_prompt_lineage(pick(ids)), repeat),
+        "compare": (compare, repeat),
+        "export_project": (lambda: registry.export_prompts(project=pick(projects)), heavy),
+        "import_project": (import_project, heavy),
+        "stats": (lambda: registry.get_usage_stats(), heavy),
+    }
+
+    results = {}
+    for name, (operation, count) in operations.items():
+        if count:
+            results[name] = percentiles(_time(operation, count))
+    return results
+
+
+def run_benchmarks(
+    sizes: Optional[List[int]] = None,
+    repeat: int = 50,
+    seed: int = 42,
+    work_dir: Optional[str] = None,
+    log: Optional[Callable[[str], None]] = None,
+    **shape
+) -> Dict[str, Any]:
+    """
+    Generate registries of increasing size and benchmark each one.
+
+    Args:
+        sizes (List[int], optional): Total prompt versions per run
+        repeat (int): Samples per operation
+        seed (int): Random seed for generation and inputs
+        work_dir (str, optional): Directory for the benchmark databases.
+            A temporary directory is used and removed if omitted.
+        log (Callable, optional): Called with progress messages
+        **shape: Overrides for DEFAULT_SHAPE keys
+
+    Returns:
+        Dict[str, Any]: Environment, per-size results and scaling curves
+
+    Example:
+        >>> report = run_benchmarks(sizes=[1000, 10000], repeat=20)
+        >>> print([point["p50_ms"] for point in report["scaling"]["alias_resolve"]])
+        "[0.41, 0.43]"
+    """
+    sizes = sizes or DEFAULT_SIZES
+    log = log or (lambda message: None)
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cuebit_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "numpy": np.__version__,
+        },
+        "config": {
+            "sizes": sizes,
+            "repeat": repeat,
+            "seed": seed,
+            "shape": dict(DEFAULT_SHAPE, **shape),
+        },
+        "results": [],
+        "scaling": {},
+    }
+
+    try:
+        for size in sizes:
+            db_path = os.path.join(work_dir, f"bench_{size}.db")
+            scratch_path = os.path.join(work_dir, f"bench_{size}_scratch.db")
+            for path in (db_path, scratch_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+            generator = RegistryGenerator(seed=seed, **shape)
+            registry = PromptRegistry(db_url=f"sqlite:///{db_path}")
+            scratch = PromptRegistry(db_url=f"sqlite:///{scratch_path}")
+
+            log(f"Generating {size} versions...")
+            start = time.perf_counter()
+            generated = generator.populate(registry, size)
+            generate_seconds = time.perf_counter() - start
+
+            log(f"Benchmarking {size} versions...")
+            operations = benchmark_registry(registry, scratch, repeat=repeat, seed=seed)
+
+            report["results"].append({
+                "versions": size,
+                "projects": generator.shape["projects"],
+                "tasks_per_project": generator.tasks_per_project(size),
+                "generate_seconds": round(generate_seconds, 3),
+                "generated": generated,
+                "db_size_bytes": os.path.getsize(db_path),
+                "operations": operations,
+            })
+            for name, summary in operations.items():
+                report["scaling"].setdefault(name, []).append({
+                    "versions": size,
+                    "p50_ms": summary["p50_ms"],
+                    "p95_ms": summary["p95_ms"],
+                    "p99_ms": summary["p99_ms"],
+                })
+
+            registry.engine.dispose()
+            scratch.engine.dispose()
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return report
@@ -7,6 +7,7 @@ through a command-line interface.
 """
 
 import argparse
+import gzip
 import uvicorn
 import subprocess
 import os
@@ -18,7 +19,10 @@ from typing import List, Dict, Any, Optional
 from pprint import pprint
 from datetime import datetime
 
-from cuebit.registry import PromptRegistry
+from cuebit.registry import PromptRegistry, split_tag_filter
+
+# Examples printed by "cuebit get"
+EXAMPLES_SHOWN = 5
 
 
 class CuebitCLI:
@@ -46,6 +50,16 @@ class CuebitCLI:
             cuebit render --alias summarizer-prod \   # Render a prompt
                 --vars '{"input":"text to summarize"}'
             cuebit export --format json               # Export all prompts to JSON
+            cuebit export --file all.ndjson.gz        # Stream a compressed export
+            cuebit export --split-by-project backup/  # One file per project + manifest
+            cuebit export --since 1h --file d.json    # Changes in the last hour
+            cuebit dedupe --threshold 0.9             # Find near-duplicate templates
+            cuebit gc --keep-last 5 \                 # Purge old versions and compact
+                --purge-deleted-after 30
+            cuebit archive --keep-last 3 \            # Move old versions to the archive
+                --older-than 90
+            cuebit backup prompts-backup.db.gz        # Online snapshot of the database
+            cuebit diagnose slow-queries              # Summarize the slow query log
             """
         )
         
@@ -70,7 +84,16 @@ class CuebitCLI:
         list_prompts = list_subparsers.add_parser("prompts", help="List prompts")
         list_prompts.add_argument("--project", type=str, help="Filter by project")
         list_prompts.add_argument("--search", type=str, help="Search term")
-        list_prompts.add_argument("--tags", type=str, help="Filter by tags (comma-separated)")
+        list_prompts.add_argument("--tags", type=str, 
+                                  help="Filter by tags (comma-separated, prefix with - to exclude, e.g. --tags=prod,-old)")
+        list_prompts.add_argument("--any-tag", action="store_true", 
+                                  help="Match prompts with any of the tags instead of all")
+        list_prompts.add_argument("--variable", type=str,
+                                  help="Only prompts whose template takes this variable")
+        
+        list_variables = list_subparsers.add_parser("variables", help="List template variables by usage")
+        list_variables.add_argument("--project", type=str, help="Filter by project")
+        list_variables.add_argument("--limit", type=int, help="Show only the most used variables")
         
         # get command
         get_parser = subparsers.add_parser("get", help="Get a prompt by ID or alias")
@@ -133,6 +156,8 @@ class CuebitCLI:
         history_parser = subparsers.add_parser("history", help="Show version history")
         history_parser.add_argument("project", type=str, help="Project name")
         history_parser.add_argument("task", type=str, help="Task name")
+        history_parser.add_argument("--archived", action="store_true", 
+                                    help="Include versions moved to the archive")
         
         # compare command
         compare_parser = subparsers.add_parser("compare", help="Compare two prompt versions")
@@ -142,21 +167,115 @@ class CuebitCLI:
         # export command
         export_parser = subparsers.add_parser("export", help="Export prompts")
         export_parser.add_argument("--project", type=str, help="Project to export (all if omitted)")
-        export_parser.add_argument("--format", type=str, choices=["json", "yaml"], default="json", 
-                                   help="Export format")
-        export_parser.add_argument("--file", type=str, help="Output file (stdout if omitted)")
+        export_parser.add_argument("--format", type=str, choices=["json", "ndjson", "yaml", "yaml-stream"], 
+                                   help="Export format (detected from --file, json for stdout)")
+        export_parser.add_argument("--file", type=str, 
+                                   help="Output file, gzipped if it ends in .gz (stdout if omitted)")
+        export_parser.add_argument("--split-by-project", type=str, metavar="DIR", 
+                                   help="Write one gzipped file per project plus a manifest to DIR")
+        export_parser.add_argument("--workers", type=int, 
+                                   help="Worker processes for --split-by-project (CPU count if omitted)")
+        export_parser.add_argument("--since", type=str, 
+                                   help="Only export changes from this time on (ISO 8601 or a duration like 1h), as a delta")
+        export_parser.add_argument("--until", type=str, 
+                                   help="Only export changes before this time, as a delta")
         
         # import command
         import_parser = subparsers.add_parser("import", help="Import prompts")
-        import_parser.add_argument("file", type=str, help="File to import")
-        import_parser.add_argument("--format", type=str, choices=["json", "yaml"], 
+        import_parser.add_argument("file", type=str, 
+                                   help="File, split-export manifest or directory to import")
+        import_parser.add_argument("--format", type=str, choices=["json", "ndjson", "yaml", "yaml-stream"], 
                                    help="Import format (detected from file extension if omitted)")
         import_parser.add_argument("--skip-existing", action="store_true", default=True, 
                                    help="Skip existing prompts")
+        import_parser.add_argument("--on-conflict", type=str, 
+                                   choices=["skip", "overwrite", "overwrite-if-newer", "fail"], 
+                                   help="What to do with prompts that already exist (default: skip)")
         
         # stats command
         subparsers.add_parser("stats", help="Show registry statistics")
         
+        # dedupe command
+        dedupe_parser = subparsers.add_parser("dedupe", help="Find near-duplicate prompt templates")
+        dedupe_parser.add_argument("--threshold", type=float, default=0.8, 
+                                   help="Minimum similarity between 0 and 1")
+        dedupe_parser.add_argument("--project", type=str, help="Limit to a project")
+        dedupe_parser.add_argument("--include-versions", action="store_true", 
+                                   help="Also report versions of the same task")
+        
+        # gc command
+        gc_parser = subparsers.add_parser("gc", help="Purge old versions and compact the database")
+        gc_parser.add_argument("--keep-last", type=int, 
+                               help="Keep the newest N versions per task (aliased versions are always kept)")
+        gc_parser.add_argument("--purge-deleted-after", type=float, metavar="DAYS",
+                               help="Purge prompts soft-deleted more than DAYS days ago")
+        gc_parser.add_argument("--batch-size", type=int, default=500, 
+                               help="Prompts deleted per transaction")
+        gc_parser.add_argument("--dry-run", action="store_true", help="Only report what would be purged")
+        gc_parser.add_argument("--no-vacuum", action="store_true", help="Skip releasing free pages")
+        gc_parser.add_argument("--full-vacuum", action="store_true", 
+                               help="Rewrite the whole database file instead of an incremental vacuum")
+        gc_parser.add_argument("--compress-examples", action="store_true", 
+                               help="Also compress large example bodies stored uncompressed")
+        gc_parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+        
+        # archive command
+        archive_parser = subparsers.add_parser("archive", help="Move superseded versions to the archive table")
+        archive_parser.add_argument("--keep-last", type=int, default=1, 
+                                    help="Keep the newest N versions per task in place (aliased versions are always kept)")
+        archive_parser.add_argument("--older-than", type=float, metavar="DAYS",
+                                    help="Only archive versions created more than DAYS days ago")
+        archive_parser.add_argument("--project", type=str, help="Only archive versions in this project")
+        archive_parser.add_argument("--batch-size", type=int, default=500, 
+                                    help="Prompts moved per transaction")
+        archive_parser.add_argument("--dry-run", action="store_true", help="Only report what would be archived")
+        archive_parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+        
+        # backup and restore commands
+        backup_parser = subparsers.add_parser("backup", help="Snapshot the SQLite database with the online backup API")
+        backup_parser.add_argument("dest", type=str, help="Backup file (gzip-compressed if it ends in .gz)")
+        backup_parser.add_argument("--pages-per-step", type=int, default=1024, 
+                                   help="Database pages copied per step; writers proceed between steps")
+        backup_parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+        
+        restore_parser = subparsers.add_parser("restore", help="Replace the database with a backup")
+        restore_parser.add_argument("source", type=str, help="Backup file written by 'cuebit backup'")
+        restore_parser.add_argument("--pages-per-step", type=int, default=1024, 
+                                    help="Database pages copied per step")
+        
+        # bench command
+        bench_parser = subparsers.add_parser("bench", help="Benchmark registry operations on synthetic data")
+        bench_parser.add_argument("--sizes", type=str, default="1000,10000", 
+                                  help="Comma-separated registry sizes in prompt versions")
+        bench_parser.add_argument("--full", action="store_true", 
+                                  help="Run the full 1k to 1M version scaling curve")
+        bench_parser.add_argument("--repeat", type=int, default=50, help="Samples per operation")
+        bench_parser.add_argument("--seed", type=int, default=42, help="Random seed")
+        bench_parser.add_argument("--projects", type=int, default=20, help="Projects per registry")
+        bench_parser.add_argument("--versions-per-task", type=int, default=10, help="Versions per task")
+        bench_parser.add_argument("--tag-cardinality", type=int, default=50, help="Number of distinct tags")
+        bench_parser.add_argument("--template-words", type=int, default=60, 
+                                  help="Median template length in words")
+        bench_parser.add_argument("--examples-per-prompt", type=float, default=1.0, 
+                                  help="Mean number of examples per prompt")
+        bench_parser.add_argument("--work-dir", type=str, 
+                                  help="Keep benchmark databases in this directory")
+        bench_parser.add_argument("--output", type=str, help="Output JSON file (stdout if omitted)")
+        
+        # diagnose command
+        diagnose_parser = subparsers.add_parser("diagnose", help="Diagnose registry performance")
+        diagnose_subparsers = diagnose_parser.add_subparsers(dest="diagnose_type", help="What to diagnose")
+        
+        slow_queries = diagnose_subparsers.add_parser("slow-queries", help="Show the slow query log")
+        slow_queries.add_argument("--log-file", type=str, 
+                                  help="Log file (defaults to the one next to the database)")
+        slow_queries.add_argument("--min-ms", type=float, default=0.0, 
+                                  help="Only show statements at least this slow")
+        slow_queries.add_argument("--limit", type=int, default=10, help="Maximum number of statements")
+        slow_queries.add_argument("--raw", action="store_true", 
+                                  help="List individual executions instead of grouping by statement")
+        slow_queries.add_argument("--json", action="store_true", help="Output as JSON")
+        
         # init command (new)
         init_parser = subparsers.add_parser("init", help="Initialize a prompt registry")
         init_parser.add_argument("--data-dir", type=str, help="Custom data directory for prompt registry")
@@ -228,17 +347,25 @@ class CuebitCLI:
     def list_prompts(self, args):
         """List prompts with filtering."""
         # Parse tag filter
-        tag_filter = None
+        tag_filter, exclude_tags = None, None
         if args.tags:
-            tag_filter = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+            tag_filter, exclude_tags = split_tag_filter(args.tags.split(","))
         
-        if args.project:
+        if args.variable:
+            prompts = self.registry.find_by_variable(args.variable, project=args.project)
+            print(f"Prompts using {{{args.variable}}}:")
+        elif args.project:
             # List prompts for specific project
             prompts = self.registry.list_prompts_by_project(args.project)
             print(f"Prompts in project '{args.project}':")
         else:
             # List all prompts
-            prompts, _ = self.registry.list_prompts(search_term=args.search, tag_filter=tag_filter)
+            prompts, _ = self.registry.list_prompts(
+                search_term=args.search,
+                tag_filter=tag_filter,
+                tag_mode="any" if args.any_tag else "all",
+                exclude_tags=exclude_tags
+            )
             print("All prompts:")
         
         if not prompts:
@@ -252,6 +379,7 @@ class CuebitCLI:
         for p in prompts:
             project = p.project or "Unassigned"
             projects_map[project][p.task].append(p)
+        example_counts = self.registry.get_example_counts([p.prompt_id for p in prompts])
         
         # Display prompts
         for project_name in sorted(projects_map.keys()):
@@ -269,22 +397,35 @@ class CuebitCLI:
                     tags_str = f" [{', '.join(tags)}]" if tags else ""
                     updated_by = f" by {p.updated_by}" if p.updated_by else ""
                     updated_at = p.updated_at.strftime("%Y-%m-%d")
+                    examples_str = f", {example_counts[p.prompt_id]} examples" if example_counts[p.prompt_id] else ""
                     
-                    print(f"      v{p.version}{alias_str}{tags_str} - {updated_at}{updated_by}")
+                    print(f"      v{p.version}{alias_str}{tags_str} - {updated_at}{updated_by}{examples_str}")
                     print(f"      ID: {p.prompt_id}")
     
+    def list_variables(self, args):
+        """List template variables with the number of prompts using them."""
+        usage = self.registry.get_variable_usage(project=args.project, limit=args.limit)
+        if not usage:
+            print("No template variables found")
+            return
+        
+        width = max(len(row["variable"]) for row in usage) + 2
+        print(f"{'Variable':<{width}} {'Prompts':>8} {'Tasks':>6}")
+        for row in usage:
+            print(f"{'{' + row['variable'] + '}':<{width}} {row['prompts']:>8} {row['tasks']:>6}")
+    
     def get_prompt(self, args):
         """Get a prompt by ID or alias."""
-        if args.by_alias:
-            prompt = self.registry.get_prompt_by_alias(args.identifier)
-            if not prompt:
-                print(f"No prompt found with alias '{args.identifier}'")
-                return
-        else:
-            prompt = self.registry.get_prompt(args.identifier)
-            if not prompt:
-                print(f"No prompt found with ID '{args.identifier}'")
-                return
+        detail = self.registry.get_prompt_detail(
+            args.identifier, examples_limit=EXAMPLES_SHOWN, lineage_depth=0
+        )
+        prompt = detail["prompt"] if detail else None
+        if args.by_alias and prompt and prompt.alias != args.identifier:
+            prompt = None
+        if not prompt:
+            kind = "alias" if args.by_alias else "ID"
+            print(f"No prompt found with {kind} '{args.identifier}'")
+            return
         
         # Display prompt details
         print(f"Prompt: {prompt.task} (v{prompt.version})")
@@ -311,14 +452,16 @@ class CuebitCLI:
         print("\nMetadata:")
         pprint(prompt.meta)
         
-        # Get examples
-        examples = self.registry.get_examples(prompt.prompt_id)
+        # Only the first examples are loaded; prompts may carry thousands
+        examples = detail["examples"]
         if examples:
             print("\nExamples:")
             for i, ex in enumerate(examples):
                 print(f"Example {i+1}: {ex.get('description', '')}")
                 print("  Input: " + ex.get('input', '')[:50] + ('...' if len(ex.get('input', '')) > 50 else ''))
                 print("  Output: " + ex.get('output', '')[:50] + ('...' if len(ex.get('output', '')) > 50 else ''))
+            if detail["example_count"] > len(examples):
+                print(f"... and {detail['example_count'] - len(examples)} more")
     
     def create_prompt(self, args):
         """Create a new prompt."""
@@ -447,19 +590,37 @@ class CuebitCLI:
     
     def delete_project(self, args):
         """Delete a project."""
-        count = self.registry.delete_project(args.project, use_soft_delete=not args.hard)
-        print(f"{count} prompts {'permanently deleted' if args.hard else 'soft deleted'} from project '{args.project}'")
+        if args.hard:
+            rows_deleted = self.registry.hard_delete_prompts(project=args.project)
+            print(f"{rows_deleted['prompts']} prompts permanently deleted from project '{args.project}'")
+            self._print_child_rows(rows_deleted)
+            return
+        count = self.registry.delete_project(args.project, use_soft_delete=True)
+        print(f"{count} prompts soft deleted from project '{args.project}'")
     
     def delete_task(self, args):
         """Delete a task in a project."""
+        if args.hard:
+            rows_deleted = self.registry.hard_delete_prompts(project=args.project, task=args.task)
+            print(f"{rows_deleted['prompts']} prompts permanently deleted from task '{args.task}' in project '{args.project}'")
+            self._print_child_rows(rows_deleted)
+            return
         count = self.registry.delete_prompts_by_project_task(
-            args.project, args.task, use_soft_delete=not args.hard
+            args.project, args.task, use_soft_delete=True
         )
-        print(f"{count} prompts {'permanently deleted' if args.hard else 'soft deleted'} from task '{args.task}' in project '{args.project}'")
+        print(f"{count} prompts soft deleted from task '{args.task}' in project '{args.project}'")
+    
+    def _print_child_rows(self, rows_deleted):
+        """Print the rows a hard delete removed from each child table."""
+        for table, count in rows_deleted.items():
+            if count and table != "prompts":
+                print(f"  {table}: {count} rows deleted")
     
     def show_history(self, args):
         """Show version history for a project/task."""
-        history = self.registry.get_version_history(args.project, args.task)
+        history = self.registry.get_version_history(
+            args.project, args.task, include_archived=args.archived
+        )
         
         if not history:
             print(f"No history found for {args.project}/{args.task}")
@@ -531,47 +692,73 @@ class CuebitCLI:
                 print(f"  Removed: {', '.join(['{' + v + '}' for v in comparison['variables_changes']['removed']])}")
     
     def export_prompts(self, args):
-        """Export prompts to a file or stdout."""
+        """Export prompts to a file, per-project files or stdout."""
         try:
+            if args.split_by_project:
+                from cuebit import exchange
+                extension = exchange.format_extension(args.format or "ndjson") + ".gz"
+                manifest = self.registry.export_by_project(
+                    args.split_by_project,
+                    extension=extension,
+                    max_workers=args.workers
+                )
+                for entry in manifest["files"]:
+                    print(f"{entry['file']}: {entry['prompts']} prompts, {entry['bytes']} bytes")
+                print(f"Exported {manifest['total_prompts']} prompts from {len(manifest['files'])} projects "
+                      f"to {args.split_by_project}")
+                return
+            
+            if args.since or args.until:
+                exported = self.registry.export_prompts(
+                    project=args.project,
+                    format=args.format or "json",
+                    since=args.since,
+                    until=args.until
+                )
+                if not args.file:
+                    print(exported)
+                    return
+                opener = gzip.open if args.file.endswith(".gz") else open
+                with opener(args.file, "wt", encoding="utf-8") as f:
+                    f.write(exported)
+                delta = json.loads(exported) if (args.format or "json") == "json" else None
+                summary = f" ({len(delta['prompts'])} changed, {len(delta['tombstones'])} deleted, next --since {delta['next_since']})" if delta else ""
+                print(f"Exported changes to {args.file}{summary}")
+                return
+            
+            if args.file:
+                result = self.registry.export_to_file(
+                    args.file,
+                    project=args.project,
+                    format=args.format
+                )
+                if not result["prompts"]:
+                    print("No prompts to export")
+                    return
+                print(f"Exported to {args.file} ({result['prompts']} prompts, {result['bytes']} bytes)")
+                return
+            
             exported = self.registry.export_prompts(
                 project=args.project,
-                format=args.format
+                format=args.format or "json"
             )
             
             if not exported:
                 print("No prompts to export")
                 return
             
-            if args.file:
-                with open(args.file, "w") as f:
-                    f.write(exported)
-                print(f"Exported to {args.file}")
-            else:
-                print(exported)
+            print(exported)
         except Exception as e:
             print(f"Export error: {str(e)}")
     
     def import_prompts(self, args):
-        """Import prompts from a file."""
-        # Determine format if not specified
-        format = args.format
-        if not format:
-            if args.file.endswith(".json"):
-                format = "json"
-            elif args.file.endswith(".yaml") or args.file.endswith(".yml"):
-                format = "yaml"
-            else:
-                print("Error: Could not determine format from file extension. Use --format.")
-                return
-        
+        """Import prompts from a file or a split export."""
         try:
-            with open(args.file, "r") as f:
-                import_data = f.read()
-            
-            results = self.registry.import_prompts(
-                data=import_data,
-                format=format,
-                skip_existing=args.skip_existing
+            results = self.registry.import_from_file(
+                args.file,
+                format=args.format,
+                skip_existing=args.skip_existing,
+                on_conflict=args.on_conflict
             )
             
             if "error" in results:
@@ -581,6 +768,10 @@ class CuebitCLI:
             print(f"Import completed:")
             print(f"- Total: {results['total']}")
             print(f"- Imported: {results['imported']}")
+            if "updated" in results:
+                print(f"- Updated: {results['updated']}")
+            if "deleted" in results:
+                print(f"- Deleted: {results['deleted']}")
             print(f"- Skipped: {results['skipped']}")
             print(f"- Errors: {results['errors']}")
             
@@ -619,6 +810,205 @@ class CuebitCLI:
             for tag, count in stats["top_tags"]:
                 print(f"- {tag}: {count} prompts")
     
+    def find_duplicates(self, args):
+        """Report near-duplicate prompt templates."""
+        try:
+            pairs = self.registry.find_near_duplicates(
+                threshold=args.threshold,
+                project=args.project,
+                include_same_task=args.include_versions
+            )
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        
+        if not pairs:
+            print(f"No near-duplicates found at threshold {args.threshold}")
+            return
+        
+        print(f"Found {len(pairs)} near-duplicate pairs:")
+        for pair in pairs:
+            first, second = pair["first"], pair["second"]
+            print(f"\n{pair['similarity']:.0%} similar")
+            print(f"  {first['project'] or 'Unassigned'}/{first['task']} v{first['version']} ({first['prompt_id']})")
+            print(f"  {second['project'] or 'Unassigned'}/{second['task']} v{second['version']} ({second['prompt_id']})")
+    
+    def run_gc(self, args):
+        """Apply retention policies and compact the database."""
+        try:
+            compressed = None
+            if args.compress_examples and not args.dry_run:
+                # Before gc, so the vacuum returns the freed pages
+                compressed = self.registry.compress_examples(batch_size=args.batch_size)
+            result = self.registry.gc(
+                keep_last=args.keep_last,
+                purge_deleted_after_days=args.purge_deleted_after,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run,
+                vacuum=not args.no_vacuum,
+                full_vacuum=args.full_vacuum
+            )
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        
+        if compressed is not None:
+            result["examples_compressed"] = compressed
+        
+        if args.json:
+            print(json.dumps(result, indent=2))
+            return
+        
+        if compressed is not None:
+            print(f"Compressed {compressed['compressed']} examples, "
+                  f"saving {compressed['bytes_saved'] / 1024:.1f} KiB")
+        verb = "Would purge" if result["dry_run"] else "Purged"
+        print(f"{verb} {result['superseded_versions']} superseded versions "
+              f"and {result['expired_deleted']} expired soft-deleted prompts")
+        for table, count in result["rows_deleted"].items():
+            if count:
+                print(f"  {table}: {count} rows deleted")
+        orphans = {t: c for t, c in result["orphans_removed"].items() if c}
+        if orphans:
+            label = "orphaned rows found" if result["dry_run"] else "orphaned rows removed"
+            for table, count in orphans.items():
+                print(f"  {table}: {count} {label}")
+        if result["vacuum"]:
+            vacuum = result["vacuum"]
+            kind = "Full vacuum" if vacuum["full_vacuum"] else "Incremental vacuum"
+            print(f"{kind} freed {vacuum['bytes_freed'] / 1024:.1f} KiB "
+                  f"(database is now {vacuum['size_bytes'] / 1024:.1f} KiB)")
+    
+    def run_archive(self, args):
+        """Move superseded versions to the archive table."""
+        try:
+            result = self.registry.archive_versions(
+                keep_last=args.keep_last,
+                older_than_days=args.older_than,
+                project=args.project,
+                batch_size=args.batch_size,
+                dry_run=args.dry_run
+            )
+        except ValueError as e:
+            print(f"Error: {str(e)}")
+            return
+        
+        if args.json:
+            print(json.dumps(result, indent=2))
+            return
+        
+        if result["dry_run"]:
+            print(f"Would archive {result['selected_versions']} versions")
+            return
+        print(f"Archived {result['archived']} versions")
+        for table, count in result["rows_deleted"].items():
+            if count and table != "prompts":
+                print(f"  {table}: {count} rows removed")
+    
+    def run_backup(self, args):
+        """Copy the database to a backup file."""
+        try:
+            result = self.registry.backup(args.dest, pages_per_step=args.pages_per_step)
+        except (ValueError, OSError) as e:
+            print(f"Backup error: {str(e)}")
+            return
+        
+        if args.json:
+            print(json.dumps(result, indent=2))
+            return
+        
+        kind = "compressed backup" if result["compressed"] else "backup"
+        print(f"Wrote {kind} to {result['path']}: {result['pages']} pages, "
+              f"{result['bytes']} bytes in {result['duration_ms']:.0f} ms")
+    
+    def run_restore(self, args):
+        """Replace the database with a backup file."""
+        try:
+            result = self.registry.restore(args.source, pages_per_step=args.pages_per_step)
+        except (ValueError, OSError) as e:
+            print(f"Restore error: {str(e)}")
+            return
+        
+        print(f"Restored {result['prompts']} prompts from {result['path']} "
+              f"({result['pages']} pages in {result['duration_ms']:.0f} ms)")
+    
+    def run_bench(self, args):
+        """Run the benchmark suite and write a JSON report."""
+        from cuebit.bench import run_benchmarks, FULL_SIZES
+        
+        if args.full:
+            sizes = FULL_SIZES
+        else:
+            try:
+                sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+            except ValueError:
+                print("Error: --sizes must be a comma-separated list of integers")
+                return
+        
+        report = run_benchmarks(
+            sizes=sizes,
+            repeat=args.repeat,
+            seed=args.seed,
+            work_dir=args.work_dir,
+            log=lambda message: print(message, file=sys.stderr),
+            projects=args.projects,
+            versions_per_task=args.versions_per_task,
+            tag_cardinality=args.tag_cardinality,
+            template_words_median=args.template_words,
+            examples_per_prompt=args.examples_per_prompt
+        )
+        
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output)
+            print(f"Benchmark report written to {args.output}")
+        else:
+            print(output)
+    
+    def show_slow_queries(self, args):
+        """Summarize the slow query log."""
+        from cuebit import slowlog
+        
+        path = args.log_file or self.registry.slow_query_log_path()
+        entries = [
+            entry for entry in slowlog.read_entries(path)
+            if entry.get("duration_ms", 0) >= args.min_ms
+        ]
+        if not entries:
+            print(f"No slow queries logged in {path}")
+            print("Enable logging with CUEBIT_SLOW_QUERY_MS=<threshold> or "
+                  "PromptRegistry.enable_slow_query_log()")
+            return
+        
+        if args.raw:
+            items = sorted(entries, key=lambda e: e["duration_ms"], reverse=True)[:args.limit]
+        else:
+            items = slowlog.summarize(entries)[:args.limit]
+        
+        if args.json:
+            print(json.dumps(items, indent=2))
+            return
+        
+        print(f"Slow query log: {path} ({len(entries)} entries)")
+        for item in items:
+            print()
+            if args.raw:
+                rows = item["rows"] if item.get("rows") is not None else "?"
+                print(f"{item['duration_ms']:.1f} ms  rows={rows}  {item['timestamp']}")
+                print(f"  Parameters: {item['parameters']}")
+                plan = item.get("plan")
+            else:
+                scan = "  FULL SCAN" if item["full_scan"] else ""
+                print(f"{item['total_ms']:.1f} ms total, {item['count']} calls, "
+                      f"mean {item['mean_ms']:.1f} ms, max {item['max_ms']:.1f} ms{scan}")
+                plan = item["plan"]
+            print("  " + " ".join(item["statement"].split()))
+            if plan:
+                print("  Plan:")
+                for line in plan:
+                    print(f"    {line}")
+    
     def init_registry(self, args):
         """Initialize a new prompt registry."""
         if args.data_dir:
@@ -657,10 +1047,12 @@ class CuebitCLI:
         elif args.command == "list":
             if args.list_type == "projects":
                 self.list_projects(args)
+            elif args.list_type == "variables":
+                self.list_variables(args)
             elif args.list_type == "prompts":
                 self.list_prompts(args)
             else:
-                print("Error: Missing list type (projects or prompts)")
+                print("Error: Missing list type (projects, prompts or variables)")
         elif args.command == "get":
             self.get_prompt(args)
         elif args.command == "create":
@@ -693,6 +1085,23 @@ class CuebitCLI:
             self.import_prompts(args)
         elif args.command == "stats":
             self.show_stats(args)
+        elif args.command == "dedupe":
+            self.find_duplicates(args)
+        elif args.command == "gc":
+            self.run_gc(args)
+        elif args.command == "archive":
+            self.run_archive(args)
+        elif args.command == "backup":
+            self.run_backup(args)
+        elif args.command == "restore":
+            self.run_restore(args)
+        elif args.command == "bench":
+            self.run_bench(args)
+        elif args.command == "diagnose":
+            if args.diagnose_type == "slow-queries":
+                self.show_slow_queries(args)
+            else:
+                print("Error: Missing diagnose type (slow-queries)")
         elif args.command == "init":
             self.init_registry(args)
 
@@ -17,7 +17,7 @@ import altair as alt
 import os
 import tempfile
 
-from cuebit.registry import PromptRegistry
+from cuebit.registry import IMPORT_CONFLICT_STRATEGIES, PromptRegistry
 
 # Set page config
 st.set_page_config(
@@ -29,6 +29,9 @@ st.set_page_config(
 # Initialize registry
 registry = PromptRegistry()
 
+# Examples shown on a prompt's detail page
+DETAIL_EXAMPLES = 20
+
 # Print DB URL during startup to help with troubleshooting
 print(f"Using database at: {registry.db_url}")
 
@@ -246,19 +249,17 @@ def render_version_history(project, task):
 
 def render_prompt_detail(prompt_id):
     """Render detailed view of a prompt."""
-    prompt = registry.get_prompt(prompt_id)
-    if not prompt:
+    detail = registry.get_prompt_detail(prompt_id, examples_limit=DETAIL_EXAMPLES)
+    if not detail:
         st.error("Prompt not found")
         return
+    prompt = detail["prompt"]
     
     # Add a back button at the top
     if st.button("← Back to Prompt Explorer", key="back_button_top"):
         st.session_state.pop("selected_prompt", None)
         st.rerun()
     
-    # Get lineage information
-    lineage = registry.get_prompt_lineage(prompt_id)
-    
     # Display prompt basic info
     col1, col2 = st.columns([2, 1])
     
@@ -297,27 +298,28 @@ def render_prompt_detail(prompt_id):
     st.markdown("### Version History")
     
     # Show ancestors
-    if lineage["ancestors"]:
+    if detail["ancestors"]:
         st.markdown("**Previous versions:**")
-        for ancestor in lineage["ancestors"]:
-            st.markdown(f"- v{ancestor.version} by {ancestor.updated_by or 'Unknown'} on {ancestor.updated_at.strftime('%Y-%m-%d')}")
+        for ancestor in detail["ancestors"]:
+            st.markdown(f"- v{ancestor['version']} by {ancestor['updated_by'] or 'Unknown'} on {ancestor['updated_at'].strftime('%Y-%m-%d')}")
     
     # Show descendants
-    if lineage["descendants"]:
+    if detail["descendants"]:
         st.markdown("**Later versions:**")
-        for descendant in lineage["descendants"]:
-            st.markdown(f"- v{descendant.version} by {descendant.updated_by or 'Unknown'} on {descendant.updated_at.strftime('%Y-%m-%d')}")
+        for descendant in detail["descendants"]:
+            st.markdown(f"- v{descendant['version']} by {descendant['updated_by'] or 'Unknown'} on {descendant['updated_at'].strftime('%Y-%m-%d')}")
     
-    # Get examples
-    examples = registry.get_examples(prompt_id)
+    examples = detail["examples"]
     if examples:
-        st.markdown("### Examples")
+        st.markdown(f"### Examples ({detail['example_count']})")
         for ex in examples:
             with st.expander(f"Example: {ex['description'] or 'Unnamed example'}"):
                 st.markdown("**Input:**")
                 st.text(ex["input"])
                 st.markdown("**Output:**")
                 st.text(ex["output"])
+        if detail["example_count"] > len(examples):
+            st.caption(f"Showing the first {len(examples)} of {detail['example_count']} examples")
     
     # Actions
     st.markdown("### Actions")
@@ -433,6 +435,26 @@ def prompt_builder():
             for warning in validation["warnings"]:
                 st.warning(warning)
     
+    # Similar existing prompts
+    if template:
+        with st.expander("Similar prompts"):
+            similar = registry.similar_prompts(template, k=5)
+            if editing:
+                similar = [s for s in similar if s["prompt_id"] != st.session_state["edit_prompt"]]
+            
+            if not similar:
+                st.info("No similar prompts found")
+            for match in similar:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    label = f"**{match['project'] or 'Unassigned'}/{match['task']}** v{match['version']}"
+                    if match["alias"]:
+                        label += f' <span class="alias-tag">{match["alias"]}</span>'
+                    st.markdown(label, unsafe_allow_html=True)
+                    st.caption(match["template"][:200])
+                with col2:
+                    st.metric("Similarity", f"{match['score']:.0%}")
+    
     # Tags
     tags = st.text_input(
         "Tags (comma separated)", 
@@ -692,6 +714,7 @@ def prompt_explorer():
     for p in prompts:
         project = p.project or "Unassigned"
         projects_map[project][p.task].append(p)
+    example_counts = registry.get_example_counts([p.prompt_id for p in prompts])
     
     # Display prompts
     if not projects_map:
@@ -724,6 +747,8 @@ def prompt_explorer():
                         with col3:
                             update_info = f"By: {p.updated_by or 'Unknown'}"
                             update_info += f" on {p.updated_at.strftime('%Y-%m-%d')}"
+                            if example_counts[p.prompt_id]:
+                                update_info += f" · {example_counts[p.prompt_id]} examples"
                             st.markdown(update_info)
                             
                         with col4:
@@ -799,6 +824,24 @@ def dashboard_view():
         else:
             st.info("No tag data available")
     
+    # Template variables, from the variable index
+    st.subheader("Template Variables")
+    
+    variable_df = pd.DataFrame(registry.get_variable_usage(limit=15))
+    
+    if not variable_df.empty:
+        chart = alt.Chart(variable_df).mark_bar().encode(
+            x=alt.X('prompts:Q', title='Number of Prompts'),
+            y=alt.Y('variable:N', title='Variable', sort='-x'),
+            tooltip=['variable', 'prompts', 'tasks']
+        ).properties(
+            title='Variables by Usage'
+        )
+        
+        st.altair_chart(chart, use_container_width=True)
+    else:
+        st.info("No template variables found")
+    
     # Recent prompts
     st.subheader("Recent Prompts")
     
@@ -890,15 +933,21 @@ def import_export_view():
         st.subheader("Import Prompts")
         
         # Upload file
-        uploaded_file = st.file_uploader("Upload Import File", type=["json", "yaml", "yml"])
+        uploaded_file = st.file_uploader("Upload Import File", type=["json", "yaml", "yml", "yamls", "ymls"])
         
-        skip_existing = st.checkbox("Skip Existing Prompts", value=True)
+        on_conflict = st.selectbox(
+            "Existing Prompts",
+            IMPORT_CONFLICT_STRATEGIES,
+            help="skip keeps them, overwrite replaces them, overwrite-if-newer replaces older ones, fail aborts"
+        )
         
         if uploaded_file is not None:
             # Determine format from file extension
             file_format = uploaded_file.name.split(".")[-1].lower()
             if file_format == "yml":
                 file_format = "yaml"
+            elif file_format in ("yamls", "ymls"):
+                file_format = "yaml-stream"
             
             # Read file content
             import_data = uploaded_file.read().decode("utf-8")
@@ -908,7 +957,7 @@ def import_export_view():
                     results = registry.import_prompts(
                         data=import_data,
                         format=file_format,
-                        skip_existing=skip_existing
+                        on_conflict=on_conflict
                     )
                     
                     if "error" in results:
@@ -918,6 +967,7 @@ def import_export_view():
                         Import completed:
                         - Total: {results['total']}
                         - Imported: {results['imported']}
+                        - Updated: {results.get('updated', 0)}
                         - Skipped: {results['skipped']}
                         - Errors: {results['errors']}
                         """)
@@ -0,0 +1,223 @@
+"""
+Near-duplicate detection for Cuebit prompt templates.
+
+Templates are reduced to word shingles and hashed into MinHash
+signatures. Signatures are bucketed with LSH banding so that
+candidate pairs can be found in near-linear time instead of
+comparing every template against every other one.
+"""
+
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Set, Tuple
+
+import numpy as np
+
+# Number of hash permutations in a signature
+NUM_PERM = 128
+
+# Number of words per shingle
+SHINGLE_SIZE = 3
+
+# Fixed seed so persisted signatures stay comparable across processes
+_SEED = 1
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+@lru_cache(maxsize=8)
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the (a, b) coefficients of the universal hash permutations."""
+    rng = np.random.RandomState(_SEED)
+    # Keeping a, b and the shingle hashes below 2**32 means a * x + b
+    # never overflows uint64.
+    a = rng.randint(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """
+    Split text into a set of overlapping word shingles.
+
+    Args:
+        text (str): Text to shingle
+        size (int): Number of words per shingle
+
+    Returns:
+        Set[str]: Lowercased word shingles
+    """
+    tokens = re.findall(r"\w+", (text or "").lower())
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def minhash_signature(text: str, num_perm: int = NUM_PERM) -> np.ndarray:
+    """
+    Compute the MinHash signature of a text.
+
+    Args:
+        text (str): Text to hash
+        num_perm (int): Number of hash permutations
+
+    Returns:
+        np.ndarray: uint32 array of length num_perm
+    """
+    items = shingles(text)
+    if not items:
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint32)
+
+    a, b = _permutations(num_perm)
+    hashes = np.fromiter(
+        (zlib.crc32(item.encode("utf-8")) for item in items),
+        dtype=np.uint64,
+        count=len(items)
+    )
+    # One row per shingle, one column per permutation
+    permuted = (np.outer(hashes, a) + b) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def is_empty_signature(signature: np.ndarray) -> bool:
+    """
+    Check whether a signature was computed from text with no shingles.
+
+    All such texts share one signature, so they must not be compared
+    with each other as if they were duplicates.
+    """
+    return bool(np.all(np.asarray(signature) == _MAX_HASH))
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    """Serialize a signature for storage."""
+    return np.asarray(signature, dtype=np.uint32).tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    """Deserialize a stored signature."""
+    return np.frombuffer(data, dtype=np.uint32)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    Choose the number of bands and rows per band for a similarity threshold.
+
+    Picks the (bands, rows) split that minimizes the combined probability
+    of false positives below the threshold and false negatives above it.
+
+    Args:
+        threshold (float): Jaccard similarity threshold in (0, 1)
+        num_perm (int): Number of permutations in each signature
+
+    Returns:
+        Tuple[int, int]: Number of bands and rows per band
+    """
+    below = np.linspace(0.0, threshold, 100)
+    above = np.linspace(threshold, 1.0, 100)
+
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        false_positive = np.mean(1 - (1 - below ** rows) ** bands) * threshold
+        false_negative = np.mean((1 - above ** rows) ** bands) * (1 - threshold)
+        error = false_positive + false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+
+    return best[1], best[2]
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int, rows: int) -> np.ndarray:
+    """
+    Find candidate pairs that share at least one LSH band bucket.
+
+    Args:
+        signatures (np.ndarray): (n, num_perm) uint32 signature matrix
+        bands (int): Number of bands
+        rows (int): Rows per band
+
+    Returns:
+        np.ndarray: (m, 2) array of row index pairs with i < j
+    """
+    n = signatures.shape[0]
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # Random multipliers fold each band into a single uint64 bucket key.
+    # Rare key collisions only add candidates, which are verified later.
+    rng = np.random.RandomState(_SEED)
+    multipliers = rng.randint(1, 2 ** 63 - 1, size=rows, dtype=np.uint64) | np.uint64(1)
+
+    pairs = set()
+    for band in range(bands):
+        chunk = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys = (chunk * multipliers).sum(axis=1)
+
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_keys)) + 1))
+        ends = np.concatenate((starts[1:], [n]))
+
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            bucket = np.sort(order[start:end])
+            for x in range(len(bucket) - 1):
+                for y in bucket[x + 1:]:
+                    pairs.add((int(bucket[x]), int(y)))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.array(sorted(pairs), dtype=np.int64)
+
+
+def estimate_similarity(signatures: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """
+    Estimate the Jaccard similarity of each pair from their signatures.
+
+    Args:
+        signatures (np.ndarray): (n, num_perm) signature matrix
+        pairs (np.ndarray): (m, 2) array of row index pairs
+
+    Returns:
+        np.ndarray: Estimated similarity for each pair
+    """
+    result = np.empty(len(pairs), dtype=np.float64)
+    # Compare in chunks to bound memory on very large candidate sets
+    for start in range(0, len(pairs), 10000):
+        chunk = pairs[start:start + 10000]
+        result[start:start + 10000] = (
+            signatures[chunk[:, 0]] == signatures[chunk[:, 1]]
+        ).mean(axis=1)
+    return result
+
+
+def find_duplicate_pairs(
+    signatures: np.ndarray,
+    threshold: float = 0.8
+) -> List[Tuple[int, int, float]]:
+    """
+    Find all pairs of signatures whose estimated similarity meets a threshold.
+
+    Args:
+        signatures (np.ndarray): (n, num_perm) signature matrix
+        threshold (float): Minimum estimated Jaccard similarity
+
+    Returns:
+        List[Tuple[int, int, float]]: (i, j, similarity) for each match
+    """
+    if signatures.shape[0] < 2:
+        return []
+
+    bands, rows = lsh_params(threshold, signatures.shape[1])
+    pairs = candidate_pairs(signatures, bands, rows)
+    if len(pairs) == 0:
+        return []
+
+    similarity = estimate_similarity(signatures, pairs)
+    keep = similarity >= threshold
+    return [
+        (int(i), int(j), float(s))
+        for (i, j), s in zip(pairs[keep], similarity[keep])
+    ]
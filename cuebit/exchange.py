@@ -0,0 +1,462 @@
+"""
+Export and import file formats for Cuebit.
+
+Exports are streams of prompt records (the dictionaries produced by
+PromptRegistry.iter_export_records). They can be written as a JSON
+array, newline-delimited JSON (one record per line), a YAML list or a
+YAML stream (one record per "---" document), each optionally
+gzip-compressed. The format is taken from the file name: "prompts.json",
+"prompts.ndjson.gz", "prompts.yaml", "prompts.yamls" and so on. NDJSON
+and YAML stream files are written and read one record at a time, so
+neither side holds the whole registry in memory. YAML goes through
+libyaml's C loader and dumper when PyYAML was built with it.
+
+export_split_by_project writes one file per project from a process pool
+plus a manifest.json listing the files, their prompt counts and checksums.
+
+A delta document (PromptRegistry.export_changes) is a JSON or YAML object
+with "format": "cuebit-delta", the since/until window it covers, the
+prompts changed in that window and tombstones for prompts deleted in it.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Formats understood by write_records and read_records
+FORMATS = ("json", "ndjson", "yaml", "yaml-stream")
+
+# Formats read record by record rather than parsed as one document
+STREAMED_FORMATS = ("ndjson", "yaml-stream")
+
+# Records serialized per yaml.dump call when writing YAML
+YAML_BATCH_SIZE = 100
+
+# File name extensions per format; ".gz" may follow any of them
+FORMAT_EXTENSIONS = {
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".yamls": "yaml-stream",
+    ".ymls": "yaml-stream",
+}
+
+# Name of the manifest written next to per-project export files
+MANIFEST_NAME = "manifest.json"
+
+# File name used for prompts without a project in split exports
+UNASSIGNED_NAME = "_unassigned"
+
+# Value of the "format" key identifying delta documents
+DELTA_FORMAT = "cuebit-delta"
+
+# Seconds per unit of relative since/until bounds such as "15m"
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def detect_format(path: str) -> Tuple[str, bool]:
+    """
+    Return (format, gzip-compressed) for an export file name.
+
+    Args:
+        path (str): File name such as "backup.ndjson.gz"
+
+    Returns:
+        Tuple[str, bool]: One of FORMATS and whether the file is gzipped
+    """
+    name = os.path.basename(path).lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    for extension, format in FORMAT_EXTENSIONS.items():
+        if name.endswith(extension):
+            return format, compressed
+    raise ValueError(f"Cannot determine the export format of {path}; use .json, .ndjson, .yaml or .yamls (optionally .gz)")
+
+
+def format_extension(format: str) -> str:
+    """Return the usual file extension for a format, e.g. ".yamls" for "yaml-stream"."""
+    for extension, name in FORMAT_EXTENSIONS.items():
+        if name == format:
+            return extension
+    raise ValueError(f"Unsupported export format: {format}")
+
+
+def _open_text(path: str, mode: str, compressed: bool):
+    """Open a text file, through gzip when compressed."""
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_records(
+        path: str,
+        records: Iterable[Dict[str, Any]],
+        format: Optional[str] = None,
+        compressed: Optional[bool] = None
+    ) -> Dict[str, Any]:
+    """
+    Stream export records to a file.
+
+    Args:
+        path (str): Output file
+        records (Iterable[Dict[str, Any]]): Records to write
+        format (str, optional): One of FORMATS; detected from path if omitted
+        compressed (bool, optional): Gzip the output; detected from path if omitted
+
+    Returns:
+        Dict[str, Any]: path, format, compressed, prompts written and file size in bytes
+    """
+    if format is None:
+        format = detect_format(path)[0]
+    if compressed is None:
+        compressed = path.lower().endswith(".gz")
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+
+    counter = _Counter(records)
+    with _open_text(path, "w", compressed) as f:
+        for chunk in encode_records(counter, format):
+            f.write(chunk)
+
+    return {
+        "path": path,
+        "format": format,
+        "compressed": compressed,
+        "prompts": counter.count,
+        "bytes": os.path.getsize(path),
+    }
+
+
+class _Counter:
+    """Iterable wrapper counting the records drawn from it."""
+
+    def __init__(self, records: Iterable[Dict[str, Any]]):
+        self.records = records
+        self.count = 0
+
+    def __iter__(self):
+        for record in self.records:
+            self.count += 1
+            yield record
+
+
+def encode_records(records: Iterable[Dict[str, Any]], format: str) -> Iterator[str]:
+    """
+    Serialize export records as a stream of text chunks.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): Records to serialize
+        format (str): One of FORMATS
+
+    Yields:
+        str: Consecutive pieces of the document
+    """
+    if format == "ndjson":
+        for record in records:
+            yield json.dumps(record, separators=(",", ":")) + "\n"
+    elif format == "json":
+        first = True
+        yield "["
+        for record in records:
+            yield ("\n" if first else ",\n") + json.dumps(record, indent=2)
+            first = False
+        yield "]\n" if first else "\n]\n"
+    elif format == "yaml":
+        # Block sequences concatenate, so each batch is dumped as its own list
+        empty = True
+        for batch in batched(records, YAML_BATCH_SIZE):
+            yield yaml_dump(batch)
+            empty = False
+        if empty:
+            yield "[]\n"
+    elif format == "yaml-stream":
+        for batch in batched(records, YAML_BATCH_SIZE):
+            yield yaml_dump_all(batch)
+    else:
+        raise ValueError(f"Unsupported export format: {format}")
+
+
+def gzip_chunks(chunks: Iterable[str], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a stream of text chunks incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def read_records(path: str, format: Optional[str] = None, compressed: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Read export records from a file.
+
+    NDJSON is read one line at a time and YAML streams one document at a
+    time; JSON and YAML lists are parsed whole.
+
+    Args:
+        path (str): Export file
+        format (str, optional): One of FORMATS; detected from path if omitted
+        compressed (bool, optional): Whether the file is gzipped; detected if omitted
+
+    Yields:
+        Dict[str, Any]: Prompt records
+    """
+    if format is None:
+        format = detect_format(path)[0]
+    if compressed is None:
+        compressed = path.lower().endswith(".gz")
+
+    if format == "ndjson":
+        with _open_text(path, "r", compressed) as f:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise ValueError(f"Invalid JSON on line {number} of {path}: {e}") from e
+        return
+    if format == "yaml-stream":
+        with _open_text(path, "r", compressed) as f:
+            yield from yaml_load_all(f)
+        return
+    yield from document_records(load_document(path, format, compressed))
+
+
+def load_document(path: str, format: Optional[str] = None, compressed: Optional[bool] = None) -> Any:
+    """
+    Parse a whole JSON or YAML export file, which may be a delta document.
+
+    Args:
+        path (str): Export file
+        format (str, optional): "json" or "yaml"; detected from path if omitted
+        compressed (bool, optional): Whether the file is gzipped; detected if omitted
+
+    Returns:
+        Any: The parsed document
+    """
+    if format is None:
+        format = detect_format(path)[0]
+    if compressed is None:
+        compressed = path.lower().endswith(".gz")
+
+    with _open_text(path, "r", compressed) as f:
+        if format == "json":
+            return json.load(f)
+        if format == "yaml":
+            return yaml_load(f)
+    raise ValueError(f"Unsupported import format: {format}")
+
+
+def _yaml_classes():
+    """Return PyYAML's safe loader and dumper, preferring the libyaml C versions."""
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+    return yaml, loader, dumper
+
+
+def yaml_load(stream: Any) -> Any:
+    """Parse one YAML document from a string or file."""
+    yaml, loader, _ = _yaml_classes()
+    return yaml.load(stream, Loader=loader)
+
+
+def yaml_load_all(stream: Any) -> Iterator[Dict[str, Any]]:
+    """Parse a YAML stream lazily, yielding its non-empty documents."""
+    yaml, loader, _ = _yaml_classes()
+    for document in yaml.load_all(stream, Loader=loader):
+        if document is not None:
+            yield document
+
+
+def yaml_dump(data: Any, **options) -> str:
+    """Serialize data as block-style YAML; options are passed to yaml.dump."""
+    yaml, _, dumper = _yaml_classes()
+    return yaml.dump(data, Dumper=dumper, default_flow_style=False, **options)
+
+
+def yaml_dump_all(documents: Iterable[Any], **options) -> str:
+    """Serialize each item as its own "---" YAML document."""
+    yaml, _, dumper = _yaml_classes()
+    return yaml.dump_all(documents, Dumper=dumper, default_flow_style=False, explicit_start=True, **options)
+
+
+def document_records(data: Any) -> List[Dict[str, Any]]:
+    """Return the records of a parsed full export, which must be a list."""
+    if not data:
+        return []
+    if not isinstance(data, list):
+        raise ValueError(f"Expected a list of prompts, got {type(data).__name__}")
+    return data
+
+
+def is_delta(data: Any) -> bool:
+    """Return True if a parsed document is a delta written by export_changes."""
+    return isinstance(data, dict) and data.get("format") == DELTA_FORMAT
+
+
+def parse_timestamp(value: Union[str, datetime, None], now: Optional[datetime] = None) -> Optional[datetime]:
+    """
+    Parse a since/until bound into a naive UTC datetime.
+
+    Accepts datetimes, ISO 8601 strings (offsets are converted to UTC) and
+    durations before now such as "90s", "15m", "1h" or "7d".
+
+    Args:
+        value (str or datetime, optional): The bound
+        now (datetime, optional): Reference time for durations (defaults to utcnow)
+
+    Returns:
+        Optional[datetime]: The bound, or None if value is None
+    """
+    if value is None or isinstance(value, datetime):
+        moment = value
+    else:
+        match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*", value)
+        if match:
+            amount, unit = float(match.group(1)), match.group(2)
+            return (now or datetime.utcnow()) - timedelta(seconds=amount * DURATION_UNITS[unit])
+        try:
+            moment = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError(f"Invalid timestamp {value!r}; use ISO 8601 or a duration like 1h") from None
+    if moment is not None and moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def parse_ndjson(data: str) -> List[Dict[str, Any]]:
+    """Parse newline-delimited JSON text into a list of records."""
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def batched(records: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Yield lists of up to size items."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def project_file_name(project: Optional[str], extension: str, taken: set) -> str:
+    """Return a file-system safe, unique file name for a project's export."""
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", project).strip("._") if project else UNASSIGNED_NAME
+    stem = stem or "project"
+    name, n = f"{stem}{extension}", 1
+    while name.lower() in taken:
+        n += 1
+        name = f"{stem}-{n}{extension}"
+    taken.add(name.lower())
+    return name
+
+
+def _sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _export_project(db_url: str, project: Optional[str], path: str) -> Dict[str, Any]:
+    """Process pool worker: export one project of a registry to a file."""
+    from cuebit.registry import PromptRegistry
+
+    registry = PromptRegistry(db_url)
+    try:
+        records = registry.iter_export_records(project=project, unassigned_only=project is None)
+        result = write_records(path, records)
+    finally:
+        registry.engine.dispose()
+    result["sha256"] = _sha256(path)
+    return result
+
+
+def export_split_by_project(
+        db_url: str,
+        directory: str,
+        projects: List[Optional[str]],
+        extension: str = ".ndjson.gz",
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+    """
+    Export each project to its own file concurrently and write a manifest.
+
+    Every worker process opens its own connection to db_url, so the
+    database must be reachable from other processes (not in-memory).
+
+    Args:
+        db_url (str): Database URL of the registry
+        directory (str): Output directory, created if missing
+        projects (List[Optional[str]]): Projects to export; None stands for prompts without a project
+        extension (str): File extension, which selects the format
+        max_workers (int, optional): Worker processes (defaults to the CPU count)
+
+    Returns:
+        Dict[str, Any]: The manifest, also written to directory/manifest.json
+    """
+    detect_format(extension)
+    os.makedirs(directory, exist_ok=True)
+    taken = {MANIFEST_NAME}
+    jobs = [
+        (project, os.path.join(directory, project_file_name(project, extension, taken)))
+        for project in projects
+    ]
+
+    files = []
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [(project, pool.submit(_export_project, db_url, project, path)) for project, path in jobs]
+            for project, future in futures:
+                result = future.result()
+                files.append({
+                    "project": project,
+                    "file": os.path.basename(result["path"]),
+                    "format": result["format"],
+                    "compressed": result["compressed"],
+                    "prompts": result["prompts"],
+                    "bytes": result["bytes"],
+                    "sha256": result["sha256"],
+                })
+
+    manifest = {
+        "created_at": datetime.utcnow().isoformat(),
+        "total_prompts": sum(f["prompts"] for f in files),
+        "files": files,
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Load a split export's manifest.
+
+    Args:
+        path (str): The manifest file or the directory holding it
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: The export directory and the manifest
+    """
+    if os.path.isdir(path):
+        path = os.path.join(path, MANIFEST_NAME)
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or "files" not in manifest:
+        raise ValueError(f"{path} is not a Cuebit export manifest")
+    return os.path.dirname(os.path.abspath(path)), manifest
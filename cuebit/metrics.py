@@ -0,0 +1,504 @@
+"""
+In-process metrics for Cuebit in the Prometheus text exposition format.
+
+This module provides minimal counters, gauges and histograms with
+labels, a process-wide collector, and hooks that instrument a
+PromptRegistry's SQLAlchemy engine and sessions. No external services
+or client libraries are required; the server exposes the collected
+values at /metrics.
+"""
+
+import bisect
+import math
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple, cast
+
+from sqlalchemy import event
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Default size buckets in bytes
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Default row count buckets
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects."""
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a label set, optionally with an extra pre-rendered label."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric with its HELP and TYPE lines."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        """Drop every recorded series."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increment the counter for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        """Return the current value for a label set."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be sampled from a callback."""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable] = None):
+        """
+        Initialize the gauge.
+
+        Args:
+            callback (Callable, optional): Called at render time; returns
+                a dict mapping label value tuples to values to report
+        """
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        """Set the gauge for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """Increment the gauge for a label set."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        """Decrement the gauge for a label set."""
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        """Return the current value for a label set."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        if self.callback:
+            values.update(self.callback())
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        """Record an observation for a label set."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        """Return the number of observations for a label set."""
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create (or return the existing) counter."""
+        return cast(Counter, self._register(Counter(name, documentation, labelnames)))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable] = None) -> Gauge:
+        """Create (or return the existing) gauge."""
+        return cast(Gauge, self._register(Gauge(name, documentation, labelnames, callback)))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Create (or return the existing) histogram."""
+        return cast(Histogram, self._register(Histogram(name, documentation, labelnames, buckets)))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Look up a metric by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+    def clear(self) -> None:
+        """Reset every metric's recorded values."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+# Process-wide collector
+METRICS = MetricsRegistry()
+
+# Content type of the text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- HTTP ---
+
+HTTP_REQUESTS = METRICS.counter(
+    "cuebit_http_requests_total",
+    "HTTP requests handled, by route and status.",
+    ("method", "route", "status")
+)
+HTTP_LATENCY = METRICS.histogram(
+    "cuebit_http_request_duration_seconds",
+    "HTTP request latency, by route and status.",
+    ("method", "route", "status")
+)
+HTTP_IN_PROGRESS = METRICS.gauge(
+    "cuebit_http_requests_in_progress",
+    "HTTP requests currently being handled.",
+    ("method",)
+)
+HTTP_RESPONSE_SIZE = METRICS.histogram(
+    "cuebit_http_response_size_bytes",
+    "HTTP response body size, by route.",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS
+)
+RENDER_PAYLOAD_SIZE = METRICS.histogram(
+    "cuebit_render_payload_bytes",
+    "Size of rendered prompt payloads.",
+    buckets=SIZE_BUCKETS
+)
+
+# --- Database ---
+
+DB_CHECKOUTS = METRICS.counter(
+    "cuebit_db_pool_checkouts_total",
+    "Connections checked out of the pool."
+)
+DB_CHECKOUT_WAIT = METRICS.histogram(
+    "cuebit_db_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool."
+)
+DB_CHECKOUT_HELD = METRICS.histogram(
+    "cuebit_db_pool_checkout_duration_seconds",
+    "Time a connection was held before being returned to the pool."
+)
+# Engines passed to instrument_engine; dropped when their registry is
+# garbage collected
+_POOL_ENGINES = weakref.WeakSet()
+
+
+def _pool_state() -> Dict[Tuple[str, ...], float]:
+    """Sum pool connection counts over every instrumented engine."""
+    state = {}
+    for engine in list(_POOL_ENGINES):
+        # Read the pool at render time; dispose() replaces it
+        pool = engine.pool
+        # Pools without a fixed size (e.g. NullPool) report nothing
+        for name, attr in (("checked_out", "checkedout"), ("overflow", "overflow"),
+                           ("size", "size"), ("checked_in", "checkedin")):
+            method = getattr(pool, attr, None)
+            if callable(method):
+                try:
+                    value = float(method())
+                except (TypeError, NotImplementedError):
+                    continue
+                state[(name,)] = state.get((name,), 0.0) + value
+    return state
+
+
+DB_POOL_CONNECTIONS = METRICS.gauge(
+    "cuebit_db_pool_connections",
+    "Current pool connection counts, by state, summed over all engines.",
+    ("state",),
+    callback=_pool_state
+)
+DB_QUERY_ROWS = METRICS.histogram(
+    "cuebit_db_query_rows",
+    "Rows returned per ORM query, by table.",
+    ("table",),
+    buckets=ROW_BUCKETS
+)
+DB_QUERY_LATENCY = METRICS.histogram(
+    "cuebit_db_statement_duration_seconds",
+    "SQL statement execution time, by statement type.",
+    ("statement",)
+)
+
+DB_LOCK_WAIT = METRICS.histogram(
+    "cuebit_db_lock_wait_seconds",
+    "Time registry writes spent waiting for the database write lock, by operation.",
+    ("operation",)
+)
+DB_WRITE_RETRIES = METRICS.counter(
+    "cuebit_db_write_retries_total",
+    "Registry writes retried because the database was locked, by operation.",
+    ("operation",)
+)
+DB_WRITE_TIMEOUTS = METRICS.counter(
+    "cuebit_db_write_timeouts_total",
+    "Registry writes abandoned after their lock deadline, by operation.",
+    ("operation",)
+)
+
+# --- Caches ---
+
+CACHE_REQUESTS = METRICS.counter(
+    "cuebit_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ("cache", "result")
+)
+
+
+def _cache_ratios():
+    """Compute hit ratios from the cache request counter."""
+    totals = {}
+    for (cache, result), value in list(CACHE_REQUESTS._values.items()):
+        hits, count = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (value if result == "hit" else 0.0), count + value)
+    return {(cache,): hits / count for cache, (hits, count) in totals.items() if count}
+
+
+CACHE_HIT_RATIO = METRICS.gauge(
+    "cuebit_cache_hit_ratio",
+    "Fraction of cache lookups that were hits, by cache.",
+    ("cache",),
+    callback=_cache_ratios
+)
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    """
+    Record cache lookups.
+
+    Args:
+        cache (str): Name of the cache
+        hit (bool): Whether the lookups were served from the cache
+        count (int): Number of lookups to record
+    """
+    if count:
+        CACHE_REQUESTS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+def statement_type(statement: str) -> str:
+    """Return the leading SQL keyword of a statement."""
+    keyword = statement.lstrip().split(None, 1)[0] if statement.strip() else ""
+    return keyword.upper() or "UNKNOWN"
+
+
+def _time_checkout_waits(pool) -> None:
+    """
+    Measure how long callers block waiting for a connection from a pool.
+
+    The pool has no "before checkout" event, so its internal getter is wrapped.
+    """
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            DB_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+
+
+def instrument_engine(engine) -> None:
+    """
+    Record pool and statement metrics for an SQLAlchemy engine.
+
+    Args:
+        engine: SQLAlchemy engine to instrument
+    """
+    if getattr(engine, "_cuebit_metrics", False):
+        return
+    engine._cuebit_metrics = True
+    pool = engine.pool
+    _time_checkout_waits(pool)
+
+    @event.listens_for(engine, "engine_disposed")
+    def on_disposed(engine):
+        # dispose() replaces the pool; its event listeners carry over, the wrapper does not
+        _time_checkout_waits(engine.pool)
+
+    @event.listens_for(pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CHECKOUTS.inc()
+        connection_record.info["cuebit_checkout_at"] = time.perf_counter()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop("cuebit_checkout_at", None)
+        if started is not None:
+            DB_CHECKOUT_HELD.observe(time.perf_counter() - started)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("cuebit_statement_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("cuebit_statement_start")
+        if starts:
+            DB_QUERY_LATENCY.observe(
+                time.perf_counter() - starts.pop(), statement=statement_type(statement)
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        starts = context.connection.info.get("cuebit_statement_start") if context.connection else None
+        if starts:
+            DB_QUERY_LATENCY.observe(
+                time.perf_counter() - starts.pop(), statement=statement_type(context.statement or "")
+            )
+
+    _POOL_ENGINES.add(engine)
+
+
+def instrument_sessions(session_factory) -> None:
+    """
+    Record rows returned per ORM query for sessions made by a factory.
+
+    Buffered queries are counted by freezing their results and replaying
+    them, the documented pattern for intercepting ORM execution.
+    Streaming queries (yield_per) are left untouched.
+
+    Args:
+        session_factory: sessionmaker to instrument
+    """
+    if getattr(session_factory, "_cuebit_metrics", False):
+        return
+    session_factory._cuebit_metrics = True
+
+    @event.listens_for(session_factory, "do_orm_execute")
+    def on_orm_execute(orm_execute_state):
+        if not orm_execute_state.is_select:
+            return None
+        if orm_execute_state.execution_options.get("stream_results") or \
+                getattr(orm_execute_state.load_options, "_yield_per", None):
+            return None
+
+        mapper = orm_execute_state.bind_mapper
+        table = mapper.local_table.name if mapper is not None else "unknown"
+        frozen = orm_execute_state.invoke_statement().freeze()
+        DB_QUERY_ROWS.observe(len(frozen.data), table=table)
+        return frozen()
+
+
+def instrument_registry(registry) -> None:
+    """
+    Record database metrics for a PromptRegistry.
+
+    Args:
+        registry (PromptRegistry): Registry to instrument
+    """
+    instrument_engine(registry.engine)
+    instrument_sessions(registry.Session)
@@ -7,27 +7,160 @@ version history and lineage tracking.
 """
 
 import uuid
+import gzip
 import json
+import lzma
 import re
 import os
+import shutil
+import sqlite3
+import tempfile
+import zlib
 import appdirs
-from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple, Set, Union
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Set, Union
 from collections import Counter, defaultdict
 import copy
+import functools
+import random
+import threading
+import time
+import warnings
+from contextvars import ContextVar
 
+import numpy as np
 from sqlalchemy import (
     create_engine, Column, String, Integer, DateTime, 
-    Text, JSON, ForeignKey, Boolean, Float, func, and_, or_
+    Text, JSON, ForeignKey, Boolean, Float, LargeBinary, Index, func, and_, or_,
+    select, exists, update, bindparam, inspect, literal, true, union_all, cast, text,
+    MetaData, Table
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, backref, Session
+from sqlalchemy.orm import sessionmaker, relationship, backref, deferred, undefer, Session
 from sqlalchemy.orm.exc import DetachedInstanceError
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+
+from cuebit import dedupe, exchange, metrics, slowlog, tracing
+from cuebit.metrics import record_cache
+from cuebit.similarity import SimilarityIndex
 
 # Get application data directory
 APP_NAME = "cuebit"
 APP_AUTHOR = "cuebit"
 
+# Prompts processed per statement by bulk operations
+BULK_CHUNK_SIZE = 500
+
+# Example bodies longer than this many bytes (input and output together)
+# are stored compressed
+EXAMPLE_COMPRESSION_THRESHOLD = 4096
+
+# Compression algorithms for example bodies: (compress, decompress)
+EXAMPLE_COMPRESSORS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# Attempts at writing a new version before a version conflict is raised
+VERSION_ALLOCATION_ATTEMPTS = 5
+
+# Seconds a write keeps retrying while the database is locked
+DEFAULT_WRITE_TIMEOUT = 30.0
+
+# Seconds SQLite waits for a lock before reporting it busy, per attempt
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+# Backoff between write attempts: first delay and cap, in seconds
+WRITE_RETRY_BASE_DELAY = 0.01
+WRITE_RETRY_MAX_DELAY = 1.0
+
+# Online backups copy this many pages per step, pausing between steps
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_SLEEP = 0.005
+
+# How far a delta's next_since reaches back before its until; covers writes
+# stamped before until but committed after the export read them
+DELTA_OVERLAP_SECONDS = 300
+
+
+class RegistryBusyError(RuntimeError):
+    """Raised when a write cannot get the database lock before its deadline."""
+
+
+# Lock wait accounting for the write running in the current context
+_write_state = ContextVar("cuebit_write_state", default=None)
+
+
+def _is_lock_error(error: Exception) -> bool:
+    """Return whether a database error is a transient lock conflict."""
+    if not isinstance(error, OperationalError):
+        return False
+    # Postgres serialization failures and deadlocks
+    if getattr(error.orig, "pgcode", None) in ("40001", "40P01"):
+        return True
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database table is locked" in message \
+        or "database is busy" in message
+
+
+def _conflict_strategy(skip_existing: bool, on_conflict: Optional[str]) -> str:
+    """Resolve the import conflict strategy from the legacy skip_existing flag."""
+    if on_conflict is None:
+        return "skip" if skip_existing else "fail"
+    if on_conflict not in IMPORT_CONFLICT_STRATEGIES:
+        raise ValueError(
+            f"Unknown conflict strategy: {on_conflict} (use {', '.join(IMPORT_CONFLICT_STRATEGIES)})"
+        )
+    return on_conflict
+
+
+def _writes(method):
+    """
+    Mark a PromptRegistry method as mutating.
+    
+    Its transactions start with BEGIN IMMEDIATE on SQLite, and the whole
+    call is retried with exponential backoff and full jitter while the
+    database is locked, until the registry's write_timeout has passed.
+    Nested calls run inside the outer call's retry loop.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if _write_state.get() is not None:
+            return method(self, *args, **kwargs)
+            
+        operation = method.__name__
+        state = {"lock_wait": 0.0}
+        token = _write_state.set(state)
+        deadline = time.monotonic() + self.write_timeout
+        attempt = 0
+        try:
+            while True:
+                try:
+                    return method(self, *args, **kwargs)
+                except OperationalError as e:
+                    if not _is_lock_error(e):
+                        raise
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        metrics.DB_WRITE_TIMEOUTS.inc(operation=operation)
+                        raise RegistryBusyError(
+                            f"Database is locked; {operation} gave up after "
+                            f"{self.write_timeout:g}s and {attempt} retries"
+                        ) from e
+                    cap = min(WRITE_RETRY_MAX_DELAY, WRITE_RETRY_BASE_DELAY * 2 ** attempt)
+                    delay = min(remaining, random.uniform(0, cap))
+                    attempt += 1
+                    metrics.DB_WRITE_RETRIES.inc(operation=operation)
+                    time.sleep(delay)
+                    state["lock_wait"] += delay
+        finally:
+            _write_state.reset(token)
+            metrics.DB_LOCK_WAIT.observe(state["lock_wait"], operation=operation)
+            
+    return wrapper
+
 def get_default_db_path():
     """Get the default database path in the user's data directory."""
     user_data_dir = appdirs.user_data_dir(APP_NAME, APP_AUTHOR)
@@ -62,6 +195,9 @@ class PromptORM(Base):
         updated_by (str): User who last updated this prompt
     """
     __tablename__ = "prompts"
+    __table_args__ = (
+        Index("ux_prompts_project_task_version", "project", "task", "version", unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     prompt_id = Column(String, unique=True, nullable=False)
     project = Column(String, nullable=True)
@@ -70,8 +206,9 @@ class PromptORM(Base):
     version = Column(Integer, default=1)
     alias = Column(String, nullable=True)
     tags = Column(Text)
-    meta = Column(JSON)
-    parent_id = Column(String, ForeignKey("prompts.prompt_id"), nullable=True)
+    meta = Column(JSON().with_variant(JSONB(), "postgresql"))
+    # Not a foreign key: the parent may have been moved to prompts_archive
+    parent_id = Column(String, nullable=True)
     template_variables = Column(JSON, default=list)  # Store expected variables
     is_deleted = Column(Boolean, default=False)  # Soft delete support
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -81,8 +218,8 @@ class PromptORM(Base):
     # Define relationship for version history
     children = relationship(
         "PromptORM", 
-        backref=backref("parent", remote_side=[prompt_id]),
-        foreign_keys=[parent_id]
+        primaryjoin="PromptORM.prompt_id == foreign(PromptORM.parent_id)",
+        backref=backref("parent", remote_side=[prompt_id])
     )
 
     def to_dict(self):
@@ -104,49 +241,402 @@ class PromptTagORM(Base):
     """
     Junction table for many-to-many relationship between prompts and tags.
     
+    This table is the source of truth for tags; PromptORM.tags is a
+    denormalized JSON copy kept for display and export.
+    
     Attributes:
         id (int): Auto-incrementing primary key
         prompt_id (str): Reference to prompt
         tag_name (str): Tag name
     """
     __tablename__ = "prompt_tags"
+    __table_args__ = (
+        Index("ux_prompt_tags_prompt_tag", "prompt_id", "tag_name", unique=True),
+        Index("ix_prompt_tags_tag_prompt", "tag_name", "prompt_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    prompt_id = Column(String, ForeignKey("prompts.prompt_id"), nullable=False)
+    prompt_id = Column(String, ForeignKey("prompts.prompt_id", ondelete="CASCADE"), nullable=False)
     tag_name = Column(String, nullable=False)
 
+class PromptVersionSequenceORM(Base):
+    """
+    Last allocated version number per project and task.
+    
+    Writers increment the row for their project/task inside their own
+    transaction, which serializes concurrent version allocation without
+    scanning the prompts table.
+    
+    Attributes:
+        project (str): Project name ("" for prompts without a project)
+        task (str): Task name
+        last_version (int): Highest version number handed out
+    """
+    __tablename__ = "prompt_version_sequences"
+    project = Column(String, primary_key=True)
+    task = Column(String, primary_key=True)
+    last_version = Column(Integer, nullable=False, default=0)
+
+def split_tag_filter(tags: Optional[List[str]]) -> Tuple[List[str], List[str]]:
+    """
+    Split a tag filter into required and excluded tags.
+    
+    Tags prefixed with "-" are excluded, e.g. ["prod", "-deprecated"].
+    
+    Args:
+        tags (List[str], optional): Tag filter
+        
+    Returns:
+        Tuple[List[str], List[str]]: Included and excluded tags
+    """
+    include, exclude = [], []
+    for tag in tags or []:
+        tag = tag.strip()
+        if tag.startswith("-") and len(tag) > 1:
+            exclude.append(tag[1:])
+        elif tag:
+            include.append(tag)
+    return include, exclude
+
 # Example input/output
 class ExampleORM(Base):
     """
     Stores example inputs and outputs for prompt templates.
     
+    Large bodies are stored compressed in ``body`` with the algorithm in
+    ``compression``, leaving input_text and output_text empty. ``body`` is
+    deferred, so it is only loaded when an example's text is read through
+    ``input`` and ``output``.
+    
     Attributes:
         id (int): Auto-incrementing primary key
         prompt_id (str): Reference to related prompt
-        input_text (str): Example input text
-        output_text (str): Example output text
+        input_text (str): Example input text, empty when compressed
+        output_text (str): Example output text, empty when compressed
         description (str): Optional description of this example
         created_at (datetime): Creation timestamp
+        compression (str): "zlib" or "lzma" when the bodies are compressed
+        body (bytes): Compressed JSON list of [input, output]
     """
     __tablename__ = "examples"
+    __table_args__ = (
+        Index("ix_examples_prompt_id", "prompt_id", "id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    prompt_id = Column(String, ForeignKey("prompts.prompt_id"), nullable=False)
+    prompt_id = Column(String, ForeignKey("prompts.prompt_id", ondelete="CASCADE"), nullable=False)
     input_text = Column(Text, nullable=False)
     output_text = Column(Text, nullable=False)
     description = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    compression = Column(String, nullable=True)
+    body = deferred(Column(LargeBinary, nullable=True))
+
+    @property
+    def input(self) -> str:
+        """Example input text, decompressed if needed."""
+        return decode_example_bodies(self)[0]
+
+    @property
+    def output(self) -> str:
+        """Example output text, decompressed if needed."""
+        return decode_example_bodies(self)[1]
 
     def to_dict(self):
         """Convert ORM object to dictionary for serialization"""
+        input_text, output_text = decode_example_bodies(self)
         return {
             "id": self.id,
             "prompt_id": self.prompt_id,
-            "input": self.input_text,
-            "output": self.output_text,
+            "input": input_text,
+            "output": output_text,
             "description": self.description,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
 
+def encode_example_bodies(
+        input_text: str,
+        output_text: str,
+        compression: Optional[str] = "zlib",
+        threshold: int = EXAMPLE_COMPRESSION_THRESHOLD
+    ) -> Dict[str, Any]:
+    """
+    Return the examples columns that store an input/output pair.
+    
+    Pairs longer than threshold bytes are compressed into body unless that
+    does not make them smaller.
+    
+    Args:
+        input_text (str): Example input
+        output_text (str): Example output
+        compression (str, optional): Key of EXAMPLE_COMPRESSORS, or None to store text
+        threshold (int): Size in bytes above which bodies are compressed
+        
+    Returns:
+        Dict[str, Any]: Values for input_text, output_text, compression and body
+    """
+    plain = {"input_text": input_text, "output_text": output_text, "compression": None, "body": None}
+    if compression is None:
+        return plain
+    raw = json.dumps([input_text, output_text]).encode("utf-8")
+    if len(raw) <= threshold:
+        return plain
+    packed = EXAMPLE_COMPRESSORS[compression][0](raw)
+    if len(packed) >= len(raw):
+        return plain
+    return {"input_text": "", "output_text": "", "compression": compression, "body": packed}
+
+def decode_example_bodies(example: Any) -> Tuple[str, str]:
+    """
+    Return (input, output) of an ExampleORM or examples row, decompressing if needed.
+    """
+    if not example.compression:
+        return example.input_text, example.output_text
+    raw = EXAMPLE_COMPRESSORS[example.compression][1](example.body)
+    input_text, output_text = json.loads(raw.decode("utf-8"))
+    return input_text, output_text
+
+# MinHash signature used for near-duplicate detection
+class PromptSignatureORM(Base):
+    """
+    Persisted MinHash signature of a prompt template.
+    
+    Attributes:
+        prompt_id (str): Reference to prompt
+        num_perm (int): Number of permutations the signature was built with
+        signature (bytes): Serialized uint32 MinHash signature
+    """
+    __tablename__ = "prompt_signatures"
+    prompt_id = Column(String, ForeignKey("prompts.prompt_id", ondelete="CASCADE"), primary_key=True)
+    num_perm = Column(Integer, nullable=False)
+    signature = Column(LargeBinary, nullable=False)
+
+
+class MetaIndexKeyORM(Base):
+    """
+    Meta key declared for indexed querying with query_by_meta().
+    
+    Attributes:
+        key (str): Meta key; dots address nested values ("params.temperature")
+        created_at (datetime): When the key was declared
+    """
+    __tablename__ = "meta_index_keys"
+    key = Column(String, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PromptMetaValueORM(Base):
+    """
+    Index of scalar meta values for declared keys (entity-attribute-value).
+    
+    Rows are rewritten whenever a prompt version is written, so queries
+    on declared keys are index lookups instead of JSON scans.
+    
+    Attributes:
+        id (int): Auto-incrementing primary key
+        prompt_id (str): Reference to prompt
+        key (str): Declared meta key
+        value_text (str): Value as text (numbers in JSON form, booleans as true/false)
+        value_num (float): Numeric value, for numbers only
+    """
+    __tablename__ = "prompt_meta_values"
+    __table_args__ = (
+        Index("ux_prompt_meta_values_prompt_key", "prompt_id", "key", unique=True),
+        Index("ix_prompt_meta_values_key_text", "key", "value_text", "prompt_id"),
+        Index("ix_prompt_meta_values_key_num", "key", "value_num", "prompt_id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, ForeignKey("prompts.prompt_id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    value_text = Column(String, nullable=True)
+    value_num = Column(Float, nullable=True)
+
+class PromptVariableORM(Base):
+    """
+    Inverted index from template variable names to prompts.
+    
+    Derived from each template when the prompt version is written, so
+    prompts taking a variable are found without loading every template.
+    
+    Attributes:
+        id (int): Auto-incrementing primary key
+        prompt_id (str): Reference to prompt
+        variable_name (str): Variable name as written between braces
+    """
+    __tablename__ = "prompt_variables"
+    __table_args__ = (
+        Index("ux_prompt_variables_prompt_variable", "prompt_id", "variable_name", unique=True),
+        Index("ix_prompt_variables_variable_prompt", "variable_name", "prompt_id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, ForeignKey("prompts.prompt_id", ondelete="CASCADE"), nullable=False)
+    variable_name = Column(String, nullable=False)
+
+class PromptArchiveORM(Base):
+    """
+    Superseded prompt versions moved out of the prompts table.
+    
+    Archived rows keep every prompt column, plus the prompt's examples as
+    JSON, and have no rows in the child tables. They stay readable through
+    get_prompt, get_version_history(include_archived=True) and lineage.
+    
+    Attributes:
+        id (int): Auto-incrementing primary key
+        prompt_id (str): ID of the archived prompt
+        examples (list): Examples of the prompt as dicts
+        archived_at (datetime): When the version was archived
+        (other columns as in PromptORM)
+    """
+    __tablename__ = "prompts_archive"
+    __table_args__ = (
+        Index("ix_prompts_archive_project_task_version", "project", "task", "version"),
+        Index("ix_prompts_archive_parent", "parent_id"),
+    )
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, unique=True, nullable=False)
+    project = Column(String, nullable=True)
+    task = Column(String, nullable=False)
+    template = Column(Text, nullable=False)
+    version = Column(Integer)
+    alias = Column(String, nullable=True)
+    tags = Column(Text)
+    meta = Column(JSON().with_variant(JSONB(), "postgresql"))
+    parent_id = Column(String, nullable=True)
+    template_variables = Column(JSON, default=list)
+    is_deleted = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    updated_by = Column(String, nullable=True)
+    examples = Column(JSON, default=list)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+# PromptORM columns copied to and from prompts_archive
+ARCHIVED_PROMPT_COLUMNS = tuple(c.name for c in PromptORM.__table__.columns if c.name != "id")
+
+# Strategies for imported prompts whose prompt_id already exists
+IMPORT_CONFLICT_STRATEGIES = ("skip", "overwrite", "overwrite-if-newer", "fail")
+
+# Per-connection scratch table import batches are loaded into before they
+# are merged into prompts; not part of Base.metadata, so never created there
+IMPORT_STAGING_TABLE = Table(
+    "cuebit_import_staging",
+    MetaData(),
+    *[Column(c.name, c.type, primary_key=c.name == "prompt_id")
+      for c in PromptORM.__table__.columns if c.name != "id"],
+    prefixes=["TEMPORARY"]
+)
+
+def template_variable_names(template: Optional[str]) -> List[str]:
+    """
+    Return the distinct variable names of a template, in order of appearance.
+    
+    Args:
+        template (str): Template with {variable} placeholders
+        
+    Returns:
+        List[str]: Non-empty variable names
+    """
+    return list(dict.fromkeys(v for v in re.findall(r'\{([^{}]*)\}', template or "") if v))
+
+# Comparison operators accepted as "key__op" in meta filters
+META_FILTER_OPERATORS = ("eq", "ne", "lt", "lte", "gt", "gte", "in")
+
+_MISSING = object()
+
+def _meta_lookup(meta: Any, key: str) -> Any:
+    """Return the value at a dotted meta key, or _MISSING."""
+    value = meta
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _meta_text(value: Any) -> Optional[str]:
+    """Return the value_text form of a scalar meta value."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def split_meta_filter(name: str) -> Tuple[str, str]:
+    """
+    Split a meta filter name into key and operator.
+    
+    Args:
+        name (str): "key" or "key__op", e.g. "temperature__lte"
+        
+    Returns:
+        Tuple[str, str]: Meta key and operator ("eq" when none is given)
+    """
+    key, sep, op = name.rpartition("__")
+    if sep and op in META_FILTER_OPERATORS:
+        return key, op
+    return name, "eq"
+
+def parse_meta_filters(params) -> Dict[str, Any]:
+    """
+    Collect meta filters from "meta."-prefixed query parameters.
+    
+    Values that look like JSON numbers, booleans or null are converted;
+    anything else is kept as a string. "in" takes a comma-separated list.
+    
+    Args:
+        params: Mapping or sequence of (name, value) pairs
+        
+    Returns:
+        Dict[str, Any]: Filters for query_by_meta()
+        
+    Example:
+        >>> parse_meta_filters({"meta.model": "gpt-4", "meta.temperature__lte": "0.3"})
+        {'model': 'gpt-4', 'temperature__lte': 0.3}
+    """
+    def coerce(raw: str) -> Any:
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return raw
+        return value if value is None or isinstance(value, (bool, int, float)) else raw
+        
+    items = params.items() if hasattr(params, "items") else params
+    filters = {}
+    for name, raw in items:
+        if not name.startswith("meta.") or len(name) == len("meta."):
+            continue
+        name = name[len("meta."):]
+        if split_meta_filter(name)[1] == "in":
+            filters[name] = [coerce(v) for v in raw.split(",")]
+        else:
+            filters[name] = coerce(raw)
+    return filters
+
+# Tables holding per-prompt rows keyed by prompt_id, removed with their prompt
+PROMPT_CHILD_TABLES = (
+    PromptTagORM.__table__,
+    ExampleORM.__table__,
+    PromptSignatureORM.__table__,
+    PromptMetaValueORM.__table__,
+    PromptVariableORM.__table__,
+)
+
+# PostgreSQL-only indexes, created by PromptRegistry._upgrade_postgres().
+# GIN indexes serve JSONB containment (@>) on the tags cache and meta.
+POSTGRES_GIN_INDEXES = {
+    "ix_prompts_tags_gin":
+        "CREATE INDEX IF NOT EXISTS ix_prompts_tags_gin ON prompts USING gin ((tags::jsonb) jsonb_path_ops)",
+    "ix_prompts_meta_gin":
+        "CREATE INDEX IF NOT EXISTS ix_prompts_meta_gin ON prompts USING gin (meta jsonb_path_ops)",
+}
 
+# Trigram indexes serve the ILIKE '%term%' searches of list_prompts and
+# search_prompts; every searched column needs one for a bitmap OR plan.
+POSTGRES_TRIGRAM_INDEXES = {
+    f"ix_prompts_{column}_trgm":
+        f"CREATE INDEX IF NOT EXISTS ix_prompts_{column}_trgm ON prompts USING gin ({column} gin_trgm_ops)"
+    for column in ("template", "task", "project", "prompt_id")
+}
+
+
+@tracing.trace_public_methods
 class PromptRegistry:
     """
     Main registry class for managing prompt templates, versions, and metadata.
@@ -156,7 +646,14 @@ class PromptRegistry:
     by project and task.
     """
     
-    def __init__(self, db_url: Optional[str] = None):
+    def __init__(
+            self,
+            db_url: Optional[str] = None,
+            write_timeout: Optional[float] = None,
+            busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+            example_compression: Optional[str] = "zlib",
+            example_compression_threshold: int = EXAMPLE_COMPRESSION_THRESHOLD
+        ):
         """
         Initialize the prompt registry with a database connection.
         
@@ -165,6 +662,13 @@ class PromptRegistry:
                 1. CUEBIT_DB_PATH environment variable
                 2. Standard user data directory
                 3. Local file "prompts.db" in current directory (legacy behavior)
+            write_timeout (float, optional): Seconds a write keeps retrying while the
+                database is locked. Defaults to CUEBIT_WRITE_TIMEOUT or 30.
+            busy_timeout (float): Seconds SQLite waits on a lock before each retry
+            example_compression (str, optional): "zlib", "lzma" or None to store
+                example bodies uncompressed
+            example_compression_threshold (int): Size in bytes above which example
+                bodies are compressed
         """
         if db_url is None:
             # Check environment variable first
@@ -178,135 +682,726 @@ class PromptRegistry:
         # Store the database URL for reference
         self.db_url = db_url
         
+        if write_timeout is None:
+            write_timeout = float(os.environ.get("CUEBIT_WRITE_TIMEOUT", DEFAULT_WRITE_TIMEOUT))
+        self.write_timeout = write_timeout
+        self.busy_timeout = busy_timeout
+        
+        if example_compression is not None and example_compression not in EXAMPLE_COMPRESSORS:
+            raise ValueError(f"Unknown example compression: {example_compression}")
+        self.example_compression = example_compression
+        self.example_compression_threshold = example_compression_threshold
+        
         # Initialize database connection
         self.engine = create_engine(db_url, echo=False)
-        Base.metadata.create_all(self.engine)
+        if self.engine.dialect.name == "sqlite":
+            self._configure_sqlite_transactions()
+        tracing.instrument_engine(self.engine)
+        existing_tables = set(inspect(self.engine).get_table_names())
+        with self.engine.begin() as conn:
+            if not existing_tables and self.engine.dialect.name == "sqlite":
+                # Only possible before the first table exists; gc() converts older files
+                conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(conn)
+        self._upgrade_schema(existing_tables)
         self.Session = sessionmaker(bind=self.engine)
+        
+        # Similarity index is loaded lazily on first use
+        self._similarity_index = None
+        self._similarity_lock = threading.Lock()
+        
+        # Slow query logging is off unless enabled here or by the environment
+        self.slow_query_log = None
+        threshold = os.environ.get("CUEBIT_SLOW_QUERY_MS")
+        if threshold:
+            self.enable_slow_query_log(threshold_ms=float(threshold))
 
-    def register_prompt(
-            self,
-            task: str,
-            template: str,
-            meta: dict = {},
-            tags: List[str] = [],
-            project: Optional[str] = None,
-            updated_by: Optional[str] = None,
-            examples: Optional[List[Dict[str, str]]] = None
-        ) -> PromptORM:
+    def _configure_sqlite_transactions(self) -> None:
         """
-        Register a new prompt template with metadata.
+        Take over transaction control from the sqlite3 driver.
+        
+        The driver only issues BEGIN before its first write, so two writers
+        that both read first can deadlock on the lock upgrade. Mutating
+        methods instead start with BEGIN IMMEDIATE and wait for the write
+        lock up front, which is what makes retrying them safe.
+        """
+        busy_timeout_ms = int(self.busy_timeout * 1000)
+        
+        @event.listens_for(self.engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+            dbapi_connection.execute(f"PRAGMA busy_timeout = {busy_timeout_ms}")
+            
+        @event.listens_for(self.engine, "begin")
+        def on_begin(conn):
+            state = _write_state.get()
+            if state is None:
+                conn.exec_driver_sql("BEGIN")
+                return
+            start = time.perf_counter()
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+            finally:
+                state["lock_wait"] += time.perf_counter() - start
+
+    def _upgrade_schema(self, existing_tables: Set[str]) -> None:
+        """
+        Apply schema changes that create_all() makes only for new tables.
         
         Args:
-            task (str): Task category for this prompt
-            template (str): The prompt template text with {variable} placeholders
-            meta (dict): JSON metadata (model info, parameters, etc.)
-            tags (List[str]): Tags for categorizing this prompt
-            project (str, optional): Project name
-            updated_by (str, optional): Username of person registering
-            examples (List[Dict], optional): Example input/output pairs
-            
-        Returns:
-            PromptORM: The newly created prompt object
-            
-        Example:
-            >>> registry.register_prompt(
-            ...     task="summarization",
-            ...     template="Summarize this text: {input}",
-            ...     meta={"model": "gpt-4", "temp": 0.7},
-            ...     tags=["prod", "summarization"],
-            ...     project="content-generator",
-            ...     examples=[{
-            ...         "input": "Long article text...",
-            ...         "output": "Concise summary...",
-            ...         "description": "News article summarization"
-            ...     }]
-            ... )
+            existing_tables (Set[str]): Tables that existed before create_all()
         """
-        session = self.Session()
+        inspector = inspect(self.engine)
+        self._upgrade_prompt_tags(inspector)
+        self._upgrade_example_index(inspector)
+        self._upgrade_missing_columns(inspector, ExampleORM.__table__)
+        self._upgrade_prompt_versions(inspector)
+        if "prompts" in existing_tables and "prompt_variables" not in existing_tables:
+            self._upgrade_prompt_variables()
+        if self.engine.dialect.name != "sqlite":
+            self._upgrade_parent_foreign_key(inspector)
+        if self.engine.dialect.name == "postgresql":
+            self._upgrade_postgres(inspector)
+
+    def _upgrade_parent_foreign_key(self, inspector) -> None:
+        """Drop the prompts.parent_id foreign key, which archived parents would violate."""
+        for fk in inspector.get_foreign_keys("prompts"):
+            if fk["constrained_columns"] == ["parent_id"] and fk.get("name"):
+                with self.engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE prompts DROP CONSTRAINT {fk['name']}"))
+
+    def _upgrade_postgres(self, inspector) -> None:
+        """
+        Convert meta to JSONB and create the PostgreSQL-only indexes.
+        
+        The trigram indexes need the pg_trgm extension. If it cannot be
+        created (e.g. without the privilege) search still works, unindexed.
+        """
+        meta_type = next(c["type"] for c in inspector.get_columns("prompts") if c["name"] == "meta")
+        if not isinstance(meta_type, JSONB):
+            with self.engine.begin() as conn:
+                conn.execute(text("ALTER TABLE prompts ALTER COLUMN meta TYPE jsonb USING meta::jsonb"))
+                
+        existing = {ix["name"] for ix in inspector.get_indexes("prompts")}
+        with self.engine.begin() as conn:
+            for name, ddl in POSTGRES_GIN_INDEXES.items():
+                if name not in existing:
+                    conn.execute(text(ddl))
+                    
+        if all(name in existing for name in POSTGRES_TRIGRAM_INDEXES):
+            return
         try:
-            prompt_id = str(uuid.uuid4())
+            with self.engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for name, ddl in POSTGRES_TRIGRAM_INDEXES.items():
+                    if name not in existing:
+                        conn.execute(text(ddl))
+        except DBAPIError as e:
+            warnings.warn(f"Trigram search indexes were not created: {e.orig}")
 
-            # Auto-increment version within project/task
-            version = 1
-            if project and task:
-                latest_version = (
-                    session.query(func.max(PromptORM.version))
-                    .filter(
-                        PromptORM.project == project,
-                        PromptORM.task == task,
-                        PromptORM.is_deleted == False
-                    )
-                    .scalar()
+    def _upgrade_prompt_versions(self, inspector) -> None:
+        """Add the unique (project, task, version) index to older registries."""
+        if any(ix["name"] == "ux_prompts_project_task_version"
+               for ix in inspector.get_indexes("prompts")):
+            return
+            
+        prompts = PromptORM.__table__
+        with self.engine.begin() as conn:
+            duplicate = conn.execute(
+                select(prompts.c.project, prompts.c.task, prompts.c.version)
+                .where(prompts.c.project.isnot(None))
+                .group_by(prompts.c.project, prompts.c.task, prompts.c.version)
+                .having(func.count() > 1)
+                .limit(1)
+            ).first()
+            if duplicate:
+                # Renumbering would change versions users already refer to
+                warnings.warn(
+                    f"Registry has duplicate versions (e.g. {duplicate.project}/{duplicate.task} "
+                    f"v{duplicate.version}); the unique version index was not created"
                 )
-                if latest_version:
-                    version = latest_version + 1
+                return
+            for ix in prompts.indexes:
+                if ix.name == "ux_prompts_project_task_version":
+                    ix.create(conn)
 
-            # Extract template variables
-            template_vars = re.findall(r'\{([^{}]*)\}', template)
-            
-            new_prompt = PromptORM(
-                prompt_id=prompt_id,
-                project=project,
-                task=task,
-                template=template,
-                version=version,
-                alias=None,
-                tags=json.dumps(tags),
-                meta=meta,
-                template_variables=template_vars,
-                updated_by=updated_by,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
-            session.add(new_prompt)
-            
-            # Process tags
-            for tag in tags:
-                if tag:
-                    prompt_tag = PromptTagORM(prompt_id=prompt_id, tag_name=tag)
-                    session.add(prompt_tag)
-            
-            # Add examples if provided
-            if examples:
-                for ex in examples:
-                    example = ExampleORM(
-                        prompt_id=prompt_id,
-                        input_text=ex.get("input", ""),
-                        output_text=ex.get("output", ""),
-                        description=ex.get("description")
-                    )
-                    session.add(example)
-            
-            session.commit()
-            session.refresh(new_prompt)
-            
-            # Make a copy to avoid DetachedInstanceError after session close
-            result = copy.deepcopy(new_prompt)
-            return result
-        finally:
-            session.close()
+    def _upgrade_prompt_variables(self) -> None:
+        """Fill the new prompt_variables index from existing templates."""
+        prompts = PromptORM.__table__
+        with self.engine.begin() as conn:
+            batch = []
+            for prompt_id, template in conn.execute(select(prompts.c.prompt_id, prompts.c.template)).fetchall():
+                batch.extend(
+                    {"prompt_id": prompt_id, "variable_name": name}
+                    for name in template_variable_names(template)
+                )
+                if len(batch) >= BULK_CHUNK_SIZE:
+                    conn.execute(PromptVariableORM.__table__.insert(), batch)
+                    batch = []
+            if batch:
+                conn.execute(PromptVariableORM.__table__.insert(), batch)
 
-    def get_prompt(self, prompt_id: str, include_deleted: bool = False) -> Optional[PromptORM]:
+    def _upgrade_missing_columns(self, inspector, table) -> None:
+        """Add nullable columns that a table created by an older version lacks."""
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        missing = [c for c in table.columns if c.name not in existing]
+        if not missing:
+            return
+        with self.engine.begin() as conn:
+            for column in missing:
+                ddl_type = column.type.compile(dialect=self.engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}"))
+
+    def _upgrade_example_index(self, inspector) -> None:
+        """Index examples by prompt on registries created without the index."""
+        existing = {ix["name"] for ix in inspector.get_indexes("examples")}
+        for ix in ExampleORM.__table__.indexes:
+            if ix.name not in existing:
+                ix.create(self.engine)
+
+    def _upgrade_prompt_tags(self, inspector) -> None:
+        """Index prompt_tags, rebuilding it from the JSON column if needed."""
+        existing = {ix["name"] for ix in inspector.get_indexes("prompt_tags")}
+        missing = [ix for ix in PromptTagORM.__table__.indexes if ix.name not in existing]
+        if not missing:
+            return
+            
+        # Registries created before prompt_tags was authoritative may hold
+        # duplicate or stale rows, so rebuild them once from the JSON column
+        prompts = PromptORM.__table__
+        with self.engine.begin() as conn:
+            rows = []
+            for prompt_id, tags in conn.execute(select(prompts.c.prompt_id, prompts.c.tags)):
+                try:
+                    tags = json.loads(tags or "[]")
+                except ValueError:
+                    tags = []
+                rows.extend(
+                    {"prompt_id": prompt_id, "tag_name": tag}
+                    for tag in dict.fromkeys(t for t in tags if t)
+                )
+            conn.execute(PromptTagORM.__table__.delete())
+            if rows:
+                conn.execute(PromptTagORM.__table__.insert(), rows)
+            for ix in missing:
+                ix.create(conn)
+
+    def _sidecar_path(self, suffix: str) -> Optional[str]:
         """
-        Retrieve a prompt by its ID.
+        Return a file path next to the SQLite database for auxiliary data.
         
         Args:
-            prompt_id (str): The UUID of the prompt
-            include_deleted (bool): Whether to include soft-deleted prompts
+            suffix (str): Suffix to add to the database file name
             
         Returns:
-            Optional[PromptORM]: The prompt object if found, None otherwise
-            
-        Example:
-            >>> prompt = registry.get_prompt("550e8400-e29b-41d4-a716-446655440000")
-            >>> print(prompt.template)
-            "Summarize this text: {input}"
+            Optional[str]: Path, or None for non-file databases
         """
-        session = self.Session()
-        try:
-            query = session.query(PromptORM).filter_by(prompt_id=prompt_id)
-            
-            if not include_deleted:
+        database = self.engine.url.database
+        if self.engine.dialect.name != "sqlite" or not database or database == ":memory:":
+            return None
+        return f"{os.path.splitext(database)[0]}.{suffix}"
+
+    def slow_query_log_path(self) -> str:
+        """
+        Return the default slow query log path for this registry.
+        
+        Returns:
+            str: Next to the SQLite database file, or in the user data
+                directory for other databases
+        """
+        path = self._sidecar_path("slow-queries.log")
+        if path is None:
+            path = os.path.join(os.path.dirname(get_default_db_path()), "slow-queries.log")
+        return path
+
+    def enable_slow_query_log(
+            self,
+            threshold_ms: float = slowlog.DEFAULT_THRESHOLD_MS,
+            path: Optional[str] = None,
+            max_bytes: int = slowlog.DEFAULT_MAX_BYTES,
+            backup_count: int = slowlog.DEFAULT_BACKUP_COUNT,
+            explain: bool = True
+        ) -> slowlog.SlowQueryLog:
+        """
+        Log statements slower than a threshold, with their query plans.
+        
+        Replaces any slow query log already enabled on this registry.
+        
+        Args:
+            threshold_ms (float): Minimum duration of logged statements in milliseconds
+            path (str, optional): Log file path (defaults to slow_query_log_path())
+            max_bytes (int): Size at which the log file is rotated
+            backup_count (int): Number of rotated files to keep
+            explain (bool): Whether to capture EXPLAIN QUERY PLAN output
+            
+        Returns:
+            SlowQueryLog: The active log
+            
+        Example:
+            >>> registry.enable_slow_query_log(threshold_ms=50)
+            >>> registry.list_prompts(tag_filter=["prod"])
+        """
+        self.disable_slow_query_log()
+        log = slowlog.SlowQueryLog(
+            path or self.slow_query_log_path(),
+            threshold_ms=threshold_ms,
+            max_bytes=max_bytes,
+            backup_count=backup_count,
+            explain=explain
+        )
+        log.attach(self.engine)
+        self.slow_query_log = log
+        return log
+
+    def disable_slow_query_log(self) -> None:
+        """Stop logging slow queries."""
+        if self.slow_query_log is not None:
+            self.slow_query_log.detach()
+            self.slow_query_log = None
+
+    def _sync_version_sequence(self, session: Session, project: Optional[str], task: str) -> None:
+        """
+        Create the version sequence row for a project/task if missing and
+        move it past any version already present in the prompts table.
+        
+        Args:
+            session (Session): Session of the write
+            project (str, optional): Project name
+            task (str): Task name
+        """
+        seq = PromptVersionSequenceORM.__table__
+        latest = select(func.coalesce(func.max(PromptORM.version), 0)).where(
+            PromptORM.project == project,
+            PromptORM.task == task
+        ).scalar_subquery()
+        
+        session.execute(self._insert_ignoring_conflicts(
+            seq,
+            select(
+                literal(project or "").label("project"),
+                literal(task).label("task"),
+                latest.label("last_version")
+            ),
+            ["project", "task"]
+        ))
+        session.execute(
+            seq.update()
+            .where(seq.c.project == (project or ""), seq.c.task == task, seq.c.last_version < latest)
+            .values(last_version=latest)
+        )
+
+    def _allocate_version(
+            self,
+            session: Session,
+            project: Optional[str],
+            task: str,
+            resync: bool = False
+        ) -> int:
+        """
+        Atomically take the next version number for a project/task.
+        
+        The sequence row is incremented in the caller's transaction, so
+        concurrent writers are serialized on that row (UPDATE ... RETURNING
+        where supported, otherwise the write lock SQLite takes for the
+        UPDATE) and the number is released if the transaction rolls back.
+        
+        Args:
+            session (Session): Session of the write
+            project (str, optional): Project name
+            task (str): Task name
+            resync (bool): Catch the sequence up with the prompts table first,
+                after a version conflict
+            
+        Returns:
+            int: The allocated version
+        """
+        seq = PromptVersionSequenceORM.__table__
+        key = and_(seq.c.project == (project or ""), seq.c.task == task)
+        if resync:
+            self._sync_version_sequence(session, project, task)
+            
+        for _ in range(2):
+            increment = seq.update().where(key).values(last_version=seq.c.last_version + 1)
+            if getattr(self.engine.dialect, "full_returning", False):
+                version = session.execute(increment.returning(seq.c.last_version)).scalar()
+            elif session.execute(increment).rowcount:
+                version = session.execute(select(seq.c.last_version).where(key)).scalar()
+            else:
+                version = None
+            if version is not None:
+                return version
+            # First version for this project/task in this registry
+            self._sync_version_sequence(session, project, task)
+        raise RuntimeError(f"Could not allocate a version for {project}/{task}")
+
+    def _write_with_version_retry(self, write):
+        """
+        Run a write that allocates a version, retrying on version conflicts.
+        
+        Args:
+            write: Callable taking (session, resync) that performs the write
+                and commits
+            
+        Returns:
+            Whatever write returns
+        """
+        for attempt in range(VERSION_ALLOCATION_ATTEMPTS):
+            session = self.Session()
+            try:
+                return write(session, attempt > 0)
+            except IntegrityError as e:
+                session.rollback()
+                if "version" not in str(e.orig) or attempt == VERSION_ALLOCATION_ATTEMPTS - 1:
+                    raise
+            finally:
+                session.close()
+
+    def _add_tags(self, session: Session, prompt_id: str, tags: Optional[List[str]]) -> List[str]:
+        """
+        Write prompt_tags rows for a new prompt.
+        
+        Args:
+            session (Session): Session the prompt is being written in
+            prompt_id (str): ID of the prompt
+            tags (List[str], optional): Tags to attach
+            
+        Returns:
+            List[str]: The de-duplicated tags, for the JSON cache column
+        """
+        unique = list(dict.fromkeys(tag for tag in tags or [] if tag))
+        for tag in unique:
+            session.add(PromptTagORM(prompt_id=prompt_id, tag_name=tag))
+        return unique
+
+    def _get_tags(self, session: Session, prompt_id: str) -> List[str]:
+        """Return the tags of a prompt from prompt_tags, in insertion order."""
+        rows = session.query(PromptTagORM.tag_name)\
+            .filter_by(prompt_id=prompt_id)\
+            .order_by(PromptTagORM.id)
+        return [tag_name for tag_name, in rows]
+
+    def _refresh_tag_cache(self, session: Session, prompt_ids: List[str]) -> None:
+        """
+        Rewrite the JSON tags column of prompts from prompt_tags.
+        
+        Args:
+            session (Session): Session holding the tag changes
+            prompt_ids (List[str]): Prompts whose tags changed
+        """
+        if not prompt_ids:
+            return
+        session.flush()
+        
+        tags = {prompt_id: [] for prompt_id in prompt_ids}
+        rows = session.query(PromptTagORM.prompt_id, PromptTagORM.tag_name)\
+            .filter(PromptTagORM.prompt_id.in_(prompt_ids))\
+            .order_by(PromptTagORM.id)
+        for prompt_id, tag_name in rows:
+            tags[prompt_id].append(tag_name)
+            
+        session.execute(
+            update(PromptORM.__table__)
+            .where(PromptORM.__table__.c.prompt_id == bindparam("b_prompt_id"))
+            .values(tags=bindparam("b_tags")),
+            [{"b_prompt_id": pid, "b_tags": json.dumps(values)} for pid, values in tags.items()]
+        )
+
+    def _filter_by_tags(
+            self,
+            query,
+            tags: Optional[List[str]] = None,
+            mode: str = "all",
+            exclude_tags: Optional[List[str]] = None
+        ):
+        """
+        Restrict a prompt query by tags using semi-joins on prompt_tags.
+        
+        Args:
+            query: Query over PromptORM
+            tags (List[str], optional): Tags to match
+            mode (str): "all" to require every tag, "any" for at least one
+            exclude_tags (List[str], optional): Tags that must not be present
+            
+        Returns:
+            The filtered query
+        """
+        if mode not in ("all", "any"):
+            raise ValueError(f"Unknown tag mode: {mode}. Use 'all' or 'any'")
+            
+        tags = list(dict.fromkeys(tags or []))
+        if self.engine.dialect.name == "postgresql":
+            return self._filter_by_tags_jsonb(query, tags, mode, exclude_tags)
+            
+        if tags:
+            tagged = select(PromptTagORM.prompt_id).where(PromptTagORM.tag_name.in_(tags))
+            if mode == "all" and len(tags) > 1:
+                tagged = tagged.group_by(PromptTagORM.prompt_id)\
+                    .having(func.count(PromptTagORM.tag_name) == len(tags))
+            query = query.filter(PromptORM.prompt_id.in_(tagged))
+            
+        if exclude_tags:
+            query = query.filter(~exists().where(and_(
+                PromptTagORM.prompt_id == PromptORM.prompt_id,
+                PromptTagORM.tag_name.in_(list(exclude_tags))
+            )))
+        return query
+
+    def _filter_by_tags_jsonb(self, query, tags: List[str], mode: str, exclude_tags: Optional[List[str]]):
+        """
+        PostgreSQL variant of _filter_by_tags using JSONB containment on
+        the tags column, which the ix_prompts_tags_gin index serves.
+        """
+        tags_jsonb = cast(PromptORM.tags, JSONB)
+        if tags:
+            if mode == "all":
+                query = query.filter(tags_jsonb.contains(tags))
+            else:
+                query = query.filter(or_(*[tags_jsonb.contains([tag]) for tag in tags]))
+                
+        if exclude_tags:
+            query = query.filter(or_(
+                PromptORM.tags.is_(None),
+                ~or_(*[tags_jsonb.contains([tag]) for tag in exclude_tags])
+            ))
+        return query
+
+    def _index_prompt(
+            self,
+            session: Session,
+            prompt_id: str,
+            template: str,
+            meta: Optional[dict] = None
+        ) -> None:
+        """
+        Maintain derived per-prompt indexes for a prompt being written.
+        
+        Args:
+            session (Session): Session the prompt is being written in
+            prompt_id (str): ID of the prompt
+            template (str): The prompt template text
+            meta (dict, optional): The prompt metadata
+        """
+        session.add(PromptSignatureORM(
+            prompt_id=prompt_id,
+            num_perm=dedupe.NUM_PERM,
+            signature=dedupe.signature_to_bytes(dedupe.minhash_signature(template))
+        ))
+        session.add_all(
+            PromptVariableORM(prompt_id=prompt_id, variable_name=name)
+            for name in template_variable_names(template)
+        )
+        with session.no_autoflush:
+            keys = [k for (k,) in session.query(MetaIndexKeyORM.key)]
+        if keys:
+            session.add_all(
+                PromptMetaValueORM(prompt_id=prompt_id, **row)
+                for row in self._meta_index_rows(meta, keys)
+            )
+
+    def _meta_index_rows(self, meta: Optional[dict], keys: List[str]) -> List[Dict[str, Any]]:
+        """
+        Build prompt_meta_values rows for the declared keys present in meta.
+        
+        Lists and objects are not indexed.
+        """
+        rows = []
+        for key in keys:
+            value = _meta_lookup(meta or {}, key)
+            if value is _MISSING or isinstance(value, (dict, list)):
+                continue
+            rows.append({
+                "key": key,
+                "value_text": _meta_text(value),
+                "value_num": float(value) if _is_number(value) else None
+            })
+        return rows
+
+    def _meta_condition(self, key: str, op: str, value: Any, indexed: bool):
+        """
+        Build the SQL condition for one meta filter.
+        
+        Declared keys become a semi-join on prompt_meta_values; other keys
+        fall back to a JSON path expression evaluated per row.
+        """
+        if op not in META_FILTER_OPERATORS:
+            raise ValueError(f"Unknown meta operator: {op}. Use one of: {', '.join(META_FILTER_OPERATORS)}")
+        if op == "in":
+            if not isinstance(value, (list, tuple, set)) or not value:
+                raise ValueError(f"meta.{key}__in needs a non-empty list")
+            return or_(*[self._meta_condition(key, "eq", v, indexed) for v in value])
+        if isinstance(value, (dict, list)):
+            raise ValueError(f"meta.{key} can only be compared with a scalar value")
+        if value is None and op != "eq":
+            raise ValueError(f"meta.{key}__{op} cannot compare with null")
+            
+        compare = {
+            "eq": lambda c, v: c == v,
+            "ne": lambda c, v: c != v,
+            "lt": lambda c, v: c < v,
+            "lte": lambda c, v: c <= v,
+            "gt": lambda c, v: c > v,
+            "gte": lambda c, v: c >= v,
+        }[op]
+        
+        if indexed:
+            values = PromptMetaValueORM
+            if value is None:
+                condition = and_(values.value_text.is_(None), values.value_num.is_(None))
+            elif _is_number(value):
+                condition = compare(values.value_num, float(value))
+            else:
+                condition = compare(values.value_text, _meta_text(value))
+            return PromptORM.prompt_id.in_(
+                select(values.prompt_id).where(values.key == key, condition)
+            )
+            
+        path = tuple(key.split("."))
+        element = PromptORM.meta[path]
+        if value is None:
+            return element.as_json() == None
+        if isinstance(value, bool):
+            return compare(element.as_boolean(), value)
+        if _is_number(value):
+            # Keep text values out of numeric comparisons, as the index does
+            dialect = self.engine.dialect.name
+            condition = compare(element.as_float(), float(value))
+            if dialect == "sqlite":
+                json_path = "$." + ".".join(f'"{part}"' for part in path)
+                return and_(func.json_type(PromptORM.meta, json_path).in_(["integer", "real"]), condition)
+            if dialect == "postgresql":
+                return and_(func.jsonb_typeof(PromptORM.meta[path].as_json()) == "number", condition)
+            return condition
+        return compare(element.as_string(), value)
+
+    def _filter_by_meta(self, session: Session, query, filters: Optional[Dict[str, Any]]):
+        """
+        Restrict a prompt query by meta filters; all filters must match.
+        
+        Args:
+            session (Session): Session the query belongs to
+            query: Query over PromptORM
+            filters (Dict[str, Any], optional): "key" or "key__op" to value
+            
+        Returns:
+            The filtered query
+        """
+        if not filters:
+            return query
+        indexed = {k for (k,) in session.query(MetaIndexKeyORM.key)}
+        for name, value in filters.items():
+            key, op = split_meta_filter(name)
+            query = query.filter(self._meta_condition(key, op, value, key in indexed))
+        return query
+
+    @_writes
+    def register_prompt(
+            self,
+            task: str,
+            template: str,
+            meta: dict = {},
+            tags: List[str] = [],
+            project: Optional[str] = None,
+            updated_by: Optional[str] = None,
+            examples: Optional[List[Dict[str, str]]] = None
+        ) -> PromptORM:
+        """
+        Register a new prompt template with metadata.
+        
+        Args:
+            task (str): Task category for this prompt
+            template (str): The prompt template text with {variable} placeholders
+            meta (dict): JSON metadata (model info, parameters, etc.)
+            tags (List[str]): Tags for categorizing this prompt
+            project (str, optional): Project name
+            updated_by (str, optional): Username of person registering
+            examples (List[Dict], optional): Example input/output pairs
+            
+        Returns:
+            PromptORM: The newly created prompt object
+            
+        Example:
+            >>> registry.register_prompt(
+            ...     task="summarization",
+            ...     template="Summarize this text: {input}",
+            ...     meta={"model": "gpt-4", "temp": 0.7},
+            ...     tags=["prod", "summarization"],
+            ...     project="content-generator",
+            ...     examples=[{
+            ...         "input": "Long article text...",
+            ...         "output": "Concise summary...",
+            ...         "description": "News article summarization"
+            ...     }]
+            ... )
+        """
+        def write(session: Session, resync: bool):
+            prompt_id = str(uuid.uuid4())
+
+            # Auto-increment version within project/task
+            version = 1
+            if project and task:
+                version = self._allocate_version(session, project, task, resync)
+
+            # Extract template variables
+            template_vars = re.findall(r'\{([^{}]*)\}', template)
+            
+            new_prompt = PromptORM(
+                prompt_id=prompt_id,
+                project=project,
+                task=task,
+                template=template,
+                version=version,
+                alias=None,
+                tags=json.dumps(self._add_tags(session, prompt_id, tags)),
+                meta=meta,
+                template_variables=template_vars,
+                updated_by=updated_by,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            )
+            session.add(new_prompt)
+            self._index_prompt(session, prompt_id, template, meta)
+            
+            # Add examples if provided
+            if examples:
+                for ex in examples:
+                    example = self._new_example(
+                        prompt_id,
+                        ex.get("input", ""),
+                        ex.get("output", ""),
+                        ex.get("description")
+                    )
+                    session.add(example)
+            
+            session.commit()
+            session.refresh(new_prompt)
+            
+            # Make a copy to avoid DetachedInstanceError after session close
+            result = copy.deepcopy(new_prompt)
+            return result
+            
+        return self._write_with_version_retry(write)
+
+    def get_prompt(self, prompt_id: str, include_deleted: bool = False) -> Optional[PromptORM]:
+        """
+        Retrieve a prompt by its ID.
+        
+        Args:
+            prompt_id (str): The UUID of the prompt
+            include_deleted (bool): Whether to include soft-deleted prompts
+            
+        Returns:
+            Optional[PromptORM]: The prompt object if found, None otherwise
+            
+        Example:
+            >>> prompt = registry.get_prompt("550e8400-e29b-41d4-a716-446655440000")
+            >>> print(prompt.template)
+            "Summarize this text: {input}"
+        """
+        session = self.Session()
+        try:
+            query = session.query(PromptORM).filter_by(prompt_id=prompt_id)
+            
+            if not include_deleted:
                 query = query.filter_by(is_deleted=False)
                 
             prompt = query.first()
@@ -314,11 +1409,41 @@ class PromptRegistry:
             # Handle SQLAlchemy detached instance issue
             if prompt:
                 session.expunge(prompt)
+                return prompt
                 
-            return prompt
+            return self._archived_prompt(session, prompt_id, include_deleted)
         finally:
             session.close()
 
+    def _archived_prompt(
+            self,
+            session: Session,
+            prompt_id: str,
+            include_deleted: bool = True
+        ) -> Optional[PromptORM]:
+        """Return an archived version as a detached PromptORM, or None."""
+        query = session.query(PromptArchiveORM).filter_by(prompt_id=prompt_id)
+        if not include_deleted:
+            query = query.filter_by(is_deleted=False)
+        row = query.first()
+        return self._from_archive(row) if row else None
+
+    def _from_archive(self, row: PromptArchiveORM) -> PromptORM:
+        """Build a detached PromptORM from a prompts_archive row."""
+        return PromptORM(**{name: getattr(row, name) for name in ARCHIVED_PROMPT_COLUMNS})
+
+    def _find_version(
+            self,
+            session: Session,
+            prompt_id: str,
+            include_deleted: bool = True
+        ) -> Optional[PromptORM]:
+        """Return a prompt from the prompts table or, failing that, the archive."""
+        query = session.query(PromptORM).filter_by(prompt_id=prompt_id)
+        if not include_deleted:
+            query = query.filter_by(is_deleted=False)
+        return query.first() or self._archived_prompt(session, prompt_id, include_deleted)
+
     def get_prompt_by_alias(self, alias: str) -> Optional[PromptORM]:
         """
         Retrieve a prompt by its alias.
@@ -355,7 +1480,10 @@ class PromptRegistry:
         search_term: Optional[str] = None,
         tag_filter: Optional[List[str]] = None,
         page: int = 1,
-        page_size: int = 100
+        page_size: int = 100,
+        tag_mode: str = "all",
+        exclude_tags: Optional[List[str]] = None,
+        meta_filters: Optional[Dict[str, Any]] = None
     ) -> Tuple[List[PromptORM], int]:
         """
         List prompts with filtering and pagination.
@@ -364,6 +1492,9 @@ class PromptRegistry:
             include_deleted (bool): Whether to include soft-deleted prompts
             search_term (str, optional): Text to search in templates and metadata
             tag_filter (List[str], optional): Filter by tags
+            tag_mode (str): "all" to require every tag in tag_filter, "any" for at least one
+            exclude_tags (List[str], optional): Skip prompts with any of these tags
+            meta_filters (Dict[str, Any], optional): Meta filters, see query_by_meta()
             page (int): Page number for pagination (starts at 1)
             page_size (int): Items per page
             
@@ -398,11 +1529,8 @@ class PromptRegistry:
                     )
                 )
                 
-            if tag_filter:
-                # This is more complex with proper tag schema - using simplified approach
-                for tag in tag_filter:
-                    tag_pattern = f"%\"{tag}\"%"  # Match in JSON array
-                    query = query.filter(PromptORM.tags.ilike(tag_pattern))
+            query = self._filter_by_tags(query, tag_filter, tag_mode, exclude_tags)
+            query = self._filter_by_meta(session, query, meta_filters)
                     
             # Count total for pagination
             total_count = query.count()
@@ -425,39 +1553,271 @@ class PromptRegistry:
         finally:
             session.close()
 
-    def list_projects(self) -> List[str]:
+    def query_by_meta(
+        self,
+        filters: Dict[str, Any],
+        project: Optional[str] = None,
+        include_deleted: bool = False,
+        page: int = 1,
+        page_size: int = 100
+    ) -> Tuple[List[PromptORM], int]:
         """
-        List all projects in the registry.
+        Find prompts by metadata values.
+        
+        Filters map a meta key, optionally with an operator suffix
+        (__eq, __ne, __lt, __lte, __gt, __gte, __in), to a value. Dots in
+        a key address nested values. Numbers compare numerically, other
+        values as text. Keys declared with add_meta_index() are answered
+        from an index; other keys are evaluated against each row's JSON.
         
+        Args:
+            filters (Dict[str, Any]): Meta filters, all of which must match
+            project (str, optional): Limit to specific project
+            include_deleted (bool): Whether to include soft-deleted prompts
+            page (int): Page number (starts at 1)
+            page_size (int): Items per page
+            
         Returns:
-            List[str]: List of project names
+            Tuple[List[PromptORM], int]: Matching prompts and total count
             
         Example:
-            >>> projects = registry.list_projects()
-            >>> print(projects)
-            ["blog-generator", "customer-support", "marketing"]
+            >>> prompts, total = registry.query_by_meta(
+            ...     {"model": "gpt-4", "temperature__lte": 0.3}
+            ... )
+            >>> print(f"Found {total} prompts")
+            "Found 6 prompts"
         """
         session = self.Session()
         try:
-            query = session.query(PromptORM.project).distinct()
-            query = query.filter_by(is_deleted=False)
+            query = session.query(PromptORM)
+            if not include_deleted:
+                query = query.filter_by(is_deleted=False)
+            if project:
+                query = query.filter_by(project=project)
+            query = self._filter_by_meta(session, query, filters)
             
-            projects = query.all()
-            return [p[0] or "Unassigned" for p in projects]
+            total_count = query.count()
+            prompts = query.order_by(
+                PromptORM.project,
+                PromptORM.task,
+                PromptORM.version.desc()
+            ).offset((page - 1) * page_size).limit(page_size).all()
+            
+            for prompt in prompts:
+                session.expunge(prompt)
+                
+            return prompts, total_count
         finally:
             session.close()
 
-    def list_prompts_by_project(
-        self, 
-        project: str,
-        include_deleted: bool = False
-    ) -> List[PromptORM]:
+    @_writes
+    def add_meta_index(self, key: str) -> int:
         """
-        List all prompts in a specific project.
+        Declare a meta key as frequently queried and index existing prompts.
+        
+        The index is maintained whenever a prompt version is written.
         
         Args:
-            project (str): Project name to filter
-            include_deleted (bool): Whether to include soft-deleted prompts
+            key (str): Meta key; dots address nested values
+            
+        Returns:
+            int: Number of prompts with an indexed value for the key
+            
+        Example:
+            >>> registry.add_meta_index("model")
+            42
+        """
+        if not key or key.startswith(".") or key.endswith("."):
+            raise ValueError(f"Invalid meta key: {key!r}")
+            
+        session = self.Session()
+        try:
+            if session.get(MetaIndexKeyORM, key) is None:
+                session.add(MetaIndexKeyORM(key=key))
+            session.query(PromptMetaValueORM).filter_by(key=key)\
+                .delete(synchronize_session=False)
+                
+            count = 0
+            rows = session.query(PromptORM.prompt_id, PromptORM.meta)\
+                .filter(PromptORM.meta.isnot(None))\
+                .yield_per(BULK_CHUNK_SIZE)
+            batch = []
+            for prompt_id, meta in rows:
+                batch.extend(
+                    dict(row, prompt_id=prompt_id)
+                    for row in self._meta_index_rows(meta, [key])
+                )
+                if len(batch) >= BULK_CHUNK_SIZE:
+                    session.execute(PromptMetaValueORM.__table__.insert(), batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                session.execute(PromptMetaValueORM.__table__.insert(), batch)
+                count += len(batch)
+                
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+    @_writes
+    def remove_meta_index(self, key: str) -> bool:
+        """
+        Stop indexing a meta key. Queries on it fall back to JSON scans.
+        
+        Args:
+            key (str): Declared meta key
+            
+        Returns:
+            bool: True if the key was declared
+        """
+        session = self.Session()
+        try:
+            session.query(PromptMetaValueORM).filter_by(key=key)\
+                .delete(synchronize_session=False)
+            removed = session.query(MetaIndexKeyORM).filter_by(key=key)\
+                .delete(synchronize_session=False)
+            session.commit()
+            return bool(removed)
+        finally:
+            session.close()
+
+    def list_meta_indexes(self) -> List[str]:
+        """
+        List the meta keys declared with add_meta_index().
+        
+        Returns:
+            List[str]: Declared keys, sorted
+        """
+        session = self.Session()
+        try:
+            return [k for (k,) in session.query(MetaIndexKeyORM.key).order_by(MetaIndexKeyORM.key)]
+        finally:
+            session.close()
+
+    def find_by_variable(
+        self,
+        name: str,
+        project: Optional[str] = None,
+        include_deleted: bool = False
+    ) -> List[PromptORM]:
+        """
+        Find the prompts whose templates take a variable.
+        
+        Args:
+            name (str): Variable name, without braces
+            project (str, optional): Limit to specific project
+            include_deleted (bool): Whether to include soft-deleted prompts
+            
+        Returns:
+            List[PromptORM]: Matching prompts ordered by project, task and
+                newest version first
+            
+        Example:
+            >>> prompts = registry.find_by_variable("customer_id")
+            >>> print([(p.project, p.task, p.version) for p in prompts])
+            [("support-bot", "triage", 3), ("support-bot", "triage", 2)]
+        """
+        session = self.Session()
+        try:
+            query = session.query(PromptORM).filter(PromptORM.prompt_id.in_(
+                select(PromptVariableORM.prompt_id).where(PromptVariableORM.variable_name == name)
+            ))
+            if not include_deleted:
+                query = query.filter_by(is_deleted=False)
+            if project:
+                query = query.filter_by(project=project)
+                
+            prompts = query.order_by(
+                PromptORM.project,
+                PromptORM.task,
+                PromptORM.version.desc()
+            ).all()
+            for prompt in prompts:
+                session.expunge(prompt)
+            return prompts
+        finally:
+            session.close()
+
+    def get_variable_usage(
+        self,
+        project: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Count the active prompts that take each template variable.
+        
+        Args:
+            project (str, optional): Limit to specific project
+            limit (int, optional): Return only the most used variables
+            
+        Returns:
+            List[Dict[str, Any]]: Variable name, number of prompt versions and
+                number of project/task pairs using it, most used first
+            
+        Example:
+            >>> registry.get_variable_usage(limit=2)
+            [{"variable": "input", "prompts": 42, "tasks": 17},
+             {"variable": "customer_id", "prompts": 9, "tasks": 3}]
+        """
+        session = self.Session()
+        try:
+            prompts_count = func.count(PromptVariableORM.prompt_id)
+            query = session.query(
+                PromptVariableORM.variable_name,
+                prompts_count,
+                func.count(func.distinct(func.coalesce(PromptORM.project, "") + "\x1f" + PromptORM.task))
+            ).join(
+                PromptORM, PromptORM.prompt_id == PromptVariableORM.prompt_id
+            ).filter(PromptORM.is_deleted == False)
+            if project:
+                query = query.filter(PromptORM.project == project)
+                
+            query = query.group_by(PromptVariableORM.variable_name)\
+                .order_by(prompts_count.desc(), PromptVariableORM.variable_name)
+            if limit:
+                query = query.limit(limit)
+                
+            return [
+                {"variable": name, "prompts": prompts, "tasks": tasks}
+                for name, prompts, tasks in query
+            ]
+        finally:
+            session.close()
+
+    def list_projects(self) -> List[str]:
+        """
+        List all projects in the registry.
+        
+        Returns:
+            List[str]: List of project names
+            
+        Example:
+            >>> projects = registry.list_projects()
+            >>> print(projects)
+            ["blog-generator", "customer-support", "marketing"]
+        """
+        session = self.Session()
+        try:
+            query = session.query(PromptORM.project).distinct()
+            query = query.filter_by(is_deleted=False)
+            
+            projects = query.all()
+            return [p[0] or "Unassigned" for p in projects]
+        finally:
+            session.close()
+
+    def list_prompts_by_project(
+        self, 
+        project: str,
+        include_deleted: bool = False
+    ) -> List[PromptORM]:
+        """
+        List all prompts in a specific project.
+        
+        Args:
+            project (str): Project name to filter
+            include_deleted (bool): Whether to include soft-deleted prompts
             
         Returns:
             List[PromptORM]: List of prompts in the project
@@ -515,6 +1875,7 @@ class PromptRegistry:
         finally:
             session.close()
 
+    @_writes
     def add_alias(
         self, 
         prompt_id: str, 
@@ -577,6 +1938,33 @@ class PromptRegistry:
         finally:
             session.close()
 
+    @_writes
+    def remove_alias(self, alias: str) -> int:
+        """
+        Remove an alias from whichever prompt carries it.
+
+        Args:
+            alias (str): The alias name
+
+        Returns:
+            int: Number of prompts the alias was removed from
+
+        Example:
+            >>> registry.remove_alias("summarizer-prod")
+            1
+        """
+        session = self.Session()
+        try:
+            count = session.query(PromptORM).filter_by(
+                alias=alias,
+                is_deleted=False
+            ).update({"alias": None}, synchronize_session=False)
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+    @_writes
     def update_prompt(
         self, 
         prompt_id: str, 
@@ -610,8 +1998,7 @@ class PromptRegistry:
             >>> print(f"New version: {new_prompt.version}")
             "New version: 2"
         """
-        session = self.Session()
-        try:
+        def write(session: Session, resync: bool):
             old_prompt = session.query(PromptORM).filter_by(
                 prompt_id=prompt_id,
                 is_deleted=False
@@ -620,37 +2007,29 @@ class PromptRegistry:
             if not old_prompt:
                 return None
 
-            # Get the latest version for this project/task
-            latest_version = (
-                session.query(func.max(PromptORM.version))
-                .filter_by(
-                    project=old_prompt.project, 
-                    task=old_prompt.task,
-                    is_deleted=False
-                )
-                .scalar()
+            # Take the next version for this project/task
+            new_version = self._allocate_version(
+                session, old_prompt.project, old_prompt.task, resync
             )
-            new_version = (latest_version or 0) + 1
 
             # Extract template variables
             template_vars = re.findall(r'\{([^{}]*)\}', new_template)
             
             # Use existing tags if not provided
-            if tags is None:
-                try:
-                    tags = json.loads(old_prompt.tags or "[]")
-                except:
-                    tags = []
+            new_tags = tags
+            if new_tags is None:
+                new_tags = self._get_tags(session, old_prompt.prompt_id)
                     
             # Create new prompt version with parent-child relationship
+            new_prompt_id = str(uuid.uuid4())
             new_prompt = PromptORM(
-                prompt_id=str(uuid.uuid4()),
+                prompt_id=new_prompt_id,
                 project=old_prompt.project,
                 task=old_prompt.task,
                 template=new_template,
                 version=new_version,
                 alias=None,  # Don't automatically transfer alias
-                tags=json.dumps(tags),
+                tags=json.dumps(self._add_tags(session, new_prompt_id, new_tags)),
                 meta=meta or old_prompt.meta,
                 parent_id=old_prompt.prompt_id,  # Set parent reference
                 template_variables=template_vars,
@@ -659,21 +2038,16 @@ class PromptRegistry:
                 updated_at=datetime.utcnow()
             )
             session.add(new_prompt)
-            
-            # Process tags
-            for tag in tags:
-                if tag:
-                    prompt_tag = PromptTagORM(prompt_id=new_prompt.prompt_id, tag_name=tag)
-                    session.add(prompt_tag)
+            self._index_prompt(session, new_prompt.prompt_id, new_template, new_prompt.meta)
                     
             # Add examples if provided
             if examples:
                 for ex in examples:
-                    example = ExampleORM(
-                        prompt_id=new_prompt.prompt_id,
-                        input_text=ex.get("input", ""),
-                        output_text=ex.get("output", ""),
-                        description=ex.get("description")
+                    example = self._new_example(
+                        new_prompt.prompt_id,
+                        ex.get("input", ""),
+                        ex.get("output", ""),
+                        ex.get("description")
                     )
                     session.add(example)
                 
@@ -684,14 +2058,15 @@ class PromptRegistry:
             result = copy.deepcopy(new_prompt)
             session.expunge(new_prompt)
             return result
-        finally:
-            session.close()
+            
+        return self._write_with_version_retry(write)
 
     def get_version_history(
         self, 
         project: str, 
         task: str,
-        include_deleted: bool = False
+        include_deleted: bool = False,
+        include_archived: bool = False
     ) -> List[PromptORM]:
         """
         Get complete version history for a project/task.
@@ -700,6 +2075,7 @@ class PromptRegistry:
             project (str): Project name
             task (str): Task name
             include_deleted (bool): Whether to include soft-deleted prompts
+            include_archived (bool): Whether to include versions moved to the archive
             
         Returns:
             List[PromptORM]: Ordered list of prompt versions
@@ -729,6 +2105,15 @@ class PromptRegistry:
             for version in versions:
                 session.expunge(version)
                 
+            if include_archived:
+                archived = session.query(PromptArchiveORM).filter_by(project=project, task=task)
+                if not include_deleted:
+                    archived = archived.filter_by(is_deleted=False)
+                versions = sorted(
+                    versions + [self._from_archive(row) for row in archived],
+                    key=lambda p: p.version
+                )
+                
             return versions
         finally:
             session.close()
@@ -761,8 +2146,8 @@ class PromptRegistry:
                 "descendants": []
             }
             
-            # Get the current prompt
-            current = session.query(PromptORM).filter_by(prompt_id=prompt_id).first()
+            # Get the current prompt, which may be archived
+            current = self._find_version(session, prompt_id)
             if not current:
                 return result
                 
@@ -772,11 +2157,7 @@ class PromptRegistry:
             # Get ancestors (follow parent_id recursively)
             ancestor = current
             while ancestor.parent_id:
-                parent_query = session.query(PromptORM).filter_by(prompt_id=ancestor.parent_id)
-                if not include_deleted:
-                    parent_query = parent_query.filter_by(is_deleted=False)
-                    
-                parent = parent_query.first()
+                parent = self._find_version(session, ancestor.parent_id, include_deleted)
                 if parent:
                     # Handle SQLAlchemy detached instance issue
                     result["ancestors"].append(copy.deepcopy(parent))
@@ -790,10 +2171,12 @@ class PromptRegistry:
             # Get descendants (follow children recursively)
             def get_children(parent_id):
                 children_query = session.query(PromptORM).filter_by(parent_id=parent_id)
+                archived_query = session.query(PromptArchiveORM).filter_by(parent_id=parent_id)
                 if not include_deleted:
                     children_query = children_query.filter_by(is_deleted=False)
+                    archived_query = archived_query.filter_by(is_deleted=False)
                     
-                return children_query.all()
+                return [self._from_archive(row) for row in archived_query] + children_query.all()
                 
             descendants = []
             to_process = get_children(prompt_id)
@@ -810,6 +2193,138 @@ class PromptRegistry:
         finally:
             session.close()
 
+    def get_prompt_detail(
+        self,
+        id_or_alias: str,
+        examples_limit: int = 20,
+        lineage_depth: int = 10,
+        include_deleted: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get everything a prompt's detail view shows in one read transaction.
+        
+        Uses at most three queries: the prompt (by ID or alias, falling back
+        to the archive), summary columns of the versions of its project/task
+        (hot and archived, where update and rollback place relatives), and
+        the first page of examples together with their total count.
+        Relatives are returned as summaries rather than full prompts.
+        
+        Args:
+            id_or_alias (str): Prompt ID or alias
+            examples_limit (int): Maximum examples returned
+            lineage_depth (int): Generations of ancestors and descendants returned
+            include_deleted (bool): Whether to include soft-deleted prompts
+            
+        Returns:
+            Optional[Dict[str, Any]]: Dict with the prompt (PromptORM), whether
+                it is archived, its examples, example_count, next_cursor for
+                get_examples_page (None once every example is returned), and ancestors (oldest first) and descendants
+                as summary dicts; None if not found
+            
+        Example:
+            >>> detail = registry.get_prompt_detail("summarizer-prod", examples_limit=5)
+            >>> print(detail["prompt"].version, detail["example_count"], len(detail["ancestors"]))
+            4 12 3
+        """
+        if examples_limit < 0 or lineage_depth < 0:
+            raise ValueError("examples_limit and lineage_depth must not be negative")
+            
+        session = self.Session()
+        try:
+            query = session.query(PromptORM).filter(
+                or_(PromptORM.prompt_id == id_or_alias, PromptORM.alias == id_or_alias)
+            )
+            if not include_deleted:
+                query = query.filter(PromptORM.is_deleted == False)
+            matches = query.limit(2).all()
+            # An ID match wins over an alias that happens to equal it
+            prompt = next((p for p in matches if p.prompt_id == id_or_alias), matches[0] if matches else None)
+                
+            archived_examples = None
+            if prompt is None:
+                row = session.query(PromptArchiveORM).filter_by(prompt_id=id_or_alias)
+                if not include_deleted:
+                    row = row.filter_by(is_deleted=False)
+                row = row.first()
+                if row is None:
+                    return None
+                prompt = self._from_archive(row)
+                archived_examples = list(row.examples or [])
+            else:
+                session.expunge(prompt)
+                
+            # Summary columns of every version of the project/task
+            columns = ("prompt_id", "parent_id", "version", "alias", "is_deleted", "updated_at", "updated_by")
+            
+            def same_task(table):
+                return select(*[table.c[c] for c in columns], literal(table is cold).label("archived")).where(
+                    table.c.project.is_(None) if prompt.project is None else table.c.project == prompt.project,
+                    table.c.task == prompt.task
+                )
+                
+            cold = PromptArchiveORM.__table__
+            versions = union_all(same_task(PromptORM.__table__), same_task(cold))
+            relatives = {}
+            children: Dict[str, List[Dict[str, Any]]] = {}
+            for row in session.execute(versions).mappings():
+                summary = dict(row)
+                summary["archived"] = bool(summary["archived"])
+                if summary["is_deleted"] and not include_deleted:
+                    continue
+                relatives[summary["prompt_id"]] = summary
+                children.setdefault(summary["parent_id"], []).append(summary)
+                
+            ancestors = []
+            parent_id = prompt.parent_id
+            while parent_id in relatives and len(ancestors) < lineage_depth:
+                ancestors.append(relatives[parent_id])
+                parent_id = relatives[parent_id]["parent_id"]
+            ancestors.reverse()
+            
+            descendants = []
+            generation = [prompt.prompt_id]
+            for _ in range(lineage_depth):
+                generation_rows = [
+                    child for parent in generation
+                    for child in sorted(children.get(parent, []), key=lambda c: c["version"])
+                ]
+                if not generation_rows:
+                    break
+                descendants.extend(generation_rows)
+                generation = [child["prompt_id"] for child in generation_rows]
+                
+            # First page of examples with the total count in the same query
+            if archived_examples is not None:
+                examples = archived_examples[:examples_limit]
+                example_count = len(archived_examples)
+                # Archived examples have no IDs; get_examples_page takes their position
+                next_cursor = examples_limit if example_count > examples_limit else None
+            else:
+                total = func.count().over().label("total")
+                rows = session.query(ExampleORM, total)\
+                    .options(undefer(ExampleORM.body))\
+                    .filter(ExampleORM.prompt_id == prompt.prompt_id)\
+                    .order_by(ExampleORM.id)\
+                    .limit(max(examples_limit, 1))\
+                    .all()
+                example_count = rows[0].total if rows else 0
+                page = [ex for ex, _ in rows[:examples_limit]]
+                examples = [self._example_dict(ex) for ex in page]
+                # With no examples requested the cursor pages from the start
+                next_cursor = (page[-1].id if page else 0) if example_count > len(page) else None
+                
+            return {
+                "prompt": prompt,
+                "archived": archived_examples is not None,
+                "examples": examples,
+                "example_count": example_count,
+                "next_cursor": next_cursor,
+                "ancestors": ancestors,
+                "descendants": descendants,
+            }
+        finally:
+            session.close()
+
     def compare_versions(
         self, 
         prompt_id_1: str, 
@@ -837,8 +2352,8 @@ class PromptRegistry:
         
         session = self.Session()
         try:
-            prompt1 = session.query(PromptORM).filter_by(prompt_id=prompt_id_1).first()
-            prompt2 = session.query(PromptORM).filter_by(prompt_id=prompt_id_2).first()
+            prompt1 = self._find_version(session, prompt_id_1)
+            prompt2 = self._find_version(session, prompt_id_2)
             
             if not prompt1 or not prompt2:
                 return {"error": "One or both prompts not found"}
@@ -919,6 +2434,250 @@ class PromptRegistry:
         finally:
             session.close()
 
+    def find_near_duplicates(
+        self,
+        threshold: float = 0.8,
+        project: Optional[str] = None,
+        include_same_task: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Find pairs of prompts with near-duplicate templates.
+        
+        Uses persisted MinHash signatures and LSH banding, so only candidate
+        pairs that share a band bucket are compared. Prompts written before
+        signatures existed are backfilled on first use.
+        
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity (0-1)
+            project (str, optional): Limit to specific project
+            include_same_task (bool): Whether to report versions of the same
+                project/task as duplicates of each other
+            
+        Returns:
+            List[Dict[str, Any]]: Matching pairs, most similar first
+            
+        Example:
+            >>> pairs = registry.find_near_duplicates(threshold=0.9)
+            >>> for pair in pairs:
+            ...     print(pair["first"]["project"], pair["second"]["project"], pair["similarity"])
+            "support-bot marketing 0.94"
+        """
+        if not 0 < threshold <= 1:
+            raise ValueError(f"Threshold must be between 0 and 1, got {threshold}")
+            
+        session = self.Session()
+        try:
+            query = session.query(
+                PromptORM.prompt_id,
+                PromptORM.project,
+                PromptORM.task,
+                PromptORM.version,
+                PromptSignatureORM.num_perm,
+                PromptSignatureORM.signature
+            ).outerjoin(
+                PromptSignatureORM,
+                PromptSignatureORM.prompt_id == PromptORM.prompt_id
+            ).filter(PromptORM.is_deleted == False)
+            
+            if project:
+                query = query.filter(PromptORM.project == project)
+                
+            rows = query.all()
+            
+            # Signatures that are missing or were built differently
+            stale = [
+                r.prompt_id for r in rows
+                if r.signature is None or r.num_perm != dedupe.NUM_PERM
+            ]
+            templates = []
+            for start in range(0, len(stale), BULK_CHUNK_SIZE):
+                templates.extend(
+                    session.query(PromptORM.prompt_id, PromptORM.template)
+                    .filter(PromptORM.prompt_id.in_(stale[start:start + BULK_CHUNK_SIZE]))
+                )
+        finally:
+            # End the read transaction before the backfill takes the write lock
+            session.close()
+            
+        record_cache("minhash_signatures", True, len(rows) - len(stale))
+        record_cache("minhash_signatures", False, len(stale))
+        signatures = {prompt_id: dedupe.minhash_signature(template) for prompt_id, template in templates}
+        if signatures:
+            self._store_signatures(signatures)
+            
+        candidates, vectors = [], []
+        for r in rows:
+            signature = signatures[r.prompt_id] if r.prompt_id in signatures \
+                else dedupe.signature_from_bytes(r.signature)
+            # Templates without any words would all match each other
+            if not dedupe.is_empty_signature(signature):
+                candidates.append(r)
+                vectors.append(signature)
+        rows = candidates
+        
+        if len(rows) < 2:
+            return []
+            
+        matrix = np.vstack(vectors)
+        
+        def summary(row):
+            return {
+                "prompt_id": row.prompt_id,
+                "project": row.project,
+                "task": row.task,
+                "version": row.version
+            }
+            
+        with tracing.span("dedupe.find_duplicate_pairs", {"dedupe.signatures": len(rows)}):
+            pairs = dedupe.find_duplicate_pairs(matrix, threshold)
+            
+        results = []
+        for i, j, similarity in pairs:
+            first, second = rows[i], rows[j]
+            if not include_same_task and \
+                    (first.project, first.task) == (second.project, second.task):
+                continue
+            results.append({
+                "first": summary(first),
+                "second": summary(second),
+                "similarity": round(similarity, 4)
+            })
+            
+        results.sort(key=lambda r: r["similarity"], reverse=True)
+        return results
+
+    @_writes
+    def _store_signatures(self, signatures: Dict[str, np.ndarray]) -> None:
+        """Replace the persisted MinHash signatures of prompts in one short write."""
+        table = PromptSignatureORM.__table__
+        ids = list(signatures)
+        session = self.Session()
+        try:
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                chunk = ids[start:start + BULK_CHUNK_SIZE]
+                session.execute(table.delete().where(table.c.prompt_id.in_(chunk)))
+                # Prompts deleted since they were read get no signature
+                live = [pid for (pid,) in session.query(PromptORM.prompt_id).filter(PromptORM.prompt_id.in_(chunk))]
+                if live:
+                    session.execute(table.insert(), [
+                        {
+                            "prompt_id": prompt_id,
+                            "num_perm": dedupe.NUM_PERM,
+                            "signature": dedupe.signature_to_bytes(signatures[prompt_id])
+                        }
+                        for prompt_id in live
+                    ])
+            session.commit()
+        finally:
+            session.close()
+
+    def _sync_similarity_index(self, session: Session) -> SimilarityIndex:
+        """
+        Bring the similarity index up to date with the prompts table.
+        
+        New prompts get higher ids, so only rows above the last indexed one
+        need to be read. Hard deletes let SQLite hand the highest id out
+        again, though, so the index is rebuilt when its last row no longer
+        holds the prompt it indexed. Must be called with the similarity lock held.
+        """
+        if self._similarity_index is None:
+            self._similarity_index = SimilarityIndex(self._sidecar_path("similarity.npz"))
+        index = self._similarity_index
+        
+        if len(index):
+            last = session.query(PromptORM.prompt_id)\
+                .filter(PromptORM.id == index.max_row_id)\
+                .scalar()
+            if last != index.prompt_ids[-1]:
+                index.clear()
+        
+        new_rows = session.query(PromptORM.id, PromptORM.prompt_id, PromptORM.template)\
+            .filter(PromptORM.id > index.max_row_id)\
+            .order_by(PromptORM.id)\
+            .yield_per(1000)
+            
+        index.add(new_rows)
+        # Rewriting the sidecar costs its full size, so additions are batched
+        index.save_if_due()
+        return index
+
+    def _reset_similarity_index(self) -> None:
+        """Drop the similarity index and its sidecar file so the next search rebuilds it."""
+        with self._similarity_lock:
+            if self._similarity_index is not None:
+                self._similarity_index.clear()
+            self._similarity_index = None
+            path = self._sidecar_path("similarity.npz")
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def similar_prompts(
+        self,
+        text: str,
+        k: int = 5,
+        project: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find the prompts whose templates are most similar to a text.
+        
+        Uses a hashed TF-IDF index that is persisted next to the database
+        and updated incrementally with prompts registered since it was last used.
+        
+        Args:
+            text (str): Text to compare against (e.g. a draft template)
+            k (int): Maximum number of results
+            project (str, optional): Limit to specific project
+            
+        Returns:
+            List[Dict[str, Any]]: Matching prompts with a cosine similarity score,
+                most similar first
+            
+        Example:
+            >>> matches = registry.similar_prompts("Summarize this article: {input}", k=3)
+            >>> print([(m["task"], m["score"]) for m in matches])
+            "[('summarization', 0.82), ('tldr', 0.41)]"
+        """
+        session = self.Session()
+        try:
+            with self._similarity_lock:
+                with tracing.span("similarity.sync"):
+                    index = self._sync_similarity_index(session)
+                
+                # Over-fetch so deleted or filtered prompts can be dropped
+                fetch = k * 4 + 10
+                while True:
+                    candidates = index.query(text, fetch)
+                    scores = dict(candidates)
+                    
+                    query = session.query(PromptORM).filter(
+                        PromptORM.prompt_id.in_(list(scores)),
+                        PromptORM.is_deleted == False
+                    )
+                    if project:
+                        query = query.filter(PromptORM.project == project)
+                    prompts = query.all()
+                    
+                    if len(prompts) >= k or len(candidates) < fetch:
+                        break
+                    fetch *= 4
+                    
+            prompts.sort(key=lambda p: scores[p.prompt_id], reverse=True)
+            return [
+                {
+                    "prompt_id": p.prompt_id,
+                    "project": p.project,
+                    "task": p.task,
+                    "version": p.version,
+                    "alias": p.alias,
+                    "template": p.template,
+                    "score": round(scores[p.prompt_id], 4)
+                }
+                for p in prompts[:k]
+            ]
+        finally:
+            session.close()
+
+    @_writes
     def rollback_to_version(
         self, 
         prompt_id: str, 
@@ -942,36 +2701,38 @@ class PromptRegistry:
             >>> print(f"Rolled back to create v{new_prompt.version}")
             "Rolled back to create v4"
         """
-        session = self.Session()
-        try:
+        def write(session: Session, resync: bool):
             old_prompt = session.query(PromptORM).filter_by(
                 prompt_id=prompt_id,
                 is_deleted=False
             ).first()
+            archived = old_prompt is None
+            if archived:
+                old_prompt = self._archived_prompt(session, prompt_id, include_deleted=False)
             
             if not old_prompt:
                 return None
                 
-            # Get latest version
-            latest_version = (
-                session.query(func.max(PromptORM.version))
-                .filter_by(
-                    project=old_prompt.project, 
-                    task=old_prompt.task,
-                    is_deleted=False
-                )
-                .scalar() or 0
+            # Take the next version for this project/task
+            new_version = self._allocate_version(
+                session, old_prompt.project, old_prompt.task, resync
             )
             
             # Create new version based on old one
+            new_prompt_id = str(uuid.uuid4())
+            if archived:
+                old_tags = json.loads(old_prompt.tags) if old_prompt.tags else []
+            else:
+                old_tags = self._get_tags(session, old_prompt.prompt_id)
+            tags = self._add_tags(session, new_prompt_id, old_tags)
             new_prompt = PromptORM(
-                prompt_id=str(uuid.uuid4()),
+                prompt_id=new_prompt_id,
                 project=old_prompt.project,
                 task=old_prompt.task,
                 template=old_prompt.template,  # Copy the old template
-                version=latest_version + 1,
+                version=new_version,
                 alias=None,  # Don't transfer alias
-                tags=old_prompt.tags,
+                tags=json.dumps(tags),
                 meta=old_prompt.meta.copy() if old_prompt.meta else {},
                 parent_id=old_prompt.prompt_id,  # Link to source
                 template_variables=old_prompt.template_variables,
@@ -991,16 +2752,7 @@ class PromptRegistry:
             }
             
             session.add(new_prompt)
-            
-            # Copy tags
-            try:
-                tags = json.loads(old_prompt.tags or "[]")
-                for tag in tags:
-                    if tag:
-                        prompt_tag = PromptTagORM(prompt_id=new_prompt.prompt_id, tag_name=tag)
-                        session.add(prompt_tag)
-            except:
-                pass
+            self._index_prompt(session, new_prompt.prompt_id, new_prompt.template, new_prompt.meta)
             
             session.commit()
             session.refresh(new_prompt)
@@ -1009,9 +2761,10 @@ class PromptRegistry:
             result = copy.deepcopy(new_prompt)
             session.expunge(new_prompt)
             return result
-        finally:
-            session.close()
+            
+        return self._write_with_version_retry(write)
 
+    @_writes
     def soft_delete_prompt(
         self, 
         prompt_id: str, 
@@ -1021,201 +2774,793 @@ class PromptRegistry:
         Soft delete a prompt (mark as deleted).
         
         Args:
-            prompt_id (str): Prompt ID to soft delete
-            deleted_by (str, optional): User performing the deletion
+            prompt_id (str): Prompt ID to soft delete
+            deleted_by (str, optional): User performing the deletion
+            
+        Returns:
+            bool: True if deleted, False if not found
+            
+        Example:
+            >>> success = registry.soft_delete_prompt(
+            ...     "550e8400-e29b-41d4-a716-446655440000",
+            ...     deleted_by="bob"
+            ... )
+            >>> print(f"Deleted: {success}")
+            "Deleted: True"
+        """
+        session = self.Session()
+        try:
+            prompt = session.query(PromptORM).filter_by(prompt_id=prompt_id).first()
+            
+            if not prompt:
+                return False
+                
+            # Mark as deleted
+            prompt.is_deleted = True
+            
+            # Record who deleted (a new dict, so the JSON column is written)
+            meta = dict(prompt.meta or {})
+            meta["deleted"] = {
+                "by": deleted_by,
+                "at": datetime.utcnow().isoformat()
+            }
+            prompt.meta = meta
+            
+            # Remove any aliases
+            if prompt.alias:
+                prompt.alias = None
+                
+            session.commit()
+            return True
+        finally:
+            session.close()
+
+    @_writes
+    def restore_prompt(self, prompt_id: str) -> bool:
+        """
+        Restore a soft-deleted prompt.
+        
+        Args:
+            prompt_id (str): Prompt ID to restore
+            
+        Returns:
+            bool: True if restored, False if not found or not deleted
+            
+        Example:
+            >>> success = registry.restore_prompt("550e8400-e29b-41d4-a716-446655440000")
+            >>> print(f"Restored: {success}")
+            "Restored: True"
+        """
+        session = self.Session()
+        try:
+            prompt = session.query(PromptORM).filter_by(
+                prompt_id=prompt_id,
+                is_deleted=True
+            ).first()
+            
+            if not prompt:
+                return False
+                
+            prompt.is_deleted = False
+            
+            # Record restoration
+            meta = dict(prompt.meta or {})
+            meta["restored"] = {
+                "at": datetime.utcnow().isoformat()
+            }
+            prompt.meta = meta
+            
+            session.commit()
+            return True
+        finally:
+            session.close()
+
+    @_writes
+    def delete_prompt_by_id(self, prompt_id: str) -> bool:
+        """
+        Hard delete a prompt (use with caution).
+        
+        Args:
+            prompt_id (str): Prompt ID to delete
+            
+        Returns:
+            bool: True if deleted, False if not found
+            
+        Example:
+            >>> success = registry.delete_prompt_by_id("550e8400-e29b-41d4-a716-446655440000")
+            >>> print(f"Deleted: {success}")
+            "Deleted: True"
+        """
+        counts = self.hard_delete_prompts(prompt_ids=[prompt_id])
+        return counts[PromptORM.__tablename__] + counts[PromptArchiveORM.__tablename__] > 0
+
+    @_writes
+    def delete_project(self, project: str, use_soft_delete: bool = True) -> int:
+        """
+        Delete all prompts in a project.
+        
+        Args:
+            project (str): Project name to delete
+            use_soft_delete (bool): Whether to use soft delete or hard delete
+            
+        Returns:
+            int: Number of prompts deleted
+            
+        Example:
+            >>> deleted = registry.delete_project("old-experiments", use_soft_delete=True)
+            >>> print(f"Deleted {deleted} prompts")
+            "Deleted 15 prompts"
+        """
+        if not use_soft_delete:
+            # Hard delete - remove prompts and their child rows
+            return self.hard_delete_prompts(project=project)[PromptORM.__tablename__]
+            
+        session = self.Session()
+        try:
+            # Soft delete - mark prompts as deleted
+            count = session.query(PromptORM).filter_by(
+                project=project,
+                is_deleted=False
+            ).update({
+                "is_deleted": True,
+                "alias": None  # Remove aliases
+            })
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+    @_writes
+    def delete_prompts_by_project_task(
+        self, 
+        project: str, 
+        task: str,
+        use_soft_delete: bool = True
+    ) -> int:
+        """
+        Delete all prompts for a task in a project.
+        
+        Args:
+            project (str): Project name
+            task (str): Task name
+            use_soft_delete (bool): Whether to use soft delete or hard delete
+            
+        Returns:
+            int: Number of prompts deleted
+            
+        Example:
+            >>> deleted = registry.delete_prompts_by_project_task(
+            ...     "content-generator", 
+            ...     "translation",
+            ...     use_soft_delete=True
+            ... )
+            >>> print(f"Deleted {deleted} prompts")
+            "Deleted 7 prompts"
+        """
+        if not use_soft_delete:
+            # Hard delete - remove prompts and their child rows
+            return self.hard_delete_prompts(project=project, task=task)[PromptORM.__tablename__]
+            
+        session = self.Session()
+        try:
+            # Soft delete - mark prompts as deleted
+            count = session.query(PromptORM).filter_by(
+                project=project,
+                task=task,
+                is_deleted=False
+            ).update({
+                "is_deleted": True,
+                "alias": None  # Remove aliases
+            })
+            session.commit()
+            return count
+        finally:
+            session.close()
+
+    @_writes
+    def hard_delete_prompts(
+        self,
+        prompt_ids: Optional[List[str]] = None,
+        project: Optional[str] = None,
+        task: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Permanently delete prompts together with their tags, examples and index rows.
+        
+        Prompts are selected by ID, by project, or by project and task;
+        matching archived versions are deleted as well. The
+        delete runs as chunked set-based statements in a single transaction,
+        so either every selected prompt is removed or none is. Versions that
+        descend from a deleted prompt are re-linked to its surviving ancestor.
+        
+        Args:
+            prompt_ids (Optional[List[str]]): Prompts to delete
+            project (Optional[str]): Delete every prompt in this project
+            task (Optional[str]): Restrict a project delete to this task
+            
+        Returns:
+            Dict[str, int]: Rows deleted per table, including "prompts" and "prompts_archive"
+            
+        Example:
+            >>> registry.hard_delete_prompts(project="old-experiments")
+            {'prompt_tags': 12, 'examples': 4, ..., 'prompts': 6}
+        """
+        if prompt_ids is None and project is None:
+            raise ValueError("Select prompts by prompt_ids or project")
+        if task is not None and project is None:
+            raise ValueError("task requires project")
+            
+        session = self.Session()
+        try:
+            query = session.query(PromptORM.prompt_id)
+            if prompt_ids is not None:
+                query = query.filter(PromptORM.prompt_id.in_(list(prompt_ids)))
+            if project is not None:
+                query = query.filter(PromptORM.project == project)
+            if task is not None:
+                query = query.filter(PromptORM.task == task)
+                
+            ids = [row[0] for row in query.all()]
+            counts = self._purge_prompts(session, ids)
+            
+            archive = PromptArchiveORM.__table__
+            conditions = []
+            if prompt_ids is not None:
+                conditions.append(archive.c.prompt_id.in_(list(prompt_ids)))
+            if project is not None:
+                conditions.append(archive.c.project == project)
+            if task is not None:
+                conditions.append(archive.c.task == task)
+            counts[archive.name] = session.execute(archive.delete().where(*conditions)).rowcount
+            
+            session.commit()
+            return counts
+        finally:
+            session.close()
+
+    def _purge_prompts(
+            self,
+            session: Session,
+            prompt_ids: List[str],
+            relink: bool = True
+        ) -> Dict[str, int]:
+        """
+        Permanently delete prompts and their rows in every child table.
+        
+        Children of a purged version are re-linked to its nearest surviving
+        ancestor so lineage stays connected. Works in chunks of
+        BULK_CHUNK_SIZE with set-based statements and does not commit.
+        
+        Args:
+            session (Session): Session to delete in
+            prompt_ids (List[str]): Prompts to delete
+            relink (bool): Whether to re-link children (not needed when archiving)
+            
+        Returns:
+            Dict[str, int]: Rows deleted per table
+        """
+        counts = {table.name: 0 for table in PROMPT_CHILD_TABLES}
+        counts[PromptORM.__tablename__] = 0
+        prompts = PromptORM.__table__
+        session.flush()
+        
+        for start in range(0, len(prompt_ids), BULK_CHUNK_SIZE):
+            chunk = prompt_ids[start:start + BULK_CHUNK_SIZE]
+            
+            parents = dict(session.execute(
+                select(prompts.c.prompt_id, prompts.c.parent_id).where(prompts.c.prompt_id.in_(chunk))
+            ).fetchall())
+            
+            def surviving_ancestor(prompt_id):
+                seen = set()
+                while prompt_id in parents and prompt_id not in seen:
+                    seen.add(prompt_id)
+                    prompt_id = parents[prompt_id]
+                return prompt_id
+                
+            children = session.execute(
+                select(prompts.c.prompt_id, prompts.c.parent_id).where(
+                    prompts.c.parent_id.in_(chunk),
+                    prompts.c.prompt_id.notin_(chunk)
+                )
+            ).fetchall() if relink else []
+            if children:
+                session.execute(
+                    update(prompts)
+                    .where(prompts.c.prompt_id == bindparam("b_prompt_id"))
+                    .values(parent_id=bindparam("b_parent_id")),
+                    [{"b_prompt_id": child, "b_parent_id": surviving_ancestor(parent)}
+                     for child, parent in children]
+                )
+                
+            for table in PROMPT_CHILD_TABLES:
+                result = session.execute(table.delete().where(table.c.prompt_id.in_(chunk)))
+                counts[table.name] += result.rowcount
+            result = session.execute(prompts.delete().where(prompts.c.prompt_id.in_(chunk)))
+            counts[prompts.name] += result.rowcount
+            
+        return counts
+
+    def _superseded_versions(
+            self,
+            session: Session,
+            keep_last: int,
+            project: Optional[str] = None,
+            created_before: Optional[datetime] = None
+        ) -> List[str]:
+        """
+        Return IDs of active versions beyond the newest keep_last of their
+        project/task, leaving out aliased versions.
+        """
+        rank = func.row_number().over(
+            partition_by=(PromptORM.project, PromptORM.task),
+            order_by=PromptORM.version.desc()
+        ).label("rank")
+        ranked = select(PromptORM.prompt_id, PromptORM.alias, PromptORM.created_at, rank)\
+            .where(PromptORM.is_deleted == False)
+        if project is not None:
+            ranked = ranked.where(PromptORM.project == project)
+        ranked = ranked.subquery()
+        
+        query = select(ranked.c.prompt_id).where(ranked.c.rank > keep_last, ranked.c.alias.is_(None))
+        if created_before is not None:
+            query = query.where(ranked.c.created_at < created_before)
+        return [pid for (pid,) in session.execute(query)]
+
+    def _archive_prompts(self, session: Session, prompt_ids: List[str]) -> Dict[str, int]:
+        """
+        Move prompts with their examples into prompts_archive.
+        
+        Copies each chunk to the archive, then deletes it from prompts and
+        the child tables without re-linking children. Does not commit.
+        
+        Returns:
+            Dict[str, int]: Rows archived ("prompts_archive") and deleted per table
+        """
+        prompts = PromptORM.__table__
+        examples = ExampleORM.__table__
+        archive = PromptArchiveORM.__table__
+        counts = {archive.name: 0}
+        archived_at = datetime.utcnow()
+        
+        for start in range(0, len(prompt_ids), BULK_CHUNK_SIZE):
+            chunk = prompt_ids[start:start + BULK_CHUNK_SIZE]
+            
+            by_prompt: Dict[str, List[Dict[str, Any]]] = {}
+            for row in session.execute(
+                select(examples).where(examples.c.prompt_id.in_(chunk)).order_by(examples.c.id)
+            ):
+                input_text, output_text = decode_example_bodies(row)
+                by_prompt.setdefault(row.prompt_id, []).append({
+                    "id": None,
+                    "input": input_text,
+                    "output": output_text,
+                    "description": row.description,
+                    "created_at": row.created_at.isoformat() if row.created_at else None
+                })
+                
+            rows = []
+            for row in session.execute(
+                select(*[prompts.c[name] for name in ARCHIVED_PROMPT_COLUMNS])
+                .where(prompts.c.prompt_id.in_(chunk))
+            ).mappings():
+                values = dict(row)
+                values["examples"] = by_prompt.get(row["prompt_id"], [])
+                values["archived_at"] = archived_at
+                rows.append(values)
+            if not rows:
+                continue
+                
+            session.execute(archive.insert(), rows)
+            counts[archive.name] += len(rows)
+            for table, count in self._purge_prompts(session, chunk, relink=False).items():
+                counts[table] = counts.get(table, 0) + count
+                
+        return counts
+
+    @_writes
+    def archive_versions(
+        self,
+        keep_last: int = 1,
+        older_than_days: Optional[float] = None,
+        project: Optional[str] = None,
+        batch_size: int = BULK_CHUNK_SIZE,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Move superseded versions out of the prompts table into prompts_archive.
+        
+        The newest keep_last active versions of each project/task and any
+        aliased version stay in place. With older_than_days, only versions
+        created before that age are archived. Archived versions drop out of
+        listings, search and statistics but remain readable by ID, in
+        get_version_history(include_archived=True) and in lineage, and can
+        be rolled back to. Their tags and examples travel with them.
+        
+        Args:
+            keep_last (int): Versions to keep in place per project/task
+            older_than_days (float, optional): Minimum age in days of archived versions
+            project (str, optional): Only archive versions in this project
+            batch_size (int): Prompts moved per transaction
+            dry_run (bool): Only report what would be archived
             
         Returns:
-            bool: True if deleted, False if not found
+            Dict[str, Any]: Versions selected, rows archived and rows deleted per table
             
         Example:
-            >>> success = registry.soft_delete_prompt(
-            ...     "550e8400-e29b-41d4-a716-446655440000",
-            ...     deleted_by="bob"
-            ... )
-            >>> print(f"Deleted: {success}")
-            "Deleted: True"
+            >>> result = registry.archive_versions(keep_last=3, older_than_days=90)
+            >>> print(result["archived"])
+            412
         """
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        if older_than_days is not None and older_than_days < 0:
+            raise ValueError("older_than_days must not be negative")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+            
+        cutoff = None
+        if older_than_days is not None:
+            cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+            
         session = self.Session()
         try:
-            prompt = session.query(PromptORM).filter_by(prompt_id=prompt_id).first()
-            
-            if not prompt:
-                return False
-                
-            # Mark as deleted
-            prompt.is_deleted = True
+            selected = self._superseded_versions(session, keep_last, project, cutoff)
+        finally:
+            session.close()
             
-            # Record who deleted
-            if prompt.meta is None:
-                prompt.meta = {}
-                
-            prompt.meta["deleted"] = {
-                "by": deleted_by,
-                "at": datetime.utcnow().isoformat()
-            }
+        result = {
+            "dry_run": dry_run,
+            "selected_versions": len(selected),
+            "archived": 0,
+            "rows_deleted": {},
+        }
+        if dry_run:
+            return result
             
-            # Remove any aliases
-            if prompt.alias:
-                prompt.alias = None
-                
+        for start in range(0, len(selected), batch_size):
+            session = self.Session()
+            try:
+                counts = self._archive_prompts(session, selected[start:start + batch_size])
+                session.commit()
+            finally:
+                session.close()
+            result["archived"] += counts.pop(PromptArchiveORM.__tablename__)
+            for table, count in counts.items():
+                result["rows_deleted"][table] = result["rows_deleted"].get(table, 0) + count
+        return result
+
+    def _purge_in_batches(
+            self,
+            prompt_ids: List[str],
+            batch_size: int,
+            counts: Dict[str, int]
+        ) -> None:
+        """Purge prompts with one transaction per batch, adding to counts."""
+        for start in range(0, len(prompt_ids), batch_size):
+            session = self.Session()
+            try:
+                deleted = self._purge_prompts(session, prompt_ids[start:start + batch_size])
+                session.commit()
+            finally:
+                session.close()
+            for table, count in deleted.items():
+                counts[table] = counts.get(table, 0) + count
+
+    def _remove_orphans(self, dry_run: bool) -> Dict[str, int]:
+        """Delete (or count) child rows whose prompt no longer exists."""
+        prompts = PromptORM.__table__
+        orphans = {}
+        session = self.Session()
+        try:
+            for table in PROMPT_CHILD_TABLES:
+                orphaned = ~exists().where(prompts.c.prompt_id == table.c.prompt_id)
+                if dry_run:
+                    orphans[table.name] = session.execute(
+                        select(func.count()).select_from(table).where(orphaned)
+                    ).scalar()
+                else:
+                    orphans[table.name] = session.execute(table.delete().where(orphaned)).rowcount
             session.commit()
-            return True
+            return orphans
         finally:
             session.close()
 
-    def restore_prompt(self, prompt_id: str) -> bool:
+    def _incremental_vacuum(self, full: bool = False) -> Dict[str, Any]:
         """
-        Restore a soft-deleted prompt.
+        Return free SQLite pages to the file system.
         
-        Args:
-            prompt_id (str): Prompt ID to restore
-            
-        Returns:
-            bool: True if restored, False if not found or not deleted
-            
-        Example:
-            >>> success = registry.restore_prompt("550e8400-e29b-41d4-a716-446655440000")
-            >>> print(f"Restored: {success}")
-            "Restored: True"
+        Databases created before auto_vacuum was enabled are converted to
+        incremental mode with one full VACUUM, which rewrites the file.
         """
-        session = self.Session()
+        raw = self.engine.raw_connection()
         try:
-            prompt = session.query(PromptORM).filter_by(
-                prompt_id=prompt_id,
-                is_deleted=True
-            ).first()
-            
-            if not prompt:
-                return False
-                
-            prompt.is_deleted = False
+            cursor = raw.cursor()
             
-            # Record restoration
-            if prompt.meta is None:
-                prompt.meta = {}
+            def pragma(statement):
+                cursor.execute(f"PRAGMA {statement}")
+                rows = cursor.fetchall()
+                return rows[0][0] if rows else None
                 
-            prompt.meta["restored"] = {
-                "at": datetime.utcnow().isoformat()
-            }
-            
-            session.commit()
-            return True
+            page_size = pragma("page_size")
+            before = pragma("page_count")
+            converted = False
+            if full or pragma("auto_vacuum") != 2:
+                pragma("auto_vacuum = INCREMENTAL")
+                cursor.execute("VACUUM")
+                converted = True
+            else:
+                pragma("incremental_vacuum")
+            after = pragma("page_count")
+            cursor.close()
         finally:
-            session.close()
+            raw.close()
+        return {
+            "full_vacuum": converted,
+            "pages_freed": before - after,
+            "bytes_freed": (before - after) * page_size,
+            "size_bytes": after * page_size,
+        }
 
-    def delete_prompt_by_id(self, prompt_id: str) -> bool:
+    @_writes
+    def gc(
+        self,
+        keep_last: Optional[int] = None,
+        purge_deleted_after_days: Optional[float] = None,
+        batch_size: int = BULK_CHUNK_SIZE,
+        dry_run: bool = False,
+        vacuum: bool = True,
+        full_vacuum: bool = False
+    ) -> Dict[str, Any]:
         """
-        Hard delete a prompt (use with caution).
+        Apply retention policies and compact the database.
+        
+        Policies:
+            keep_last: Keep the newest N active versions of each project/task,
+                plus any aliased version; permanently delete the rest.
+            purge_deleted_after_days: Permanently delete soft-deleted prompts
+                last updated (i.e. deleted) more than D days ago.
+                
+        Purged prompts are deleted with their tags, examples and indexes in
+        transactions of batch_size prompts. Child rows left behind by older
+        deletes are removed, and on SQLite free pages are released with
+        an incremental VACUUM. Version numbers of purged prompts are not
+        reused.
         
         Args:
-            prompt_id (str): Prompt ID to delete
+            keep_last (int, optional): Versions to keep per project/task
+            purge_deleted_after_days (float, optional): Age in days of soft-deleted prompts to purge
+            batch_size (int): Prompts deleted per transaction
+            dry_run (bool): Only report what would be deleted
+            vacuum (bool): Whether to release free pages (SQLite only)
+            full_vacuum (bool): Rewrite the whole file instead of an incremental vacuum
             
         Returns:
-            bool: True if deleted, False if not found
+            Dict[str, Any]: Prompts selected by each policy, rows deleted per
+                table, orphaned rows removed per table and vacuum results
             
         Example:
-            >>> success = registry.delete_prompt_by_id("550e8400-e29b-41d4-a716-446655440000")
-            >>> print(f"Deleted: {success}")
-            "Deleted: True"
+            >>> result = registry.gc(keep_last=5, purge_deleted_after_days=30)
+            >>> print(result["rows_deleted"]["prompts"])
+            128
         """
+        if keep_last is not None and keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        if purge_deleted_after_days is not None and purge_deleted_after_days < 0:
+            raise ValueError("purge_deleted_after_days must not be negative")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+            
         session = self.Session()
         try:
-            prompt = session.query(PromptORM).filter_by(prompt_id=prompt_id).first()
-            
-            if prompt:
-                session.delete(prompt)
-                session.commit()
-                return True
-                
-            return False
+            superseded, expired = [], []
+            if keep_last is not None:
+                superseded = self._superseded_versions(session, keep_last)
+            if purge_deleted_after_days is not None:
+                cutoff = datetime.utcnow() - timedelta(days=purge_deleted_after_days)
+                expired = [pid for (pid,) in session.query(PromptORM.prompt_id).filter(
+                    PromptORM.is_deleted == True,
+                    PromptORM.updated_at < cutoff
+                )]
         finally:
             session.close()
+            
+        result = {
+            "dry_run": dry_run,
+            "superseded_versions": len(superseded),
+            "expired_deleted": len(expired),
+            "rows_deleted": {},
+            "orphans_removed": {},
+            "vacuum": None,
+        }
+        if not dry_run:
+            self._purge_in_batches(list(dict.fromkeys(superseded + expired)), batch_size, result["rows_deleted"])
+        result["orphans_removed"] = self._remove_orphans(dry_run)
+        
+        if vacuum and not dry_run and self.engine.dialect.name == "sqlite":
+            result["vacuum"] = self._incremental_vacuum(full_vacuum)
+        return result
 
-    def delete_project(self, project: str, use_soft_delete: bool = True) -> int:
+    def backup(
+        self,
+        dest_path: str,
+        pages_per_step: int = BACKUP_PAGES_PER_STEP,
+        sleep: float = BACKUP_STEP_SLEEP,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
         """
-        Delete all prompts in a project.
+        Copy the database to a file with the SQLite online backup API.
+        
+        Pages are copied pages_per_step at a time. The source is only locked
+        while a step runs, so other connections keep reading and writing
+        between steps; if they change the database the copy picks up the
+        changes. The result is a consistent snapshot taken when the last
+        step finished. The copy is written to a temporary file and moved into
+        place when complete; a name ending in ".gz" gzip-compresses it.
+        Sidecar files such as the similarity index are not included; they
+        are rebuilt from the database after a restore.
         
         Args:
-            project (str): Project name to delete
-            use_soft_delete (bool): Whether to use soft delete or hard delete
+            dest_path (str): Backup file, e.g. "prompts-2024-05-01.db.gz"
+            pages_per_step (int): Database pages copied per step
+            sleep (float): Seconds to pause between steps
+            progress (Callable[[int, int], None], optional): Called after each
+                step with the pages remaining and the total page count
             
         Returns:
-            int: Number of prompts deleted
+            Dict[str, Any]: path, compressed, pages copied, steps, file size in
+                bytes and duration in milliseconds
             
         Example:
-            >>> deleted = registry.delete_project("old-experiments", use_soft_delete=True)
-            >>> print(f"Deleted {deleted} prompts")
-            "Deleted 15 prompts"
+            >>> result = registry.backup("/backups/prompts.db.gz")
+            >>> print(result["pages"], result["bytes"])
+            18244 9843521
         """
-        session = self.Session()
+        self._require_sqlite("Online backups")
+        if pages_per_step < 1:
+            raise ValueError("pages_per_step must be at least 1")
+            
+        compressed = dest_path.lower().endswith(".gz")
+        directory = os.path.dirname(os.path.abspath(dest_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".cuebit-backup-", suffix=".db", dir=directory)
+        os.close(fd)
+        
+        stats = {"pages": 0, "steps": 0}
+        
+        def on_step(status, remaining, total):
+            stats["pages"], stats["steps"] = total, stats["steps"] + 1
+            if progress:
+                progress(remaining, total)
+                
+        start = time.perf_counter()
         try:
-            if use_soft_delete:
-                # Soft delete - mark prompts as deleted
-                count = session.query(PromptORM).filter_by(
-                    project=project,
-                    is_deleted=False
-                ).update({
-                    "is_deleted": True,
-                    "alias": None  # Remove aliases
-                })
-            else:
-                # Hard delete - remove from database
-                count = session.query(PromptORM).filter_by(project=project).delete()
+            raw = self.engine.raw_connection()
+            try:
+                target = sqlite3.connect(temp_path)
+                try:
+                    raw.driver_connection.backup(target, pages=pages_per_step, progress=on_step, sleep=sleep)
+                finally:
+                    target.close()
+            finally:
+                raw.close()
                 
-            session.commit()
-            return count
+            if compressed:
+                fd, gzip_path = tempfile.mkstemp(prefix=".cuebit-backup-", suffix=".gz", dir=directory)
+                try:
+                    with open(temp_path, "rb") as src, os.fdopen(fd, "wb") as raw_dst, \
+                            gzip.GzipFile(fileobj=raw_dst, mode="wb") as dst:
+                        shutil.copyfileobj(src, dst, 1024 * 1024)
+                    os.replace(gzip_path, dest_path)
+                except BaseException:
+                    if os.path.exists(gzip_path):
+                        os.unlink(gzip_path)
+                    raise
+            else:
+                os.replace(temp_path, dest_path)
         finally:
-            session.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+                
+        return {
+            "path": dest_path,
+            "compressed": compressed,
+            "pages": stats["pages"],
+            "steps": stats["steps"],
+            "bytes": os.path.getsize(dest_path),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
 
-    def delete_prompts_by_project_task(
-        self, 
-        project: str, 
-        task: str,
-        use_soft_delete: bool = True
-    ) -> int:
+    def restore(
+        self,
+        source_path: str,
+        pages_per_step: int = BACKUP_PAGES_PER_STEP
+    ) -> Dict[str, Any]:
         """
-        Delete all prompts for a task in a project.
+        Replace the database contents with a backup made by backup().
+        
+        The backup is copied over the live database page by page with the
+        SQLite online backup API. Other connections of this registry are
+        closed first; the restore holds the write lock until it completes.
+        Backups from older Cuebit versions are upgraded to the current schema,
+        and the similarity index is discarded so that it is rebuilt.
         
         Args:
-            project (str): Project name
-            task (str): Task name
-            use_soft_delete (bool): Whether to use soft delete or hard delete
+            source_path (str): Backup file, gzip-compressed if it ends in ".gz"
+            pages_per_step (int): Database pages copied per step
             
         Returns:
-            int: Number of prompts deleted
+            Dict[str, Any]: path, pages copied, prompts restored and duration
+                in milliseconds
             
         Example:
-            >>> deleted = registry.delete_prompts_by_project_task(
-            ...     "content-generator", 
-            ...     "translation",
-            ...     use_soft_delete=True
-            ... )
-            >>> print(f"Deleted {deleted} prompts")
-            "Deleted 7 prompts"
+            >>> registry.restore("/backups/prompts.db.gz")["prompts"]
+            12840
         """
-        session = self.Session()
+        self._require_sqlite("Restoring backups")
+        if pages_per_step < 1:
+            raise ValueError("pages_per_step must be at least 1")
+        if not os.path.exists(source_path):
+            raise FileNotFoundError(source_path)
+            
+        start = time.perf_counter()
+        temp_path = None
+        path = source_path
         try:
-            if use_soft_delete:
-                # Soft delete - mark prompts as deleted
-                count = session.query(PromptORM).filter_by(
-                    project=project,
-                    task=task,
-                    is_deleted=False
-                ).update({
-                    "is_deleted": True,
-                    "alias": None  # Remove aliases
-                })
-            else:
-                # Hard delete - remove from database
-                count = session.query(PromptORM).filter_by(
-                    project=project,
-                    task=task
-                ).delete()
+            if source_path.lower().endswith(".gz"):
+                fd, temp_path = tempfile.mkstemp(prefix=".cuebit-restore-", suffix=".db")
+                with os.fdopen(fd, "wb") as dst, gzip.open(source_path, "rb") as src:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                path = temp_path
                 
-            session.commit()
-            return count
+            source = sqlite3.connect(path)
+            try:
+                try:
+                    tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                except sqlite3.DatabaseError as e:
+                    raise ValueError(f"{source_path} is not a SQLite database: {e}") from e
+                if "prompts" not in tables:
+                    raise ValueError(f"{source_path} is not a Cuebit registry backup")
+                pages = source.execute("PRAGMA page_count").fetchone()[0]
+                
+                self.engine.dispose()
+                raw = self.engine.raw_connection()
+                try:
+                    source.backup(raw.driver_connection, pages=pages_per_step)
+                finally:
+                    raw.close()
+            finally:
+                source.close()
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+                
+        # Pooled connections may hold pages of the replaced database
+        self.engine.dispose()
+        # The sidecar indexes the replaced rows, whose ids the restored ones reuse
+        self._reset_similarity_index()
+        Base.metadata.create_all(self.engine)
+        self._upgrade_schema(tables)
+        
+        session = self.Session()
+        try:
+            prompts = session.query(func.count(PromptORM.id)).scalar()
         finally:
             session.close()
+        return {
+            "path": source_path,
+            "pages": pages,
+            "prompts": prompts,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def _require_sqlite(self, operation: str) -> None:
+        """Raise ValueError unless the registry is backed by SQLite."""
+        if self.engine.dialect.name != "sqlite":
+            raise ValueError(
+                f"{operation} need SQLite; use export_to_file() or the tools of your "
+                f"{self.engine.dialect.name} server"
+            )
 
     def search_prompts(
         self, 
@@ -1223,7 +3568,9 @@ class PromptRegistry:
         project: Optional[str] = None,
         tags: Optional[List[str]] = None,
         page: int = 1,
-        page_size: int = 20
+        page_size: int = 20,
+        tag_mode: str = "all",
+        exclude_tags: Optional[List[str]] = None
     ) -> Tuple[List[PromptORM], int]:
         """
         Search prompts with filtering and pagination.
@@ -1232,6 +3579,8 @@ class PromptRegistry:
             query (str): Search text
             project (str, optional): Limit to specific project
             tags (List[str], optional): Filter by tags
+            tag_mode (str): "all" to require every tag, "any" for at least one
+            exclude_tags (List[str], optional): Skip prompts with any of these tags
             page (int): Page number (starts at 1)
             page_size (int): Items per page
             
@@ -1259,11 +3608,7 @@ class PromptRegistry:
                 search = search.filter_by(project=project)
                 
             # Apply tag filters if provided
-            if tags:
-                for tag in tags:
-                    # This would be more efficient with proper tag schema
-                    tag_pattern = f"%\"{tag}\"%"  # Match in JSON array
-                    search = search.filter(PromptORM.tags.ilike(tag_pattern))
+            search = self._filter_by_tags(search, tags, tag_mode, exclude_tags)
                 
             # Apply text search
             search_pattern = f"%{query}%"
@@ -1297,19 +3642,30 @@ class PromptRegistry:
         finally:
             session.close()
 
+    @_writes
     def bulk_tag_prompts(
         self, 
-        prompt_ids: List[str], 
+        prompt_ids: Optional[List[str]], 
         tags: List[str],
-        operation: str = "add"  # "add", "remove", "set"
+        operation: str = "add",  # "add", "remove", "set"
+        project: Optional[str] = None,
+        task: Optional[str] = None,
+        tag_filter: Optional[List[str]] = None
     ) -> int:
         """
         Bulk tag operation on multiple prompts.
         
+        Prompts are selected by ID, by filter, or both (filters then narrow
+        the ID list). The work is done with a few set-based statements per
+        chunk of prompts, all in one transaction.
+        
         Args:
-            prompt_ids (List[str]): List of prompt IDs to modify
+            prompt_ids (List[str], optional): List of prompt IDs to modify
             tags (List[str]): Tags to add/remove/set
             operation (str): "add", "remove", or "set"
+            project (str, optional): Select prompts in this project
+            task (str, optional): Select prompts for this task
+            tag_filter (List[str], optional): Select prompts having all of these tags
             
         Returns:
             int: Number of prompts modified
@@ -1322,57 +3678,121 @@ class PromptRegistry:
             ... )
             >>> print(f"Modified {modified} prompts")
             "Modified 3 prompts"
+            >>> registry.bulk_tag_prompts(None, ["release-2"], project="blog-generator")
+            42
         """
+        if operation not in ("add", "remove", "set"):
+            raise ValueError(f"Unknown operation: {operation}")
+        if prompt_ids is None and not (project or task or tag_filter):
+            raise ValueError("Select prompts by prompt_ids or by project, task or tag_filter")
+        tags = list(dict.fromkeys(tag for tag in tags if tag))
+        
+        selection = select(PromptORM.prompt_id).where(PromptORM.is_deleted == False)
+        if project:
+            selection = selection.where(PromptORM.project == project)
+        if task:
+            selection = selection.where(PromptORM.task == task)
+        selection = self._filter_by_tags(selection, tag_filter)
+            
         session = self.Session()
         try:
-            count = 0
-            
-            for prompt_id in prompt_ids:
-                prompt = session.query(PromptORM).filter_by(
-                    prompt_id=prompt_id,
-                    is_deleted=False
-                ).first()
+            # Resolve the selection to live prompt IDs
+            if prompt_ids is None:
+                selected = list(session.execute(selection).scalars())
+            else:
+                selected = []
+                requested = list(dict.fromkeys(prompt_ids))
+                for start in range(0, len(requested), BULK_CHUNK_SIZE):
+                    chunk = requested[start:start + BULK_CHUNK_SIZE]
+                    selected.extend(session.execute(
+                        selection.where(PromptORM.prompt_id.in_(chunk))
+                    ).scalars())
+            
+            tag_table = PromptTagORM.__table__
+            for start in range(0, len(selected), BULK_CHUNK_SIZE):
+                chunk = selected[start:start + BULK_CHUNK_SIZE]
                 
-                if not prompt:
-                    continue
-                    
-                try:
-                    current_tags = set(json.loads(prompt.tags or "[]"))
-                    
-                    if operation == "add":
-                        # Add new tags
-                        new_tags = list(current_tags | set(tags))
-                    elif operation == "remove":
-                        # Remove specified tags
-                        new_tags = list(current_tags - set(tags))
-                    elif operation == "set":
-                        # Replace with new tags
-                        new_tags = tags
-                    else:
-                        raise ValueError(f"Unknown operation: {operation}")
-                        
-                    prompt.tags = json.dumps(new_tags)
+                if operation == "remove" and tags:
+                    session.execute(tag_table.delete().where(and_(
+                        tag_table.c.prompt_id.in_(chunk),
+                        tag_table.c.tag_name.in_(tags)
+                    )))
+                elif operation == "set":
+                    stale = tag_table.delete().where(tag_table.c.prompt_id.in_(chunk))
+                    if tags:
+                        stale = stale.where(tag_table.c.tag_name.notin_(tags))
+                    session.execute(stale)
                     
-                    # Update prompt_tags table
-                    # First delete existing
-                    session.query(PromptTagORM).filter_by(prompt_id=prompt_id).delete()
-                    
-                    # Add new tags
-                    for tag in new_tags:
-                        if tag:
-                            prompt_tag = PromptTagORM(prompt_id=prompt_id, tag_name=tag)
-                            session.add(prompt_tag)
-                    
-                    count += 1
-                except Exception as e:
-                    print(f"Error updating tags for {prompt_id}: {str(e)}")
-                    continue
+                if operation in ("add", "set") and tags:
+                    session.execute(self._insert_missing_tags(chunk, tags))
                     
+                # Derive the JSON cache from the normalized rows
+                self._refresh_tag_cache(session, chunk)
+                
             session.commit()
-            return count
+            return len(selected)
+        except Exception:
+            session.rollback()
+            raise
         finally:
             session.close()
 
+    def _insert_missing_tags(self, prompt_ids: List[str], tags: List[str]):
+        """
+        Build an INSERT ... SELECT adding tags to prompts that lack them.
+        
+        Args:
+            prompt_ids (List[str]): Prompts to tag
+            tags (List[str]): Tags to add
+            
+        Returns:
+            Insert statement that skips existing (prompt_id, tag_name) pairs
+        """
+        tag_table = PromptTagORM.__table__
+        pairs = union_all(*[
+            select(PromptORM.prompt_id, literal(tag).label("tag_name"))
+            .where(PromptORM.prompt_id.in_(prompt_ids))
+            for tag in tags
+        ]).subquery()
+        return self._insert_ignoring_conflicts(
+            tag_table,
+            select(pairs.c.prompt_id, pairs.c.tag_name),
+            ["prompt_id", "tag_name"]
+        )
+
+    def _insert_ignoring_conflicts(self, table, rows, conflict_columns: List[str]):
+        """
+        Build an INSERT ... SELECT that skips rows already present.
+        
+        Uses ON CONFLICT DO NOTHING where the dialect supports it and a
+        NOT EXISTS guard elsewhere.
+        
+        Args:
+            table: Target table
+            rows: SELECT whose column labels match the target columns
+            conflict_columns (List[str]): Columns of the unique key
+            
+        Returns:
+            Insert statement
+        """
+        columns = [column.name for column in rows.selected_columns]
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            source = rows.subquery()
+            guarded = select(*[source.c[name] for name in columns]).where(~exists().where(and_(
+                *[table.c[name] == source.c[name] for name in conflict_columns]
+            )))
+            return table.insert().from_select(columns, guarded)
+            
+        # SQLite needs a WHERE on the SELECT to parse the ON CONFLICT clause
+        return dialect_insert(table).from_select(
+            columns, rows.where(true())
+        ).on_conflict_do_nothing(index_elements=conflict_columns)
+
     def render_prompt(
         self, 
         prompt_id: str, 
@@ -1471,24 +3891,168 @@ class PromptRegistry:
             >>> print(f"Found {len(examples)} examples")
             "Found 3 examples"
         """
+        return self.get_examples_for_many([prompt_id])[prompt_id]
+
+    def _new_example(
+            self,
+            prompt_id: str,
+            input_text: str,
+            output_text: str,
+            description: Optional[str]
+        ) -> ExampleORM:
+        """Build an ExampleORM, compressing large bodies per the registry settings."""
+        return ExampleORM(
+            prompt_id=prompt_id,
+            description=description,
+            **encode_example_bodies(
+                input_text, output_text,
+                self.example_compression, self.example_compression_threshold
+            )
+        )
+
+    def _example_dict(self, ex: ExampleORM) -> Dict[str, Any]:
+        """Return the dictionary form of an example used by the read methods."""
+        input_text, output_text = decode_example_bodies(ex)
+        return {
+            "id": ex.id,
+            "input": input_text,
+            "output": output_text,
+            "description": ex.description,
+            "created_at": ex.created_at.isoformat() if ex.created_at else None
+        }
+
+    def _examples_for(self, session: Session, prompt_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Fetch the examples of many prompts with one IN query per chunk."""
+        result: Dict[str, List[Dict[str, Any]]] = {prompt_id: [] for prompt_id in prompt_ids}
+        ids = list(result)
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_CHUNK_SIZE]
+            examples = session.query(ExampleORM)\
+                .options(undefer(ExampleORM.body))\
+                .filter(ExampleORM.prompt_id.in_(chunk))\
+                .order_by(ExampleORM.prompt_id, ExampleORM.id)
+            for ex in examples:
+                result[ex.prompt_id].append(self._example_dict(ex))
+                
+        # Archived versions keep their examples in the archive row
+        missing = [prompt_id for prompt_id in ids if not result[prompt_id]]
+        for start in range(0, len(missing), BULK_CHUNK_SIZE):
+            archived = session.query(PromptArchiveORM.prompt_id, PromptArchiveORM.examples)\
+                .filter(PromptArchiveORM.prompt_id.in_(missing[start:start + BULK_CHUNK_SIZE]))
+            for prompt_id, examples in archived:
+                result[prompt_id] = list(examples or [])
+                
+        return result
+
+    def get_examples_for_many(self, prompt_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the examples of several prompts at once.
+        
+        Runs one IN query per chunk of BULK_CHUNK_SIZE prompts instead of
+        one query per prompt.
+        
+        Args:
+            prompt_ids (List[str]): Prompt IDs to get examples for
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Examples by prompt ID, in
+                insertion order; prompts without examples map to []
+            
+        Example:
+            >>> examples = registry.get_examples_for_many([p.prompt_id for p in prompts])
+            >>> print(len(examples[prompts[0].prompt_id]))
+            3
+        """
         session = self.Session()
         try:
-            examples = session.query(ExampleORM).filter_by(prompt_id=prompt_id).all()
+            return self._examples_for(session, prompt_ids)
+        finally:
+            session.close()
+
+    def get_examples_page(
+        self,
+        prompt_id: str,
+        limit: int = 100,
+        after_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get one page of a prompt's examples, ordered by ID.
+        
+        Pages are addressed by the ID of the last example already seen
+        rather than an offset, so each page is an index range scan.
+        Archived versions keep their examples as a list without IDs; their
+        cursor is the number of examples already returned.
+        
+        Args:
+            prompt_id (str): Prompt ID to get examples for
+            limit (int): Maximum examples per page
+            after_id (int, optional): Return examples after this example ID
             
-            result = []
-            for ex in examples:
-                result.append({
-                    "id": ex.id,
-                    "input": ex.input_text,
-                    "output": ex.output_text,
-                    "description": ex.description,
-                    "created_at": ex.created_at.isoformat() if ex.created_at else None
-                })
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[int]]: The examples and the
+                after_id of the next page, or None on the last page
+            
+        Example:
+            >>> page, cursor = registry.get_examples_page(prompt_id, limit=20)
+            >>> while cursor is not None:
+            ...     page, cursor = registry.get_examples_page(prompt_id, limit=20, after_id=cursor)
+        """
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+            
+        session = self.Session()
+        try:
+            query = session.query(ExampleORM)\
+                .options(undefer(ExampleORM.body))\
+                .filter(ExampleORM.prompt_id == prompt_id)
+            if after_id is not None:
+                query = query.filter(ExampleORM.id > after_id)
+            rows = query.order_by(ExampleORM.id).limit(limit + 1).all()
+            
+            if not rows:
+                archived = session.query(PromptArchiveORM.examples)\
+                    .filter(PromptArchiveORM.prompt_id == prompt_id)\
+                    .first()
+                if archived is None:
+                    return [], None
+                examples = archived.examples or []
+                start = after_id or 0
+                next_cursor = start + limit if len(examples) > start + limit else None
+                return list(examples[start:start + limit]), next_cursor
                 
-            return result
+            page = [self._example_dict(ex) for ex in rows[:limit]]
+            next_cursor = rows[limit - 1].id if len(rows) > limit else None
+            return page, next_cursor
+        finally:
+            session.close()
+
+    def get_example_counts(self, prompt_ids: List[str]) -> Dict[str, int]:
+        """
+        Count the examples of several prompts without loading them.
+        
+        Args:
+            prompt_ids (List[str]): Prompt IDs to count examples for
+            
+        Returns:
+            Dict[str, int]: Example count by prompt ID (0 when none)
+            
+        Example:
+            >>> counts = registry.get_example_counts([p.prompt_id for p in prompts])
+        """
+        counts = {prompt_id: 0 for prompt_id in prompt_ids}
+        ids = list(counts)
+        session = self.Session()
+        try:
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                rows = session.query(ExampleORM.prompt_id, func.count(ExampleORM.id))\
+                    .filter(ExampleORM.prompt_id.in_(ids[start:start + BULK_CHUNK_SIZE]))\
+                    .group_by(ExampleORM.prompt_id)
+                counts.update(dict(rows.all()))
+            return counts
         finally:
             session.close()
 
+    @_writes
     def add_example(
         self, 
         prompt_id: str, 
@@ -1528,16 +4092,21 @@ class PromptRegistry:
             if not prompt:
                 return None
                 
-            example = ExampleORM(
-                prompt_id=prompt_id,
-                input_text=input_text,
-                output_text=output_text,
-                description=description
+            example = self._new_example(
+                prompt_id,
+                input_text,
+                output_text,
+                description
             )
             
             session.add(example)
+            # New examples are a change of the prompt for incremental exports
+            prompt.updated_at = datetime.utcnow()
             session.commit()
             session.refresh(example)
+            if example.compression:
+                # Load the deferred body so the detached copy can be decoded
+                session.refresh(example, ["body"])
             
             # Handle SQLAlchemy detached instance issue
             result = copy.deepcopy(example)
@@ -1546,6 +4115,77 @@ class PromptRegistry:
         finally:
             session.close()
 
+    @_writes
+    def compress_examples(self, batch_size: int = BULK_CHUNK_SIZE) -> Dict[str, int]:
+        """
+        Compress stored example bodies above the registry's threshold.
+        
+        New examples are compressed when written; this rewrites examples
+        stored before compression was enabled, one transaction per batch.
+        
+        Args:
+            batch_size (int): Examples rewritten per transaction
+            
+        Returns:
+            Dict[str, int]: Examples compressed and bytes saved
+            
+        Example:
+            >>> registry.compress_examples()
+            {'compressed': 120, 'bytes_saved': 5242880}
+        """
+        if self.example_compression is None:
+            raise ValueError("Example compression is disabled for this registry")
+            
+        examples = ExampleORM.__table__
+        result = {"compressed": 0, "bytes_saved": 0}
+        # Character lengths never exceed byte lengths, so this only skips small rows
+        threshold = self.example_compression_threshold // 4
+        last_id = 0
+        while True:
+            session = self.Session()
+            try:
+                rows = session.execute(
+                    select(examples.c.id, examples.c.input_text, examples.c.output_text)
+                    .where(
+                        examples.c.id > last_id,
+                        examples.c.compression.is_(None),
+                        func.length(examples.c.input_text) + func.length(examples.c.output_text) > threshold
+                    )
+                    .order_by(examples.c.id)
+                    .limit(batch_size)
+                ).fetchall()
+                if not rows:
+                    return result
+                last_id = rows[-1].id
+                
+                changes = []
+                for row in rows:
+                    values = encode_example_bodies(
+                        row.input_text, row.output_text,
+                        self.example_compression, self.example_compression_threshold
+                    )
+                    if values["compression"]:
+                        values["b_id"] = row.id
+                        changes.append(values)
+                        size = len(row.input_text.encode("utf-8")) + len(row.output_text.encode("utf-8"))
+                        result["bytes_saved"] += size - len(values["body"])
+                if changes:
+                    session.execute(
+                        examples.update()
+                        .where(examples.c.id == bindparam("b_id"))
+                        .values(
+                            input_text=bindparam("input_text"),
+                            output_text=bindparam("output_text"),
+                            compression=bindparam("compression"),
+                            body=bindparam("body")
+                        ),
+                        changes
+                    )
+                    session.commit()
+                    result["compressed"] += len(changes)
+            finally:
+                session.close()
+
     def get_usage_stats(self) -> Dict[str, Any]:
         """
         Get database usage statistics.
@@ -1571,7 +4211,7 @@ class PromptRegistry:
                     PromptORM.is_deleted == False
                 ).count(),
                 "average_template_length": session.query(func.avg(func.length(PromptORM.template))).scalar(),
-                "total_examples": session.query(ExampleORM).count()
+                "total_examples": session.query(func.count(ExampleORM.id)).scalar()
             }
             
             # Get most active projects
@@ -1593,14 +4233,23 @@ class PromptRegistry:
     def export_prompts(
         self, 
         project: Optional[str] = None,
-        format: str = "json"
+        format: str = "json",
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None
     ) -> str:
         """
-        Export prompts to a portable format (JSON/YAML).
+        Export prompts to JSON/YAML format.
+        
+        With since or until, only changes in that window are exported, as
+        a delta document (see export_changes) that import_prompts applies.
         
         Args:
             project (str, optional): Limit to specific project
-            format (str): "json" or "yaml"
+            format (str): "json", "ndjson", "yaml" or "yaml-stream" ("json" or
+                "yaml" for deltas)
+            since (str or datetime, optional): Export changes from this time on
+                (ISO 8601, or a duration before now such as "1h")
+            until (str or datetime, optional): Export changes before this time
             
         Returns:
             str: Exported data in selected format
@@ -1609,83 +4258,336 @@ class PromptRegistry:
             >>> exported = registry.export_prompts(project="blog-generator", format="json")
             >>> print(f"Exported data length: {len(exported)} bytes")
             "Exported data length: 24560 bytes"
+            >>> delta = registry.export_prompts(since="1h")
         """
-        session = self.Session()
+        if since is not None or until is not None:
+            delta = self.export_changes(since=since, until=until, project=project)
+            if format.lower() == "json":
+                return json.dumps(delta, indent=2)
+            elif format.lower() == "yaml":
+                return exchange.yaml_dump(delta, sort_keys=False)
+            raise ValueError(f"Delta exports are written as json or yaml, not {format}")
+            
+        export_data = list(self.iter_export_records(project=project))
+        
+        # Format the output
+        if format.lower() == "json":
+            return json.dumps(export_data, indent=2)
+        elif format.lower() == "ndjson":
+            return "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in export_data)
+        elif format.lower() in ("yaml", "yaml-stream"):
+            return "".join(exchange.encode_records(export_data, format.lower()))
+        else:
+            raise ValueError(f"Unsupported export format: {format}")
+
+    def _export_record(self, p: PromptORM, examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Return the portable form of a prompt and its examples."""
+        # Ensure tags are properly parsed
         try:
-            # Build query
-            query = session.query(PromptORM).filter_by(is_deleted=False)
-            if project:
-                query = query.filter_by(project=project)
-                
-            prompts = query.all()
+            tags = json.loads(p.tags or "[]")
+        except ValueError:
+            tags = []
             
-            # Convert to serializable format
-            export_data = []
-            for p in prompts:
-                try:
-                    # Get examples for this prompt
-                    examples = []
-                    for ex in session.query(ExampleORM).filter_by(prompt_id=p.prompt_id).all():
-                        examples.append({
-                            "input": ex.input_text,
-                            "output": ex.output_text,
-                            "description": ex.description
-                        })
-                    
-                    # Convert datetime objects to strings
-                    created_at = p.created_at.isoformat() if p.created_at else None
-                    updated_at = p.updated_at.isoformat() if p.updated_at else None
-                    
-                    # Ensure tags are properly parsed
+        return {
+            "prompt_id": p.prompt_id,
+            "project": p.project,
+            "task": p.task,
+            "template": p.template,
+            "version": p.version,
+            "alias": p.alias,
+            "tags": tags,
+            "meta": p.meta or {},
+            "parent_id": p.parent_id,
+            "template_variables": p.template_variables or [],
+            "created_at": p.created_at.isoformat() if p.created_at else None,
+            "updated_at": p.updated_at.isoformat() if p.updated_at else None,
+            "updated_by": p.updated_by,
+            "examples": [
+                {"input": ex["input"], "output": ex["output"], "description": ex["description"]}
+                for ex in examples
+            ]
+        }
+
+    def iter_export_records(
+        self,
+        project: Optional[str] = None,
+        unassigned_only: bool = False,
+        batch_size: int = BULK_CHUNK_SIZE,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        include_archived: bool = True
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield active prompts in their portable export form, batch by batch.
+        
+        Each batch of prompts is read with its examples in a short session,
+        so exports of any size run in bounded memory. Versions moved to
+        prompts_archive follow the hot prompts, marked "archived": true;
+        import_prompts puts them back into the archive.
+        
+        Args:
+            project (str, optional): Limit to specific project
+            unassigned_only (bool): Only export prompts without a project
+            batch_size (int): Prompts read per query
+            since (datetime, optional): Only prompts updated at or after this time
+            until (datetime, optional): Only prompts updated before this time
+            include_archived (bool): Whether to export archived versions too
+            
+        Yields:
+            Dict[str, Any]: Prompt records accepted by import_prompts
+            
+        Example:
+            >>> for record in registry.iter_export_records(project="blog-generator"):
+            ...     print(record["task"], record["version"])
+        """
+        last_id = 0
+        while True:
+            session = self.Session()
+            try:
+                query = session.query(PromptORM).filter(
+                    PromptORM.is_deleted == False,
+                    PromptORM.id > last_id
+                )
+                if project:
+                    query = query.filter(PromptORM.project == project)
+                elif unassigned_only:
+                    query = query.filter(PromptORM.project.is_(None))
+                if since is not None:
+                    query = query.filter(PromptORM.updated_at >= since)
+                if until is not None:
+                    query = query.filter(PromptORM.updated_at < until)
+                prompts = query.order_by(PromptORM.id).limit(batch_size).all()
+                if not prompts:
+                    break
+                last_id = prompts[-1].id
+                
+                examples = self._examples_for(session, [p.prompt_id for p in prompts])
+                records = []
+                for p in prompts:
                     try:
-                        tags = json.loads(p.tags or "[]")
-                    except:
-                        tags = []
-                    
-                    prompt_data = {
-                        "prompt_id": p.prompt_id,
-                        "project": p.project,
-                        "task": p.task,
-                        "template": p.template,
-                        "version": p.version,
-                        "alias": p.alias,
-                        "tags": tags,
-                        "meta": p.meta or {},
-                        "parent_id": p.parent_id,
-                        "template_variables": p.template_variables or [],
-                        "created_at": created_at,
-                        "updated_at": updated_at,
-                        "updated_by": p.updated_by,
-                        "examples": examples
-                    }
-                    export_data.append(prompt_data)
-                except Exception as e:
-                    print(f"Error exporting prompt {p.prompt_id}: {str(e)}")
-                    
-            # Format the output
-            if format.lower() == "json":
-                return json.dumps(export_data, indent=2)
-            elif format.lower() == "yaml":
-                import yaml
-                return yaml.dump(export_data, default_flow_style=False)
-            else:
-                raise ValueError(f"Unsupported export format: {format}")
+                        records.append(self._export_record(p, examples[p.prompt_id]))
+                    except Exception as e:
+                        print(f"Error exporting prompt {p.prompt_id}: {str(e)}")
+            finally:
+                session.close()
+            yield from records
+            
+        if include_archived:
+            yield from self._iter_archived_records(project, unassigned_only, batch_size, since, until)
+            
+    def _iter_archived_records(
+        self,
+        project: Optional[str],
+        unassigned_only: bool,
+        batch_size: int,
+        since: Optional[datetime],
+        until: Optional[datetime]
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the export records of active archived versions, batch by batch."""
+        last_id = 0
+        while True:
+            session = self.Session()
+            try:
+                query = session.query(PromptArchiveORM).filter(
+                    PromptArchiveORM.is_deleted == False,
+                    PromptArchiveORM.id > last_id
+                )
+                if project:
+                    query = query.filter(PromptArchiveORM.project == project)
+                elif unassigned_only:
+                    query = query.filter(PromptArchiveORM.project.is_(None))
+                if since is not None:
+                    query = query.filter(PromptArchiveORM.updated_at >= since)
+                if until is not None:
+                    query = query.filter(PromptArchiveORM.updated_at < until)
+                rows = query.order_by(PromptArchiveORM.id).limit(batch_size).all()
+                if not rows:
+                    return
+                last_id = rows[-1].id
+                
+                records = []
+                for row in rows:
+                    record = self._export_record(self._from_archive(row), row.examples or [])
+                    record["archived"] = True
+                    record["archived_at"] = row.archived_at.isoformat() if row.archived_at else None
+                    records.append(record)
+            finally:
+                session.close()
+            yield from records
+
+    def export_changes(
+        self,
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        project: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Export what changed in a time window as a delta document.
+        
+        A prompt changes when it is created, soft-deleted or restored, gains
+        or loses an alias (also when the alias moves to another version),
+        has its tags edited or gains examples; each of these moves its
+        updated_at. Active prompts changed in the window are exported in
+        full, soft-deleted ones as tombstones. Hard deletes and archiving
+        leave nothing to export.
+        
+        updated_at is stamped when a write is flushed, but the write only
+        becomes visible when its transaction commits, so a write stamped
+        just before until can commit after this export has read the table.
+        To chain deltas without gaps, pass the returned "next_since" (until
+        minus DELTA_OVERLAP_SECONDS) as the next call's "since" rather than
+        "until". Consecutive deltas then overlap, which is safe because
+        apply_changes is idempotent.
+        
+        Args:
+            since (str or datetime, optional): Start of the window, inclusive
+                (ISO 8601, or a duration before now such as "1h"); everything
+                before until if omitted
+            until (str or datetime, optional): End of the window, exclusive
+                (defaults to now)
+            project (str, optional): Limit to specific project
+            
+        Returns:
+            Dict[str, Any]: format, since, until, next_since, prompts and tombstones
+            
+        Example:
+            >>> delta = registry.export_changes(since="2024-05-01T10:00:00")
+            >>> print(len(delta["prompts"]), len(delta["tombstones"]), delta["until"])
+            12 1 2024-05-01T11:00:00.183321
+            >>> replica.apply_changes(delta)
+        """
+        now = datetime.utcnow()
+        since = exchange.parse_timestamp(since, now)
+        until = exchange.parse_timestamp(until, now) or now
+        
+        session = self.Session()
+        try:
+            query = session.query(PromptORM).filter(
+                PromptORM.is_deleted == True,
+                PromptORM.updated_at < until
+            )
+            if since is not None:
+                query = query.filter(PromptORM.updated_at >= since)
+            if project:
+                query = query.filter(PromptORM.project == project)
+            tombstones = [
+                {
+                    "prompt_id": p.prompt_id,
+                    "project": p.project,
+                    "task": p.task,
+                    "version": p.version,
+                    "deleted_at": p.updated_at.isoformat() if p.updated_at else None,
+                    "deleted_by": ((p.meta or {}).get("deleted") or {}).get("by"),
+                }
+                for p in query.order_by(PromptORM.id)
+            ]
         finally:
             session.close()
+            
+        return {
+            "format": exchange.DELTA_FORMAT,
+            "since": since.isoformat() if since else None,
+            "until": until.isoformat(),
+            "next_since": (until - timedelta(seconds=DELTA_OVERLAP_SECONDS)).isoformat(),
+            "project": project,
+            "prompts": list(self.iter_export_records(
+                project=project, since=since, until=until, include_archived=False
+            )),
+            "tombstones": tombstones,
+        }
+
+    def export_to_file(
+        self,
+        path: str,
+        project: Optional[str] = None,
+        format: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream prompts to a file, gzip-compressed if its name ends in ".gz".
+        
+        Args:
+            path (str): Output file, e.g. "backup.ndjson.gz"
+            project (str, optional): Limit to specific project
+            format (str, optional): one of exchange.FORMATS; taken from the
+                file name if omitted
+            
+        Returns:
+            Dict[str, Any]: path, format, compressed, prompts written and file size
+            
+        Example:
+            >>> registry.export_to_file("nightly.ndjson.gz")["prompts"]
+            12840
+        """
+        return exchange.write_records(path, self.iter_export_records(project=project), format)
+
+    def export_by_project(
+        self,
+        directory: str,
+        extension: str = ".ndjson.gz",
+        max_workers: Optional[int] = None,
+        projects: Optional[List[Optional[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Export each project to its own file with a process pool, plus a manifest.
+        
+        Args:
+            directory (str): Output directory
+            extension (str): File extension selecting format and compression
+            max_workers (int, optional): Worker processes (defaults to the CPU count)
+            projects (List[Optional[str]], optional): Projects to export (all by
+                default); None stands for prompts without a project
+            
+        Returns:
+            Dict[str, Any]: The manifest written to directory/manifest.json
+            
+        Example:
+            >>> manifest = registry.export_by_project("/backups/2024-05-01")
+            >>> print(len(manifest["files"]), manifest["total_prompts"])
+            14 12840
+        """
+        url = self.engine.url
+        if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+            raise ValueError("Split exports need a database other processes can open, not an in-memory one")
+            
+        if projects is None:
+            session = self.Session()
+            try:
+                rows = session.query(PromptORM.project).filter(
+                    PromptORM.is_deleted == False
+                ).distinct().all()
+            finally:
+                session.close()
+            projects = sorted((row[0] for row in rows), key=lambda name: (name is None, name or ""))
+                
+        return exchange.export_split_by_project(
+            url.render_as_string(hide_password=False), directory, projects, extension, max_workers
+        )
 
     def import_prompts(
         self, 
         data: str,
         format: str = "json",
-        skip_existing: bool = True
+        skip_existing: bool = True,
+        on_conflict: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Import prompts from JSON/YAML format.
         
+        on_conflict decides what happens to prompts whose prompt_id exists:
+            skip: keep the existing prompt
+            overwrite: replace it, with its tags and examples
+            overwrite-if-newer: replace it if the import's updated_at is later
+            fail: import nothing and report the conflicting IDs
+        
+        Delta documents written by export_prompts(since=...) are applied
+        with apply_changes, whatever skip_existing says.
+        
         Args:
             data (str): Data to import
-            format (str): "json" or "yaml"
-            skip_existing (bool): Whether to skip existing prompts
+            format (str): "json", "ndjson", "yaml" or "yaml-stream"
+            skip_existing (bool): Shorthand for on_conflict "skip" (True) or "fail" (False)
+            on_conflict (str, optional): One of IMPORT_CONFLICT_STRATEGIES;
+                overrides skip_existing
             
         Returns:
             Dict[str, Any]: Import results statistics
@@ -1694,7 +4596,11 @@ class PromptRegistry:
             >>> results = registry.import_prompts(json_data, format="json")
             >>> print(f"Imported: {results['imported']}, Skipped: {results['skipped']}")
             "Imported: 25, Skipped: 3"
+            >>> registry.import_prompts(json_data, on_conflict="overwrite-if-newer")["updated"]
+            4
         """
+        on_conflict = _conflict_strategy(skip_existing, on_conflict)
+        
         # Parse the input
         if format.lower() == "json":
             try:
@@ -1706,16 +4612,28 @@ class PromptRegistry:
                 return {"error": f"Invalid JSON: {str(e)}"}
         elif format.lower() == "yaml":
             try:
-                import yaml
-                prompts_data = yaml.safe_load(data)
+                prompts_data = exchange.yaml_load(data)
                 # Handle empty YAML document
                 if not prompts_data:
                     prompts_data = []
             except Exception as e:
                 return {"error": f"Invalid YAML: {str(e)}"}
+        elif format.lower() == "yaml-stream":
+            try:
+                prompts_data = list(exchange.yaml_load_all(data))
+            except Exception as e:
+                return {"error": f"Invalid YAML stream: {str(e)}"}
+        elif format.lower() == "ndjson":
+            try:
+                prompts_data = exchange.parse_ndjson(data)
+            except Exception as e:
+                return {"error": f"Invalid NDJSON: {str(e)}"}
         else:
             return {"error": f"Unsupported import format: {format}"}
             
+        if exchange.is_delta(prompts_data):
+            return self.apply_changes(prompts_data)
+            
         # Handle case where data isn't a list
         if not isinstance(prompts_data, list):
             return {
@@ -1727,80 +4645,655 @@ class PromptRegistry:
                 "error_details": [f"Expected a list of prompts, got {type(prompts_data).__name__}"]
             }
             
-        # Stats for import results
+        return self._import_records(prompts_data, on_conflict)
+
+    @_writes
+    def _import_records(self, prompts_data: List[Any], on_conflict: str = "skip") -> Dict[str, Any]:
+        """
+        Import parsed prompt records in one transaction and return the stats.
+        
+        The records are bulk-loaded into a temporary staging table. Conflicts
+        with existing prompts are resolved there with set-based statements,
+        and the remaining rows are written with one INSERT ... SELECT ...
+        ON CONFLICT, so no prompt is looked up individually. Records marked
+        "archived" go to prompts_archive instead. A prompt that exists in
+        either table counts as existing.
+        """
         stats = {
             "total": len(prompts_data),
             "imported": 0,
+            "updated": 0,
             "skipped": 0,
             "errors": 0,
             "error_details": []
         }
         
+        # Build the prompts rows; a later record for the same prompt wins
+        records, archived = {}, {}
+        now = datetime.utcnow()
+        for prompt_data in prompts_data:
+            try:
+                row = self._import_row(prompt_data, now)
+            except Exception as e:
+                stats["errors"] += 1
+                stats["error_details"].append(str(e))
+                continue
+            if records.pop(row["prompt_id"], None) is not None or archived.pop(row["prompt_id"], None) is not None:
+                stats["skipped"] += 1
+            (archived if prompt_data.get("archived") else records)[row["prompt_id"]] = (row, prompt_data)
+            
+        # Two records may not share a version; the first one keeps it. Rows
+        # without a project never clash, as the unique index treats NULLs as distinct.
+        versions = {}
+        for prompt_id, (row, _) in list(records.items()):
+            if row["project"] is None:
+                continue
+            owner = versions.setdefault((row["project"], row["task"], row["version"]), prompt_id)
+            if owner != prompt_id:
+                del records[prompt_id]
+                stats["errors"] += 1
+                stats["error_details"].append(
+                    f"{prompt_id}: {row['project']}/{row['task']} v{row['version']} is also imported as {owner}"
+                )
+                
         # Return early if there's nothing to import
-        if not prompts_data:
+        if not records and not archived:
             return stats
             
+        prompts, staging = PromptORM.__table__, IMPORT_STAGING_TABLE
+        archive = PromptArchiveORM.__table__
         session = self.Session()
         try:
-            for prompt_data in prompts_data:
-                try:
-                    prompt_id = prompt_data.get("prompt_id")
-                    
-                    # Check if prompt already exists
-                    if skip_existing and prompt_id:
-                        existing = session.query(PromptORM).filter_by(prompt_id=prompt_id).first()
-                        if existing:
-                            stats["skipped"] += 1
-                            continue
-                            
-                    # Create a new prompt with imported data
-                    new_prompt = PromptORM(
-                        prompt_id=prompt_id or str(uuid.uuid4()),
-                        project=prompt_data.get("project"),
-                        task=prompt_data.get("task", "imported"),
-                        template=prompt_data.get("template", ""),
-                        version=prompt_data.get("version", 1),
-                        alias=prompt_data.get("alias"),
-                        tags=json.dumps(prompt_data.get("tags", [])),
-                        meta=prompt_data.get("meta", {}),
-                        parent_id=prompt_data.get("parent_id"),
-                        template_variables=prompt_data.get("template_variables", []),
-                        is_deleted=False,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow(),
-                        updated_by=prompt_data.get("updated_by", "import")
+            if archived:
+                clashes = self._import_archived_records(session, archived, on_conflict, stats)
+                if clashes:
+                    session.rollback()
+                    stats["errors"] += 1
+                    stats["error_details"].append(f"Prompts already exist: {', '.join(clashes)}")
+                    return dict(stats, error=f"Import aborted, prompts already exist (e.g. {clashes[0]})")
+            if not records:
+                session.commit()
+                return stats
+                
+            connection = session.connection()
+            staging.create(connection)
+            session.execute(staging.insert(), [row for row, _ in records.values()])
+            
+            existing = or_(
+                exists().where(prompts.c.prompt_id == staging.c.prompt_id),
+                exists().where(archive.c.prompt_id == staging.c.prompt_id)
+            )
+            if on_conflict == "fail":
+                clashes = [pid for (pid,) in session.execute(select(staging.c.prompt_id).where(existing).limit(5))]
+                if clashes:
+                    session.rollback()
+                    stats["errors"] += 1
+                    stats["error_details"].append(f"Prompts already exist: {', '.join(clashes)}")
+                    return dict(stats, error=f"Import aborted, prompts already exist (e.g. {clashes[0]})")
+            elif on_conflict == "skip":
+                stats["skipped"] += session.execute(staging.delete().where(existing)).rowcount
+            elif on_conflict == "overwrite-if-newer":
+                stats["skipped"] += session.execute(staging.delete().where(or_(*[
+                    exists().where(
+                        table.c.prompt_id == staging.c.prompt_id,
+                        table.c.updated_at >= staging.c.updated_at
                     )
+                    for table in (prompts, archive)
+                ]))).rowcount
+                
+            # A new prompt may not take the version of another prompt
+            taken = exists().where(
+                prompts.c.project == staging.c.project,
+                prompts.c.task == staging.c.task,
+                prompts.c.version == staging.c.version,
+                prompts.c.prompt_id != staging.c.prompt_id
+            )
+            for (prompt_id,) in session.execute(select(staging.c.prompt_id).where(taken)).all():
+                row = records[prompt_id][0]
+                stats["errors"] += 1
+                stats["error_details"].append(
+                    f"{prompt_id}: {row['project']}/{row['task']} v{row['version']} belongs to another prompt"
+                )
+            session.execute(staging.delete().where(taken))
+            
+            updated = session.execute(
+                select(func.count()).select_from(staging).where(existing)
+            ).scalar()
+            if updated:
+                overwritten = select(staging.c.prompt_id).where(existing)
+                for table in PROMPT_CHILD_TABLES:
+                    session.execute(table.delete().where(table.c.prompt_id.in_(overwritten)))
+                # Archived versions come back to the prompts table
+                session.execute(archive.delete().where(archive.c.prompt_id.in_(overwritten)))
+                stats["updated"] += updated
                     
-                    session.add(new_prompt)
-                    
-                    # Process tags
-                    for tag in prompt_data.get("tags", []):
-                        if tag:
-                            prompt_tag = PromptTagORM(prompt_id=new_prompt.prompt_id, tag_name=tag)
-                            session.add(prompt_tag)
-                            
-                    # Process examples
-                    for ex in prompt_data.get("examples", []):
-                        example = ExampleORM(
-                            prompt_id=new_prompt.prompt_id,
-                            input_text=ex.get("input", ""),
-                            output_text=ex.get("output", ""),
-                            description=ex.get("description")
-                        )
-                        session.add(example)
-                    
-                    stats["imported"] += 1
-                    
+            self._upsert_staged_prompts(session, on_conflict)
+            written = [pid for (pid,) in session.execute(select(staging.c.prompt_id))]
+            keys = session.execute(select(staging.c.project, staging.c.task).distinct()).all()
+            
+            # Rolled back with the transaction if anything above fails
+            staging.drop(connection)
+            
+            stats["imported"] += len(written) - updated
+            self._insert_imported_children(session, [records[pid] for pid in written])
+            
+            # Keep version allocation ahead of the imported versions
+            for project, task in keys:
+                self._sync_version_sequence(session, project, task)
+                
+            session.commit()
+            if stats["updated"]:
+                # Overwritten prompts keep their row ids, which the index only appends past
+                self._reset_similarity_index()
+            return stats
+        except Exception as e:
+            session.rollback()
+            if _is_lock_error(e):
+                raise
+            stats["errors"] += 1
+            stats["error_details"].append(f"Database error: {str(e)}")
+            stats["imported"] = stats["updated"] = 0
+            return stats
+        finally:
+            session.close()
+
+    def _import_archived_records(
+            self,
+            session: Session,
+            items: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]],
+            on_conflict: str,
+            stats: Dict[str, Any]
+        ) -> List[str]:
+        """
+        Write records of archived versions to prompts_archive, adding to stats.
+        
+        Overwritten prompts are removed from whichever table holds them.
+        Does not commit.
+        
+        Returns:
+            List[str]: Up to five existing prompt IDs if on_conflict is "fail"
+                and any exist, in which case nothing is written
+        """
+        prompts, archive = PromptORM.__table__, PromptArchiveORM.__table__
+        ids = list(items)
+        current = {}
+        for table in (prompts, archive):
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                for prompt_id, updated_at in session.execute(
+                    select(table.c.prompt_id, table.c.updated_at)
+                    .where(table.c.prompt_id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                ):
+                    current[prompt_id] = (table, updated_at)
+        if on_conflict == "fail" and current:
+            return sorted(current)[:5]
+            
+        rows, replaced = [], {prompts: [], archive: []}
+        now = datetime.utcnow()
+        for prompt_id, (row, prompt_data) in items.items():
+            if prompt_id in current:
+                table, updated_at = current[prompt_id]
+                if on_conflict == "skip" or (
+                    on_conflict == "overwrite-if-newer" and updated_at and updated_at >= row["updated_at"]
+                ):
+                    stats["skipped"] += 1
+                    continue
+                replaced[table].append(prompt_id)
+                stats["updated"] += 1
+            else:
+                stats["imported"] += 1
+            rows.append(dict(
+                row,
+                examples=[
+                    {
+                        "id": None,
+                        "input": ex.get("input", ""),
+                        "output": ex.get("output", ""),
+                        "description": ex.get("description"),
+                        "created_at": ex.get("created_at")
+                    }
+                    for ex in prompt_data.get("examples") or []
+                ],
+                archived_at=exchange.parse_timestamp(prompt_data.get("archived_at")) or now
+            ))
+            
+        if replaced[prompts]:
+            self._purge_prompts(session, replaced[prompts], relink=False)
+        for start in range(0, len(replaced[archive]), BULK_CHUNK_SIZE):
+            chunk = replaced[archive][start:start + BULK_CHUNK_SIZE]
+            session.execute(archive.delete().where(archive.c.prompt_id.in_(chunk)))
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            session.execute(archive.insert(), rows[start:start + BULK_CHUNK_SIZE])
+        return []
+
+    def _import_row(self, prompt_data: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """Return the prompts row for an export record, keeping its timestamps."""
+        if not isinstance(prompt_data, dict):
+            raise ValueError(f"Expected a prompt object, got {type(prompt_data).__name__}")
+        tags = list(dict.fromkeys(tag for tag in prompt_data.get("tags") or [] if tag))
+        return {
+            "prompt_id": prompt_data.get("prompt_id") or str(uuid.uuid4()),
+            "project": prompt_data.get("project"),
+            "task": prompt_data.get("task", "imported"),
+            "template": prompt_data.get("template", ""),
+            "version": prompt_data.get("version", 1),
+            "alias": prompt_data.get("alias"),
+            "tags": json.dumps(tags),
+            "meta": prompt_data.get("meta", {}),
+            "parent_id": prompt_data.get("parent_id"),
+            "template_variables": prompt_data.get("template_variables", []),
+            "is_deleted": False,
+            "created_at": exchange.parse_timestamp(prompt_data.get("created_at")) or now,
+            "updated_at": exchange.parse_timestamp(prompt_data.get("updated_at")) or now,
+            "updated_by": prompt_data.get("updated_by", "import"),
+        }
+
+    def _upsert_staged_prompts(self, session: Session, on_conflict: str):
+        """
+        Move the staged rows into prompts with one INSERT ... SELECT.
+        
+        Rows that conflict on prompt_id update the existing prompt for the
+        overwrite strategies (only if older, for overwrite-if-newer) and are
+        left alone otherwise. Dialects without ON CONFLICT delete the
+        prompts being overwritten first.
+        """
+        prompts, staging = PromptORM.__table__, IMPORT_STAGING_TABLE
+        columns = list(ARCHIVED_PROMPT_COLUMNS)
+        rows = select(*[staging.c[name] for name in columns])
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            session.execute(prompts.delete().where(
+                prompts.c.prompt_id.in_(select(staging.c.prompt_id))
+            ))
+            return session.execute(prompts.insert().from_select(columns, rows))
+            
+        # SQLite needs a WHERE on the SELECT to parse the ON CONFLICT clause
+        statement = dialect_insert(prompts).from_select(columns, rows.where(true()))
+        if on_conflict == "skip":
+            statement = statement.on_conflict_do_nothing(index_elements=["prompt_id"])
+        elif on_conflict != "fail":
+            statement = statement.on_conflict_do_update(
+                index_elements=["prompt_id"],
+                set_={name: statement.excluded[name] for name in columns if name != "prompt_id"},
+                where=(prompts.c.updated_at < statement.excluded.updated_at
+                       if on_conflict == "overwrite-if-newer" else None)
+            )
+        return session.execute(statement)
+
+    def _insert_imported_children(self, session: Session, items: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+        """Bulk insert the tags, examples and derived indexes of imported prompts."""
+        meta_keys = [k for (k,) in session.query(MetaIndexKeyORM.key)]
+        children = {table: [] for table in PROMPT_CHILD_TABLES}
+        for row, prompt_data in items:
+            prompt_id = row["prompt_id"]
+            children[PromptTagORM.__table__].extend(
+                {"prompt_id": prompt_id, "tag_name": tag} for tag in json.loads(row["tags"])
+            )
+            for ex in prompt_data.get("examples") or []:
+                children[ExampleORM.__table__].append(dict(
+                    prompt_id=prompt_id,
+                    description=ex.get("description"),
+                    **encode_example_bodies(
+                        ex.get("input", ""), ex.get("output", ""),
+                        self.example_compression, self.example_compression_threshold
+                    )
+                ))
+            children[PromptSignatureORM.__table__].append({
+                "prompt_id": prompt_id,
+                "num_perm": dedupe.NUM_PERM,
+                "signature": dedupe.signature_to_bytes(dedupe.minhash_signature(row["template"]))
+            })
+            children[PromptVariableORM.__table__].extend(
+                {"prompt_id": prompt_id, "variable_name": name}
+                for name in template_variable_names(row["template"])
+            )
+            if meta_keys:
+                children[PromptMetaValueORM.__table__].extend(
+                    dict(prompt_id=prompt_id, **values) for values in self._meta_index_rows(row["meta"], meta_keys)
+                )
+        for table, values in children.items():
+            for start in range(0, len(values), BULK_CHUNK_SIZE):
+                session.execute(table.insert(), values[start:start + BULK_CHUNK_SIZE])
+
+    def _add_imported_prompt(
+            self,
+            session: Session,
+            prompt_data: Dict[str, Any],
+            keep_timestamps: bool = False
+        ) -> PromptORM:
+        """
+        Add a prompt and its examples from an export record to a session.
+        
+        Args:
+            session (Session): Session of the import
+            prompt_data (Dict[str, Any]): Export record
+            keep_timestamps (bool): Keep the record's created_at/updated_at
+                instead of stamping the import time
+            
+        Returns:
+            PromptORM: The new prompt
+        """
+        now = datetime.utcnow()
+        created_at = updated_at = now
+        if keep_timestamps:
+            created_at = exchange.parse_timestamp(prompt_data.get("created_at")) or now
+            updated_at = exchange.parse_timestamp(prompt_data.get("updated_at")) or now
+            
+        prompt_id = prompt_data.get("prompt_id") or str(uuid.uuid4())
+        tags = self._add_tags(session, prompt_id, prompt_data.get("tags", []))
+        new_prompt = PromptORM(
+            prompt_id=prompt_id,
+            project=prompt_data.get("project"),
+            task=prompt_data.get("task", "imported"),
+            template=prompt_data.get("template", ""),
+            version=prompt_data.get("version", 1),
+            alias=prompt_data.get("alias"),
+            tags=json.dumps(tags),
+            meta=prompt_data.get("meta", {}),
+            parent_id=prompt_data.get("parent_id"),
+            template_variables=prompt_data.get("template_variables", []),
+            is_deleted=False,
+            created_at=created_at,
+            updated_at=updated_at,
+            updated_by=prompt_data.get("updated_by", "import")
+        )
+        
+        session.add(new_prompt)
+        self._index_prompt(session, new_prompt.prompt_id, new_prompt.template, new_prompt.meta)
+                
+        # Process examples
+        for ex in prompt_data.get("examples", []):
+            session.add(self._new_example(
+                new_prompt.prompt_id,
+                ex.get("input", ""),
+                ex.get("output", ""),
+                ex.get("description")
+            ))
+        return new_prompt
+
+    @_writes
+    def apply_changes(self, delta: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Apply a delta document written by export_changes, in one transaction.
+        
+        Prompts missing here are created; existing ones take the record's
+        alias, tags, metadata, examples, deletion state and updated_at.
+        Versions archived here are updated in prompts_archive, where they
+        stay. An alias arriving on a prompt is removed from any other prompt that
+        carries it. Tombstones soft-delete their prompt. Applying the same
+        delta again changes nothing, so overlapping windows are safe.
+        
+        Args:
+            delta (Dict[str, Any]): The delta document
+            
+        Returns:
+            Dict[str, Any]: Counts of prompts imported, updated, deleted and
+                skipped (already up to date or unknown tombstones), and errors
+            
+        Example:
+            >>> replica.apply_changes(primary.export_changes(since="1h"))
+            {'total': 13, 'imported': 9, 'updated': 3, 'deleted': 1, 'skipped': 0, 'errors': 0, 'error_details': []}
+        """
+        if not exchange.is_delta(delta):
+            return {"error": "Not a Cuebit delta document"}
+        records = [r for r in delta.get("prompts") or [] if isinstance(r, dict)]
+        tombstones = [t for t in delta.get("tombstones") or [] if isinstance(t, dict)]
+        stats = {
+            "total": len(records) + len(tombstones),
+            "imported": 0,
+            "updated": 0,
+            "deleted": 0,
+            "skipped": 0,
+            "errors": 0,
+            "error_details": []
+        }
+        
+        session = self.Session()
+        try:
+            ids = [r.get("prompt_id") for r in records + tombstones if r.get("prompt_id")]
+            existing = {}
+            for start in range(0, len(ids), BULK_CHUNK_SIZE):
+                for prompt in session.query(PromptORM).filter(
+                    PromptORM.prompt_id.in_(ids[start:start + BULK_CHUNK_SIZE])
+                ):
+                    existing[prompt.prompt_id] = prompt
+            current_examples = self._examples_for(session, list(existing))
+            
+            # Versions archived on this side are updated where they are
+            cold = [prompt_id for prompt_id in ids if prompt_id not in existing]
+            for start in range(0, len(cold), BULK_CHUNK_SIZE):
+                for row in session.query(PromptArchiveORM).filter(
+                    PromptArchiveORM.prompt_id.in_(cold[start:start + BULK_CHUNK_SIZE])
+                ):
+                    existing[row.prompt_id] = row
+            
+            # Aliases move: clear them from prompts the delta does not assign them to
+            assigned = {r["alias"]: r.get("prompt_id") for r in records if r.get("alias")}
+            for alias, prompt_id in assigned.items():
+                for model in (PromptORM, PromptArchiveORM):
+                    session.query(model).filter(
+                        model.alias == alias,
+                        model.prompt_id != prompt_id
+                    ).update({"alias": None}, synchronize_session="fetch")
+                
+            touched_tags, new_keys = [], set()
+            for record in records:
+                try:
+                    prompt = existing.get(record.get("prompt_id"))
+                    if prompt is None:
+                        prompt = self._add_imported_prompt(session, record, keep_timestamps=True)
+                        existing[prompt.prompt_id] = prompt
+                        new_keys.add((prompt.project, prompt.task))
+                        stats["imported"] += 1
+                        continue
+                        
+                    if isinstance(prompt, PromptArchiveORM):
+                        changed = self._apply_archived_record(prompt, record)
+                    else:
+                        changed = self._apply_record(session, prompt, record, current_examples[prompt.prompt_id])
+                        if changed:
+                            touched_tags.append(prompt.prompt_id)
+                    stats["updated" if changed else "skipped"] += 1
                 except Exception as e:
+                    if _is_lock_error(e):
+                        raise
                     stats["errors"] += 1
-                    stats["error_details"].append(str(e))
+                    stats["error_details"].append(f"{record.get('prompt_id')}: {str(e)}")
                     
+            for tombstone in tombstones:
+                prompt = existing.get(tombstone.get("prompt_id"))
+                if prompt is None or prompt.is_deleted:
+                    stats["skipped"] += 1
+                    continue
+                meta = dict(prompt.meta or {})
+                meta["deleted"] = {"by": tombstone.get("deleted_by"), "at": tombstone.get("deleted_at")}
+                prompt.meta = meta
+                prompt.is_deleted = True
+                prompt.alias = None
+                prompt.updated_at = exchange.parse_timestamp(tombstone.get("deleted_at")) or datetime.utcnow()
+                stats["deleted"] += 1
+                
+            session.flush()
+            self._refresh_tag_cache(session, touched_tags)
+            for project, task in new_keys:
+                self._sync_version_sequence(session, project, task)
             session.commit()
             return stats
         except Exception as e:
             session.rollback()
+            if _is_lock_error(e):
+                raise
             stats["errors"] += 1
             stats["error_details"].append(f"Database error: {str(e)}")
             return stats
         finally:
-            session.close()
\ No newline at end of file
+            session.close()
+
+    def _apply_record(
+            self,
+            session: Session,
+            prompt: PromptORM,
+            record: Dict[str, Any],
+            examples: List[Dict[str, Any]]
+        ) -> bool:
+        """
+        Bring an existing prompt in line with a delta record.
+        
+        Returns:
+            bool: False if the prompt already matched the record
+        """
+        tags = list(dict.fromkeys(tag for tag in record.get("tags") or [] if tag))
+        wanted_examples = [
+            (ex.get("input", ""), ex.get("output", ""), ex.get("description"))
+            for ex in record.get("examples") or []
+        ]
+        have_examples = [(ex["input"], ex["output"], ex["description"]) for ex in examples]
+        try:
+            have_tags = json.loads(prompt.tags or "[]")
+        except ValueError:
+            have_tags = []
+        changes = {
+            "alias": record.get("alias"),
+            "meta": record.get("meta") or {},
+            "is_deleted": False,
+            "updated_by": record.get("updated_by", prompt.updated_by),
+        }
+        if (all(getattr(prompt, key) == value for key, value in changes.items())
+                and have_tags == tags and have_examples == wanted_examples):
+            return False
+            
+        for key, value in changes.items():
+            setattr(prompt, key, value)
+        prompt.updated_at = exchange.parse_timestamp(record.get("updated_at")) or datetime.utcnow()
+        
+        if have_tags != tags:
+            session.query(PromptTagORM).filter_by(prompt_id=prompt.prompt_id).delete(synchronize_session=False)
+            self._add_tags(session, prompt.prompt_id, tags)
+        if have_examples != wanted_examples:
+            session.query(ExampleORM).filter_by(prompt_id=prompt.prompt_id).delete(synchronize_session=False)
+            for ex_input, ex_output, description in wanted_examples:
+                session.add(self._new_example(prompt.prompt_id, ex_input, ex_output, description))
+        return True
+
+    def _apply_archived_record(self, row: PromptArchiveORM, record: Dict[str, Any]) -> bool:
+        """
+        Bring an archived version in line with a delta record.
+        
+        Archived rows have no child table rows, so tags and examples are
+        only rewritten in the row itself.
+        
+        Returns:
+            bool: False if the row already matched the record
+        """
+        tags = list(dict.fromkeys(tag for tag in record.get("tags") or [] if tag))
+        wanted_examples = [
+            (ex.get("input", ""), ex.get("output", ""), ex.get("description"))
+            for ex in record.get("examples") or []
+        ]
+        have_examples = [
+            (ex.get("input", ""), ex.get("output", ""), ex.get("description"))
+            for ex in row.examples or []
+        ]
+        try:
+            have_tags = json.loads(row.tags or "[]")
+        except ValueError:
+            have_tags = []
+        changes = {
+            "alias": record.get("alias"),
+            "meta": record.get("meta") or {},
+            "is_deleted": False,
+            "updated_by": record.get("updated_by", row.updated_by),
+        }
+        if (all(getattr(row, key) == value for key, value in changes.items())
+                and have_tags == tags and have_examples == wanted_examples):
+            return False
+            
+        for key, value in changes.items():
+            setattr(row, key, value)
+        row.tags = json.dumps(tags)
+        row.updated_at = exchange.parse_timestamp(record.get("updated_at")) or datetime.utcnow()
+        if have_examples != wanted_examples:
+            row.examples = [
+                {"id": None, "input": ex_input, "output": ex_output, "description": description, "created_at": None}
+                for ex_input, ex_output, description in wanted_examples
+            ]
+        return True
+
+    def import_from_file(
+        self,
+        path: str,
+        format: Optional[str] = None,
+        skip_existing: bool = True,
+        batch_size: int = BULK_CHUNK_SIZE,
+        on_conflict: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Stream prompts from an export file, a split-export manifest or its directory.
+        
+        Gzip-compressed files (".gz") are decompressed on the fly and NDJSON
+        files are read line by line; prompts are imported in batches of
+        batch_size, each committed in its own transaction. With on_conflict
+        "fail", the import stops at the first batch with a conflict; earlier
+        batches stay imported.
+        
+        Args:
+            path (str): Export file, manifest.json or split-export directory
+            format (str, optional): one of exchange.FORMATS; taken from the
+                file name if omitted
+            skip_existing (bool): Shorthand for on_conflict "skip" (True) or "fail" (False)
+            batch_size (int): Prompts imported per transaction
+            on_conflict (str, optional): How to treat existing prompts; see import_prompts
+            
+        Returns:
+            Dict[str, Any]: Import results statistics
+            
+        Example:
+            >>> results = registry.import_from_file("nightly.ndjson.gz")
+            >>> print(f"Imported: {results['imported']}, Skipped: {results['skipped']}")
+            "Imported: 12840, Skipped: 0"
+        """
+        on_conflict = _conflict_strategy(skip_existing, on_conflict)
+        stats = {"total": 0, "imported": 0, "updated": 0, "skipped": 0, "errors": 0, "error_details": []}
+        
+        if os.path.isdir(path) or os.path.basename(path) == exchange.MANIFEST_NAME:
+            try:
+                directory, manifest = exchange.read_manifest(path)
+            except Exception as e:
+                return {"error": f"Invalid manifest: {str(e)}"}
+            files = [os.path.join(directory, entry["file"]) for entry in manifest["files"]]
+        else:
+            files = [path]
+            
+        for file_path in files:
+            try:
+                file_format = format or exchange.detect_format(file_path)[0]
+                if file_format in exchange.STREAMED_FORMATS:
+                    records = exchange.read_records(file_path, file_format)
+                else:
+                    document = exchange.load_document(file_path, format)
+                    if exchange.is_delta(document):
+                        result = self.apply_changes(document)
+                        for key, value in result.items():
+                            if key == "error_details":
+                                stats[key].extend(value)
+                            else:
+                                stats[key] = stats.get(key, 0) + value
+                        continue
+                    records = exchange.document_records(document)
+                for batch in exchange.batched(records, batch_size):
+                    result = self._import_records(batch, on_conflict)
+                    for key in ("total", "imported", "updated", "skipped", "errors"):
+                        stats[key] += result[key]
+                    stats["error_details"].extend(result["error_details"])
+                    if "error" in result:
+                        return dict(stats, error=result["error"])
+            except (OSError, ValueError, EOFError) as e:
+                if len(files) > 1:
+                    stats["errors"] += 1
+                    stats["error_details"].append(f"{file_path}: {str(e)}")
+                else:
+                    return dict(stats, error=f"Cannot read {file_path}: {str(e)}")
+        return stats
\ No newline at end of file
@@ -6,7 +6,9 @@ Cuebit prompts, with endpoints for listing, creating, updating,
 and comparing prompt versions.
 """
 
-from fastapi import FastAPI, HTTPException, Body, Query, Path, Response
+from fastapi import FastAPI, HTTPException, Body, Query, Path, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
@@ -14,8 +16,15 @@ from datetime import datetime
 import json
 import os
 import copy
-
-from cuebit.registry import PromptRegistry, PromptORM, ExampleORM
+import time
+import uuid
+import tempfile
+
+from cuebit import exchange, metrics, tracing
+from cuebit.registry import (
+    IMPORT_CONFLICT_STRATEGIES, PromptRegistry, PromptORM, ExampleORM, RegistryBusyError,
+    split_tag_filter, parse_meta_filters
+)
 
 # Helper functions for serialization
 def orm_to_dict(orm_obj):
@@ -62,10 +71,66 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(RegistryBusyError)
+async def registry_busy(request: Request, exc: RegistryBusyError):
+    """Report lock timeouts as a retryable 503 instead of a 500."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "1"}
+    )
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Bind a request id to the request and run it inside a tracing span."""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = tracing.set_request_id(request_id)
+    try:
+        with tracing.span(f"HTTP {request.method}", {
+            "http.method": request.method,
+            "http.target": request.url.path,
+        }) as span:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            if route is not None:
+                span.set_name(f"HTTP {request.method} {route.path}")
+                span.set_attribute("http.route", route.path)
+            span.set_attribute("http.status_code", response.status_code)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        tracing.reset_request_id(token)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record latency, status and response size for each request."""
+    method = request.method
+    metrics.HTTP_IN_PROGRESS.inc(method=method)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        metrics.HTTP_IN_PROGRESS.dec(method=method)
+        
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(method=method, route=route_path, status=status)
+        metrics.HTTP_LATENCY.observe(duration, method=method, route=route_path, status=status)
+        if status != 500 and response.headers.get("content-length"):
+            metrics.HTTP_RESPONSE_SIZE.observe(
+                int(response.headers["content-length"]), method=method, route=route_path
+            )
+
 # Initialize registry using the improved initialization
 # It will respect CUEBIT_DB_PATH environment variable
 # or use the standard data directory
 registry = PromptRegistry()
+metrics.instrument_registry(registry)
 
 # --- Pydantic Models ---
 
@@ -169,20 +234,37 @@ class SearchQuery(BaseModel):
     query: str
     project: Optional[str] = None
     tags: Optional[List[str]] = []
+    tag_mode: str = "all"  # "all", "any"
     page: int = 1
     page_size: int = 20
 
+class SimilarQuery(BaseModel):
+    """Input model for similar prompt lookup."""
+    text: str
+    k: int = 5
+    project: Optional[str] = None
+
 class BulkTagRequest(BaseModel):
-    """Input model for bulk tagging prompts."""
-    prompt_ids: List[str]
+    """Input model for bulk tagging prompts, selected by ID and/or filter."""
+    prompt_ids: Optional[List[str]] = None
     tags: List[str]
     operation: str = "add"  # "add", "remove", "set"
+    project: Optional[str] = None
+    task: Optional[str] = None
+    tag_filter: Optional[List[str]] = None
+
+class MetaIndexRequest(BaseModel):
+    """Input model for declaring an indexed meta key."""
+    key: str = Field(..., description="Meta key; dots address nested values")
 
 class ImportRequest(BaseModel):
     """Input model for importing prompts."""
     data: str
     format: str = "json"
     skip_existing: bool = True
+    on_conflict: Optional[str] = Field(
+        None, description="skip, overwrite, overwrite-if-newer or fail (overrides skip_existing)"
+    )
 
 class ExampleOut(BaseModel):
     """Output model for prompt examples."""
@@ -225,8 +307,12 @@ def delete_project(
     use_soft_delete: bool = Query(True, description="Whether to use soft delete (True) or hard delete (False)")
 ):
     """Delete all prompts in a project."""
-    deleted = registry.delete_project(project, use_soft_delete=use_soft_delete)
-    return {"deleted": deleted, "project": project}
+    if use_soft_delete:
+        deleted = registry.delete_project(project, use_soft_delete=True)
+        return {"deleted": deleted, "project": project}
+        
+    rows_deleted = registry.hard_delete_prompts(project=project)
+    return {"deleted": rows_deleted["prompts"], "project": project, "rows_deleted": rows_deleted}
 
 @app.delete(
     f"{API_PREFIX}/projects/{{project}}/tasks/{{task}}",
@@ -253,28 +339,48 @@ def delete_project_task(
     description="List all prompts with pagination and filtering options."
 )
 def list_prompts(
+    request: Request,
     page: int = Query(1, description="Page number (starts at 1)"),
     page_size: int = Query(20, description="Items per page"),
     include_deleted: bool = Query(False, description="Include soft-deleted prompts"),
     search: Optional[str] = Query(None, description="Search term"),
-    tags: Optional[str] = Query(None, description="Comma-separated tags to filter by")
+    tags: Optional[str] = Query(None, description="Comma-separated tags to filter by; prefix a tag with - to exclude it"),
+    tag_mode: str = Query("all", description="Match all tags or any tag (all, any)")
 ):
-    """List all prompts with pagination and filtering."""
+    """
+    List all prompts with pagination and filtering.
+    
+    Metadata is filtered with meta.<key>[__op]=<value> parameters, e.g.
+    meta.model=gpt-4&meta.temperature__lte=0.3
+    """
+    if tag_mode not in ("all", "any"):
+        raise HTTPException(status_code=400, detail="tag_mode must be 'all' or 'any'")
+        
     # Parse tag filter if provided
-    tag_filter = tags.split(",") if tags else None
+    tag_filter, exclude_tags = split_tag_filter(tags.split(",") if tags else None)
+    meta_filters = parse_meta_filters(request.query_params.multi_items())
     
-    prompts, total = registry.list_prompts(
-        include_deleted=include_deleted,
-        search_term=search,
-        tag_filter=tag_filter,
-        page=page,
-        page_size=page_size
-    )
+    try:
+        prompts, total = registry.list_prompts(
+            include_deleted=include_deleted,
+            search_term=search,
+            tag_filter=tag_filter,
+            page=page,
+            page_size=page_size,
+            tag_mode=tag_mode,
+            exclude_tags=exclude_tags,
+            meta_filters=meta_filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     pages = (total + page_size - 1) // page_size  # Ceiling division
     
-    # Convert ORM objects to dictionaries
+    # Convert ORM objects to dictionaries, with example counts rather than examples
+    example_counts = registry.get_example_counts([p.prompt_id for p in prompts])
     prompt_dicts = [orm_to_dict(p) for p in prompts]
+    for item in prompt_dicts:
+        item["example_count"] = example_counts[item["prompt_id"]]
     
     return {
         "items": prompt_dicts,
@@ -335,6 +441,31 @@ def get_prompt(
         raise HTTPException(status_code=404, detail="Prompt not found")
     return orm_to_dict(prompt)
 
+@app.get(
+    f"{API_PREFIX}/prompts/{{prompt_id}}/detail",
+    response_model=Dict[str, Any],
+    summary="Get prompt detail",
+    description="Get a prompt (by ID or alias) with its first examples and a lineage summary "
+                "in a single request."
+)
+def get_prompt_detail(
+    prompt_id: str = Path(..., description="Prompt ID or alias"),
+    examples_limit: int = Query(20, ge=0, le=1000, description="Maximum examples returned"),
+    lineage_depth: int = Query(10, ge=0, le=1000, description="Generations of ancestors and descendants"),
+    include_deleted: bool = Query(False, description="Include soft-deleted prompts")
+):
+    """Get a prompt with its examples and lineage summary."""
+    detail = registry.get_prompt_detail(
+        prompt_id,
+        examples_limit=examples_limit,
+        lineage_depth=lineage_depth,
+        include_deleted=include_deleted
+    )
+    if not detail:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    detail["prompt"] = orm_to_dict(detail["prompt"])
+    return detail
+
 @app.put(
     f"{API_PREFIX}/prompts/{{prompt_id}}", 
     response_model=Dict[str, Any],
@@ -419,13 +550,14 @@ def delete_prompt(
 ):
     """Delete a prompt."""
     if hard_delete:
-        success = registry.delete_prompt_by_id(prompt_id)
-    else:
-        success = registry.soft_delete_prompt(prompt_id, deleted_by=deleted_by)
+        rows_deleted = registry.hard_delete_prompts(prompt_ids=[prompt_id])
+        if not (rows_deleted.get("prompts") or rows_deleted.get("prompts_archive")):
+            raise HTTPException(status_code=404, detail="Prompt not found")
+        return {"success": True, "prompt_id": prompt_id, "hard_delete": True, "rows_deleted": rows_deleted}
         
-    if not success:
+    if not registry.soft_delete_prompt(prompt_id, deleted_by=deleted_by):
         raise HTTPException(status_code=404, detail="Prompt not found")
-    return {"success": True, "prompt_id": prompt_id, "hard_delete": hard_delete}
+    return {"success": True, "prompt_id": prompt_id, "hard_delete": False}
 
 @app.post(
     f"{API_PREFIX}/prompts/{{prompt_id}}/restore",
@@ -455,6 +587,7 @@ def render_prompt(
     rendered = registry.render_prompt(request.prompt_id, request.variables)
     if rendered is None:
         raise HTTPException(status_code=404, detail="Prompt not found")
+    metrics.RENDER_PAYLOAD_SIZE.observe(len(rendered.encode("utf-8")))
     return {"rendered": rendered, "prompt_id": request.prompt_id}
 
 @app.post(
@@ -476,7 +609,8 @@ def validate_template(
 )
 def get_prompt_history(
     prompt_id: str = Path(..., description="Prompt ID"),
-    include_deleted: bool = Query(False, description="Include soft-deleted prompts")
+    include_deleted: bool = Query(False, description="Include soft-deleted prompts"),
+    include_archived: bool = Query(False, description="Include versions moved to the archive")
 ):
     """Get version history for a prompt's project/task."""
     prompt = registry.get_prompt(prompt_id)
@@ -486,7 +620,8 @@ def get_prompt_history(
     history = registry.get_version_history(
         prompt.project, 
         prompt.task,
-        include_deleted=include_deleted
+        include_deleted=include_deleted,
+        include_archived=include_archived
     )
     
     # Convert to dictionaries for serialization
@@ -553,13 +688,19 @@ def search_prompts(
     query: SearchQuery = Body(..., description="Search parameters")
 ):
     """Search prompts with filtering."""
-    results, total = registry.search_prompts(
-        query=query.query,
-        project=query.project,
-        tags=query.tags,
-        page=query.page,
-        page_size=query.page_size
-    )
+    tags, exclude_tags = split_tag_filter(query.tags)
+    try:
+        results, total = registry.search_prompts(
+            query=query.query,
+            project=query.project,
+            tags=tags,
+            page=query.page,
+            page_size=query.page_size,
+            tag_mode=query.tag_mode,
+            exclude_tags=exclude_tags
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     pages = (total + query.page_size - 1) // query.page_size  # Ceiling division
     
@@ -574,20 +715,46 @@ def search_prompts(
         "pages": pages
     }
 
+@app.post(
+    f"{API_PREFIX}/prompts/similar",
+    summary="Find similar prompts",
+    description="Find existing prompts whose templates are similar to a text."
+)
+def similar_prompts(
+    query: SimilarQuery = Body(..., description="Similarity query")
+):
+    """Find prompts similar to a text."""
+    if query.k < 1:
+        raise HTTPException(status_code=400, detail="k must be at least 1")
+        
+    results = registry.similar_prompts(
+        query.text,
+        k=query.k,
+        project=query.project
+    )
+    return {"items": results, "total": len(results)}
+
 @app.post(
     f"{API_PREFIX}/prompts/bulk-tag",
     summary="Bulk tag prompts",
-    description="Apply tag operations to multiple prompts at once."
+    description="Apply tag operations to multiple prompts at once, selected by ID list "
+                "or by project/task/tag filter."
 )
 def bulk_tag_prompts(
     request: BulkTagRequest = Body(..., description="Bulk tag request")
 ):
     """Bulk tag operation on multiple prompts."""
-    count = registry.bulk_tag_prompts(
-        request.prompt_ids,
-        request.tags,
-        request.operation
-    )
+    try:
+        count = registry.bulk_tag_prompts(
+            request.prompt_ids,
+            request.tags,
+            request.operation,
+            project=request.project,
+            task=request.task,
+            tag_filter=request.tag_filter
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {"modified": count, "operation": request.operation}
 
@@ -597,13 +764,20 @@ def bulk_tag_prompts(
     f"{API_PREFIX}/prompts/{{prompt_id}}/examples",
     response_model=List[Dict[str, Any]],
     summary="Get prompt examples",
-    description="Get input/output examples for a prompt."
+    description="Get input/output examples for a prompt, one page at a time. "
+                "When more examples follow, the X-Next-Cursor response header "
+                "holds the cursor of the next page."
 )
 def get_examples(
-    prompt_id: str = Path(..., description="Prompt ID")
+    response: Response,
+    prompt_id: str = Path(..., description="Prompt ID"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum examples per page"),
+    cursor: Optional[int] = Query(None, description="Cursor from the previous page's X-Next-Cursor header")
 ):
-    """Get examples for a prompt."""
-    examples = registry.get_examples(prompt_id)
+    """Get a page of examples for a prompt."""
+    examples, next_cursor = registry.get_examples_page(prompt_id, limit=limit, after_id=cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
     return examples  # Already returned as dictionaries by the registry
 
 @app.post(
@@ -635,6 +809,71 @@ def add_example(
         "created_at": result.created_at.isoformat() if result.created_at else None
     }
 
+# --- Template variables ---
+
+@app.get(
+    f"{API_PREFIX}/variables",
+    summary="Template variable usage",
+    description="Count the active prompts that take each template variable."
+)
+def get_variable_usage(
+    project: Optional[str] = Query(None, description="Limit to specific project"),
+    limit: Optional[int] = Query(None, description="Return only the most used variables")
+):
+    """Get template variable usage counts."""
+    return registry.get_variable_usage(project=project, limit=limit)
+
+@app.get(
+    f"{API_PREFIX}/variables/{{name}}/prompts",
+    response_model=List[Dict[str, Any]],
+    summary="Find prompts by variable",
+    description="List the prompts whose templates take a variable."
+)
+def find_prompts_by_variable(
+    name: str = Path(..., description="Variable name, without braces"),
+    project: Optional[str] = Query(None, description="Limit to specific project"),
+    include_deleted: bool = Query(False, description="Include soft-deleted prompts")
+):
+    """Find prompts that use a template variable."""
+    prompts = registry.find_by_variable(name, project=project, include_deleted=include_deleted)
+    return convert_orm_list(prompts)
+
+# --- Meta indexes ---
+
+@app.get(
+    f"{API_PREFIX}/meta-indexes",
+    response_model=List[str],
+    summary="List indexed meta keys",
+    description="List the meta keys that are indexed for meta.<key> filters."
+)
+def list_meta_indexes():
+    """List indexed meta keys."""
+    return registry.list_meta_indexes()
+
+@app.post(
+    f"{API_PREFIX}/meta-indexes",
+    summary="Index a meta key",
+    description="Declare a frequently queried meta key and index existing prompts."
+)
+def add_meta_index(request: MetaIndexRequest):
+    """Declare an indexed meta key."""
+    try:
+        count = registry.add_meta_index(request.key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"key": request.key, "indexed_prompts": count}
+
+@app.delete(
+    f"{API_PREFIX}/meta-indexes/{{key}}",
+    summary="Stop indexing a meta key",
+    description="Remove a meta key index; filters on it fall back to JSON scans."
+)
+def remove_meta_index(key: str = Path(..., description="Indexed meta key")):
+    """Remove an indexed meta key."""
+    if not registry.remove_meta_index(key):
+        raise HTTPException(status_code=404, detail="Meta key is not indexed")
+    return {"key": key, "removed": True}
+
 # --- Stats & Import/Export ---
 
 @app.get(
@@ -650,39 +889,103 @@ def get_system_stats():
 @app.get(
     f"{API_PREFIX}/export",
     summary="Export prompts",
-    description="Export prompts to a portable format (JSON/YAML)."
+    description="Export prompts to a portable format (JSON/NDJSON/YAML/YAML stream), optionally gzip-compressed."
 )
 def export_prompts(
     project: Optional[str] = Query(None, description="Limit to specific project"),
-    format: str = Query("json", description="Export format: 'json' or 'yaml'")
+    format: str = Query("json", description="Export format: 'json', 'ndjson', 'yaml' or 'yaml-stream'"),
+    compress: bool = Query(False, description="Gzip-compress the response"),
+    since: Optional[str] = Query(None, description="Only export changes from this time on (ISO 8601 or e.g. '1h'), as a delta"),
+    until: Optional[str] = Query(None, description="Only export changes before this time, as a delta")
 ):
-    """Export prompts to JSON or YAML."""
-    try:
-        data = registry.export_prompts(project=project, format=format)
-        return Response(
-            content=data,
-            media_type="application/json" if format == "json" else "application/yaml",
-            headers={
-                "Content-Disposition": f"attachment; filename=cuebit_export_{datetime.now().strftime('%Y%m%d')}.{format}"
-            }
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    """Stream prompts as JSON, NDJSON or YAML, or a delta of changes in a time window."""
+    if format not in exchange.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+        
+    filename = f"cuebit_export_{datetime.now().strftime('%Y%m%d')}{exchange.format_extension(format)}"
+    media_type = {
+        "json": "application/json",
+        "ndjson": "application/x-ndjson",
+        "yaml": "application/yaml",
+        "yaml-stream": "application/yaml"
+    }[format]
+    if since is not None or until is not None:
+        try:
+            chunks = iter([registry.export_prompts(project=project, format=format, since=since, until=until)])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        filename = f"cuebit_delta_{datetime.now().strftime('%Y%m%d%H%M%S')}{exchange.format_extension(format)}"
+    else:
+        chunks = exchange.encode_records(registry.iter_export_records(project=project), format)
+    if compress:
+        chunks = exchange.gzip_chunks(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+        
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 @app.post(
     f"{API_PREFIX}/import",
     summary="Import prompts",
-    description="Import prompts from JSON or YAML format."
+    description="Import prompts from JSON, NDJSON or YAML format, or apply a delta document."
 )
 def import_prompts(
     request: ImportRequest = Body(..., description="Import request")
 ):
-    """Import prompts from JSON or YAML."""
-    results = registry.import_prompts(
-        data=request.data,
-        format=request.format,
-        skip_existing=request.skip_existing
-    )
+    """Import prompts from JSON, NDJSON or YAML."""
+    try:
+        results = registry.import_prompts(
+            data=request.data,
+            format=request.format,
+            skip_existing=request.skip_existing,
+            on_conflict=request.on_conflict
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if "error" in results:
+        raise HTTPException(status_code=400, detail=results["error"])
+        
+    return results
+
+@app.post(
+    f"{API_PREFIX}/import/file",
+    summary="Import an export file",
+    description="Import a raw export file upload (JSON, NDJSON, YAML or YAML stream, optionally gzip-compressed)."
+)
+async def import_file(
+    request: Request,
+    format: str = Query("ndjson", description="File format: 'json', 'ndjson', 'yaml' or 'yaml-stream'"),
+    skip_existing: bool = Query(True, description="Skip existing prompts"),
+    on_conflict: Optional[str] = Query(None, description="skip, overwrite, overwrite-if-newer or fail")
+):
+    """Spool an uploaded export file to disk and import it in batches."""
+    if format not in exchange.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported import format: {format}")
+    if on_conflict is not None and on_conflict not in IMPORT_CONFLICT_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"Unknown conflict strategy: {on_conflict}")
+        
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "upload")
+        first = b""
+        with open(path, "wb") as f:
+            async for chunk in request.stream():
+                if len(first) < 2:
+                    first += chunk[:2]
+                f.write(chunk)
+        # Gzip input is recognized by its magic number
+        suffix = exchange.format_extension(format)
+        if first[:2] == b"\x1f\x8b":
+            suffix += ".gz"
+        os.rename(path, path + suffix)
+        results = await run_in_threadpool(
+            registry.import_from_file, path + suffix,
+            skip_existing=skip_existing, on_conflict=on_conflict
+        )
     
     if "error" in results:
         raise HTTPException(status_code=400, detail=results["error"])
@@ -695,6 +998,11 @@ def health_check():
     """Health check endpoint."""
     return {"status": "ok", "database_url": registry.db_url, "version": "1.0"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Metrics endpoint in the Prometheus text exposition format."""
+    return Response(content=metrics.METRICS.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 def root():
     """Root endpoint with basic API information."""
@@ -0,0 +1,956 @@
+"""
+Project-sharded prompt registry for Cuebit.
+
+ShardedPromptRegistry spreads projects over several databases, each
+managed by an ordinary PromptRegistry. A project lives on exactly one
+shard, chosen by an explicit routing table or else by a stable hash of
+its name, so per-project operations touch a single database. Operations
+that span projects fan out to every shard in a thread pool and merge
+the results.
+
+Routing must stay stable once data is written: changing the shard list
+or the routing table moves projects to shards that do not hold their
+prompts. Move a project by exporting it from the old shard and
+importing it through the sharded registry after changing its route.
+"""
+
+import json
+import os
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from cuebit import exchange
+from cuebit.registry import BULK_CHUNK_SIZE, ExampleORM, PromptORM, PromptRegistry, _conflict_strategy
+
+
+class ShardedPromptRegistry:
+    """
+    Prompt registry that routes each project to one of several databases.
+
+    Exposes the PromptRegistry interface. Prompt IDs are UUIDs and unique
+    across shards; the shard holding an ID is found by asking every shard
+    once and remembering the answer. Near-duplicate detection only
+    compares prompts held by the same shard.
+    """
+
+    def __init__(
+            self,
+            shards: Union[Dict[str, str], List[str]],
+            routes: Optional[Dict[str, str]] = None,
+            max_workers: Optional[int] = None
+        ):
+        """
+        Open every shard.
+
+        Args:
+            shards (Dict[str, str] or List[str]): Shard name to database URL,
+                or a list of URLs named "shard-0", "shard-1", ... The first
+                shard also holds prompts without a project.
+            routes (Dict[str, str], optional): Project to shard name. Projects
+                without a route are placed by hashing their name.
+            max_workers (int, optional): Threads used for fan-out queries.
+                Defaults to the number of shards.
+
+        Example:
+            >>> registry = ShardedPromptRegistry(
+            ...     ["sqlite:///shard-0.db", "sqlite:///shard-1.db"],
+            ...     routes={"support-bot": "shard-1"}
+            ... )
+        """
+        if isinstance(shards, (list, tuple)):
+            shards = {f"shard-{i}": url for i, url in enumerate(shards)}
+        if not shards:
+            raise ValueError("At least one shard is required")
+
+        self.routes = dict(routes or {})
+        unknown = set(self.routes.values()) - set(shards)
+        if unknown:
+            raise ValueError(f"Routes refer to unknown shards: {', '.join(sorted(unknown))}")
+
+        self.shard_names = list(shards)
+        self.shards: Dict[str, PromptRegistry] = {
+            name: PromptRegistry(url) for name, url in shards.items()
+        }
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(self.shards),
+            thread_name_prefix="cuebit-shard"
+        )
+
+        # Prompt ID to shard name, filled as IDs are located
+        self._locations: Dict[str, str] = {}
+        self._locations_lock = threading.Lock()
+
+    @classmethod
+    def from_directory(
+            cls,
+            path: str,
+            num_shards: int,
+            routes: Optional[Dict[str, str]] = None,
+            max_workers: Optional[int] = None
+        ) -> "ShardedPromptRegistry":
+        """
+        Open (or create) SQLite shards named shard-00.db, shard-01.db, ... in a directory.
+
+        Args:
+            path (str): Directory holding the shard databases
+            num_shards (int): Number of shards
+            routes (Dict[str, str], optional): Project to shard name ("shard-00", ...)
+            max_workers (int, optional): Threads used for fan-out queries
+
+        Returns:
+            ShardedPromptRegistry: The sharded registry
+        """
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        os.makedirs(path, exist_ok=True)
+        shards = {
+            f"shard-{i:02d}": f"sqlite:///{os.path.join(os.path.abspath(path), f'shard-{i:02d}.db')}"
+            for i in range(num_shards)
+        }
+        return cls(shards, routes=routes, max_workers=max_workers)
+
+    def close(self) -> None:
+        """Shut down the fan-out thread pool and dispose every shard's engine."""
+        self._executor.shutdown(wait=True)
+        for shard in self.shards.values():
+            if shard.slow_query_log is not None:
+                shard.disable_slow_query_log()
+            shard.engine.dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Routing
+
+    def shard_for_project(self, project: Optional[str]) -> str:
+        """
+        Return the name of the shard that holds a project.
+
+        Args:
+            project (str, optional): Project name
+
+        Returns:
+            str: Shard name from the routing table, else from a CRC32 hash
+                of the project name. Prompts without a project go to the
+                first shard.
+        """
+        if project in self.routes:
+            return self.routes[project]
+        if not project:
+            return self.shard_names[0]
+        index = zlib.crc32(project.encode("utf-8")) % len(self.shard_names)
+        return self.shard_names[index]
+
+    def route(self, project: str, shard_name: str) -> None:
+        """
+        Pin a project to a shard. Existing prompts are not moved.
+
+        Args:
+            project (str): Project name
+            shard_name (str): Target shard
+        """
+        if shard_name not in self.shards:
+            raise ValueError(f"Unknown shard: {shard_name}")
+        self.routes[project] = shard_name
+
+    def _shard(self, project: Optional[str]) -> PromptRegistry:
+        return self.shards[self.shard_for_project(project)]
+
+    def _fan_out(self, call: Callable[[PromptRegistry], Any]) -> List[Tuple[str, Any]]:
+        """Run call on every shard in the thread pool, in shard order."""
+        futures = [
+            (name, self._executor.submit(call, self.shards[name]))
+            for name in self.shard_names
+        ]
+        return [(name, future.result()) for name, future in futures]
+
+    def _remember(self, prompt, shard_name: str) -> None:
+        """Record the shard a prompt was returned by."""
+        if prompt is not None:
+            with self._locations_lock:
+                self._locations[prompt.prompt_id] = shard_name
+
+    def _locate(self, prompt_id: str) -> Optional[str]:
+        """Return the name of the shard holding a prompt ID, or None if no shard has it."""
+        with self._locations_lock:
+            name = self._locations.get(prompt_id)
+        if name is not None:
+            return name
+
+        for name, prompt in self._fan_out(lambda s: s.get_prompt(prompt_id, include_deleted=True)):
+            if prompt is not None:
+                self._remember(prompt, name)
+                return name
+        return None
+
+    def _on_prompt_shard(self, prompt_id: str, call: Callable[[PromptRegistry], Any], default=None):
+        """Run call on the shard holding a prompt ID, or return default."""
+        name = self._locate(prompt_id)
+        return default if name is None else call(self.shards[name])
+
+    def _by_shard(self, prompt_ids: List[str]) -> Dict[str, List[str]]:
+        """Group prompt IDs by the shard holding them, dropping unknown IDs."""
+        by_shard: Dict[str, List[str]] = {}
+        for prompt_id in prompt_ids:
+            name = self._locate(prompt_id)
+            if name is not None:
+                by_shard.setdefault(name, []).append(prompt_id)
+        return by_shard
+
+    # Single-shard operations
+
+    def register_prompt(
+            self,
+            task: str,
+            template: str,
+            meta: dict = {},
+            tags: List[str] = [],
+            project: Optional[str] = None,
+            updated_by: Optional[str] = None,
+            examples: Optional[List[Dict[str, str]]] = None
+        ) -> PromptORM:
+        """Register a prompt on the project's shard. See PromptRegistry.register_prompt."""
+        name = self.shard_for_project(project)
+        prompt = self.shards[name].register_prompt(
+            task, template, meta=meta, tags=tags, project=project,
+            updated_by=updated_by, examples=examples
+        )
+        self._remember(prompt, name)
+        return prompt
+
+    def get_prompt(self, prompt_id: str, include_deleted: bool = False) -> Optional[PromptORM]:
+        """Get a prompt by ID from whichever shard holds it."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.get_prompt(prompt_id, include_deleted))
+
+    def list_prompts_by_project(self, project: str, include_deleted: bool = False) -> List[PromptORM]:
+        """List a project's prompts from its shard."""
+        return self._shard(project).list_prompts_by_project(project, include_deleted)
+
+    def update_prompt(
+            self,
+            prompt_id: str,
+            new_template: str,
+            meta: Optional[dict] = None,
+            updated_by: Optional[str] = None,
+            tags: Optional[List[str]] = None,
+            examples: Optional[List[Dict[str, str]]] = None
+        ) -> Optional[PromptORM]:
+        """Create a new version on the prompt's shard. See PromptRegistry.update_prompt."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.update_prompt(
+            prompt_id, new_template, meta=meta, updated_by=updated_by, tags=tags, examples=examples
+        ))
+
+    def get_version_history(
+            self,
+            project: str,
+            task: str,
+            include_deleted: bool = False,
+            include_archived: bool = False
+        ) -> List[PromptORM]:
+        """Get a task's version history from its project's shard."""
+        return self._shard(project).get_version_history(project, task, include_deleted, include_archived)
+
+    def get_prompt_lineage(self, prompt_id: str, include_deleted: bool = False) -> Dict[str, Any]:
+        """Get a prompt's lineage from the shard holding it."""
+        return self._on_prompt_shard(
+            prompt_id,
+            lambda s: s.get_prompt_lineage(prompt_id, include_deleted),
+            default={"error": "Prompt not found"}
+        )
+
+    def get_prompt_detail(
+            self,
+            id_or_alias: str,
+            examples_limit: int = 20,
+            lineage_depth: int = 10,
+            include_deleted: bool = False
+        ) -> Optional[Dict[str, Any]]:
+        """Get a prompt's detail bundle from the shard holding its ID or alias."""
+        name = self._locate(id_or_alias)
+        if name is None:
+            alias_matches = self._fan_out(lambda s: s.get_prompt_by_alias(id_or_alias))
+            name = next((n for n, prompt in alias_matches if prompt is not None), None)
+        if name is None:
+            return None
+        return self.shards[name].get_prompt_detail(id_or_alias, examples_limit, lineage_depth, include_deleted)
+
+    def compare_versions(self, prompt_id_1: str, prompt_id_2: str) -> Dict[str, Any]:
+        """Compare two prompts held by the same shard."""
+        first, second = self._locate(prompt_id_1), self._locate(prompt_id_2)
+        if first is None or second is None:
+            return {"error": "One or both prompts not found"}
+        if first != second:
+            return {"error": "Prompts are stored on different shards"}
+        return self.shards[first].compare_versions(prompt_id_1, prompt_id_2)
+
+    def rollback_to_version(self, prompt_id: str, updated_by: Optional[str] = None) -> Optional[PromptORM]:
+        """Roll back on the shard holding the prompt."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.rollback_to_version(prompt_id, updated_by))
+
+    def soft_delete_prompt(self, prompt_id: str, deleted_by: Optional[str] = None) -> bool:
+        """Soft-delete a prompt on the shard holding it."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.soft_delete_prompt(prompt_id, deleted_by), False)
+
+    def restore_prompt(self, prompt_id: str) -> bool:
+        """Restore a soft-deleted prompt on the shard holding it."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.restore_prompt(prompt_id), False)
+
+    def delete_prompt_by_id(self, prompt_id: str) -> bool:
+        """Permanently delete a prompt from the shard holding it."""
+        deleted = self._on_prompt_shard(prompt_id, lambda s: s.delete_prompt_by_id(prompt_id), False)
+        if deleted:
+            with self._locations_lock:
+                self._locations.pop(prompt_id, None)
+        return deleted
+
+    def delete_project(self, project: str, use_soft_delete: bool = True) -> int:
+        """Delete a project's prompts on its shard."""
+        return self._shard(project).delete_project(project, use_soft_delete)
+
+    def delete_prompts_by_project_task(self, project: str, task: str, use_soft_delete: bool = True) -> int:
+        """Delete a task's prompts on its project's shard."""
+        return self._shard(project).delete_prompts_by_project_task(project, task, use_soft_delete)
+
+    def hard_delete_prompts(
+            self,
+            prompt_ids: Optional[List[str]] = None,
+            project: Optional[str] = None,
+            task: Optional[str] = None
+        ) -> Dict[str, int]:
+        """
+        Permanently delete prompts and their child rows. See PromptRegistry.hard_delete_prompts.
+
+        A project selection runs on its shard. Prompt IDs are grouped by the
+        shard holding them, with one transaction per shard.
+        """
+        if project is not None:
+            return self._shard(project).hard_delete_prompts(prompt_ids, project, task)
+        if prompt_ids is None:
+            raise ValueError("Select prompts by prompt_ids or project")
+        if task is not None:
+            raise ValueError("task requires project")
+
+        counts: Dict[str, int] = {}
+        for name, ids in self._by_shard(prompt_ids).items():
+            for table, count in self.shards[name].hard_delete_prompts(ids).items():
+                counts[table] = counts.get(table, 0) + count
+            with self._locations_lock:
+                for prompt_id in ids:
+                    self._locations.pop(prompt_id, None)
+        return counts
+
+    def render_prompt(self, prompt_id: str, variables: Dict[str, str]) -> Optional[str]:
+        """Render a prompt held by any shard."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.render_prompt(prompt_id, variables))
+
+    def validate_template(self, template: str) -> Dict[str, Any]:
+        """Validate a template; this does not touch the database."""
+        return self.shards[self.shard_names[0]].validate_template(template)
+
+    def get_examples(self, prompt_id: str) -> List[Dict[str, Any]]:
+        """Get a prompt's examples from the shard holding it."""
+        return self._on_prompt_shard(prompt_id, lambda s: s.get_examples(prompt_id), [])
+
+    def get_examples_for_many(self, prompt_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get the examples of several prompts, with one batched query per shard."""
+        result: Dict[str, List[Dict[str, Any]]] = {prompt_id: [] for prompt_id in prompt_ids}
+        for name, ids in self._by_shard(list(result)).items():
+            result.update(self.shards[name].get_examples_for_many(ids))
+        return result
+
+    def get_examples_page(
+            self,
+            prompt_id: str,
+            limit: int = 100,
+            after_id: Optional[int] = None
+        ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Get one page of a prompt's examples from the shard holding it."""
+        return self._on_prompt_shard(
+            prompt_id, lambda s: s.get_examples_page(prompt_id, limit, after_id), ([], None)
+        )
+
+    def get_example_counts(self, prompt_ids: List[str]) -> Dict[str, int]:
+        """Count the examples of several prompts across shards."""
+        counts = {prompt_id: 0 for prompt_id in prompt_ids}
+        for name, ids in self._by_shard(list(counts)).items():
+            counts.update(self.shards[name].get_example_counts(ids))
+        return counts
+
+    def add_example(
+            self,
+            prompt_id: str,
+            input_text: str,
+            output_text: str,
+            description: Optional[str] = None
+        ) -> Optional[ExampleORM]:
+        """Add an example on the shard holding the prompt."""
+        return self._on_prompt_shard(
+            prompt_id, lambda s: s.add_example(prompt_id, input_text, output_text, description)
+        )
+
+    # Aliases are unique across shards
+
+    def get_prompt_by_alias(self, alias: str) -> Optional[PromptORM]:
+        """Look an alias up on every shard."""
+        for name, prompt in self._fan_out(lambda s: s.get_prompt_by_alias(alias)):
+            if prompt is not None:
+                self._remember(prompt, name)
+                return prompt
+        return None
+
+    def add_alias(self, prompt_id: str, alias: str, overwrite: bool = True) -> Optional[PromptORM]:
+        """
+        Point an alias at a prompt, removing it from prompts on other shards.
+
+        Args:
+            prompt_id (str): The prompt ID to alias
+            alias (str): The alias name
+            overwrite (bool): Whether to move an alias that is already in use
+
+        Returns:
+            Optional[PromptORM]: The updated prompt, or None if the prompt was
+                not found or the alias is taken and overwrite is False
+        """
+        name = self._locate(prompt_id)
+        if name is None:
+            return None
+        if not overwrite and self.get_prompt_by_alias(alias) is not None:
+            return None
+
+        prompt = self.shards[name].add_alias(prompt_id, alias, overwrite=overwrite)
+        if prompt is not None:
+            for other in self.shard_names:
+                if other != name:
+                    self.shards[other].remove_alias(alias)
+        return prompt
+
+    # Cross-shard operations
+
+    def list_projects(self) -> List[str]:
+        """List the projects on every shard."""
+        projects = set()
+        for _, names in self._fan_out(lambda s: s.list_projects()):
+            projects.update(names)
+        return sorted(projects)
+
+    def get_tag_stats(self) -> Counter:
+        """Sum tag usage over every shard."""
+        totals = Counter()
+        for _, counts in self._fan_out(lambda s: s.get_tag_stats()):
+            totals.update(counts)
+        return totals
+
+    def _merge_pages(self, results, page: int, page_size: int) -> Tuple[List[PromptORM], int]:
+        """Merge per-shard first pages in the order a single registry uses."""
+        prompts, total = [], 0
+        for name, (shard_prompts, shard_total) in results:
+            for prompt in shard_prompts:
+                self._remember(prompt, name)
+            prompts.extend(shard_prompts)
+            total += shard_total
+        # Project, task, newest version first; SQLite sorts NULL projects first
+        prompts.sort(key=lambda p: (p.project is not None, p.project or "", p.task, -p.version))
+        start = (page - 1) * page_size
+        return prompts[start:start + page_size], total
+
+    def list_prompts(
+            self,
+            include_deleted: bool = False,
+            search_term: Optional[str] = None,
+            tag_filter: Optional[List[str]] = None,
+            page: int = 1,
+            page_size: int = 100,
+            tag_mode: str = "all",
+            exclude_tags: Optional[List[str]] = None,
+            meta_filters: Optional[Dict[str, Any]] = None
+        ) -> Tuple[List[PromptORM], int]:
+        """
+        List prompts from every shard. See PromptRegistry.list_prompts.
+
+        Each shard returns its first page * page_size prompts, which is
+        enough to fill the requested page after merging.
+        """
+        results = self._fan_out(lambda s: s.list_prompts(
+            include_deleted=include_deleted,
+            search_term=search_term,
+            tag_filter=tag_filter,
+            page=1,
+            page_size=page * page_size,
+            tag_mode=tag_mode,
+            exclude_tags=exclude_tags,
+            meta_filters=meta_filters
+        ))
+        return self._merge_pages(results, page, page_size)
+
+    def query_by_meta(
+            self,
+            filters: Dict[str, Any],
+            project: Optional[str] = None,
+            include_deleted: bool = False,
+            page: int = 1,
+            page_size: int = 100
+        ) -> Tuple[List[PromptORM], int]:
+        """
+        Find prompts by metadata on one project's shard or every shard.
+        See PromptRegistry.query_by_meta.
+        """
+        def query(shard: PromptRegistry):
+            return shard.query_by_meta(
+                filters, project=project, include_deleted=include_deleted,
+                page=1, page_size=page * page_size
+            )
+
+        if project:
+            results = [(self.shard_for_project(project), query(self._shard(project)))]
+        else:
+            results = self._fan_out(query)
+        return self._merge_pages(results, page, page_size)
+
+    def find_by_variable(
+            self,
+            name: str,
+            project: Optional[str] = None,
+            include_deleted: bool = False
+        ) -> List[PromptORM]:
+        """Find prompts taking a variable on one project's shard or every shard."""
+        if project:
+            return self._shard(project).find_by_variable(name, project, include_deleted)
+        prompts = []
+        for shard_name, shard_prompts in self._fan_out(
+                lambda s: s.find_by_variable(name, None, include_deleted)):
+            for prompt in shard_prompts:
+                self._remember(prompt, shard_name)
+            prompts.extend(shard_prompts)
+        prompts.sort(key=lambda p: (p.project is not None, p.project or "", p.task, -p.version))
+        return prompts
+
+    def get_variable_usage(self, project: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Sum template variable usage over one project's shard or every shard.
+
+        Task counts add up exactly because a project lives on one shard.
+        """
+        if project:
+            return self._shard(project).get_variable_usage(project, limit)
+        totals: Dict[str, Dict[str, Any]] = {}
+        for _, usage in self._fan_out(lambda s: s.get_variable_usage()):
+            for row in usage:
+                total = totals.setdefault(row["variable"], {"variable": row["variable"], "prompts": 0, "tasks": 0})
+                total["prompts"] += row["prompts"]
+                total["tasks"] += row["tasks"]
+        merged = sorted(totals.values(), key=lambda r: (-r["prompts"], r["variable"]))
+        return merged[:limit] if limit else merged
+
+    def add_meta_index(self, key: str) -> int:
+        """Declare an indexed meta key on every shard."""
+        return sum(count for _, count in self._fan_out(lambda s: s.add_meta_index(key)))
+
+    def remove_meta_index(self, key: str) -> bool:
+        """Stop indexing a meta key on every shard."""
+        return any(removed for _, removed in self._fan_out(lambda s: s.remove_meta_index(key)))
+
+    def list_meta_indexes(self) -> List[str]:
+        """List the meta keys indexed on any shard."""
+        keys = set()
+        for _, shard_keys in self._fan_out(lambda s: s.list_meta_indexes()):
+            keys.update(shard_keys)
+        return sorted(keys)
+
+    def search_prompts(
+            self,
+            query: str,
+            project: Optional[str] = None,
+            tags: Optional[List[str]] = None,
+            page: int = 1,
+            page_size: int = 20,
+            tag_mode: str = "all",
+            exclude_tags: Optional[List[str]] = None
+        ) -> Tuple[List[PromptORM], int]:
+        """
+        Search one project's shard, or every shard when no project is given.
+        See PromptRegistry.search_prompts.
+        """
+        def search(shard: PromptRegistry):
+            return shard.search_prompts(
+                query, project=project, tags=tags, page=1, page_size=page * page_size,
+                tag_mode=tag_mode, exclude_tags=exclude_tags
+            )
+
+        if project:
+            results = [(self.shard_for_project(project), search(self._shard(project)))]
+        else:
+            results = self._fan_out(search)
+        return self._merge_pages(results, page, page_size)
+
+    def similar_prompts(self, text: str, k: int = 5, project: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Find the k most similar prompts over one project's shard or every shard."""
+        if project:
+            return self._shard(project).similar_prompts(text, k=k, project=project)
+        matches = []
+        for _, shard_matches in self._fan_out(lambda s: s.similar_prompts(text, k=k)):
+            matches.extend(shard_matches)
+        matches.sort(key=lambda m: m["score"], reverse=True)
+        return matches[:k]
+
+    def find_near_duplicates(
+            self,
+            threshold: float = 0.8,
+            project: Optional[str] = None,
+            include_same_task: bool = False
+        ) -> List[Dict[str, Any]]:
+        """
+        Find near-duplicate pairs within each shard.
+
+        Pairs whose prompts are on different shards are not compared.
+        """
+        if project:
+            return self._shard(project).find_near_duplicates(threshold, project, include_same_task)
+        pairs = []
+        for _, shard_pairs in self._fan_out(
+                lambda s: s.find_near_duplicates(threshold, None, include_same_task)):
+            pairs.extend(shard_pairs)
+        pairs.sort(key=lambda r: r["similarity"], reverse=True)
+        return pairs
+
+    def bulk_tag_prompts(
+            self,
+            prompt_ids: Optional[List[str]],
+            tags: List[str],
+            operation: str = "add",
+            project: Optional[str] = None,
+            task: Optional[str] = None,
+            tag_filter: Optional[List[str]] = None
+        ) -> int:
+        """
+        Tag prompts on the shards that hold them. See PromptRegistry.bulk_tag_prompts.
+
+        IDs are grouped by shard; a filter-only selection runs on the
+        project's shard, or on every shard when no project is given.
+        """
+        if operation not in ("add", "remove", "set"):
+            raise ValueError(f"Unsupported operation: {operation}")
+        if prompt_ids is None and project is None and task is None and tag_filter is None:
+            raise ValueError("Select prompts by ID or by project, task or tag_filter")
+
+        def tag(shard: PromptRegistry, ids: Optional[List[str]]) -> int:
+            return shard.bulk_tag_prompts(
+                ids, tags, operation, project=project, task=task, tag_filter=tag_filter
+            )
+
+        if prompt_ids is None:
+            if project:
+                return tag(self._shard(project), None)
+            return sum(count for _, count in self._fan_out(lambda s: tag(s, None)))
+
+        return sum(tag(self.shards[name], ids) for name, ids in self._by_shard(prompt_ids).items())
+
+    def gc(self, **policy) -> Dict[str, Dict[str, Any]]:
+        """
+        Apply retention policies on every shard. See PromptRegistry.gc.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Result per shard name
+        """
+        return dict(self._fan_out(lambda s: s.gc(**policy)))
+
+    def compress_examples(self, batch_size: int = 500) -> Dict[str, Dict[str, int]]:
+        """Compress stored example bodies on every shard. See PromptRegistry.compress_examples."""
+        return dict(self._fan_out(lambda s: s.compress_examples(batch_size)))
+
+    def backup(self, directory: str, compress: bool = False, **options) -> Dict[str, Dict[str, Any]]:
+        """
+        Back up every shard to <directory>/<shard name>.db (or .db.gz) concurrently.
+        See PromptRegistry.backup.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Result per shard name
+        """
+        extension = ".db.gz" if compress else ".db"
+        futures = [
+            (name, self._executor.submit(
+                self.shards[name].backup, os.path.join(directory, name + extension), **options
+            ))
+            for name in self.shard_names
+        ]
+        return {name: future.result() for name, future in futures}
+
+    def restore(self, directory: str, **options) -> Dict[str, Dict[str, Any]]:
+        """
+        Restore every shard from the files written by backup(). See PromptRegistry.restore.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Result per shard name
+        """
+        results = {}
+        for name in self.shard_names:
+            path = os.path.join(directory, name + ".db")
+            if not os.path.exists(path):
+                path += ".gz"
+            results[name] = self.shards[name].restore(path, **options)
+        with self._locations_lock:
+            self._locations.clear()
+        return results
+
+    def archive_versions(self, project: Optional[str] = None, **policy) -> Dict[str, Dict[str, Any]]:
+        """
+        Archive superseded versions on every shard, or only on a project's
+        shard. See PromptRegistry.archive_versions.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Result per shard name
+        """
+        if project is not None:
+            name = self.shard_for_project(project)
+            return {name: self.shards[name].archive_versions(project=project, **policy)}
+        return dict(self._fan_out(lambda s: s.archive_versions(**policy)))
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """
+        Combine usage statistics from every shard.
+
+        Counts are summed, the average template length is weighted by each
+        shard's prompt count and tasks are counted once across shards.
+        """
+        def collect(shard: PromptRegistry):
+            session = shard.Session()
+            try:
+                tasks = {t[0] for t in session.query(PromptORM.task).distinct() if t[0]}
+            finally:
+                session.close()
+            return shard.get_usage_stats(), tasks, shard.get_tag_stats()
+
+        results = [result for _, result in self._fan_out(collect)]
+
+        summed = ("total_prompts", "active_prompts", "deleted_prompts", "total_projects",
+                  "prompts_with_aliases", "total_examples")
+        stats = {key: sum(r[0][key] for r in results) for key in summed}
+
+        tasks, tag_counts, project_counts = set(), Counter(), Counter()
+        length_total = 0.0
+        for shard_stats, shard_tasks, shard_tags in results:
+            tasks |= shard_tasks
+            tag_counts.update(shard_tags)
+            project_counts.update(dict(shard_stats["most_active_projects"]))
+            if shard_stats["average_template_length"] is not None:
+                length_total += shard_stats["average_template_length"] * shard_stats["total_prompts"]
+
+        stats["total_tasks"] = len(tasks)
+        stats["average_template_length"] = (
+            length_total / stats["total_prompts"] if stats["total_prompts"] else None
+        )
+        stats["most_active_projects"] = project_counts.most_common(5)
+        stats["top_tags"] = tag_counts.most_common(10)
+        stats["shards"] = {
+            name: r[0]["total_prompts"] for name, r in zip(self.shard_names, results)
+        }
+        return stats
+
+    def export_prompts(
+            self,
+            project: Optional[str] = None,
+            format: str = "json",
+            since: Optional[Union[str, datetime]] = None,
+            until: Optional[Union[str, datetime]] = None
+        ) -> str:
+        """
+        Export one project from its shard, or every shard merged.
+        See PromptRegistry.export_prompts.
+        """
+        if format.lower() not in exchange.FORMATS:
+            raise ValueError(f"Unsupported export format: {format}")
+        if since is not None or until is not None:
+            if format.lower() not in ("json", "yaml"):
+                raise ValueError(f"Delta exports are written as json or yaml, not {format}")
+            delta = self.export_changes(since=since, until=until, project=project)
+            if format.lower() == "json":
+                return json.dumps(delta, indent=2)
+            return exchange.yaml_dump(delta, sort_keys=False)
+        if project:
+            return self._shard(project).export_prompts(project=project, format=format)
+        return "".join(exchange.encode_records(self.iter_export_records(), format.lower()))
+
+    def export_changes(
+            self,
+            since: Optional[Union[str, datetime]] = None,
+            until: Optional[Union[str, datetime]] = None,
+            project: Optional[str] = None
+        ) -> Dict[str, Any]:
+        """
+        Export changes from the project's shard, or every shard merged, as
+        one delta document. See PromptRegistry.export_changes.
+        """
+        # Resolve relative bounds once so every shard covers the same window
+        now = datetime.utcnow()
+        since = exchange.parse_timestamp(since, now)
+        until = exchange.parse_timestamp(until, now) or now
+        if project:
+            return self._shard(project).export_changes(since=since, until=until, project=project)
+
+        delta = None
+        for _, shard_delta in self._fan_out(lambda s: s.export_changes(since=since, until=until)):
+            if delta is None:
+                delta = shard_delta
+            else:
+                delta["prompts"].extend(shard_delta["prompts"])
+                delta["tombstones"].extend(shard_delta["tombstones"])
+        return delta
+
+    def apply_changes(self, delta: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Apply a delta document, sending each change to its project's shard.
+        See PromptRegistry.apply_changes.
+        """
+        if not exchange.is_delta(delta):
+            return {"error": "Not a Cuebit delta document"}
+
+        parts: Dict[str, Dict[str, Any]] = {}
+        for key in ("prompts", "tombstones"):
+            for item in delta.get(key) or []:
+                if not isinstance(item, dict):
+                    continue
+                name = self.shard_for_project(item.get("project"))
+                part = parts.setdefault(name, dict(delta, prompts=[], tombstones=[]))
+                part[key].append(item)
+
+        stats = {"total": 0, "imported": 0, "updated": 0, "deleted": 0, "skipped": 0, "errors": 0, "error_details": []}
+        for name, part in parts.items():
+            result = self.shards[name].apply_changes(part)
+            for key, value in result.items():
+                if key == "error_details":
+                    stats[key].extend(value)
+                else:
+                    stats[key] += value
+        return stats
+
+    def iter_export_records(self, project: Optional[str] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Yield export records from the project's shard, or from each shard in turn.
+        See PromptRegistry.iter_export_records.
+        """
+        if project:
+            yield from self._shard(project).iter_export_records(project=project, **kwargs)
+            return
+        for name in self.shard_names:
+            yield from self.shards[name].iter_export_records(**kwargs)
+
+    def export_to_file(self, path: str, project: Optional[str] = None, format: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream prompts from every shard to one file.
+        See PromptRegistry.export_to_file.
+        """
+        return exchange.write_records(path, self.iter_export_records(project=project), format)
+
+    def import_prompts(
+            self,
+            data: str,
+            format: str = "json",
+            skip_existing: bool = True,
+            on_conflict: Optional[str] = None
+        ) -> Dict[str, Any]:
+        """
+        Import prompts, sending each to its project's shard.
+        See PromptRegistry.import_prompts.
+        """
+        try:
+            if format.lower() == "json":
+                prompts_data = json.loads(data)
+            elif format.lower() == "yaml":
+                prompts_data = exchange.yaml_load(data)
+            elif format.lower() == "yaml-stream":
+                prompts_data = list(exchange.yaml_load_all(data))
+            elif format.lower() == "ndjson":
+                prompts_data = exchange.parse_ndjson(data)
+            else:
+                prompts_data = None
+        except Exception:
+            prompts_data = None
+
+        if exchange.is_delta(prompts_data):
+            return self.apply_changes(prompts_data)
+
+        # Let a shard report unparseable input the way a single registry does
+        if not isinstance(prompts_data, list):
+            return self.shards[self.shard_names[0]].import_prompts(data, format, skip_existing, on_conflict)
+
+        by_shard: Dict[str, List[Dict[str, Any]]] = {}
+        for item in prompts_data:
+            project = item.get("project") if isinstance(item, dict) else None
+            by_shard.setdefault(self.shard_for_project(project), []).append(item)
+
+        stats = {"total": len(prompts_data), "imported": 0, "updated": 0, "skipped": 0, "errors": 0, "error_details": []}
+        self._import_routed(by_shard, _conflict_strategy(skip_existing, on_conflict), stats)
+        return stats
+
+    def _import_routed(self, by_shard: Dict[str, List[Dict[str, Any]]], on_conflict: str, stats: Dict[str, Any]) -> None:
+        """Import records already grouped by shard, adding the results to stats."""
+        for name, items in by_shard.items():
+            result = self.shards[name].import_prompts(
+                json.dumps(items, default=str), "json", on_conflict=on_conflict
+            )
+            for key in ("imported", "updated", "skipped", "errors"):
+                stats[key] += result.get(key, 0)
+            stats["error_details"].extend(result.get("error_details", []))
+            if "error" in result:
+                stats.setdefault("error", f"{name}: {result['error']}")
+
+    def import_from_file(
+            self,
+            path: str,
+            format: Optional[str] = None,
+            skip_existing: bool = True,
+            batch_size: int = BULK_CHUNK_SIZE,
+            on_conflict: Optional[str] = None
+        ) -> Dict[str, Any]:
+        """
+        Stream an export file into the shards, batch by batch.
+        See PromptRegistry.import_from_file.
+        """
+        on_conflict = _conflict_strategy(skip_existing, on_conflict)
+        stats = {"total": 0, "imported": 0, "updated": 0, "skipped": 0, "errors": 0, "error_details": []}
+        if os.path.isdir(path) or os.path.basename(path) == exchange.MANIFEST_NAME:
+            try:
+                directory, manifest = exchange.read_manifest(path)
+            except Exception as e:
+                return {"error": f"Invalid manifest: {str(e)}"}
+            files = [os.path.join(directory, entry["file"]) for entry in manifest["files"]]
+        else:
+            files = [path]
+
+        for file_path in files:
+            try:
+                file_format = format or exchange.detect_format(file_path)[0]
+                if file_format not in exchange.STREAMED_FORMATS:
+                    document = exchange.load_document(file_path, format)
+                    if exchange.is_delta(document):
+                        for key, value in self.apply_changes(document).items():
+                            if key == "error_details":
+                                stats[key].extend(value)
+                            else:
+                                stats[key] = stats.get(key, 0) + value
+                        continue
+                    records = iter(exchange.document_records(document))
+                else:
+                    records = exchange.read_records(file_path, file_format)
+                for batch in exchange.batched(records, batch_size):
+                    by_shard: Dict[str, List[Dict[str, Any]]] = {}
+                    for item in batch:
+                        project = item.get("project") if isinstance(item, dict) else None
+                        by_shard.setdefault(self.shard_for_project(project), []).append(item)
+                    stats["total"] += len(batch)
+                    self._import_routed(by_shard, on_conflict, stats)
+                    if "error" in stats:
+                        return stats
+            except (OSError, ValueError, EOFError) as e:
+                if len(files) > 1:
+                    stats["errors"] += 1
+                    stats["error_details"].append(f"{file_path}: {str(e)}")
+                else:
+                    return dict(stats, error=f"Cannot read {file_path}: {str(e)}")
+        return stats
@@ -0,0 +1,275 @@
+"""
+TF-IDF similarity index for Cuebit prompt templates.
+
+Templates are tokenized into word unigrams and bigrams and hashed into
+a fixed-size feature space, so no vocabulary has to be kept. Raw term
+counts are stored as a CSR matrix in plain NumPy arrays and TF-IDF
+weights are derived at query time, which lets new prompts be appended
+without reweighting the rows already indexed.
+"""
+
+import os
+import re
+import time
+import zlib
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from cuebit.metrics import record_cache
+
+# Size of the hashed feature space
+N_FEATURES = 2 ** 18
+
+# Rows appended before a saved index is rewritten, or a tenth of the
+# index if that is more, so each save is paid for by many additions
+SAVE_BATCH_ROWS = 500
+
+# Seconds after which appended rows are saved regardless of their number
+SAVE_INTERVAL = 300.0
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercased word unigrams and bigrams.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Unigram and bigram terms
+    """
+    words = re.findall(r"\w+", (text or "").lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_terms(text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hash a text into sparse term counts.
+
+    Args:
+        text (str): Text to vectorize
+        n_features (int): Size of the hashed feature space
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Sorted feature indices and their counts
+    """
+    terms = tokenize(text)
+    if not terms:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+    hashed = np.fromiter(
+        (zlib.crc32(term.encode("utf-8")) % n_features for term in terms),
+        dtype=np.int32,
+        count=len(terms)
+    )
+    indices, counts = np.unique(hashed, return_counts=True)
+    return indices.astype(np.int32), counts.astype(np.float32)
+
+
+class SimilarityIndex:
+    """
+    Hashed TF-IDF index over prompt templates.
+
+    Rows are keyed by the prompts table's autoincrement id, so the index
+    can be brought up to date by appending every row with a higher id
+    than the last one indexed. Prompts written by other processes are
+    picked up the same way. Callers clear the index when indexed rows were
+    rewritten or their ids handed out again.
+    """
+
+    def __init__(self, path: Optional[str] = None, n_features: int = N_FEATURES):
+        """
+        Initialize the index, loading it from disk if a saved copy exists.
+
+        Args:
+            path (str, optional): .npz file to persist the index to.
+                If None, the index is kept in memory only.
+            n_features (int): Size of the hashed feature space
+        """
+        self.path = path
+        self.n_features = n_features
+        self.row_ids = np.empty(0, dtype=np.int64)
+        self.prompt_ids = np.empty(0, dtype=object)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int32)
+        self.counts = np.empty(0, dtype=np.float32)
+        self.doc_freq = np.zeros(n_features, dtype=np.int32)
+        self._weights = None
+        # Rows added since the index was last saved or loaded
+        self.pending = 0
+        self._saved_at = None
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    @property
+    def max_row_id(self) -> int:
+        """Highest prompts.id included in the index (0 if empty)."""
+        return int(self.row_ids[-1]) if len(self.row_ids) else 0
+
+    def add(self, rows: Iterable[Tuple[int, str, str]]) -> int:
+        """
+        Append prompts to the index.
+
+        Args:
+            rows (Iterable[Tuple[int, str, str]]): (row id, prompt id, template)
+                tuples in increasing row id order
+
+        Returns:
+            int: Number of rows added
+        """
+        row_ids, prompt_ids, indices, counts, lengths = [], [], [], [], []
+        for row_id, prompt_id, template in rows:
+            if row_id <= self.max_row_id:
+                continue
+            idx, cnt = hash_terms(template, self.n_features)
+            row_ids.append(row_id)
+            prompt_ids.append(prompt_id)
+            indices.append(idx)
+            counts.append(cnt)
+            lengths.append(len(idx))
+
+        if not row_ids:
+            return 0
+
+        new_indices = np.concatenate(indices)
+        self.row_ids = np.concatenate((self.row_ids, np.array(row_ids, dtype=np.int64)))
+        self.prompt_ids = np.concatenate((self.prompt_ids, np.array(prompt_ids, dtype=object)))
+        self.indptr = np.concatenate(
+            (self.indptr, self.indptr[-1] + np.cumsum(lengths, dtype=np.int64))
+        )
+        self.indices = np.concatenate((self.indices, new_indices))
+        self.counts = np.concatenate((self.counts, np.concatenate(counts)))
+        np.add.at(self.doc_freq, new_indices, 1)
+        self._weights = None
+        self.pending += len(row_ids)
+        return len(row_ids)
+
+    def _idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency per feature."""
+        n_docs = len(self.row_ids)
+        return np.log((1.0 + n_docs) / (1.0 + self.doc_freq)) + 1.0
+
+    def _document_weights(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return L2-normalized TF-IDF values for every stored entry."""
+        record_cache("similarity_weights", self._weights is not None)
+        if self._weights is None:
+            idf = self._idf()
+            values = self.counts * idf[self.indices]
+            rows = np.repeat(np.arange(len(self.row_ids)), np.diff(self.indptr))
+            norms = np.sqrt(np.bincount(rows, values ** 2, minlength=len(self.row_ids)))
+            norms[norms == 0] = 1.0
+            self._weights = (rows, values / norms[rows])
+        return self._weights
+
+    def query(self, text: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Find the indexed prompts most similar to a text.
+
+        Args:
+            text (str): Query text
+            k (int): Maximum number of results
+
+        Returns:
+            List[Tuple[str, float]]: (prompt id, cosine similarity) pairs,
+                most similar first, excluding zero scores
+        """
+        q_indices, q_counts = hash_terms(text, self.n_features)
+        if not len(self.row_ids) or not len(q_indices) or k <= 0:
+            return []
+
+        idf = self._idf()
+        q_values = q_counts * idf[q_indices]
+        q_values /= np.linalg.norm(q_values)
+        query = np.zeros(self.n_features, dtype=np.float64)
+        query[q_indices] = q_values
+
+        rows, values = self._document_weights()
+        scores = np.bincount(
+            rows, values * query[self.indices], minlength=len(self.row_ids)
+        )
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self.prompt_ids[i], float(scores[i]))
+            for i in top if scores[i] > 0
+        ]
+
+    def save(self) -> None:
+        """Write the index to its path atomically (no-op for in-memory indexes)."""
+        if not self.path:
+            return
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".npz", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    n_features=np.array(self.n_features),
+                    row_ids=self.row_ids,
+                    prompt_ids=self.prompt_ids.astype(str),
+                    indptr=self.indptr,
+                    indices=self.indices,
+                    counts=self.counts,
+                    doc_freq=self.doc_freq
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.pending = 0
+        self._saved_at = time.monotonic()
+
+    def save_if_due(self) -> bool:
+        """
+        Save the index if it has never been saved or enough rows are pending.
+
+        Rows that are not saved yet are only a cache miss for other
+        processes, which append them from the prompts table themselves.
+
+        Returns:
+            bool: Whether the index was written
+        """
+        if not self.path:
+            return False
+        if self._saved_at is not None:
+            if not self.pending:
+                return False
+            batch = max(SAVE_BATCH_ROWS, len(self) // 10)
+            if self.pending < batch and time.monotonic() - self._saved_at < SAVE_INTERVAL:
+                return False
+        self.save()
+        return True
+
+    def load(self) -> None:
+        """Load the index from its path, starting empty if it is unreadable."""
+        try:
+            with np.load(self.path, allow_pickle=False) as saved:
+                if int(saved["n_features"]) != self.n_features:
+                    return
+                self.row_ids = saved["row_ids"]
+                self.prompt_ids = saved["prompt_ids"].astype(object)
+                self.indptr = saved["indptr"]
+                self.indices = saved["indices"]
+                self.counts = saved["counts"]
+                self.doc_freq = saved["doc_freq"]
+                self._weights = None
+                self._saved_at = time.monotonic()
+        except (OSError, ValueError, KeyError):
+            # A corrupt or foreign file just means a full rebuild
+            pass
+
+    def clear(self) -> None:
+        """Drop every indexed row, keeping the index's path."""
+        path = self.path
+        self.__init__(path=None, n_features=self.n_features)
+        self.path = path
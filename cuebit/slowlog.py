@@ -0,0 +1,306 @@
+"""
+Slow query log for Cuebit.
+
+Statements that run longer than a threshold are written as JSON lines
+to a rotating log file, together with their redacted parameters, the
+row count reported by the driver and the backend's query plan, so full
+table scans can be found without attaching a profiler.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+from datetime import datetime, date
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+
+from cuebit import tracing
+from cuebit.metrics import statement_type
+
+# Default threshold above which a statement is logged
+DEFAULT_THRESHOLD_MS = 100.0
+
+# Default size of each log file and number of rotated files kept
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+# Parameter sets kept for executemany statements
+MAX_PARAMETER_SETS = 10
+
+# EXPLAIN prefix per dialect; other backends are logged without a plan
+EXPLAIN_PREFIXES = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+# Statements that can be explained
+EXPLAINABLE = {"SELECT", "WITH", "INSERT", "UPDATE", "DELETE"}
+
+# Plan lines that indicate a full table scan
+_FULL_SCAN = re.compile(r"^\s*(SCAN \w+\s*$|.*Seq Scan on )")
+
+
+def redact_value(value: Any) -> Any:
+    """
+    Redact a single statement parameter.
+
+    Numbers, booleans and None are kept since they are needed to
+    reproduce a plan and rarely sensitive. Text and binary values are
+    replaced by their type and length.
+
+    Args:
+        value: Parameter value
+
+    Returns:
+        The value, or a placeholder string
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return f"<str len={len(value)}>"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<bytes len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> Any:
+    """
+    Redact the parameters of a statement.
+
+    Args:
+        parameters: Positional (sequence) or named (mapping) parameters,
+            or a list of them for executemany
+        executemany (bool): Whether parameters holds several sets
+
+    Returns:
+        Parameters with every value passed through redact_value()
+    """
+    if executemany:
+        return [redact_parameters(p) for p in list(parameters)[:MAX_PARAMETER_SETS]]
+    if isinstance(parameters, dict):
+        return {key: redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact_value(value) for value in parameters]
+    return redact_value(parameters)
+
+
+def is_full_scan(plan: Optional[List[str]]) -> bool:
+    """Return whether a query plan contains a full table scan."""
+    return any(_FULL_SCAN.match(line) for line in plan or [])
+
+
+class SlowQueryLog:
+    """
+    Logs SQL statements that exceed a duration threshold.
+
+    Timing uses the before/after_cursor_execute engine events, so it
+    covers statement execution up to the first row. For SQLite that
+    includes the scan needed to find the first match and all of the
+    work for aggregates such as COUNT.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            threshold_ms: float = DEFAULT_THRESHOLD_MS,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            backup_count: int = DEFAULT_BACKUP_COUNT,
+            explain: bool = True
+        ):
+        """
+        Initialize the log.
+
+        Args:
+            path (str): Log file path
+            threshold_ms (float): Minimum duration of logged statements in milliseconds
+            max_bytes (int): Size at which the log file is rotated
+            backup_count (int): Number of rotated files to keep
+            explain (bool): Whether to capture the query plan
+        """
+        if threshold_ms < 0:
+            raise ValueError("threshold_ms must not be negative")
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self._engine = None
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def attach(self, engine) -> None:
+        """
+        Start timing the statements executed by an engine.
+
+        Args:
+            engine: SQLAlchemy engine
+        """
+        if self._engine is not None:
+            raise ValueError("Slow query log is already attached to an engine")
+        self._engine = engine
+        self._dialect = engine.dialect.name
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine, "handle_error", self._on_error)
+
+    def detach(self) -> None:
+        """Stop logging and close the log file."""
+        if self._engine is not None:
+            event.remove(self._engine, "before_cursor_execute", self._before_execute)
+            event.remove(self._engine, "after_cursor_execute", self._after_execute)
+            event.remove(self._engine, "handle_error", self._on_error)
+            self._engine = None
+        self._handler.close()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("cuebit_slowlog_start", []).append(time.perf_counter())
+
+    def _on_error(self, context):
+        starts = context.connection.info.get("cuebit_slowlog_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("cuebit_slowlog_start")
+        if not starts:
+            return
+        duration_ms = (time.perf_counter() - starts.pop()) * 1000.0
+        if duration_ms < self.threshold_ms:
+            return
+
+        kind = statement_type(statement)
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "dialect": self._dialect,
+            "statement_type": kind,
+            "statement": statement,
+            "parameters": redact_parameters(parameters, executemany),
+            "rows": cursor.rowcount if cursor.rowcount is not None and cursor.rowcount >= 0 else None,
+            "plan": None,
+            "request_id": tracing.get_request_id(),
+        }
+        if self.explain and not executemany and kind in EXPLAINABLE:
+            entry["plan"] = self._query_plan(cursor, statement, parameters)
+        self.write(entry)
+
+    def _query_plan(self, cursor, statement: str, parameters) -> Optional[List[str]]:
+        """Run EXPLAIN for a statement on the connection that executed it."""
+        prefix = EXPLAIN_PREFIXES.get(self._dialect)
+        if prefix is None:
+            return None
+
+        # Outside SQLite a failed EXPLAIN would abort the enclosing transaction
+        savepoint = self._dialect != "sqlite"
+        explain_cursor = cursor.connection.cursor()
+        try:
+            if savepoint:
+                explain_cursor.execute("SAVEPOINT cuebit_explain")
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+            if savepoint:
+                explain_cursor.execute("RELEASE SAVEPOINT cuebit_explain")
+        except Exception as e:
+            if savepoint:
+                try:
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT cuebit_explain")
+                except Exception:
+                    pass
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            explain_cursor.close()
+
+        if self._dialect == "sqlite":
+            # Rows are (id, parent, notused, detail); indent by depth
+            depth = {0: -1}
+            plan = []
+            for row in rows:
+                depth[row[0]] = depth.get(row[1], -1) + 1
+                plan.append("  " * depth[row[0]] + str(row[-1]))
+            return plan
+        return [" ".join(str(col) for col in row) for row in rows]
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        """
+        Append an entry to the log.
+
+        Args:
+            entry (Dict[str, Any]): JSON-serializable log entry
+        """
+        record = logging.makeLogRecord({"msg": json.dumps(entry, default=str)})
+        self._handler.handle(record)
+
+
+def read_entries(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read every entry from a slow query log and its rotated files.
+
+    Args:
+        path (str): Log file path
+
+    Returns:
+        Iterator[Dict[str, Any]]: Entries, oldest file first; unreadable
+            lines are skipped
+    """
+    rotated = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        rotated.append(f"{path}.{index}")
+        index += 1
+
+    for file_path in list(reversed(rotated)) + [path]:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries: Iterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Group slow query log entries by statement.
+
+    Args:
+        entries (Iterator[Dict[str, Any]]): Log entries
+
+    Returns:
+        List[Dict[str, Any]]: One item per distinct statement with count,
+            total/mean/max duration, the most recent plan and whether it
+            is a full scan, ordered by total duration descending
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry["statement"], {
+            "statement": entry["statement"],
+            "statement_type": entry.get("statement_type"),
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "plan": None,
+        })
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        group["max_ms"] = max(group["max_ms"], entry["duration_ms"])
+        if entry.get("plan"):
+            group["plan"] = entry["plan"]
+
+    results = []
+    for group in groups.values():
+        group["total_ms"] = round(group["total_ms"], 3)
+        group["mean_ms"] = round(group["total_ms"] / group["count"], 3)
+        group["full_scan"] = is_full_scan(group["plan"])
+        results.append(group)
+    return sorted(results, key=lambda g: g["total_ms"], reverse=True)
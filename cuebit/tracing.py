@@ -0,0 +1,368 @@
+"""
+Pluggable tracing hooks for Cuebit.
+
+Spans are emitted around every public PromptRegistry method, every SQL
+statement and every API request, tagged with the current request id.
+Tracing is a no-op by default. Select a backend with configure() or the
+CUEBIT_TRACING environment variable:
+
+    none    No-op (default)
+    otel    OpenTelemetry, via the globally configured tracer provider
+            (requires the opentelemetry-api package)
+    memory  Keep finished spans in memory, for debugging and tests
+"""
+
+import functools
+import inspect
+import os
+import time
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Union
+
+from sqlalchemy import event
+
+from cuebit.metrics import statement_type
+
+# Maximum length of SQL text attached to statement spans
+MAX_STATEMENT_LENGTH = 2000
+
+# Request id of the API request currently being handled
+_request_id = ContextVar("cuebit_request_id", default=None)
+
+
+def get_request_id() -> Optional[str]:
+    """Return the request id bound to the current context, if any."""
+    return _request_id.get()
+
+
+def set_request_id(request_id: Optional[str]):
+    """
+    Bind a request id to the current context.
+
+    Returns:
+        Token that can be passed to reset_request_id()
+    """
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    """Restore the request id that was bound before set_request_id()."""
+    _request_id.reset(token)
+
+
+def _attributes(attributes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Drop empty values and add the current request id."""
+    result = {k: v for k, v in (attributes or {}).items() if v is not None}
+    request_id = _request_id.get()
+    if request_id:
+        result["cuebit.request_id"] = request_id
+    return result
+
+
+class Span:
+    """A span that records nothing."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """Attach an attribute to the span."""
+
+    def set_name(self, name: str) -> None:
+        """Rename the span."""
+
+    def record_exception(self, exception: BaseException) -> None:
+        """Mark the span as failed with an exception."""
+
+    def end(self) -> None:
+        """Finish the span."""
+
+
+_NOOP_SPAN = Span()
+
+
+class Tracer:
+    """Tracer that records nothing. Base class for tracing backends."""
+
+    enabled = False
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Span:
+        """
+        Start a span that is not made current; the caller must end() it.
+
+        Args:
+            name (str): Span name
+            attributes (Dict[str, Any], optional): Span attributes
+
+        Returns:
+            Span: The started span
+        """
+        return _NOOP_SPAN
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        """
+        Run a block inside a span that is current for its duration.
+
+        Args:
+            name (str): Span name
+            attributes (Dict[str, Any], optional): Span attributes
+        """
+        yield _NOOP_SPAN
+
+
+class RecordedSpan(Span):
+    """Span kept in memory by InMemoryTracer."""
+
+    def __init__(self, tracer: "InMemoryTracer", name: str,
+                 attributes: Dict[str, Any], parent: Optional["RecordedSpan"]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.error = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Duration in seconds, or None while the span is open."""
+        return None if self.end_time is None else self.end_time - self.start_time
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_name(self, name):
+        self.name = name
+
+    def record_exception(self, exception):
+        self.error = repr(exception)
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+            self.tracer.finished.append(self)
+
+    def __repr__(self):
+        return f"<RecordedSpan {self.name!r} {self.duration}>"
+
+
+class InMemoryTracer(Tracer):
+    """Tracer that keeps finished spans in a list."""
+
+    enabled = True
+
+    def __init__(self):
+        self.finished: List[RecordedSpan] = []
+        self._current = ContextVar(f"cuebit_span_{id(self)}", default=None)
+
+    def start_span(self, name, attributes=None):
+        return RecordedSpan(self, name, _attributes(attributes), self._current.get())
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        span = self.start_span(name, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            self._current.reset(token)
+            span.end()
+
+    def clear(self) -> None:
+        """Forget every finished span."""
+        self.finished = []
+
+
+class _OpenTelemetrySpan(Span):
+    """Adapter from the Span interface to an OpenTelemetry span."""
+
+    def __init__(self, span, status_module):
+        self._span = span
+        self._status = status_module
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self._span.set_attribute(key, value)
+
+    def set_name(self, name):
+        self._span.update_name(name)
+
+    def record_exception(self, exception):
+        self._span.record_exception(exception)
+        self._span.set_status(self._status.Status(self._status.StatusCode.ERROR, str(exception)))
+
+    def end(self):
+        self._span.end()
+
+
+class OpenTelemetryTracer(Tracer):
+    """Tracer that emits spans through the OpenTelemetry API."""
+
+    enabled = True
+
+    def __init__(self, tracer_provider=None):
+        """
+        Initialize the adapter.
+
+        Args:
+            tracer_provider (optional): OpenTelemetry TracerProvider.
+                Defaults to the globally configured provider.
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetry tracing requires the opentelemetry-api package "
+                "(pip install 'cuebit[tracing]')"
+            )
+        from cuebit import __version__
+        self._status = trace
+        self._tracer = trace.get_tracer("cuebit", __version__, tracer_provider=tracer_provider)
+
+    def start_span(self, name, attributes=None):
+        return _OpenTelemetrySpan(
+            self._tracer.start_span(name, attributes=_attributes(attributes)),
+            self._status
+        )
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        with self._tracer.start_as_current_span(
+            name,
+            attributes=_attributes(attributes),
+            record_exception=False,
+            set_status_on_exception=False
+        ) as otel_span:
+            span = _OpenTelemetrySpan(otel_span, self._status)
+            try:
+                yield span
+            except BaseException as e:
+                span.record_exception(e)
+                raise
+
+
+_TRACERS = {
+    "none": Tracer,
+    "otel": OpenTelemetryTracer,
+    "opentelemetry": OpenTelemetryTracer,
+    "memory": InMemoryTracer,
+}
+
+_tracer: Tracer = Tracer()
+
+
+def configure(tracer: Union[str, Tracer, None] = None) -> Tracer:
+    """
+    Select the tracing backend used by Cuebit.
+
+    Args:
+        tracer (str or Tracer, optional): "none", "otel" or "memory", or a
+            Tracer instance. None disables tracing.
+
+    Returns:
+        Tracer: The active tracer
+
+    Example:
+        >>> from cuebit import tracing
+        >>> tracing.configure("otel")
+    """
+    global _tracer
+    if tracer is None:
+        tracer = "none"
+    if isinstance(tracer, str):
+        if tracer.lower() not in _TRACERS:
+            raise ValueError(f"Unknown tracer: {tracer}. Use one of: {', '.join(sorted(_TRACERS))}")
+        tracer = _TRACERS[tracer.lower()]()
+    _tracer = tracer
+    return _tracer
+
+
+def get_tracer() -> Tracer:
+    """Return the active tracer."""
+    return _tracer
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Run a block inside a span from the active tracer."""
+    return _tracer.span(name, attributes)
+
+
+def traced(func, name: Optional[str] = None):
+    """
+    Wrap a function so each call runs inside a span.
+
+    Args:
+        func: Function to wrap
+        name (str, optional): Span name (defaults to the qualified name)
+    """
+    span_name = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        with tracer.span(span_name, {"code.function": func.__qualname__}):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def trace_public_methods(cls):
+    """Class decorator that traces every public method of a class."""
+    for attr_name, value in list(vars(cls).items()):
+        if not attr_name.startswith("_") and inspect.isfunction(value):
+            setattr(cls, attr_name, traced(value, f"{cls.__name__}.{attr_name}"))
+    return cls
+
+
+def instrument_engine(engine) -> None:
+    """
+    Emit a span for every SQL statement executed by an engine.
+
+    Args:
+        engine: SQLAlchemy engine to instrument
+    """
+    if getattr(engine, "_cuebit_tracing", False):
+        return
+    engine._cuebit_tracing = True
+    system = engine.dialect.name
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        tracer = _tracer
+        if not tracer.enabled:
+            return
+        span = tracer.start_span(f"sql {statement_type(statement)}", {
+            "db.system": system,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            "db.executemany": executemany,
+        })
+        conn.info.setdefault("cuebit_spans", []).append(span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("cuebit_spans")
+        if spans:
+            span = spans.pop()
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rowcount", cursor.rowcount)
+            span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def on_error(context):
+        spans = context.connection.info.get("cuebit_spans") if context.connection else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(context.original_exception)
+            span.end()
+
+
+# Honour the environment, falling back to no-op if the backend is unavailable
+try:
+    configure(os.environ.get("CUEBIT_TRACING") or None)
+except (ImportError, ValueError) as e:
+    warnings.warn(f"Tracing disabled: {e}")
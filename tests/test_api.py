@@ -5,6 +5,7 @@ Tests for the FastAPI endpoints.
 import json
 import pytest
 from fastapi.testclient import TestClient
+from cuebit import tracing
 
 def test_health_endpoint(api_client):
     """Test the health check endpoint."""
@@ -344,6 +345,44 @@ def test_export_import(api_client):
     assert import_result["skipped"] >= 0
     assert import_result["errors"] == 0
 
+
+def test_export_import_streaming(api_client):
+    """Test gzip/NDJSON export and raw file import endpoints."""
+    import gzip
+    api_client.post("/api/v1/prompts", json={"task": "stream", "template": "Hi {x}", "project": "stream"})
+    
+    response = api_client.get("/api/v1/export?format=ndjson&compress=true")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/gzip"
+    body = gzip.decompress(response.content)
+    lines = body.decode("utf-8").splitlines()
+    assert any(json.loads(line)["task"] == "stream" for line in lines)
+    
+    result = api_client.post("/api/v1/import/file?format=ndjson", content=gzip.compress(body)).json()
+    assert result["total"] == len(lines) and result["skipped"] == len(lines)
+    
+    assert api_client.get("/api/v1/export?format=xml").status_code == 400
+    
+    overwrite = api_client.post("/api/v1/import/file?format=ndjson&on_conflict=overwrite", content=body).json()
+    assert overwrite["updated"] == len(lines)
+    assert api_client.post("/api/v1/import/file?on_conflict=merge", content=body).status_code == 400
+    response = api_client.post("/api/v1/import", json={"data": "[]", "on_conflict": "merge"})
+    assert response.status_code == 400
+
+
+def test_export_since(api_client):
+    """Test delta exports over a time window are applied through import."""
+    api_client.post("/api/v1/prompts", json={"task": "delta", "template": "Hi {x}", "project": "delta"})
+    
+    delta = api_client.get("/api/v1/export?since=1h").json()
+    assert delta["format"] == "cuebit-delta"
+    assert any(p["task"] == "delta" for p in delta["prompts"])
+    assert api_client.get(f"/api/v1/export?since={delta['until']}").json()["prompts"] == []
+    assert api_client.get("/api/v1/export?since=soon").status_code == 400
+    
+    result = api_client.post("/api/v1/import", json={"data": json.dumps(delta), "format": "json"}).json()
+    assert result["skipped"] == len(delta["prompts"])
+
 def test_delete_restore_prompt(api_client):
     """Test deleting and restoring a prompt."""
     # Create a prompt
@@ -375,4 +414,224 @@ def test_delete_restore_prompt(api_client):
     # Verify it's restored
     get_response_after = api_client.get(f"/api/v1/prompts/{prompt_id}")
     assert get_response_after.status_code == 200
-    assert get_response_after.json()["prompt_id"] == prompt_id
\ No newline at end of file
+    assert get_response_after.json()["prompt_id"] == prompt_id
+    
+    # Hard delete reports the rows removed per table
+    hard_response = api_client.delete(f"/api/v1/prompts/{prompt_id}", params={"hard_delete": True})
+    assert hard_response.status_code == 200
+    assert hard_response.json()["rows_deleted"]["prompts"] == 1
+    assert api_client.delete(f"/api/v1/prompts/{prompt_id}", params={"hard_delete": True}).status_code == 404
+
+def test_similar_prompts(api_client):
+    """Test finding similar prompts."""
+    response = api_client.post(
+        "/api/v1/prompts/similar",
+        json={"text": "Test template with a {variable}", "k": 3}
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["total"] >= 1
+    assert response.json()["items"][0]["task"] == "test-task"
+    
+    # Invalid k
+    response = api_client.post("/api/v1/prompts/similar", json={"text": "x", "k": 0})
+    assert response.status_code == 400
+
+def test_metrics_endpoint(api_client):
+    """Test the Prometheus metrics endpoint."""
+    api_client.get("/api/v1/projects")
+    prompt_id = api_client.get("/api/v1/prompts/alias/test-alias").json()["prompt_id"]
+    api_client.post(
+        "/api/v1/prompts/render",
+        json={"prompt_id": prompt_id, "variables": {"variable": "value"}}
+    )
+    
+    response = api_client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'cuebit_http_requests_total{method="GET",route="/api/v1/projects",status="200"}' in text
+    assert 'cuebit_http_request_duration_seconds_bucket{method="GET",route="/api/v1/prompts/alias/{alias}",status="200",le="+Inf"}' in text
+    assert "cuebit_http_requests_in_progress" in text
+    assert "cuebit_render_payload_bytes_count" in text
+
+def test_request_id_header(api_client):
+    """Test that request ids are echoed and attached to trace spans."""
+    tracer = tracing.configure("memory")
+    try:
+        response = api_client.get("/api/v1/projects", headers={"X-Request-ID": "abc-123"})
+        generated = api_client.get("/api/v1/projects").headers["X-Request-ID"]
+    finally:
+        tracing.configure(None)
+    
+    assert response.headers["X-Request-ID"] == "abc-123"
+    assert generated and generated != "abc-123"
+    
+    spans = [s for s in tracer.finished if s.attributes.get("cuebit.request_id") == "abc-123"]
+    names = {s.name for s in spans}
+    assert "HTTP GET /api/v1/projects" in names
+    assert "PromptRegistry.list_projects" in names
+
+def test_list_prompts_tag_modes(api_client):
+    """Test tag modes and excluded tags on the list endpoint."""
+    for task, tags in (("tag-a", ["alpha", "beta"]), ("tag-b", ["beta"])):
+        api_client.post(
+            "/api/v1/prompts",
+            json={"task": task, "template": "Template", "project": "tag-modes", "tags": tags}
+        )
+    
+    def tasks(query):
+        response = api_client.get(f"/api/v1/prompts?{query}")
+        assert response.status_code == 200
+        return {p["task"] for p in response.json()["items"]}
+    
+    assert tasks("tags=alpha,beta") == {"tag-a"}
+    assert tasks("tags=alpha,beta&tag_mode=any") == {"tag-a", "tag-b"}
+    assert tasks("tags=beta,-alpha") == {"tag-b"}
+    assert api_client.get("/api/v1/prompts?tags=beta&tag_mode=some").status_code == 400
+
+def test_list_prompts_meta_filters(api_client):
+    """Test meta.<key> filters on the list endpoint, with and without an index."""
+    for task, meta in (("m-a", {"model": "gpt-4", "temperature": 0.2}),
+                       ("m-b", {"model": "gpt-4", "temperature": 0.9})):
+        api_client.post(
+            "/api/v1/prompts",
+            json={"task": task, "template": "Template", "project": "meta-filters", "meta": meta}
+        )
+    
+    def tasks(query):
+        response = api_client.get(f"/api/v1/prompts?{query}")
+        assert response.status_code == 200
+        return {p["task"] for p in response.json()["items"]}
+    
+    query = "meta.model=gpt-4&meta.temperature__lte=0.3"
+    assert tasks(query) == {"m-a"}
+    
+    response = api_client.post("/api/v1/meta-indexes", json={"key": "temperature"})
+    assert response.json()["indexed_prompts"] == 2
+    assert api_client.get("/api/v1/meta-indexes").json() == ["temperature"]
+    assert tasks(query) == {"m-a"}
+    assert tasks("meta.temperature__in=0.2,0.9") == {"m-a", "m-b"}
+    
+    assert api_client.get("/api/v1/prompts?meta.model__in=").status_code == 200
+    assert api_client.delete("/api/v1/meta-indexes/temperature").status_code == 200
+    assert api_client.delete("/api/v1/meta-indexes/temperature").status_code == 404
+
+def test_examples_cursor_paging(api_client):
+    """Test example pages follow the X-Next-Cursor header and listings carry counts."""
+    created = api_client.post(
+        "/api/v1/prompts",
+        json={
+            "task": "paged", "template": "Paged {x}", "project": "examples",
+            "examples": [{"input": f"i{n}", "output": f"o{n}"} for n in range(3)]
+        }
+    ).json()
+    url = f"/api/v1/prompts/{created['prompt_id']}/examples"
+    
+    first = api_client.get(url, params={"limit": 2})
+    assert [ex["input"] for ex in first.json()] == ["i0", "i1"]
+    second = api_client.get(url, params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert [ex["input"] for ex in second.json()] == ["i2"]
+    assert "X-Next-Cursor" not in second.headers
+    
+    items = api_client.get("/api/v1/prompts", params={"search": "Paged"}).json()["items"]
+    assert items[0]["example_count"] == 3
+
+def test_prompt_detail_endpoint(api_client):
+    """Test the prompt detail bundle endpoint."""
+    created = api_client.post(
+        "/api/v1/prompts",
+        json={
+            "task": "detail", "template": "Detail {x}", "project": "detail-project",
+            "examples": [{"input": "i", "output": "o"}]
+        }
+    ).json()
+    updated = api_client.put(
+        f"/api/v1/prompts/{created['prompt_id']}", json={"new_template": "Detail v2 {x}"}
+    ).json()
+    
+    response = api_client.get(f"/api/v1/prompts/{created['prompt_id']}/detail")
+    assert response.status_code == 200
+    detail = response.json()
+    assert detail["prompt"]["template"] == "Detail {x}"
+    assert detail["example_count"] == 1
+    assert [d["prompt_id"] for d in detail["descendants"]] == [updated["prompt_id"]]
+    
+    assert api_client.get("/api/v1/prompts/missing/detail").status_code == 404
+
+def test_variable_endpoints(api_client):
+    """Test variable usage and prompts by variable endpoints."""
+    api_client.post(
+        "/api/v1/prompts",
+        json={"task": "var-a", "template": "Refund {order_id} for {customer_id}", "project": "vars"}
+    )
+    api_client.post(
+        "/api/v1/prompts",
+        json={"task": "var-b", "template": "Greet {customer_id}", "project": "vars"}
+    )
+    
+    usage = api_client.get("/api/v1/variables?project=vars").json()
+    assert usage[0] == {"variable": "customer_id", "prompts": 2, "tasks": 2}
+    
+    response = api_client.get("/api/v1/variables/order_id/prompts")
+    assert response.status_code == 200
+    assert [p["task"] for p in response.json()] == ["var-a"]
+
+def test_bulk_tag_by_filter(api_client):
+    """Test bulk tagging prompts selected by ID list and by filter."""
+    ids = []
+    for task in ("bulk-a", "bulk-b"):
+        response = api_client.post(
+            "/api/v1/prompts",
+            json={"task": task, "template": "Template", "project": "bulk-project", "tags": ["draft"]}
+        )
+        ids.append(response.json()["prompt_id"])
+    
+    response = api_client.post(
+        "/api/v1/prompts/bulk-tag",
+        json={"tags": ["release"], "project": "bulk-project"}
+    )
+    assert response.status_code == 200
+    assert response.json()["modified"] == 2
+    
+    response = api_client.post(
+        "/api/v1/prompts/bulk-tag",
+        json={"prompt_ids": ids[:1], "tags": ["draft"], "operation": "remove"}
+    )
+    assert response.json()["modified"] == 1
+    
+    tagged = api_client.get("/api/v1/prompts?tags=release,-draft").json()["items"]
+    assert [p["prompt_id"] for p in tagged] == ids[:1]
+    assert json.loads(tagged[0]["tags"]) == ["release"]
+    
+    # A selection is required
+    response = api_client.post("/api/v1/prompts/bulk-tag", json={"tags": ["x"]})
+    assert response.status_code == 400
+
+def test_locked_database_returns_503(api_client, temp_db_path, monkeypatch):
+    """Test that a write that cannot get the lock is reported as retryable."""
+    import sqlite3
+    import cuebit.server as server_module
+    from cuebit.registry import PromptRegistry
+    
+    monkeypatch.setattr(
+        server_module, "registry",
+        PromptRegistry(db_url=temp_db_path, write_timeout=0.05, busy_timeout=0.01)
+    )
+    conn = sqlite3.connect(temp_db_path.replace("sqlite:///", ""), isolation_level=None)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        response = api_client.post(
+            "/api/v1/prompts",
+            json={"task": "locked", "template": "Template", "project": "locked"}
+        )
+        read = api_client.get("/api/v1/projects")
+    finally:
+        conn.execute("ROLLBACK")
+        conn.close()
+    
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert read.status_code == 200
+    assert "cuebit_db_write_timeouts_total" in api_client.get("/metrics").text
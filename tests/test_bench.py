@@ -0,0 +1,52 @@
+"""
+Tests for the benchmark generator and runner.
+"""
+
+import pytest
+
+from cuebit.bench import RegistryGenerator, run_benchmarks, percentiles
+
+def test_generator_is_seeded():
+    """Test that the same seed produces the same registry."""
+    first = list(RegistryGenerator(seed=7).generate(50))
+    second = list(RegistryGenerator(seed=7).generate(50))
+    other = list(RegistryGenerator(seed=8).generate(50))
+    
+    assert len(first) == 50
+    assert first == second
+    assert first != other
+
+def test_generator_shape(empty_registry):
+    """Test the projects x tasks x versions shape and lineage."""
+    generator = RegistryGenerator(seed=1, projects=2, versions_per_task=3, alias_fraction=1.0)
+    results = generator.populate(empty_registry, 12)
+    
+    assert results["imported"] == 12
+    assert sorted(empty_registry.list_projects()) == ["project-0", "project-1"]
+    
+    history = empty_registry.get_version_history("project-0", "task-0")
+    assert [p.version for p in history] == [1, 2, 3]
+    assert history[2].parent_id == history[1].prompt_id
+    assert empty_registry.get_prompt_by_alias("project-0-task-0-prod") is not None
+    
+    with pytest.raises(ValueError):
+        RegistryGenerator(unknown_option=1)
+
+def test_run_benchmarks():
+    """Test that a small benchmark run reports percentiles and scaling curves."""
+    report = run_benchmarks(sizes=[100, 200], repeat=3, projects=2)
+    
+    assert [r["versions"] for r in report["results"]] == [100, 200]
+    operations = report["results"][0]["operations"]
+    for name in ("register", "alias_resolve", "list_page", "search_page",
+                 "lineage", "compare", "export_project", "import_project", "stats"):
+        assert set(operations[name]) >= {"p50_ms", "p95_ms", "p99_ms"}
+    assert [point["versions"] for point in report["scaling"]["get_prompt"]] == [100, 200]
+
+def test_percentiles():
+    """Test the percentile summary."""
+    summary = percentiles([0.001] * 99 + [0.1])
+    
+    assert summary["n"] == 100
+    assert summary["p50_ms"] == pytest.approx(1.0)
+    assert summary["max_ms"] == pytest.approx(100.0)
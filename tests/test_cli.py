@@ -6,6 +6,7 @@ import os
 import pytest
 import tempfile
 import json
+import re
 import time
 
 def test_cli_help(cli_runner):
@@ -95,6 +96,56 @@ def test_cli_list_prompts_by_project(cli_runner):
     assert project_name in result.stdout
     assert "cli-list-by-test" in result.stdout
 
+def test_cli_list_variables(cli_runner):
+    """Test variable usage and prompts by variable via CLI."""
+    cli_runner(
+        "cuebit create prompt --task cli-var-test --template \"Hello {customer_id}\" "
+        "--project cli-var-project"
+    )
+    
+    result = cli_runner("cuebit list variables")
+    assert result.returncode == 0
+    assert "{customer_id}" in result.stdout
+    
+    result = cli_runner("cuebit list prompts --variable customer_id")
+    assert result.returncode == 0
+    assert "cli-var-test" in result.stdout
+    
+    result = cli_runner("cuebit list prompts --variable missing")
+    assert "No prompts found" in result.stdout
+
+def test_cli_gc(cli_runner):
+    """Test retention and compaction via CLI."""
+    create = cli_runner(
+        "cuebit create prompt --task cli-gc-test --template \"v1\" --project cli-gc-project"
+    )
+    prompt_id = re.search(r"ID: (\S+)", create.stdout).group(1)
+    cli_runner(f"cuebit update {prompt_id} --template \"v2\"")
+    
+    result = cli_runner("cuebit gc --keep-last 1 --dry-run")
+    assert result.returncode == 0
+    assert "Would purge 1 superseded versions" in result.stdout
+    
+    result = cli_runner("cuebit gc --keep-last 1 --json")
+    assert result.returncode == 0
+    assert json.loads(result.stdout)["rows_deleted"]["prompts"] == 1
+
+def test_cli_archive(cli_runner):
+    """Test archiving superseded versions via CLI."""
+    create = cli_runner(
+        "cuebit create prompt --task cli-archive-test --template \"v1\" --project cli-archive-project"
+    )
+    prompt_id = re.search(r"ID: (\S+)", create.stdout).group(1)
+    cli_runner(f"cuebit update {prompt_id} --template \"v2\"")
+    
+    result = cli_runner("cuebit archive --project cli-archive-project")
+    assert result.returncode == 0
+    assert "Archived 1 versions" in result.stdout
+    
+    history = cli_runner("cuebit history cli-archive-project cli-archive-test --archived")
+    assert prompt_id in history.stdout
+    assert "v1" in history.stdout
+
 def test_cli_update_prompt(cli_runner):
     """Test updating a prompt via CLI."""
     # First create a prompt
@@ -242,6 +293,52 @@ def test_cli_export_import(cli_runner):
         assert "Import completed:" in import_result.stdout
         assert "Errors: 0" in import_result.stdout
 
+def test_cli_export_split_by_project(cli_runner):
+    """Test compressed and per-project exports via CLI."""
+    cli_runner("cuebit create prompt --task split --template \"Split {x}\" --project cli-split")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export_file = os.path.join(temp_dir, "all.ndjson.gz")
+        result = cli_runner(f"cuebit export --file {export_file}")
+        assert f"Exported to {export_file}" in result.stdout
+        
+        result = cli_runner(f"cuebit export --split-by-project {temp_dir}/split --workers 2")
+        assert result.returncode == 0
+        assert "cli-split.ndjson.gz" in result.stdout
+        assert os.path.exists(os.path.join(temp_dir, "split", "manifest.json"))
+        
+        for source in (export_file, os.path.join(temp_dir, "split")):
+            import_result = cli_runner(f"cuebit import {source}")
+            assert "Import completed:" in import_result.stdout
+            assert "Errors: 0" in import_result.stdout
+        
+        delta_file = os.path.join(temp_dir, "delta.json.gz")
+        result = cli_runner(f"cuebit export --since 1h --file {delta_file}")
+        assert "Exported changes to" in result.stdout
+        import_result = cli_runner(f"cuebit import {delta_file}")
+        assert "Updated: 0" in import_result.stdout
+        assert "Errors: 0" in import_result.stdout
+
+def test_cli_backup_restore(cli_runner):
+    """Test backing up and restoring the database via CLI."""
+    cli_runner("cuebit create prompt --task kept --template \"Kept {x}\" --project cli-backup")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        backup_file = os.path.join(temp_dir, "prompts.db.gz")
+        result = cli_runner(f"cuebit backup {backup_file} --pages-per-step 1")
+        assert result.returncode == 0
+        assert "Wrote compressed backup" in result.stdout
+        
+        cli_runner("cuebit create prompt --task dropped --template \"Dropped {x}\" --project cli-backup")
+        result = cli_runner(f"cuebit restore {backup_file}")
+        assert "Restored 1 prompts" in result.stdout
+        
+        list_result = cli_runner("cuebit list prompts --project cli-backup")
+        assert "kept" in list_result.stdout
+        assert "dropped" not in list_result.stdout
+        
+        assert "Restore error" in cli_runner(f"cuebit restore {temp_dir}/missing.db").stdout
+
 def test_cli_stats(cli_runner):
     """Test getting registry statistics via CLI."""
     # First create a prompt
@@ -286,4 +383,53 @@ def test_cli_delete_restore(cli_runner):
     list_result = cli_runner("cuebit list prompts")
     lines = list_result.stdout.split("\n")
     id_lines = [line for line in lines if f"ID: {prompt_id}" in line]
-    assert len(id_lines) == 0
\ No newline at end of file
+    assert len(id_lines) == 0
+
+def test_cli_dedupe(cli_runner):
+    """Test finding near-duplicates via CLI."""
+    for project in ("dedupe-a", "dedupe-b"):
+        cli_runner(
+            "cuebit create prompt --task copy "
+            "--template \"Classify the sentiment of this review as positive or negative: {review}\" "
+            f"--project {project}"
+        )
+    
+    result = cli_runner("cuebit dedupe --threshold 0.9")
+    
+    assert result.returncode == 0
+    assert "near-duplicate pairs" in result.stdout
+    assert "dedupe-a/copy" in result.stdout
+    assert "dedupe-b/copy" in result.stdout
+
+def test_cli_bench(cli_runner):
+    """Test running a small benchmark via CLI."""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_file = os.path.join(temp_dir, "bench.json")
+        result = cli_runner(f"cuebit bench --sizes 100 --repeat 2 --projects 2 --output {output_file}")
+        
+        assert result.returncode == 0
+        with open(output_file) as f:
+            report = json.load(f)
+        assert report["results"][0]["versions"] == 100
+        assert "p99_ms" in report["results"][0]["operations"]["alias_resolve"]
+
+def test_cli_diagnose_slow_queries(cli_runner):
+    """Test summarizing the slow query log via CLI."""
+    slow = {"CUEBIT_SLOW_QUERY_MS": "0"}
+    cli_runner(
+        "cuebit create prompt --task slow --template \"Hello {name}\" --tags prod",
+        env=slow
+    )
+    cli_runner("cuebit list prompts", env=slow)
+    
+    result = cli_runner("cuebit diagnose slow-queries --limit 50")
+    
+    assert result.returncode == 0
+    assert "Slow query log" in result.stdout
+    assert "Plan:" in result.stdout
+    assert "FROM prompts" in result.stdout
+    
+    raw = cli_runner("cuebit diagnose slow-queries --raw --json --limit 1")
+    entries = json.loads(raw.stdout)
+    assert len(entries) == 1
+    assert "parameters" in entries[0]
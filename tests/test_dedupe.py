@@ -0,0 +1,52 @@
+"""
+Tests for near-duplicate detection.
+"""
+
+import numpy as np
+import pytest
+
+from cuebit import dedupe
+
+def test_minhash_signature_similarity():
+    """Test that signatures estimate Jaccard similarity."""
+    base = "Summarize the following customer support transcript in three bullet points: {input}"
+    near = "Summarize the following customer support transcript in four bullet points: {input}"
+    other = "Translate this marketing copy from English to French while keeping the tone"
+    
+    sig_base = dedupe.minhash_signature(base)
+    sig_near = dedupe.minhash_signature(near)
+    sig_other = dedupe.minhash_signature(other)
+    
+    assert sig_base.dtype == np.uint32
+    assert len(sig_base) == dedupe.NUM_PERM
+    assert np.array_equal(sig_base, dedupe.minhash_signature(base))
+    assert (sig_base == sig_near).mean() > (sig_base == sig_other).mean()
+    assert not dedupe.is_empty_signature(sig_base)
+    assert dedupe.is_empty_signature(dedupe.minhash_signature("... !?"))
+    
+    # Round trip through storage
+    restored = dedupe.signature_from_bytes(dedupe.signature_to_bytes(sig_base))
+    assert np.array_equal(restored, sig_base)
+
+def test_find_duplicate_pairs():
+    """Test LSH candidate generation and verification."""
+    texts = [
+        "You are a helpful assistant. Answer the question about {topic} briefly.",
+        "You are a helpful assistant. Answer the question about {topic} briefly!",
+        "Write a haiku about autumn leaves falling in the quiet park at dusk",
+    ]
+    matrix = np.vstack([dedupe.minhash_signature(t) for t in texts])
+    
+    pairs = dedupe.find_duplicate_pairs(matrix, threshold=0.8)
+    
+    assert [(i, j) for i, j, _ in pairs] == [(0, 1)]
+    assert pairs[0][2] == pytest.approx(1.0)
+
+def test_lsh_params():
+    """Test that band parameters fit in the signature."""
+    for threshold in (0.5, 0.8, 0.95):
+        bands, rows = dedupe.lsh_params(threshold)
+        assert bands * rows <= dedupe.NUM_PERM
+    
+    # Higher thresholds need more rows per band
+    assert dedupe.lsh_params(0.95)[1] > dedupe.lsh_params(0.5)[1]
@@ -0,0 +1,107 @@
+"""
+Tests for the Prometheus metrics module.
+"""
+
+import pytest
+
+from cuebit import metrics
+from cuebit.metrics import MetricsRegistry
+
+def test_render_text_format():
+    """Test counters, gauges and histograms in the text format."""
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests.", ("route",))
+    in_flight = registry.gauge("test_in_flight", "In flight.")
+    latency = registry.histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    in_flight.inc()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+    
+    text = registry.render()
+    
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{route="/a"} 3' in text
+    assert "test_in_flight 1" in text
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_latency_seconds_count 3" in text
+    
+    with pytest.raises(ValueError):
+        requests.inc(wrong="label")
+
+def test_instrument_registry(sample_registry):
+    """Test pool, statement and row metrics for an instrumented registry."""
+    metrics.instrument_registry(sample_registry)
+    checkouts = metrics.DB_CHECKOUTS.get()
+    rows_before = metrics.DB_QUERY_ROWS.count(table="prompts")
+    
+    prompts, total = sample_registry.list_prompts()
+    
+    assert total == len(prompts)
+    assert metrics.DB_CHECKOUTS.get() > checkouts
+    assert metrics.DB_QUERY_ROWS.count(table="prompts") > rows_before
+    assert "cuebit_db_statement_duration_seconds_bucket" in metrics.METRICS.render()
+
+def test_pool_gauge_sums_engines(tmp_path):
+    """Test the pool gauge covers every instrumented engine, not just the last."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+    
+    before = metrics.DB_POOL_CONNECTIONS.callback().get(("size",), 0.0)
+    engines = [
+        create_engine(f"sqlite:///{tmp_path / f'{n}.db'}", poolclass=QueuePool, pool_size=size)
+        for n, size in ((1, 3), (2, 4))
+    ]
+    for engine in engines:
+        metrics.instrument_engine(engine)
+        
+    assert metrics.DB_POOL_CONNECTIONS.callback()[("size",)] == before + 7
+    
+    with engines[0].connect():
+        assert metrics.DB_POOL_CONNECTIONS.callback()[("checked_out",)] >= 1
+    for engine in engines:
+        engine.dispose()
+
+def test_failed_statement_is_timed(tmp_path):
+    """Test a failing statement is observed and leaves no start time behind."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import OperationalError
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'errors.db'}")
+    metrics.instrument_engine(engine)
+    before = metrics.DB_QUERY_LATENCY.count(statement="SELECT")
+
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("SELECT * FROM missing_table")
+        assert not conn.info.get("cuebit_statement_start")
+    assert metrics.DB_QUERY_LATENCY.count(statement="SELECT") == before + 1
+    engine.dispose()
+
+def test_checkout_wait_survives_dispose(tmp_path):
+    """Test checkout waits are still timed after the engine's pool is replaced."""
+    from sqlalchemy import create_engine
+    
+    engine = create_engine(f"sqlite:///{tmp_path / 'dispose.db'}")
+    metrics.instrument_engine(engine)
+    engine.dispose()
+    engine.dispose()
+    
+    before = metrics.DB_CHECKOUT_WAIT.count()
+    with engine.connect():
+        pass
+    assert metrics.DB_CHECKOUT_WAIT.count() == before + 1
+    engine.dispose()
+
+def test_cache_hit_ratio():
+    """Test hit ratios derived from cache lookups."""
+    metrics.CACHE_REQUESTS.clear()
+    metrics.record_cache("test_cache", True, 3)
+    metrics.record_cache("test_cache", False)
+    
+    assert 'cuebit_cache_hit_ratio{cache="test_cache"} 0.75' in metrics.METRICS.render()
@@ -0,0 +1,98 @@
+"""
+Tests for the PostgreSQL schema variant.
+
+Tests that need a server run against the database in
+CUEBIT_TEST_POSTGRES_URL (e.g. postgresql://postgres@localhost/cuebit_test)
+and are skipped when it is not set. The database is emptied afterwards.
+"""
+
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateTable
+
+from cuebit.registry import Base, PromptORM, PromptRegistry
+
+POSTGRES_URL = os.environ.get("CUEBIT_TEST_POSTGRES_URL")
+
+
+def test_meta_column_is_jsonb_on_postgres_only():
+    """Test the prompts table uses JSONB meta on PostgreSQL and JSON elsewhere."""
+    pg_ddl = str(CreateTable(PromptORM.__table__).compile(dialect=postgresql.dialect()))
+    sqlite_ddl = str(CreateTable(PromptORM.__table__).compile(dialect=sqlite.dialect()))
+    assert "meta JSONB" in pg_ddl
+    assert "meta JSON," in sqlite_ddl
+
+
+@pytest.fixture(scope="function")
+def pg_registry():
+    """Create a registry on a throwaway PostgreSQL database."""
+    if not POSTGRES_URL:
+        pytest.skip("CUEBIT_TEST_POSTGRES_URL is not set")
+    pytest.importorskip("psycopg2")
+    registry = PromptRegistry(POSTGRES_URL)
+    yield registry
+    Base.metadata.drop_all(registry.engine)
+    registry.engine.dispose()
+
+
+def _plan(registry, query) -> str:
+    """Return the plan PostgreSQL picks for a query when scans are discouraged."""
+    statement = query.statement.compile(registry.engine, compile_kwargs={"literal_binds": True})
+    with registry.engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        rows = conn.execute(text(f"EXPLAIN {statement}")).fetchall()
+    return "\n".join(row[0] for row in rows)
+
+
+def test_postgres_indexes_created(pg_registry):
+    """Test the GIN and trigram indexes exist."""
+    with pg_registry.engine.connect() as conn:
+        names = {row[0] for row in conn.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = 'prompts'")
+        )}
+    assert {"ix_prompts_tags_gin", "ix_prompts_meta_gin"} <= names
+
+
+def test_postgres_tag_filters(pg_registry):
+    """Test tag filter modes with JSONB containment."""
+    a = pg_registry.register_prompt("t1", "Alpha {x}", tags=["prod", "gpt"], project="p")
+    b = pg_registry.register_prompt("t2", "Beta {x}", tags=["prod"], project="p")
+    pg_registry.register_prompt("t3", "Gamma {x}", tags=["dev"], project="p")
+    pg_registry.register_prompt("t4", "Delta {x}", project="p")
+
+    prompts, total = pg_registry.list_prompts(tag_filter=["prod", "gpt"])
+    assert [p.prompt_id for p in prompts] == [a.prompt_id]
+
+    prompts, total = pg_registry.list_prompts(tag_filter=["gpt", "dev"], tag_mode="any")
+    assert total == 2
+
+    prompts, total = pg_registry.list_prompts(exclude_tags=["gpt", "dev"])
+    assert {p.task for p in prompts} == {"t2", "t4"}
+
+    pg_registry.bulk_tag_prompts([b.prompt_id], ["gpt"])
+    assert pg_registry.list_prompts(tag_filter=["prod", "gpt"])[1] == 2
+
+
+def test_postgres_search_uses_indexes(pg_registry):
+    """Test tag filters and substring search can use the GIN indexes."""
+    pg_registry.register_prompt("summarize", "Summarize {input}", tags=["prod"], project="blog")
+    results, total = pg_registry.search_prompts("mmari", tags=["prod"])
+    assert total == 1
+
+    session = pg_registry.Session()
+    try:
+        query = pg_registry._filter_by_tags(session.query(PromptORM), ["prod"])
+        assert "ix_prompts_tags_gin" in _plan(pg_registry, query)
+
+        with pg_registry.engine.connect() as conn:
+            has_trgm = conn.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first()
+        if has_trgm:
+            query = session.query(PromptORM).filter(PromptORM.template.ilike("%mmari%"))
+            assert "ix_prompts_template_trgm" in _plan(pg_registry, query)
+    finally:
+        session.close()
@@ -16,6 +16,17 @@ def test_registry_initialization(temp_db_path):
     db_path = temp_db_path.replace("sqlite:///", "")
     assert os.path.exists(db_path)
 
+def test_fresh_file_database_keeps_schema(tmp_path):
+    """Test the schema created for a new database file is committed."""
+    db_url = f"sqlite:///{tmp_path / 'fresh.db'}"
+    registry = PromptRegistry(db_url=db_url)
+    registry.register_prompt(task="greeting", template="Hello {name}", project="fresh")
+
+    reopened = PromptRegistry(db_url=db_url)
+    assert reopened.list_projects() == ["fresh"]
+    with reopened.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+
 def test_env_variable_db_path(monkeypatch):
     """Test registry respects environment variable for DB path."""
     test_path = "sqlite:///test_env_db.db"
@@ -302,6 +313,180 @@ def test_export_import(sample_registry):
     os.unlink(debug_file)
     os.rmdir(temp_dir)
     
+def test_export_import_compressed_files(sample_registry, tmp_path):
+    """Test streaming .ndjson.gz/.json.gz round trips and split exports with a manifest."""
+    import gzip
+    import json
+    from cuebit.registry import PromptRegistry
+    
+    sample_registry.register_prompt(task="loose", template="No project {x}", meta={})
+    expected = {(p["project"], p["task"], p["version"]) for p in json.loads(sample_registry.export_prompts())}
+    
+    for name in ("all.ndjson.gz", "all.json.gz"):
+        result = sample_registry.export_to_file(str(tmp_path / name))
+        assert result["compressed"] and result["prompts"] == len(expected)
+        with gzip.open(tmp_path / name, "rt") as f:
+            assert f.read(1) in "{["
+        
+        target = PromptRegistry(f"sqlite:///{tmp_path / (name + '.db')}")
+        stats = target.import_from_file(str(tmp_path / name), batch_size=2)
+        assert stats["imported"] == len(expected) and stats["errors"] == 0
+        assert {(p["project"], p["task"], p["version"]) for p in json.loads(target.export_prompts())} == expected
+        assert target.import_from_file(str(tmp_path / name))["skipped"] == len(expected)
+    
+    manifest = sample_registry.export_by_project(str(tmp_path / "split"), max_workers=2)
+    assert manifest["total_prompts"] == len(expected)
+    assert {entry["project"] for entry in manifest["files"]} == {"test-project", "translation-project", None}
+    assert all(len(entry["sha256"]) == 64 for entry in manifest["files"])
+    
+    target = PromptRegistry(f"sqlite:///{tmp_path / 'split.db'}")
+    assert target.import_from_file(str(tmp_path / "split" / "manifest.json"))["imported"] == len(expected)
+    assert "error" in target.import_from_file(str(tmp_path / "missing.ndjson"))
+    
+def test_yaml_stream_round_trip(sample_registry, tmp_path):
+    """Test multi-document YAML exports match the YAML list export and import back."""
+    import json
+    from cuebit import exchange
+    from cuebit.registry import PromptRegistry
+    
+    records = json.loads(sample_registry.export_prompts())
+    stream = sample_registry.export_prompts(format="yaml-stream")
+    assert stream.count("---\n") == len(records)
+    assert list(exchange.yaml_load_all(stream)) == exchange.yaml_load(sample_registry.export_prompts(format="yaml"))
+    
+    path = str(tmp_path / "all.yamls.gz")
+    assert sample_registry.export_to_file(path)["format"] == "yaml-stream"
+    target = PromptRegistry(f"sqlite:///{tmp_path / 'target.db'}")
+    assert target.import_from_file(path, batch_size=1)["imported"] == len(records)
+    assert target.import_prompts(stream, format="yaml-stream")["skipped"] == len(records)
+    assert "error" in target.import_prompts("- [unclosed", format="yaml-stream")
+    
+def test_incremental_export_applies_idempotently(empty_registry, tmp_path):
+    """Test deltas carry changes, alias moves and tombstones and re-apply as no-ops."""
+    import time
+    from cuebit.registry import PromptRegistry
+    
+    replica = PromptRegistry(f"sqlite:///{tmp_path / 'replica.db'}")
+    first = empty_registry.register_prompt(task="t", template="One {x}", meta={}, project="p", tags=["a"])
+    empty_registry.add_alias(first.prompt_id, "prod")
+    doomed = empty_registry.register_prompt(task="u", template="Two {x}", meta={}, project="p")
+    
+    full = empty_registry.export_changes()
+    assert full["since"] is None and len(full["prompts"]) == 2
+    assert replica.apply_changes(full)["imported"] == 2
+    
+    time.sleep(0.01)
+    second = empty_registry.update_prompt(first.prompt_id, new_template="One v2 {x}")
+    empty_registry.add_alias(second.prompt_id, "prod")
+    empty_registry.soft_delete_prompt(doomed.prompt_id, deleted_by="ops")
+    empty_registry.add_example(first.prompt_id, "in", "out")
+    
+    delta = empty_registry.export_changes(since=full["until"])
+    assert {r["prompt_id"] for r in delta["prompts"]} == {first.prompt_id, second.prompt_id}
+    assert [t["prompt_id"] for t in delta["tombstones"]] == [doomed.prompt_id]
+    assert delta["tombstones"][0]["deleted_by"] == "ops"
+    
+    exported = empty_registry.export_prompts(since=full["until"], format="yaml")
+    stats = replica.import_prompts(exported, format="yaml")
+    assert (stats["imported"], stats["updated"], stats["deleted"]) == (1, 1, 1)
+    again = replica.import_prompts(exported, format="yaml")
+    assert again["skipped"] == 3 and again["imported"] == again["updated"] == again["deleted"] == 0
+    
+    assert replica.get_prompt_by_alias("prod").prompt_id == second.prompt_id
+    assert replica.get_prompt(first.prompt_id).alias is None
+    assert replica.get_prompt(doomed.prompt_id) is None
+    assert [ex["input"] for ex in replica.get_examples(first.prompt_id)] == ["in"]
+    assert replica.get_prompt(second.prompt_id).version == 2
+    
+    assert empty_registry.export_changes(since=delta["until"])["prompts"] == []
+    overlap = empty_registry.export_changes(since=delta["next_since"], until=delta["until"])
+    assert {p["prompt_id"] for p in overlap["prompts"]} == {p["prompt_id"] for p in delta["prompts"]}
+    assert replica.apply_changes(overlap)["skipped"] == len(overlap["prompts"]) + len(overlap["tombstones"])
+    with pytest.raises(ValueError):
+        empty_registry.export_prompts(since="yesterday")
+    
+def test_changes_apply_to_versions_archived_on_the_replica(empty_registry, tmp_path):
+    """Test deltas update versions the replica has archived instead of copying them back."""
+    import time
+    from cuebit.registry import PromptRegistry
+    
+    replica = PromptRegistry(f"sqlite:///{tmp_path / 'replica.db'}")
+    v1 = empty_registry.register_prompt(task="t", template="One {x}", meta={}, project="p", tags=["a"])
+    empty_registry.update_prompt(v1.prompt_id, new_template="Two {x}")
+    full = empty_registry.export_changes()
+    replica.apply_changes(full)
+    assert replica.archive_versions(keep_last=1)["archived"] == 1
+    
+    time.sleep(0.01)
+    empty_registry.bulk_tag_prompts([v1.prompt_id], ["b"])
+    delta = empty_registry.export_changes(since=full["next_since"])
+    stats = replica.apply_changes(delta)
+    assert stats["imported"] == 0 and stats["updated"] == 1
+    
+    history = replica.get_version_history("p", "t", include_archived=True)
+    assert sorted(p.version for p in history) == [1, 2]
+    archived = replica.get_prompt(v1.prompt_id)
+    assert json.loads(archived.tags) == ["a", "b"]
+    assert [p.version for p in replica.get_version_history("p", "t")] == [2]
+    assert replica.apply_changes(delta)["skipped"] == len(delta["prompts"])
+
+def test_import_conflict_strategies(empty_registry):
+    """Test skip, overwrite, overwrite-if-newer and fail imports of existing prompts."""
+    import json
+    
+    prompt = empty_registry.register_prompt(task="t", template="Old {x}", meta={}, project="p", tags=["old"])
+    empty_registry.add_example(prompt.prompt_id, "in", "out")
+    record = json.loads(empty_registry.export_prompts())[0]
+    newer = dict(record, template="New {x}", tags=["new"], examples=[],
+                 updated_at="2999-01-01T00:00:00")
+    older = dict(record, template="Stale {x}", updated_at="2000-01-01T00:00:00")
+    fresh = dict(record, prompt_id="fresh", version=2, template="Fresh {x}", alias=None)
+    
+    stats = empty_registry.import_prompts(json.dumps([newer, fresh]))
+    assert (stats["imported"], stats["skipped"]) == (1, 1)
+    assert empty_registry.get_prompt(prompt.prompt_id).template == "Old {x}"
+    
+    stats = empty_registry.import_prompts(json.dumps([older]), on_conflict="overwrite-if-newer")
+    assert (stats["updated"], stats["skipped"]) == (0, 1)
+    
+    stats = empty_registry.import_prompts(json.dumps([newer]), on_conflict="overwrite-if-newer")
+    assert stats["updated"] == 1
+    updated = empty_registry.get_prompt(prompt.prompt_id)
+    assert (updated.template, json.loads(updated.tags)) == ("New {x}", ["new"])
+    assert empty_registry.get_examples(prompt.prompt_id) == []
+    
+    assert empty_registry.similar_prompts("New", k=1)[0]["prompt_id"] == prompt.prompt_id
+    
+    stats = empty_registry.import_prompts(json.dumps([older]), on_conflict="overwrite")
+    assert stats["updated"] == 1
+    assert empty_registry.get_prompt(prompt.prompt_id).template == "Stale {x}"
+    assert empty_registry.similar_prompts("Stale", k=1)[0]["prompt_id"] == prompt.prompt_id
+    
+    stats = empty_registry.import_prompts(json.dumps([newer, dict(fresh, prompt_id="other", version=3)]),
+                                          on_conflict="fail")
+    assert prompt.prompt_id in stats["error"]
+    assert empty_registry.get_prompt("other") is None
+    
+    with pytest.raises(ValueError):
+        empty_registry.import_prompts("[]", on_conflict="merge")
+    
+def test_import_reports_duplicate_versions_in_batch(empty_registry):
+    """Test records sharing a version in one batch fail one by one, not as a batch."""
+    import json
+    
+    records = [
+        {"prompt_id": "first", "project": "p", "task": "t", "version": 1, "template": "A {x}"},
+        {"prompt_id": "second", "project": "p", "task": "t", "version": 1, "template": "B {x}"},
+        {"prompt_id": "other", "project": "p", "task": "u", "version": 1, "template": "C {x}"},
+    ]
+    stats = empty_registry.import_prompts(json.dumps(records))
+    
+    assert (stats["imported"], stats["errors"]) == (2, 1)
+    assert "second" in stats["error_details"][0]
+    assert empty_registry.get_prompt("first").template == "A {x}"
+    assert empty_registry.get_prompt("other") is not None
+    assert empty_registry.get_prompt("second") is None
+    
 def test_soft_delete_restore(sample_registry):
     """Test soft deleting and restoring prompts."""
     # Get a prompt
@@ -374,6 +559,30 @@ def test_examples(sample_registry):
     # Verify the new example is in the list
     assert any(ex["input"] == "Example input text" for ex in updated_examples)
 
+def test_examples_batch_and_pages(empty_registry):
+    """Test batched example retrieval, counts and cursor paging."""
+    a = empty_registry.register_prompt(
+        task="a", template="A", meta={}, project="p",
+        examples=[{"input": f"in {n}", "output": f"out {n}"} for n in range(5)]
+    )
+    b = empty_registry.register_prompt(task="b", template="B", meta={}, project="p")
+    
+    batch = empty_registry.get_examples_for_many([a.prompt_id, b.prompt_id, "missing"])
+    assert [ex["input"] for ex in batch[a.prompt_id]] == [f"in {n}" for n in range(5)]
+    assert batch[b.prompt_id] == [] and batch["missing"] == []
+    assert empty_registry.get_examples(a.prompt_id) == batch[a.prompt_id]
+    
+    assert empty_registry.get_example_counts([a.prompt_id, b.prompt_id]) == {a.prompt_id: 5, b.prompt_id: 0}
+    
+    seen, cursor = [], None
+    while True:
+        page, cursor = empty_registry.get_examples_page(a.prompt_id, limit=2, after_id=cursor)
+        seen.extend(ex["input"] for ex in page)
+        if cursor is None:
+            break
+    assert seen == [f"in {n}" for n in range(5)]
+    assert empty_registry.get_examples_page(b.prompt_id) == ([], None)
+
 def test_render_prompt(sample_registry):
     """Test rendering a prompt with variables."""
     # Get the summarization prompt
@@ -387,4 +596,734 @@ def test_render_prompt(sample_registry):
     
     # Verify rendering
     assert rendered is not None
-    assert "This is a test input" in rendered
\ No newline at end of file
+    assert "This is a test input" in rendered
+
+def test_find_near_duplicates(sample_registry):
+    """Test finding near-duplicate templates across projects."""
+    copied = sample_registry.register_prompt(
+        task="summaries",
+        template="Provide a concise summary: {input}",
+        meta={},
+        project="copied-project"
+    )
+    
+    pairs = sample_registry.find_near_duplicates(threshold=0.8)
+    
+    pair_ids = {frozenset((p["first"]["prompt_id"], p["second"]["prompt_id"])) for p in pairs}
+    latest = sample_registry.get_version_history("test-project", "summarization")[-1]
+    assert frozenset((latest.prompt_id, copied.prompt_id)) in pair_ids
+    
+    # Versions of the same task are skipped unless requested
+    assert all(
+        (p["first"]["project"], p["first"]["task"]) != (p["second"]["project"], p["second"]["task"])
+        for p in pairs
+    )
+    
+    # Templates with no words share a signature but are not duplicates
+    for n, template in enumerate(("...", "!?", "--")):
+        sample_registry.register_prompt(task=f"blank{n}", template=template, meta={}, project="blank")
+    assert sample_registry.find_near_duplicates(threshold=0.8, project="blank") == []
+    
+    with pytest.raises(ValueError):
+        sample_registry.find_near_duplicates(threshold=0)
+
+def test_similar_prompts(sample_registry):
+    """Test finding prompts similar to a draft template."""
+    matches = sample_registry.similar_prompts("Translate from English to French: {text}", k=2)
+    
+    assert len(matches) > 0
+    assert matches[0]["task"] == "translation"
+    assert matches[0]["score"] > 0
+    
+    # Newly registered prompts are picked up incrementally
+    new_prompt = sample_registry.register_prompt(
+        task="haiku",
+        template="Write a haiku about {season} mornings",
+        meta={},
+        project="poetry"
+    )
+    matches = sample_registry.similar_prompts("haiku about winter mornings", k=1)
+    assert matches[0]["prompt_id"] == new_prompt.prompt_id
+    
+    # Deleted prompts are excluded and project filtering applies
+    sample_registry.soft_delete_prompt(new_prompt.prompt_id)
+    matches = sample_registry.similar_prompts("haiku about winter mornings", k=5, project="poetry")
+    assert matches == []
+
+def test_similar_prompts_after_hard_delete(tmp_path):
+    """Test prompts on a reused row id are indexed, also after a reload."""
+    from cuebit.registry import PromptRegistry
+    
+    db_url = f"sqlite:///{tmp_path / 'similar.db'}"
+    registry = PromptRegistry(db_url)
+    for task in ("a", "b", "c"):
+        last = registry.register_prompt(task=task, template=f"Describe the {task} option", meta={})
+    registry.similar_prompts("describe", k=1)
+    registry.delete_prompt_by_id(last.prompt_id)
+    
+    reused = registry.register_prompt(task="d", template="Compose a limerick about {city}", meta={})
+    assert [m["prompt_id"] for m in registry.similar_prompts("limerick about Paris", k=1)] == [reused.prompt_id]
+    assert [m["prompt_id"] for m in PromptRegistry(db_url).similar_prompts("limerick", k=1)] == [reused.prompt_id]
+
+def test_tag_filter_modes(empty_registry):
+    """Test ALL/ANY tag matching and excluded tags."""
+    both = empty_registry.register_prompt(task="a", template="A", meta={}, tags=["prod", "gpt-4"])
+    prod = empty_registry.register_prompt(task="b", template="B", meta={}, tags=["prod"])
+    empty_registry.register_prompt(task="c", template="C", meta={}, tags=["production", "gpt-4o"])
+    
+    def ids(**kwargs):
+        prompts, total = empty_registry.list_prompts(**kwargs)
+        assert total == len(prompts)
+        return {p.prompt_id for p in prompts}
+    
+    # Exact tag matches only, not substrings of other tags
+    assert ids(tag_filter=["prod"]) == {both.prompt_id, prod.prompt_id}
+    assert ids(tag_filter=["prod", "gpt-4"]) == {both.prompt_id}
+    assert ids(tag_filter=["gpt-4", "production"], tag_mode="any") == \
+        ids(include_deleted=True) - {prod.prompt_id}
+    assert ids(tag_filter=["prod"], exclude_tags=["gpt-4"]) == {prod.prompt_id}
+    
+    results, total = empty_registry.search_prompts("", tags=["prod"], exclude_tags=["gpt-4"])
+    assert [p.prompt_id for p in results] == [prod.prompt_id]
+    
+    with pytest.raises(ValueError):
+        empty_registry.list_prompts(tag_filter=["prod"], tag_mode="some")
+
+def test_bulk_tag_refreshes_tag_cache(sample_registry):
+    """Test that bulk tagging keeps the JSON tags column in sync."""
+    prompt = sample_registry.get_prompt_by_alias("test-summarizer")
+    
+    assert sample_registry.bulk_tag_prompts([prompt.prompt_id], ["reviewed", "test"], "add") == 1
+    assert json.loads(sample_registry.get_prompt(prompt.prompt_id).tags) == \
+        ["test", "summarization", "reviewed"]
+    
+    sample_registry.bulk_tag_prompts([prompt.prompt_id], ["test"], "remove")
+    assert json.loads(sample_registry.get_prompt(prompt.prompt_id).tags) == \
+        ["summarization", "reviewed"]
+    
+    sample_registry.bulk_tag_prompts([prompt.prompt_id], ["final"], "set")
+    assert json.loads(sample_registry.get_prompt(prompt.prompt_id).tags) == ["final"]
+    prompts, _ = sample_registry.list_prompts(tag_filter=["final"])
+    assert [p.prompt_id for p in prompts] == [prompt.prompt_id]
+    
+    with pytest.raises(ValueError):
+        sample_registry.bulk_tag_prompts([prompt.prompt_id], ["x"], "toggle")
+
+def test_upgrade_rebuilds_prompt_tags(temp_db_path):
+    """Test that older registries get indexed prompt_tags rebuilt from JSON."""
+    from sqlalchemy import create_engine, text
+    
+    registry = PromptRegistry(db_url=temp_db_path)
+    prompt = registry.register_prompt(task="legacy", template="T", meta={}, tags=["old"])
+    
+    # Simulate an older schema: no indexes and duplicate tag rows
+    engine = create_engine(temp_db_path)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ux_prompt_tags_prompt_tag"))
+        conn.execute(text("DROP INDEX ix_prompt_tags_tag_prompt"))
+        conn.execute(text("INSERT INTO prompt_tags (prompt_id, tag_name) VALUES (:p, 'old')"),
+                     {"p": prompt.prompt_id})
+    
+    upgraded = PromptRegistry(db_url=temp_db_path)
+    prompts, total = upgraded.list_prompts(tag_filter=["old"])
+    assert total == 1
+    with engine.connect() as conn:
+        count = conn.execute(text("SELECT COUNT(*) FROM prompt_tags")).scalar()
+    assert count == 1
+
+def test_bulk_tag_by_filter(sample_registry):
+    """Test selecting prompts for bulk tagging by project, task and tags."""
+    modified = sample_registry.bulk_tag_prompts(
+        None, ["release"], project="test-project", tag_filter=["test"]
+    )
+    prompts, total = sample_registry.list_prompts(tag_filter=["release"])
+    assert modified == total > 0
+    assert all(p.project == "test-project" for p in prompts)
+    
+    # Adding again is a no-op on the normalized rows
+    sample_registry.bulk_tag_prompts(None, ["release"], project="test-project")
+    prompts, _ = sample_registry.list_prompts(tag_filter=["release"])
+    assert all(json.loads(p.tags).count("release") == 1 for p in prompts)
+    
+    # Unknown and deleted prompts are skipped
+    assert sample_registry.bulk_tag_prompts(["missing-id"], ["x"]) == 0
+    
+    with pytest.raises(ValueError):
+        sample_registry.bulk_tag_prompts(None, ["x"])
+
+def test_concurrent_version_allocation(temp_db_path):
+    """Test that concurrent writers never share a version number."""
+    import threading
+    
+    registries = [PromptRegistry(db_url=temp_db_path) for _ in range(4)]
+    errors = []
+    
+    def writer(registry):
+        try:
+            for i in range(10):
+                registry.register_prompt(task="race", template=f"T {i}", meta={}, project="p")
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=writer, args=(r,)) for r in registries]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert errors == []
+    versions = [p.version for p in registries[0].list_prompts_by_project("p")]
+    assert sorted(versions) == list(range(1, 41))
+
+def test_version_allocation_recovers_from_stale_sequence(empty_registry):
+    """Test that versions are never reused, even after deletes or a stale sequence."""
+    from sqlalchemy import text
+    
+    first = empty_registry.register_prompt(task="seq", template="A", meta={}, project="p")
+    second = empty_registry.update_prompt(first.prompt_id, "B")
+    empty_registry.soft_delete_prompt(second.prompt_id)
+    
+    # Deleted versions keep their number
+    third = empty_registry.update_prompt(first.prompt_id, "C")
+    assert third.version == 3
+    
+    # A sequence that fell behind is caught up on conflict
+    with empty_registry.engine.begin() as conn:
+        conn.execute(text("UPDATE prompt_version_sequences SET last_version = 1"))
+    fourth = empty_registry.rollback_to_version(first.prompt_id)
+    assert fourth.version == 4
+    
+    # Imports move the sequence past imported versions
+    empty_registry.import_prompts(json.dumps([
+        {"prompt_id": "imported-1", "project": "p", "task": "seq", "template": "I", "version": 10}
+    ]))
+    assert empty_registry.update_prompt(first.prompt_id, "D").version == 11
+
+def test_upgrade_skips_version_index_with_duplicates(temp_db_path):
+    """Test that registries with duplicate versions open with a warning."""
+    from sqlalchemy import create_engine, text
+    
+    registry = PromptRegistry(db_url=temp_db_path)
+    registry.register_prompt(task="dup", template="A", meta={}, project="p")
+    
+    engine = create_engine(temp_db_path)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ux_prompts_project_task_version"))
+        conn.execute(text(
+            "INSERT INTO prompts (prompt_id, project, task, template, version, tags, is_deleted) "
+            "VALUES ('dup-2', 'p', 'dup', 'B', 1, '[]', 0)"
+        ))
+    
+    with pytest.warns(UserWarning, match="duplicate versions"):
+        upgraded = PromptRegistry(db_url=temp_db_path)
+    
+    # Allocation still moves past the duplicates
+    prompt = upgraded.register_prompt(task="dup", template="C", meta={}, project="p")
+    assert prompt.version == 2
+
+def _hold_write_lock(db_url, seconds):
+    """Hold the SQLite write lock from another connection for a while."""
+    import sqlite3
+    import threading
+    
+    conn = sqlite3.connect(db_url.replace("sqlite:///", ""), isolation_level=None, check_same_thread=False)
+    conn.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(seconds, lambda: (conn.execute("COMMIT"), conn.close()))
+    timer.start()
+    return timer
+
+def test_write_retries_while_locked(temp_db_path):
+    """Test that writes back off and retry while another writer holds the lock."""
+    from cuebit import metrics
+    
+    registry = PromptRegistry(db_url=temp_db_path, write_timeout=10, busy_timeout=0.01)
+    retries = metrics.DB_WRITE_RETRIES.get(operation="register_prompt")
+    
+    timer = _hold_write_lock(temp_db_path, 0.3)
+    prompt = registry.register_prompt(task="locked", template="T", meta={}, project="p")
+    timer.join()
+    
+    assert prompt.version == 1
+    assert metrics.DB_WRITE_RETRIES.get(operation="register_prompt") > retries
+
+def test_write_gives_up_after_deadline(temp_db_path):
+    """Test that a write raises RegistryBusyError once its deadline passes."""
+    from cuebit.registry import RegistryBusyError
+    
+    registry = PromptRegistry(db_url=temp_db_path, write_timeout=0.1, busy_timeout=0.01)
+    timer = _hold_write_lock(temp_db_path, 1.0)
+    try:
+        with pytest.raises(RegistryBusyError):
+            registry.register_prompt(task="locked", template="T", meta={}, project="p")
+        
+        # Reads are not blocked by the writer
+        assert registry.list_projects() == []
+    finally:
+        timer.join()
+
+def _seed_meta(registry):
+    """Register prompts with varied metadata."""
+    for task, meta in (
+        ("a", {"model": "gpt-4", "temperature": 0.2, "params": {"top_p": 1}}),
+        ("b", {"model": "gpt-4", "temperature": 0.7}),
+        ("c", {"model": "claude", "temperature": 0.3, "stream": True}),
+        ("d", {"model": "gpt-4", "temperature": "warm"}),
+        ("e", {}),
+    ):
+        registry.register_prompt(task=task, template="T", meta=meta, project="meta")
+
+def test_query_by_meta_indexed_and_unindexed_agree(empty_registry):
+    """Test meta filters give the same answers with and without an index."""
+    _seed_meta(empty_registry)
+    queries = [
+        ({"model": "gpt-4", "temperature__lte": 0.3}, {"a"}),
+        ({"model__in": ["claude", "llama"]}, {"c"}),
+        ({"model__ne": "gpt-4"}, {"c"}),
+        ({"temperature__gt": 0.25}, {"b", "c"}),
+        ({"params.top_p": 1}, {"a"}),
+        ({"stream": True}, {"c"}),
+    ]
+    
+    def tasks(filters):
+        prompts, total = empty_registry.query_by_meta(filters)
+        assert total == len(prompts)
+        return {p.task for p in prompts}
+    
+    for filters, expected in queries:
+        assert tasks(filters) == expected, filters
+        
+    for key in ("model", "temperature", "params.top_p", "stream"):
+        empty_registry.add_meta_index(key)
+    assert empty_registry.list_meta_indexes() == ["model", "params.top_p", "stream", "temperature"]
+    
+    for filters, expected in queries:
+        assert tasks(filters) == expected, filters
+        
+    prompts, _ = empty_registry.list_prompts(meta_filters={"model": "gpt-4"}, search_term="T")
+    assert {p.task for p in prompts} == {"a", "b", "d"}
+    
+    with pytest.raises(ValueError):
+        empty_registry.query_by_meta({"model__in": "gpt-4"})
+
+def test_meta_index_maintained_on_write(empty_registry, temp_db_path):
+    """Test new versions, rollbacks and imports keep the meta index current."""
+    from sqlalchemy import text
+    from cuebit.registry import PromptORM
+    
+    empty_registry.add_meta_index("model")
+    prompt = empty_registry.register_prompt(task="t", template="v1", meta={"model": "gpt-4"}, project="p")
+    v2 = empty_registry.update_prompt(prompt.prompt_id, "v2", meta={"model": "claude"})
+    
+    assert {p.version for p in empty_registry.query_by_meta({"model": "claude"})[0]} == {2}
+    empty_registry.rollback_to_version(prompt.prompt_id)
+    assert {p.version for p in empty_registry.query_by_meta({"model": "gpt-4"})[0]} == {1, 3}
+    
+    target = PromptRegistry(db_url=temp_db_path.replace(".db", "-import.db"))
+    target.add_meta_index("model")
+    target.import_prompts(empty_registry.export_prompts(project="p"))
+    assert target.query_by_meta({"model": "claude"})[0][0].prompt_id == v2.prompt_id
+    
+    # Declared keys are answered from the index
+    session = empty_registry.Session()
+    try:
+        query = empty_registry._filter_by_meta(
+            session, session.query(PromptORM.prompt_id), {"model": "claude"}
+        )
+        statement = query.statement.compile(empty_registry.engine, compile_kwargs={"literal_binds": True})
+        with empty_registry.engine.connect() as conn:
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {statement}")))
+    finally:
+        session.close()
+    assert "ix_prompt_meta_values_key_text" in plan
+    
+    assert empty_registry.remove_meta_index("model")
+    assert not empty_registry.remove_meta_index("model")
+    assert len(empty_registry.query_by_meta({"model": "claude"})[0]) == 1
+
+def test_find_by_variable(empty_registry):
+    """Test the variable index follows new versions, rollbacks and deletes."""
+    v1 = empty_registry.register_prompt(task="t", template="Hi {customer_id} {name}", meta={}, project="p")
+    empty_registry.update_prompt(v1.prompt_id, "Hi {name}")
+    empty_registry.register_prompt(task="u", template="Order {order_id} of {customer_id}", meta={}, project="q")
+    
+    assert [(p.task, p.version) for p in empty_registry.find_by_variable("customer_id")] == [("t", 1), ("u", 1)]
+    assert [p.task for p in empty_registry.find_by_variable("customer_id", project="q")] == ["u"]
+    
+    rollback = empty_registry.rollback_to_version(v1.prompt_id)
+    assert rollback.prompt_id in {p.prompt_id for p in empty_registry.find_by_variable("customer_id")}
+    
+    empty_registry.soft_delete_prompt(v1.prompt_id)
+    assert v1.prompt_id not in {p.prompt_id for p in empty_registry.find_by_variable("customer_id")}
+    
+    usage = {row["variable"]: row for row in empty_registry.get_variable_usage()}
+    assert usage["name"] == {"variable": "name", "prompts": 2, "tasks": 1}
+    assert usage["customer_id"]["prompts"] == 2
+    assert empty_registry.get_variable_usage(limit=1)[0]["variable"] in ("name", "customer_id")
+
+def test_upgrade_builds_variable_index(temp_db_path):
+    """Test registries created before the variable index are backfilled once."""
+    from sqlalchemy import create_engine, text
+    
+    registry = PromptRegistry(db_url=temp_db_path)
+    registry.register_prompt(task="t", template="Hi {customer_id}", meta={}, project="p")
+    
+    engine = create_engine(temp_db_path)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE prompt_variables"))
+    
+    upgraded = PromptRegistry(db_url=temp_db_path)
+    assert [p.task for p in upgraded.find_by_variable("customer_id")] == ["t"]
+
+def test_gc_keeps_last_versions_and_aliases(empty_registry):
+    """Test keep-last retention purges old versions with their child rows."""
+    from sqlalchemy import text
+    
+    v1 = empty_registry.register_prompt(
+        task="t", template="v1 {x}", meta={}, tags=["a"], project="p",
+        examples=[{"input": "i", "output": "o"}]
+    )
+    latest = v1
+    for n in range(2, 6):
+        latest = empty_registry.update_prompt(latest.prompt_id, f"v{n} {{x}}", tags=["a"])
+    empty_registry.add_alias(v1.prompt_id, "pinned")
+    other = empty_registry.register_prompt(task="u", template="only", meta={}, project="p")
+    
+    dry = empty_registry.gc(keep_last=2, dry_run=True)
+    assert dry["superseded_versions"] == 2
+    assert len(empty_registry.get_version_history("p", "t")) == 5
+    
+    result = empty_registry.gc(keep_last=2, batch_size=1)
+    assert result["rows_deleted"]["prompts"] == 2
+    assert result["rows_deleted"]["prompt_tags"] == 2
+    assert result["vacuum"]["full_vacuum"] in (True, False)
+    
+    versions = [p.version for p in empty_registry.get_version_history("p", "t")]
+    assert versions == [1, 4, 5]
+    assert empty_registry.get_prompt(other.prompt_id) is not None
+    assert len(empty_registry.get_examples(v1.prompt_id)) == 1
+    
+    # Lineage skips over purged versions
+    v4 = empty_registry.get_version_history("p", "t")[1]
+    assert v4.version == 4
+    assert v4.parent_id == v1.prompt_id
+    
+    # Purged version numbers are not reused
+    assert empty_registry.update_prompt(latest.prompt_id, "v6 {x}").version == 6
+    
+    with empty_registry.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM prompt_signatures")).scalar() == 5
+
+def test_gc_purges_expired_soft_deletes_and_orphans(empty_registry):
+    """Test soft-deleted prompts are purged after the grace period."""
+    from datetime import datetime, timedelta
+    from sqlalchemy import text
+    
+    old = empty_registry.register_prompt(task="old", template="Old", meta={}, tags=["x"], project="p")
+    recent = empty_registry.register_prompt(task="recent", template="Recent", meta={}, project="p")
+    empty_registry.soft_delete_prompt(old.prompt_id)
+    empty_registry.soft_delete_prompt(recent.prompt_id)
+    
+    with empty_registry.engine.begin() as conn:
+        conn.execute(
+            text("UPDATE prompts SET updated_at = :at WHERE prompt_id = :id"),
+            {"at": datetime.utcnow() - timedelta(days=40), "id": old.prompt_id}
+        )
+        conn.execute(text("INSERT INTO prompt_tags (prompt_id, tag_name) VALUES ('gone', 'x')"))
+    
+    result = empty_registry.gc(purge_deleted_after_days=30, vacuum=False)
+    assert result["expired_deleted"] == 1
+    assert result["orphans_removed"]["prompt_tags"] == 1
+    assert result["vacuum"] is None
+    assert empty_registry.get_prompt(old.prompt_id, include_deleted=True) is None
+    assert empty_registry.get_prompt(recent.prompt_id, include_deleted=True) is not None
+    assert empty_registry.get_tag_stats() == {}
+    
+    with pytest.raises(ValueError):
+        empty_registry.gc(keep_last=0)
+
+def test_backup_and_restore(empty_registry, tmp_path):
+    """Test online backups run alongside writers and restore into another registry."""
+    import threading
+    from cuebit.registry import PromptRegistry
+    
+    for n in range(50):
+        empty_registry.register_prompt(
+            task=f"t{n}", template="Body {x} " * 50, meta={}, project="backup",
+            examples=[{"input": "x" * 5000, "output": "y"}]
+        )
+    
+    stop = threading.Event()
+    written = []
+    
+    def writer():
+        while not stop.is_set():
+            written.append(empty_registry.register_prompt(task="live", template="Live {x}", meta={}))
+    
+    thread = threading.Thread(target=writer)
+    thread.start()
+    steps = []
+    try:
+        result = empty_registry.backup(
+            str(tmp_path / "copy.db"), pages_per_step=2,
+            progress=lambda remaining, total: steps.append(remaining)
+        )
+    finally:
+        stop.set()
+        thread.join()
+    assert result["steps"] > 1 and steps[-1] == 0
+    
+    compressed = empty_registry.backup(str(tmp_path / "copy.db.gz"))
+    assert compressed["compressed"] and compressed["bytes"] < result["bytes"]
+    
+    target = PromptRegistry(f"sqlite:///{tmp_path / 'target.db'}")
+    target.register_prompt(task="overwritten", template="Gone", meta={})
+    restored = target.restore(str(tmp_path / "copy.db.gz"))
+    assert restored["prompts"] == 50 + len(written)
+    assert target.list_prompts_by_project("backup")[0].task.startswith("t")
+    assert target.list_prompts(search_term="Gone")[1] == 0
+    assert len(target.get_examples(target.list_prompts_by_project("backup")[0].prompt_id)[0]["input"]) == 5000
+    
+    (tmp_path / "junk.db").write_bytes(b"not a database" * 100)
+    with pytest.raises(ValueError):
+        target.restore(str(tmp_path / "junk.db"))
+    with pytest.raises(FileNotFoundError):
+        target.restore(str(tmp_path / "missing.db"))
+
+def test_interrupted_compressed_backup_leaves_no_file(empty_registry, tmp_path, monkeypatch):
+    """Test a compressed backup that fails part way does not leave a truncated file."""
+    import shutil
+
+    empty_registry.register_prompt(task="t", template="Body {x}", meta={})
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(shutil, "copyfileobj", fail)
+    with pytest.raises(OSError):
+        empty_registry.backup(str(tmp_path / "copy.db.gz"))
+    assert list(tmp_path.iterdir()) == []
+
+def test_restore_discards_similarity_index(tmp_path):
+    """Test prompts registered after restoring an older backup are searchable."""
+    from cuebit.registry import PromptRegistry
+    
+    db_url = f"sqlite:///{tmp_path / 'live.db'}"
+    registry = PromptRegistry(db_url)
+    registry.register_prompt(task="a", template="Summarize {text}", meta={})
+    registry.backup(str(tmp_path / "old.db"))
+    registry.register_prompt(task="b", template="Translate {text}", meta={})
+    registry.similar_prompts("translate", k=1)
+    
+    registry.restore(str(tmp_path / "old.db"))
+    assert not (tmp_path / "live.similarity.npz").exists()
+    added = registry.register_prompt(task="c", template="Compose a sonnet about {topic}", meta={})
+    assert [m["prompt_id"] for m in registry.similar_prompts("sonnet", k=1)] == [added.prompt_id]
+    assert [m["prompt_id"] for m in PromptRegistry(db_url).similar_prompts("sonnet", k=1)] == [added.prompt_id]
+
+def test_hard_delete_cascades_to_child_tables(empty_registry):
+    """Test hard deletes remove tags, examples and index rows with the prompts."""
+    from sqlalchemy import text
+    
+    empty_registry.add_meta_index("model")
+    v1 = empty_registry.register_prompt(
+        task="t", template="Hello {name}", meta={"model": "gpt-4"}, tags=["a", "b"], project="p",
+        examples=[{"input": "i", "output": "o"}]
+    )
+    v2 = empty_registry.update_prompt(v1.prompt_id, "Hi {name}")
+    keep = empty_registry.register_prompt(task="u", template="Keep {x}", meta={}, tags=["a"], project="p")
+    other = empty_registry.register_prompt(
+        task="t", template="Other {name}", meta={"model": "gpt-4"}, tags=["a"], project="q",
+        examples=[{"input": "i", "output": "o"}]
+    )
+    
+    counts = empty_registry.hard_delete_prompts(project="p", task="t")
+    assert counts["prompts"] == 2
+    assert counts["prompt_tags"] == 4
+    assert counts["examples"] == 1
+    assert counts["prompt_variables"] == 2
+    assert counts["prompt_meta_values"] == 2
+    assert empty_registry.get_prompt(v2.prompt_id, include_deleted=True) is None
+    assert empty_registry.get_tag_stats() == {"a": 2}
+    
+    # The same task name in another project is untouched
+    survivor = empty_registry.get_prompt(other.prompt_id)
+    assert json.loads(survivor.tags) == ["a"]
+    assert len(empty_registry.get_examples(other.prompt_id)) == 1
+    assert [p.prompt_id for p in empty_registry.find_by_variable("name")] == [other.prompt_id]
+    assert [p.prompt_id for p in empty_registry.query_by_meta({"model": "gpt-4"})[0]] == [other.prompt_id]
+    
+    assert empty_registry.delete_prompt_by_id(keep.prompt_id) is True
+    assert empty_registry.delete_prompt_by_id(keep.prompt_id) is False
+    assert empty_registry.delete_project("q", use_soft_delete=False) == 1
+    
+    with empty_registry.engine.connect() as conn:
+        for table in ("prompt_tags", "examples", "prompt_signatures", "prompt_meta_values", "prompt_variables"):
+            assert conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() == 0
+    
+    with pytest.raises(ValueError):
+        empty_registry.hard_delete_prompts(task="t")
+
+def test_archive_versions_stay_readable(empty_registry):
+    """Test archived versions leave the prompts table but remain readable."""
+    from sqlalchemy import text
+    
+    v1 = empty_registry.register_prompt(
+        task="t", template="v1 {x}", meta={"m": 1}, tags=["a"], project="p",
+        examples=[{"input": "i", "output": "o"}]
+    )
+    latest = v1
+    for n in range(2, 5):
+        latest = empty_registry.update_prompt(latest.prompt_id, f"v{n} {{x}}")
+    empty_registry.add_alias(latest.prompt_id, "prod")
+    v2 = empty_registry.get_version_history("p", "t")[1]
+    
+    assert empty_registry.archive_versions(keep_last=2, dry_run=True)["selected_versions"] == 2
+    result = empty_registry.archive_versions(keep_last=2, batch_size=1)
+    assert result["archived"] == 2
+    assert result["rows_deleted"]["examples"] == 1
+    
+    assert [p.version for p in empty_registry.get_version_history("p", "t")] == [3, 4]
+    history = empty_registry.get_version_history("p", "t", include_archived=True)
+    assert [p.version for p in history] == [1, 2, 3, 4]
+    assert empty_registry.list_prompts()[1] == 2
+    
+    archived = empty_registry.get_prompt(v1.prompt_id)
+    assert archived.template == "v1 {x}"
+    assert archived.meta == {"m": 1}
+    assert empty_registry.get_examples(v1.prompt_id)[0]["input"] == "i"
+    
+    lineage = empty_registry.get_prompt_lineage(latest.prompt_id)
+    assert [p.version for p in lineage["ancestors"]] == [1, 2, 3]
+    lineage = empty_registry.get_prompt_lineage(v1.prompt_id)
+    assert [p.version for p in lineage["descendants"]] == [2, 3, 4]
+    assert "error" not in empty_registry.compare_versions(v1.prompt_id, latest.prompt_id)
+    
+    restored = empty_registry.rollback_to_version(v2.prompt_id)
+    assert restored.template == "v2 {x}"
+    assert restored.version == 5
+    assert json.loads(restored.tags) == ["a"]
+    
+    with empty_registry.engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM prompts_archive")).scalar() == 2
+        
+    counts = empty_registry.hard_delete_prompts(project="p")
+    assert counts["prompts_archive"] == 2
+    assert empty_registry.get_prompt(v1.prompt_id) is None
+
+def test_export_import_archived_versions(empty_registry):
+    """Test exports carry archived versions and imports put them back in the archive."""
+    from cuebit.registry import PromptRegistry
+    
+    latest = empty_registry.register_prompt(
+        task="t", template="v1 {x}", meta={}, project="p", examples=[{"input": "i", "output": "o"}]
+    )
+    for n in range(2, 5):
+        latest = empty_registry.update_prompt(latest.prompt_id, f"v{n} {{x}}")
+    empty_registry.archive_versions(keep_last=1)
+    
+    records = json.loads(empty_registry.export_prompts())
+    assert sorted((r["version"], r.get("archived", False)) for r in records) == \
+        [(1, True), (2, True), (3, True), (4, False)]
+    assert empty_registry.export_changes()["prompts"][0]["version"] == 4
+    
+    target = PromptRegistry("sqlite:///:memory:")
+    assert target.import_prompts(json.dumps(records))["imported"] == 4
+    assert [p.version for p in target.get_version_history("p", "t")] == [4]
+    assert len(target.get_version_history("p", "t", include_archived=True)) == 4
+    v1 = next(r["prompt_id"] for r in records if r["version"] == 1)
+    assert target.get_examples(v1)[0]["input"] == "i"
+    assert target.get_prompt_lineage(latest.prompt_id)["ancestors"][0].prompt_id == v1
+    
+    assert target.import_prompts(json.dumps(records))["skipped"] == 4
+    assert target.import_prompts(json.dumps(records), on_conflict="overwrite")["updated"] == 4
+    archived = [r for r in records if r.get("archived")]
+    assert "error" in target.import_prompts(json.dumps(archived), on_conflict="fail")
+
+def test_prompt_detail_bundle(empty_registry):
+    """Test the detail bundle resolves aliases and uses a fixed number of queries."""
+    from sqlalchemy import event
+    
+    v1 = empty_registry.register_prompt(
+        task="t", template="v1 {x}", meta={}, project="p",
+        examples=[{"input": f"in {n}", "output": "o"} for n in range(3)]
+    )
+    v2 = empty_registry.update_prompt(v1.prompt_id, "v2 {x}")
+    v3 = empty_registry.update_prompt(v2.prompt_id, "v3 {x}")
+    empty_registry.add_alias(v2.prompt_id, "prod")
+    
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(empty_registry.engine, "before_cursor_execute", listener)
+    try:
+        detail = empty_registry.get_prompt_detail("prod", examples_limit=2)
+    finally:
+        event.remove(empty_registry.engine, "before_cursor_execute", listener)
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 3
+    
+    assert detail["prompt"].prompt_id == v2.prompt_id
+    assert [a["version"] for a in detail["ancestors"]] == [1]
+    assert [d["prompt_id"] for d in detail["descendants"]] == [v3.prompt_id]
+    assert "template" not in detail["ancestors"][0]
+    assert detail["examples"] == []
+    
+    detail = empty_registry.get_prompt_detail(v1.prompt_id, examples_limit=2, lineage_depth=1)
+    assert [d["version"] for d in detail["descendants"]] == [2]
+    assert [ex["input"] for ex in detail["examples"]] == ["in 0", "in 1"]
+    assert detail["example_count"] == 3
+    page, _ = empty_registry.get_examples_page(v1.prompt_id, after_id=detail["next_cursor"])
+    assert [ex["input"] for ex in page] == ["in 2"]
+    
+    # Requesting no examples still hands out a cursor when there are some
+    detail = empty_registry.get_prompt_detail(v1.prompt_id, examples_limit=0)
+    assert detail["examples"] == [] and detail["example_count"] == 3
+    page, _ = empty_registry.get_examples_page(v1.prompt_id, after_id=detail["next_cursor"])
+    assert [ex["input"] for ex in page] == ["in 0", "in 1", "in 2"]
+    assert empty_registry.get_prompt_detail(v3.prompt_id, examples_limit=0)["next_cursor"] is None
+    
+    # Archived examples page by position
+    empty_registry.archive_versions(keep_last=1)
+    detail = empty_registry.get_prompt_detail(v1.prompt_id, examples_limit=2)
+    assert detail["archived"] and detail["next_cursor"] == 2
+    page, cursor = empty_registry.get_examples_page(v1.prompt_id, limit=1)
+    assert [ex["input"] for ex in page] == ["in 0"] and cursor == 1
+    page, cursor = empty_registry.get_examples_page(v1.prompt_id, limit=5, after_id=detail["next_cursor"])
+    assert [ex["input"] for ex in page] == ["in 2"] and cursor is None
+    
+    assert empty_registry.get_prompt_detail("missing") is None
+
+def test_large_examples_are_compressed(temp_db_path):
+    """Test example bodies above the threshold are stored compressed and read back."""
+    from sqlalchemy import create_engine, text
+    
+    big = "Customer: my order never arrived.\n" * 500
+    registry = PromptRegistry(db_url=temp_db_path, example_compression="lzma")
+    prompt = registry.register_prompt(
+        task="t", template="T", meta={}, project="p",
+        examples=[{"input": big, "output": "Refund issued"}, {"input": "short", "output": "ok"}]
+    )
+    
+    with registry.engine.connect() as conn:
+        rows = conn.execute(text("SELECT compression, input_text FROM examples ORDER BY id")).fetchall()
+    assert rows[0] == ("lzma", "")
+    assert rows[1] == (None, "short")
+    
+    examples = registry.get_examples(prompt.prompt_id)
+    assert examples[0]["input"] == big and examples[0]["output"] == "Refund issued"
+    assert json.loads(registry.export_prompts())[0]["examples"][0]["input"] == big
+    
+    # Databases from before compression gain the columns and can be compressed in place
+    registry.engine.dispose()
+    engine = create_engine(temp_db_path)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM examples"))
+        conn.execute(text("ALTER TABLE examples DROP COLUMN body"))
+        conn.execute(text("ALTER TABLE examples DROP COLUMN compression"))
+        conn.execute(
+            text("INSERT INTO examples (prompt_id, input_text, output_text) VALUES (:p, :i, 'o')"),
+            {"p": prompt.prompt_id, "i": big}
+        )
+    engine.dispose()
+    
+    upgraded = PromptRegistry(db_url=temp_db_path)
+    assert upgraded.compress_examples()["compressed"] == 1
+    assert upgraded.get_examples(prompt.prompt_id)[0]["input"] == big
@@ -0,0 +1,218 @@
+"""
+Tests for the project-sharded registry.
+"""
+
+import json
+
+import pytest
+
+from cuebit.sharding import ShardedPromptRegistry
+
+
+@pytest.fixture(scope="function")
+def sharded_registry(tmp_path):
+    """Create a registry with three shards and one pinned project."""
+    registry = ShardedPromptRegistry.from_directory(
+        str(tmp_path / "shards"), 3, routes={"pinned": "shard-02"}
+    )
+    yield registry
+    registry.close()
+
+
+def _seed(registry):
+    """Register prompts in several projects."""
+    ids = {}
+    for project in ["alpha", "beta", "gamma", "delta", "pinned"]:
+        for task in ["summarize", "classify"]:
+            prompt = registry.register_prompt(
+                task=task,
+                template=f"{task} for {project}: {{input}}",
+                tags=["prod"] if project != "beta" else ["dev"],
+                project=project
+            )
+            ids[(project, task)] = prompt.prompt_id
+    return ids
+
+
+def test_routing_is_stable(sharded_registry):
+    """Test projects are routed by table first and by hash otherwise."""
+    assert sharded_registry.shard_for_project("pinned") == "shard-02"
+    assert sharded_registry.shard_for_project(None) == "shard-00"
+    assert sharded_registry.shard_for_project("alpha") == sharded_registry.shard_for_project("alpha")
+
+    ids = _seed(sharded_registry)
+    shard = sharded_registry.shards["shard-02"]
+    assert shard.get_prompt(ids[("pinned", "summarize")]) is not None
+    alpha = sharded_registry.shards[sharded_registry.shard_for_project("alpha")]
+    assert "alpha" in alpha.list_projects()
+
+    with pytest.raises(ValueError):
+        ShardedPromptRegistry(["sqlite://"], routes={"x": "missing"})
+
+
+def test_fan_out_list_and_search(sharded_registry):
+    """Test cross-project reads merge every shard in registry order."""
+    _seed(sharded_registry)
+
+    assert sharded_registry.list_projects() == ["alpha", "beta", "delta", "gamma", "pinned"]
+
+    prompts, total = sharded_registry.list_prompts(page=1, page_size=4)
+    assert total == 10
+    assert [(p.project, p.task) for p in prompts] == [
+        ("alpha", "classify"), ("alpha", "summarize"), ("beta", "classify"), ("beta", "summarize")
+    ]
+    page3, _ = sharded_registry.list_prompts(page=3, page_size=4)
+    assert [(p.project, p.task) for p in page3] == [("pinned", "classify"), ("pinned", "summarize")]
+
+    results, total = sharded_registry.search_prompts("summarize", tags=["prod"])
+    assert total == 4
+    assert "beta" not in {p.project for p in results}
+
+    results, total = sharded_registry.search_prompts("classify", project="gamma")
+    assert total == 1
+
+
+def test_prompt_id_operations_find_their_shard(sharded_registry):
+    """Test ID-based operations reach the shard that holds the prompt."""
+    ids = _seed(sharded_registry)
+    prompt_id = ids[("gamma", "summarize")]
+
+    updated = sharded_registry.update_prompt(prompt_id, "New {input}")
+    assert updated.version == 2
+    assert sharded_registry.get_prompt(updated.prompt_id).template == "New {input}"
+    assert sharded_registry.render_prompt(updated.prompt_id, {"input": "x"}) == "New x"
+    assert len(sharded_registry.get_version_history("gamma", "summarize")) == 2
+
+    # A fresh registry over the same shards locates IDs by asking every shard
+    other = ShardedPromptRegistry(
+        {name: shard.db_url for name, shard in sharded_registry.shards.items()},
+        routes=sharded_registry.routes
+    )
+    try:
+        assert other.get_prompt(prompt_id).project == "gamma"
+        assert other.get_prompt("missing") is None
+        assert other.soft_delete_prompt(prompt_id)
+        assert other.get_prompt(prompt_id) is None
+    finally:
+        other.close()
+
+
+def test_alias_is_unique_across_shards(sharded_registry):
+    """Test moving an alias between shards removes it from the old prompt."""
+    ids = _seed(sharded_registry)
+    first, second = ids[("alpha", "summarize")], ids[("pinned", "summarize")]
+    assert sharded_registry.shard_for_project("alpha") != "shard-02"
+
+    sharded_registry.add_alias(first, "prod")
+    assert sharded_registry.add_alias(second, "prod", overwrite=False) is None
+    assert sharded_registry.get_prompt_by_alias("prod").prompt_id == first
+
+    sharded_registry.add_alias(second, "prod")
+    assert sharded_registry.get_prompt_by_alias("prod").prompt_id == second
+    assert sharded_registry.get_prompt(first).alias is None
+
+
+def test_usage_stats_and_export_merge_shards(sharded_registry):
+    """Test statistics and exports cover every shard."""
+    _seed(sharded_registry)
+
+    stats = sharded_registry.get_usage_stats()
+    assert stats["total_prompts"] == 10
+    assert stats["total_projects"] == 5
+    assert stats["total_tasks"] == 2
+    assert dict(stats["top_tags"]) == {"prod": 8, "dev": 2}
+    assert sum(stats["shards"].values()) == 10
+
+    exported = json.loads(sharded_registry.export_prompts())
+    assert len(exported) == 10
+    assert {p["project"] for p in json.loads(sharded_registry.export_prompts(project="beta"))} == {"beta"}
+
+
+def test_import_partitions_by_project(sharded_registry, tmp_path):
+    """Test imported prompts land on their project's shard."""
+    _seed(sharded_registry)
+    exported = sharded_registry.export_prompts()
+
+    target = ShardedPromptRegistry.from_directory(
+        str(tmp_path / "target"), 3, routes={"pinned": "shard-02"}
+    )
+    try:
+        results = target.import_prompts(exported)
+        assert results["imported"] == 10
+        assert results["errors"] == 0
+        for name, shard in target.shards.items():
+            for project in shard.list_projects():
+                assert target.shard_for_project(project) == name
+
+        assert target.import_prompts(exported)["skipped"] == 10
+        assert "error" in target.import_prompts("not json")
+    finally:
+        target.close()
+
+
+def test_file_export_import_across_shards(sharded_registry, tmp_path):
+    """Test compressed file exports stream every shard and imports route by project."""
+    _seed(sharded_registry)
+    path = str(tmp_path / "all.ndjson.gz")
+    assert sharded_registry.export_to_file(path)["prompts"] == 10
+
+    target = ShardedPromptRegistry.from_directory(str(tmp_path / "target"), 2)
+    try:
+        results = target.import_from_file(path, batch_size=3)
+        assert results["total"] == 10 and results["imported"] == 10
+        for name, shard in target.shards.items():
+            for project in shard.list_projects():
+                assert target.shard_for_project(project) == name
+    finally:
+        target.close()
+
+
+def test_bulk_tag_across_shards(sharded_registry):
+    """Test bulk tagging by ID and by filter reaches every shard."""
+    ids = _seed(sharded_registry)
+
+    count = sharded_registry.bulk_tag_prompts(
+        [ids[("alpha", "summarize")], ids[("pinned", "classify")]], ["reviewed"]
+    )
+    assert count == 2
+    assert sharded_registry.get_tag_stats()["reviewed"] == 2
+
+    assert sharded_registry.bulk_tag_prompts(None, ["legacy"], tag_filter=["dev"]) == 2
+    assert sharded_registry.get_tag_stats()["legacy"] == 2
+
+
+def test_delta_export_routes_changes(sharded_registry, tmp_path):
+    """Test deltas merge every shard and apply on the owning shards."""
+    ids = _seed(sharded_registry)
+    target = ShardedPromptRegistry.from_directory(str(tmp_path / "target"), 3, routes={"pinned": "shard-02"})
+    try:
+        full = sharded_registry.export_changes()
+        assert len(full["prompts"]) == 10
+        assert target.apply_changes(full)["imported"] == 10
+
+        sharded_registry.soft_delete_prompt(ids[("gamma", "classify")])
+        delta = sharded_registry.export_prompts(since=full["until"])
+        results = target.import_prompts(delta)
+        assert results["deleted"] == 1
+        assert target.get_prompt(ids[("gamma", "classify")]) is None
+        assert target.import_prompts(delta)["skipped"] == 1
+        for format in ("ndjson", "yaml-stream"):
+            with pytest.raises(ValueError):
+                sharded_registry.export_prompts(since=full["until"], format=format)
+    finally:
+        target.close()
+
+
+def test_backup_and_restore_every_shard(sharded_registry, tmp_path):
+    """Test each shard is backed up to its own file and restored from it."""
+    ids = _seed(sharded_registry)
+    results = sharded_registry.backup(str(tmp_path / "backup"), compress=True)
+    assert set(results) == set(sharded_registry.shard_names)
+    assert all(r["compressed"] for r in results.values())
+
+    sharded_registry.delete_prompt_by_id(ids[("alpha", "summarize")])
+    assert sharded_registry.get_prompt(ids[("alpha", "summarize")]) is None
+
+    restored = sharded_registry.restore(str(tmp_path / "backup"))
+    assert sum(r["prompts"] for r in restored.values()) == 10
+    assert sharded_registry.get_prompt(ids[("alpha", "summarize")]) is not None
@@ -0,0 +1,68 @@
+"""
+Tests for the TF-IDF similarity index.
+"""
+
+import os
+
+from cuebit.similarity import SimilarityIndex, hash_terms
+
+def test_hash_terms():
+    """Test hashing text into sparse term counts."""
+    indices, counts = hash_terms("Summarize summarize the text")
+    
+    # 3 distinct unigrams + 3 bigrams, with "summarize" counted twice
+    assert counts.sum() == 7
+    assert list(indices) == sorted(indices)
+    
+    empty_indices, empty_counts = hash_terms("")
+    assert len(empty_indices) == 0 and len(empty_counts) == 0
+
+def test_query_ranking():
+    """Test that the closest template ranks first."""
+    index = SimilarityIndex()
+    index.add([
+        (1, "a", "Summarize this news article in three sentences: {article}"),
+        (2, "b", "Translate the following text to German: {text}"),
+        (3, "c", "Write a product description for {product}"),
+    ])
+    
+    results = index.query("Summarize the article in two sentences", k=2)
+    
+    assert results[0][0] == "a"
+    assert 0 < results[0][1] <= 1
+    assert len(results) <= 2
+
+def test_incremental_add_and_persistence(tmp_path):
+    """Test appending rows and reloading the index from disk."""
+    path = str(tmp_path / "index.npz")
+    index = SimilarityIndex(path)
+    index.add([(1, "a", "Classify the sentiment of {review}")])
+    index.add([(1, "a", "duplicate row id is ignored"), (2, "b", "Extract named entities from {text}")])
+    index.save()
+    
+    assert len(index) == 2
+    assert os.path.exists(path)
+    
+    reloaded = SimilarityIndex(path)
+    assert len(reloaded) == 2
+    assert reloaded.max_row_id == 2
+    assert reloaded.query("named entities", k=1)[0][0] == "b"
+
+def test_saves_are_batched(tmp_path, monkeypatch):
+    """Test a saved index is only rewritten once enough rows are pending."""
+    from cuebit import similarity
+    
+    monkeypatch.setattr(similarity, "SAVE_BATCH_ROWS", 3)
+    path = str(tmp_path / "index.npz")
+    index = SimilarityIndex(path)
+    index.add([(1, "a", "Classify the sentiment of {review}")])
+    assert index.save_if_due()
+    
+    index.add([(2, "b", "Extract named entities from {text}")])
+    assert not index.save_if_due()
+    assert len(SimilarityIndex(path)) == 1
+    
+    index.add([(3, "c", "Summarize {text}"), (4, "d", "Translate {text}")])
+    assert index.save_if_due()
+    assert len(SimilarityIndex(path)) == 4
+    assert not index.save_if_due()
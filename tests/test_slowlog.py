@@ -0,0 +1,77 @@
+"""
+Tests for the slow query log.
+"""
+
+import os
+
+import pytest
+
+from cuebit import slowlog
+
+def test_redact_parameters():
+    """Test that text values are redacted and numbers kept."""
+    assert slowlog.redact_parameters(("secret", 5, None, b"abc")) == \
+        ["<str len=6>", 5, None, "<bytes len=3>"]
+    assert slowlog.redact_parameters({"name": "x", "limit": 10}) == \
+        {"name": "<str len=1>", "limit": 10}
+    assert slowlog.redact_parameters([("a",), ("bb",)], executemany=True) == \
+        [["<str len=1>"], ["<str len=2>"]]
+
+def test_is_full_scan():
+    """Test full scan detection for SQLite and Postgres plans."""
+    assert slowlog.is_full_scan(["SCAN prompts"])
+    assert slowlog.is_full_scan(["Seq Scan on prompts  (cost=0.00..1.01 rows=1 width=8)"])
+    assert not slowlog.is_full_scan(["SEARCH prompts USING INDEX ix_prompts_alias (alias=?)"])
+    assert not slowlog.is_full_scan(None)
+
+def test_registry_slow_query_log(sample_registry, tmp_path):
+    """Test that slow statements are logged with their plans."""
+    path = str(tmp_path / "slow.log")
+    sample_registry.enable_slow_query_log(threshold_ms=0, path=path)
+    try:
+        sample_registry.list_prompts()
+        sample_registry.list_prompts(tag_filter=["test"])
+    finally:
+        sample_registry.disable_slow_query_log()
+    
+    entries = list(slowlog.read_entries(path))
+    assert entries
+    count_query = next(e for e in entries if "count(*)" in e["statement"])
+    assert count_query["duration_ms"] >= 0
+    assert count_query["dialect"] == "sqlite"
+    assert slowlog.is_full_scan(count_query["plan"])
+    
+    tag_query = next(e for e in entries if "prompt_tags" in e["statement"])
+    assert any("<str len=" in str(p) for p in tag_query["parameters"])
+    assert not slowlog.is_full_scan(tag_query["plan"])
+    
+    summary = slowlog.summarize(entries)
+    assert summary[0]["total_ms"] >= summary[-1]["total_ms"]
+    assert sum(group["count"] for group in summary) == len(entries)
+
+def test_threshold_filters_fast_statements(sample_registry, tmp_path):
+    """Test that statements under the threshold are not logged."""
+    path = str(tmp_path / "slow.log")
+    sample_registry.enable_slow_query_log(threshold_ms=60000, path=path)
+    sample_registry.list_projects()
+    sample_registry.disable_slow_query_log()
+    
+    assert list(slowlog.read_entries(path)) == []
+
+def test_log_rotation(tmp_path):
+    """Test that the log rotates and rotated files are read back."""
+    path = str(tmp_path / "slow.log")
+    log = slowlog.SlowQueryLog(path, max_bytes=200, backup_count=2)
+    for i in range(10):
+        log.write({"statement": "SELECT 1", "duration_ms": float(i)})
+    log.detach()
+    
+    assert os.path.exists(path + ".1")
+    durations = [e["duration_ms"] for e in slowlog.read_entries(path)]
+    assert durations == sorted(durations)
+    assert durations[-1] == 9.0
+
+def test_negative_threshold_rejected(tmp_path):
+    """Test that a negative threshold is rejected."""
+    with pytest.raises(ValueError):
+        slowlog.SlowQueryLog(str(tmp_path / "slow.log"), threshold_ms=-1)
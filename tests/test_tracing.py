@@ -0,0 +1,78 @@
+"""
+Tests for the tracing hooks.
+"""
+
+import pytest
+
+from cuebit import tracing
+
+@pytest.fixture
+def memory_tracer():
+    """Enable the in-memory tracer for the duration of a test."""
+    tracer = tracing.configure("memory")
+    yield tracer
+    tracing.configure(None)
+
+def test_noop_by_default():
+    """Test that tracing records nothing unless configured."""
+    tracer = tracing.get_tracer()
+    assert not tracer.enabled
+    with tracing.span("anything") as span:
+        span.set_attribute("key", "value")
+
+def test_registry_and_sql_spans(memory_tracer, sample_registry):
+    """Test spans around public registry methods and SQL statements."""
+    memory_tracer.clear()
+    token = tracing.set_request_id("req-123")
+    try:
+        sample_registry.get_prompt_by_alias("test-alias")
+    finally:
+        tracing.reset_request_id(token)
+    
+    names = [s.name for s in memory_tracer.finished]
+    assert "PromptRegistry.get_prompt_by_alias" in names
+    assert "sql SELECT" in names
+    
+    method_span = next(s for s in memory_tracer.finished if s.name == "PromptRegistry.get_prompt_by_alias")
+    sql_span = next(s for s in memory_tracer.finished if s.name == "sql SELECT")
+    assert sql_span.parent is method_span
+    assert sql_span.attributes["db.system"] == "sqlite"
+    assert "prompts" in sql_span.attributes["db.statement"]
+    assert method_span.attributes["cuebit.request_id"] == "req-123"
+    assert sql_span.attributes["cuebit.request_id"] == "req-123"
+
+def test_span_records_exception(memory_tracer, sample_registry):
+    """Test that a failing method marks its span as errored."""
+    memory_tracer.clear()
+    with pytest.raises(ValueError):
+        sample_registry.find_near_duplicates(threshold=2)
+    
+    span = memory_tracer.finished[-1]
+    assert span.name == "PromptRegistry.find_near_duplicates"
+    assert "ValueError" in span.error
+
+def test_configure_rejects_unknown_backend():
+    """Test that an unknown backend name is rejected."""
+    with pytest.raises(ValueError):
+        tracing.configure("zipkin")
+
+def test_opentelemetry_adapter(sample_registry):
+    """Test spans exported through the OpenTelemetry SDK."""
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracing.configure(tracing.OpenTelemetryTracer(tracer_provider=provider))
+    try:
+        sample_registry.list_projects()
+    finally:
+        tracing.configure(None)
+    
+    spans = {s.name: s for s in exporter.get_finished_spans()}
+    assert "PromptRegistry.list_projects" in spans
+    assert "sql SELECT" in spans
+    assert spans["sql SELECT"].parent.span_id == spans["PromptRegistry.list_projects"].context.span_id